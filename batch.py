@@ -0,0 +1,245 @@
+"""
+Execução em lote de perguntas pelo grafo de pesquisa
+
+Uso:
+    python batch.py questions.jsonl --output answers.jsonl --concurrency 8
+    python batch.py questions.csv --output answers.jsonl    # retoma: pula ids já concluídos
+
+Entrada: JSONL com {"id": ..., "question": ...} por linha, ou CSV com as
+colunas id e question (sem id, usa um hash da pergunta). Cada resposta é
+gravada no JSONL de saída assim que termina, com referências e tempos por
+nó. As perguntas rodam com graph.ainvoke em um único event loop,
+compartilhando caches, pools HTTP e o escalonador de modelos, com
+prioridade de batch (interactive=False) para não atrasar usuários
+interativos do mesmo processo.
+"""
+
+import argparse
+import asyncio
+import csv
+import hashlib
+import json
+import os
+import sys
+import time
+from typing import Iterator, Optional
+
+import perplexity
+from scheduler import scheduling_context
+
+
+def _question_id(question: str) -> str:
+    return hashlib.sha1(question.encode("utf-8")).hexdigest()[:12]
+
+
+def read_questions(path: str) -> list[dict]:
+    """
+    Ler as perguntas de um arquivo JSONL ou CSV
+
+    Args:
+        path: Arquivo .jsonl/.json (um objeto por linha) ou .csv (com cabeçalho)
+
+    Returns:
+        Lista de {"id", "question"} sem ids repetidos
+
+    Raises:
+        ValueError: Linha sem pergunta ou id repetido
+    """
+    if path.lower().endswith(".csv"):
+        with open(path, newline="", encoding="utf-8") as f:
+            rows = list(csv.DictReader(f))
+    else:
+        with open(path, encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+
+    questions, seen = [], set()
+    for number, row in enumerate(rows, 1):
+        question = (row.get("question") or "").strip()
+        if not question:
+            raise ValueError(f"{path}:{number}: campo 'question' vazio")
+        question_id = str(row.get("id") or _question_id(question))
+        if question_id in seen:
+            raise ValueError(f"{path}:{number}: id repetido {question_id}")
+        seen.add(question_id)
+        questions.append({"id": question_id, "question": question})
+    return questions
+
+
+def completed_ids(path: str) -> set[str]:
+    """
+    Ids já concluídos em um arquivo de saída anterior
+
+    Linhas incompletas (queda no meio da escrita) e perguntas que falharam
+    são ignoradas, para serem executadas de novo.
+
+    Args:
+        path: JSONL de saída
+
+    Returns:
+        Conjunto de ids com status "done"
+    """
+    if not os.path.exists(path):
+        return set()
+    done = set()
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get("status") == "done":
+                done.add(record["id"])
+    return done
+
+
+class Progress:
+    """Throughput e ETA impressos a cada pergunta concluída"""
+
+    def __init__(self, total: int, stream=None):
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.started = time.perf_counter()
+        self.stream = stream or sys.stderr
+
+    def eta(self) -> Optional[float]:
+        """Segundos restantes na taxa atual (None antes da primeira pergunta)"""
+        finished = self.done + self.failed
+        if not finished:
+            return None
+        return (self.total - finished) * (time.perf_counter() - self.started) / finished
+
+    def update(self, ok: bool, question_id: str, elapsed: float) -> None:
+        if ok:
+            self.done += 1
+        else:
+            self.failed += 1
+        finished = self.done + self.failed
+        wall_time = time.perf_counter() - self.started
+        rate = finished / wall_time * 60 if wall_time else 0.0
+        eta = self.eta()
+        print(
+            f"[{finished}/{self.total}] {'✅' if ok else '❌'} {question_id} {elapsed:.1f}s | "
+            f"{rate:.1f} perguntas/min | ETA {_format_seconds(eta) if eta is not None else '?'} | "
+            f"falhas: {self.failed}",
+            file=self.stream, flush=True
+        )
+
+
+def _format_seconds(seconds: float) -> str:
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02d}m{seconds:02d}s" if hours else f"{minutes}m{seconds:02d}s"
+
+
+async def run_question(item: dict) -> dict:
+    """
+    Executar uma pergunta e montar o registro de saída
+
+    Args:
+        item: {"id", "question"}
+
+    Returns:
+        Registro com status, resposta, referências e tempos (s desde o início) por nó
+    """
+    config = None
+    graph_input = {"user_input": item["question"]}
+    record = {"id": item["id"], "question": item["question"]}
+    output, nodes, ttft = {}, {}, None
+    started = time.perf_counter()
+    try:
+        if perplexity.graph.checkpointer is not None:
+            # Mesma thread na nova execução: uma pergunta interrompida continua do último checkpoint
+            config = perplexity.run_config(f"batch-{item['id']}")
+            graph_input = await perplexity.agraph_input(item["question"], config)
+        with scheduling_context(session_id="batch", interactive=False):
+            async for mode, chunk in perplexity.graph.astream(graph_input, config,
+                                                              stream_mode=["updates", "custom", "values"]):
+                if mode == "values":
+                    output = chunk
+                elif mode == "updates":
+                    for node in chunk:
+                        nodes[node] = round(time.perf_counter() - started, 3)
+                elif "ttft" in chunk and ttft is None:
+                    ttft = round(time.perf_counter() - started, 3)
+        answer, references = perplexity.split_references(output.get("final_response") or "")
+        record.update(status="done", answer=answer, references=references, metrics=output.get("metrics", {}))
+    except Exception as e:
+        record.update(status="failed", error=f"{type(e).__name__}: {e}")
+    record.update(elapsed=round(time.perf_counter() - started, 3), ttft=ttft, nodes=nodes,
+                  finished_at=time.strftime("%Y-%m-%dT%H:%M:%S"))
+    return record
+
+
+async def run_batch(questions: list[dict], output_path: str, concurrency: int) -> Progress:
+    """
+    Executar as perguntas com até concurrency pipelines simultâneos
+
+    Args:
+        questions: Perguntas pendentes
+        output_path: JSONL de saída (aberto em modo append)
+        concurrency: Pipelines simultâneos
+
+    Returns:
+        Progress com as contagens finais
+    """
+    progress = Progress(len(questions))
+    pending = iter(questions)
+
+    with open(output_path, "a", encoding="utf-8") as out:
+        async def worker() -> None:
+            # Um pipeline por worker: a próxima pergunta só entra quando uma termina
+            for item in pending:
+                record = await run_question(item)
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+                progress.update(record["status"] == "done", item["id"], record["elapsed"])
+
+        try:
+            await asyncio.gather(*(worker() for _ in range(min(concurrency, len(questions)))))
+        finally:
+            await perplexity.llm.aclose()
+            await perplexity.reasoning_llm.aclose()
+    return progress
+
+
+def _usage() -> Iterator[str]:
+    for name in ("llm", "reasoning_llm"):
+        client = getattr(perplexity, name)
+        yield f"  {client.model}: {client.token_usage()}"
+
+
+def parse_args(argv: Optional[list[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="Perguntas em JSONL ou CSV")
+    parser.add_argument("--output", "-o", default="answers.jsonl", help="JSONL de saída (retomado se existir)")
+    parser.add_argument("--concurrency", "-c", type=int, default=8, help="Pipelines simultâneos")
+    parser.add_argument("--limit", type=int, help="Executar só as primeiras N perguntas pendentes")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    args = parse_args(argv)
+    questions = read_questions(args.input)
+    done = completed_ids(args.output)
+    pending = [item for item in questions if item["id"] not in done]
+    if args.limit is not None:
+        pending = pending[:args.limit]
+    print(f"📋 {len(questions)} perguntas, {len(done & {q['id'] for q in questions})} já concluídas, "
+          f"{len(pending)} a executar com {args.concurrency} pipelines", file=sys.stderr)
+    if not pending:
+        return 0
+
+    # O modelo de raciocínio carrega enquanto as primeiras perguntas buscam
+    perplexity.start_warmup()
+    progress = asyncio.run(run_batch(pending, args.output, args.concurrency))
+    wall_time = time.perf_counter() - progress.started
+    print(f"\n🏁 {progress.done} concluídas, {progress.failed} falhas em {_format_seconds(wall_time)} "
+          f"({progress.done / wall_time * 60:.1f} perguntas/min)", file=sys.stderr)
+    print("Tokens:", *_usage(), sep="\n", file=sys.stderr)
+    print(f"📄 Respostas em {args.output}", file=sys.stderr)
+    return 1 if progress.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+"""
+Micro-batching de chamadas concorrentes
+
+Threads (ou corrotinas) diferentes submetem chaves individuais; o MicroBatcher
+agrupa o que chegar dentro de uma janela curta em uma única chamada ao
+handler e devolve a cada chamador o Future da sua chave.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Generic, Hashable, Iterable, TypeVar, Union
+
+logger = logging.getLogger(__name__)
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+BatchHandler = Callable[[list[K]], dict[K, Union[V, Exception]]]
+
+
+class MicroBatcher(Generic[K, V]):
+    """Agrupa submissões concorrentes em lotes processados por um handler"""
+
+    def __init__(self, handler: BatchHandler, max_batch_size: int = 20, max_wait: float = 0.05, max_workers: int = 4, name: str = "batcher"):
+        """
+        Inicializar batcher
+
+        Args:
+            handler: Função que recebe uma lista de chaves e devolve um dict
+                chave -> resultado (ou Exception para falhas individuais)
+            max_batch_size: Máximo de chaves por chamada ao handler
+            max_wait: Tempo máximo (s) que a primeira chave espera o lote encher
+            max_workers: Lotes processados em paralelo
+            name: Nome usado nas threads e nos logs
+        """
+        self.handler = handler
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.name = name
+        self._cond = threading.Condition()
+        self._pending: list[K] = []
+        self._first_at = 0.0
+        self._inflight: dict[K, Future] = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._dispatcher: threading.Thread | None = None
+        self.batches = 0
+        self.items = 0
+
+    def submit(self, key: K) -> Future:
+        """
+        Submeter uma chave ao próximo lote
+
+        Chaves já pendentes ou em processamento compartilham o mesmo Future.
+
+        Args:
+            key: Chave a processar
+
+        Returns:
+            Future com o resultado da chave
+        """
+        with self._cond:
+            future = self._inflight.get(key)
+            if future is not None:
+                return future
+            future = Future()
+            self._inflight[key] = future
+            if not self._pending:
+                self._first_at = time.monotonic()
+            self._pending.append(key)
+            self._ensure_dispatcher()
+            self._cond.notify()
+            return future
+
+    def submit_many(self, keys: Iterable[K]) -> dict[K, Future]:
+        """
+        Submeter várias chaves de uma vez
+
+        Args:
+            keys: Chaves a processar
+
+        Returns:
+            Dict chave -> Future
+        """
+        return {key: self.submit(key) for key in keys}
+
+    def _ensure_dispatcher(self) -> None:
+        """Iniciar a thread de despacho (chamar com o lock adquirido)"""
+        if self._dispatcher is None:
+            self._dispatcher = threading.Thread(target=self._dispatch_loop, name=f"{self.name}-dispatch", daemon=True)
+            self._dispatcher.start()
+
+    def _dispatch_loop(self) -> None:
+        """Esperar o lote encher ou a janela expirar e enviá-lo ao executor"""
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                deadline = self._first_at + self.max_wait
+                while len(self._pending) < self.max_batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._pending[:self.max_batch_size]
+                del self._pending[:self.max_batch_size]
+                if self._pending:
+                    self._first_at = time.monotonic()
+            self._executor.submit(self._run_batch, batch)
+
+    def _run_batch(self, batch: list[K]) -> None:
+        """Executar o handler e resolver o Future de cada chave"""
+        with self._cond:
+            self.batches += 1
+            self.items += len(batch)
+        logger.debug(f"{self.name}: lote com {len(batch)} itens")
+        try:
+            results = self.handler(batch)
+        except Exception as e:
+            logger.warning(f"{self.name}: falha no lote de {len(batch)} itens: {e}")
+            results = {key: e for key in batch}
+
+        for key in batch:
+            with self._cond:
+                future = self._inflight.pop(key)
+            result = results.get(key, LookupError(f"{self.name}: sem resultado para {key!r}"))
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
+__all__ = ["MicroBatcher"]
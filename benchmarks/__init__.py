@@ -0,0 +1 @@
+"""Benchmarks offline do pipeline (Foundry e Tavily falsos, sem rede)"""
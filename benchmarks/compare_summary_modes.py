@@ -0,0 +1,56 @@
+"""
+Comparar os modos de sumarização (llm, extractive, hybrid) ponta a ponta
+
+Uso:
+    python -m benchmarks.compare_summary_modes --questions 20 --concurrency 4
+
+Cada modo roda em um processo novo (SUMMARY_MODE é lido na importação do
+config) com os mesmos parâmetros de benchmarks.run_pipeline.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+MODES = ("llm", "extractive", "hybrid")
+
+
+def run_mode(mode: str, extra_args: list[str]) -> dict:
+    """
+    Executar benchmarks.run_pipeline em um modo
+
+    Args:
+        mode: Valor de SUMMARY_MODE
+        extra_args: Argumentos repassados ao run_pipeline
+
+    Returns:
+        Relatório JSON do run_pipeline
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        output = os.path.join(tmp, f"{mode}.json")
+        subprocess.run(
+            [sys.executable, "-m", "benchmarks.run_pipeline", "--summary-mode", mode, "--output", output, *extra_args],
+            check=True, stdout=subprocess.DEVNULL
+        )
+        with open(output, encoding="utf-8") as f:
+            return json.load(f)
+
+
+def main(argv: list[str] | None = None) -> int:
+    extra_args = list(sys.argv[1:] if argv is None else argv)
+    reports = {mode: run_mode(mode, extra_args) for mode in MODES}
+
+    print(f"{'modo':<11} {'p50 (s)':>8} {'p95 (s)':>8} {'perg/s':>7} {'chamadas/perg':>14}")
+    for mode, report in reports.items():
+        latency = report["latency"]
+        print(
+            f"{mode:<11} {latency['p50']:>8.3f} {latency['p95']:>8.3f} "
+            f"{report['questions_per_second']:>7.2f} {report['model_calls_per_question']:>14.1f}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,281 @@
+"""
+Servidor Foundry falso (OpenAI-compatível) para benchmarks e testes offline
+
+Atende POST /v1/chat/completions com latência, taxa de geração de tokens e
+injeção de falhas configuráveis, inclusive em streaming (SSE). Com
+cold_start, simula a carga de cada modelo na memória no primeiro pedido (e de
+novo depois de idle_unload segundos sem uso).
+"""
+
+import json
+import random
+import re
+import socket
+import struct
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+_WORDS = (
+    "model data training tokens attention layer transformer gradient dataset "
+    "inference parameters benchmark latency throughput context embedding"
+).split()
+
+
+@dataclass
+class FakeFoundryConfig:
+    """Comportamento simulado do servidor"""
+
+    latency: float = 0.05              # Tempo até o primeiro token (prefill), em segundos
+    tokens_per_second: float = 500.0   # Velocidade de geração
+    completion_tokens: int = 64        # Tokens gerados por resposta de texto
+    failure_rate: float = 0.0          # Fração de requisições que falham
+    failure_status: int = 500          # Status HTTP das falhas injetadas
+    seed: Optional[int] = None         # Semente do gerador de falhas
+    # Falhas roteirizadas, consumidas uma por requisição na ordem: um status
+    # HTTP ("503"), "reset" (conexão fechada sem resposta), "slow" (latência
+    # extra de slow_latency) ou "ok"
+    faults: list[str] = field(default_factory=list)
+    slow_latency: float = 1.0
+    response_format: bool = True       # Aceitar response_format (False = HTTP 400, como servidores antigos)
+    malformed_rate: float = 0.0        # Fração das respostas JSON sem response_format que chegam cortadas
+    cold_start: float = 0.0            # Carga do modelo no primeiro pedido, em segundos
+    idle_unload: float = 0.0           # Descarregar o modelo após esse tempo ocioso (0 = nunca)
+
+
+class _FakeFoundryHandler(BaseHTTPRequestHandler):
+    """Handler do /v1/chat/completions falso"""
+
+    protocol_version = "HTTP/1.1"
+    server: "FakeFoundryServer"
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        server = self.server
+        messages = payload.get("messages") or [{}]
+        server.record_start(payload.get("model", ""), messages[-1].get("content", ""))
+        try:
+            time.sleep(server.load_model(payload.get("model", "")))
+            fault = server.next_fault()
+            if fault == "reset":
+                self._reset_connection()
+                return
+            if fault.isdigit():
+                self._send_json({"error": {"message": "injected fault"}}, status=int(fault))
+                return
+            if fault == "slow":
+                time.sleep(server.config.slow_latency)
+            if server.should_fail():
+                self._send_json({"error": {"message": "injected failure"}}, status=server.config.failure_status)
+                return
+            if "response_format" in payload and not server.config.response_format:
+                self._send_json({"error": {"message": "Unsupported parameter: 'response_format'"}}, status=400)
+                return
+            prompt = payload["messages"][-1]["content"]
+            content = server.respond(prompt)
+            if "response_format" not in payload and content.startswith("{") and server.should_malform():
+                content = content[:len(content) // 2]
+            time.sleep(server.config.latency)
+            if payload.get("stream"):
+                self._send_stream(content)
+            else:
+                time.sleep(server.generation_time(content))
+                self._send_json({
+                    "choices": [{"message": {"role": "assistant", "content": content}}],
+                    "usage": {
+                        "prompt_tokens": len(prompt) // 4,
+                        "completion_tokens": len(content.split()),
+                    },
+                })
+        finally:
+            server.record_end(payload.get("model", ""))
+
+    def _reset_connection(self) -> None:
+        """Fechar a conexão com RST, sem resposta (Foundry reiniciando)"""
+        self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+        self.close_connection = True
+        self.connection.close()
+
+    def _send_json(self, body: dict, status: int = 200) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_stream(self, content: str) -> None:
+        """Enviar um evento SSE por token, no ritmo de tokens_per_second"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        delay = 1.0 / self.server.config.tokens_per_second
+        for word in re.findall(r"\S+\s*", content):
+            self._write_chunk(f"data: {json.dumps({'choices': [{'delta': {'content': word}}]})}\n\n")
+            time.sleep(delay)
+        self._write_chunk("data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, text: str) -> None:
+        data = text.encode()
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeFoundryServer(ThreadingHTTPServer):
+    """Servidor Foundry falso rodando em uma thread, em porta livre"""
+
+    daemon_threads = True
+
+    def __init__(self, config: Optional[FakeFoundryConfig] = None, host: str = "127.0.0.1", port: int = 0):
+        super().__init__((host, port), _FakeFoundryHandler)
+        self.config = config or FakeFoundryConfig()
+        self._random = random.Random(self.config.seed)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.requests_by_model: dict[str, int] = {}
+        self.failures = 0
+        self.malformed = 0
+        self.loads = 0
+        self._ready_at: dict[str, float] = {}    # Modelo carregado (ou carregando) -> fim da carga
+        self._last_used: dict[str, float] = {}
+        self.prompt_tokens = 0
+        self.active = 0
+        self.peak_concurrency = 0
+
+    @property
+    def url(self) -> str:
+        """URL base para FOUNDRY_ENDPOINT"""
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeFoundryServer":
+        """Iniciar o servidor em background"""
+        self._thread = threading.Thread(target=self.serve_forever, name="fake-foundry", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Parar o servidor"""
+        self.shutdown()
+        self.server_close()
+
+    def handle_error(self, request, client_address) -> None:
+        # Clientes fechando conexões keep-alive ociosas não são erro
+        if isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            return
+        super().handle_error(request, client_address)
+
+    def __enter__(self) -> "FakeFoundryServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    # ------------------------------------------------------------------
+    # Comportamento simulado
+    # ------------------------------------------------------------------
+
+    def next_fault(self) -> str:
+        """Próxima falha roteirizada ("ok" quando o roteiro acabar)"""
+        with self._lock:
+            if not self.config.faults:
+                return "ok"
+            fault = self.config.faults.pop(0)
+            if fault != "ok" and fault != "slow":
+                self.failures += 1
+            return fault
+
+    def should_fail(self) -> bool:
+        with self._lock:
+            failed = self._random.random() < self.config.failure_rate
+            if failed:
+                self.failures += 1
+            return failed
+
+    def should_malform(self) -> bool:
+        """Sortear uma resposta JSON cortada (geração sem restrição de schema)"""
+        with self._lock:
+            malformed = self._random.random() < self.config.malformed_rate
+            if malformed:
+                self.malformed += 1
+            return malformed
+
+    def load_model(self, model: str) -> float:
+        """
+        Iniciar a carga do modelo se ele não estiver na memória
+
+        Returns:
+            Segundos que o pedido espera até o modelo ficar pronto (pedidos
+            simultâneos esperam pela mesma carga)
+        """
+        with self._lock:
+            now = time.monotonic()
+            last_used = self._last_used.get(model)
+            unloaded = self.config.idle_unload and last_used is not None and now - last_used > self.config.idle_unload
+            if model not in self._ready_at or unloaded:
+                self._ready_at[model] = now + self.config.cold_start
+                if self.config.cold_start:
+                    self.loads += 1
+            wait = max(0.0, self._ready_at[model] - now)
+            self._last_used[model] = now + wait
+            return wait
+
+    def generation_time(self, content: str) -> float:
+        return len(content.split()) / self.config.tokens_per_second
+
+    def respond(self, prompt: str) -> str:
+        """Gerar a resposta adequada ao tipo de prompt do pipeline"""
+        if '"queries"' in prompt:
+            topic = _user_input(prompt)
+            return json.dumps({"queries": [f"{topic} aspect {i}" for i in range(1, 4)]})
+        if '"summaries"' in prompt:
+            ids = [int(i) for i in re.findall(r'<SEARCH_RESULT id="(\d+)"', prompt)]
+            return json.dumps({"summaries": [{"id": i, "summary": self._words()} for i in ids]})
+        return self._words()
+
+    def _words(self) -> str:
+        return " ".join(self._random.choice(_WORDS) for _ in range(self.config.completion_tokens))
+
+    def record_start(self, model: str, prompt: str = "") -> None:
+        with self._lock:
+            self.prompt_tokens += len(prompt) // 4
+            self.requests_by_model[model] = self.requests_by_model.get(model, 0) + 1
+            self.active += 1
+            self.peak_concurrency = max(self.peak_concurrency, self.active)
+
+    def record_end(self, model: str = "") -> None:
+        with self._lock:
+            self.active -= 1
+            if model in self._last_used:
+                self._last_used[model] = time.monotonic()
+
+    def stats(self) -> dict:
+        """Requisições por modelo, falhas injetadas, cargas de modelo e pico de concorrência"""
+        with self._lock:
+            return {
+                "requests": sum(self.requests_by_model.values()),
+                "requests_by_model": dict(self.requests_by_model),
+                "failures": self.failures,
+                "malformed": self.malformed,
+                "loads": self.loads,
+                "prompt_tokens": self.prompt_tokens,
+                "peak_concurrency": self.peak_concurrency,
+            }
+
+
+def _user_input(prompt: str) -> str:
+    """Extrair a pergunta do bloco <USER_INPUT> dos prompts do projeto"""
+    match = re.search(r"<USER_INPUT>\s*(.*?)\s*</USER_INPUT>", prompt, re.DOTALL)
+    return match.group(1) if match else "topic"
+
+
+__all__ = ["FakeFoundryConfig", "FakeFoundryServer"]
@@ -0,0 +1,124 @@
+"""
+Cliente Tavily falso para benchmarks e testes offline
+
+As URLs vêm de um conjunto limitado, escolhido por hash da query, para que
+queries diferentes às vezes encontrem a mesma página como na busca real.
+Uma fração das páginas cita a query que a encontrou (página relevante); as
+demais só têm texto genérico. Uma fração das queries pode ser lenta, para
+simular o ramo que atrasa a resposta.
+"""
+
+import hashlib
+import random
+import threading
+import time
+from typing import Optional
+
+_PARAGRAPH = (
+    "Large language models are trained on large text corpora using the transformer "
+    "architecture. Training involves tokenization, pretraining with next-token "
+    "prediction, and fine-tuning with instructions and human feedback. "
+)
+
+
+class FakeTavilyClient:
+    """Implementa search e extract com latência e falhas configuráveis"""
+
+    def __init__(self, search_latency: float = 0.02, extract_latency: float = 0.05, failure_rate: float = 0.0, url_pool: int = 50, page_chars: int = 8000, relevant_fraction: float = 0.5, slow_fraction: float = 0.0, slow_latency: float = 0.0, seed: Optional[int] = None):
+        """
+        Inicializar cliente falso
+
+        Args:
+            search_latency: Latência de cada search em segundos
+            extract_latency: Latência de cada chamada de extract em segundos
+            failure_rate: Fração de URLs cujo extract falha
+            url_pool: Número de URLs distintas possíveis
+            page_chars: Tamanho do raw_content de cada página
+            relevant_fraction: Fração das páginas que citam a query
+            slow_fraction: Fração das queries (escolhidas por hash) cujo search é lento
+            slow_latency: Latência extra do search dessas queries em segundos
+            seed: Semente do gerador de falhas
+        """
+        self.search_latency = search_latency
+        self.extract_latency = extract_latency
+        self.failure_rate = failure_rate
+        self.url_pool = url_pool
+        self.page_chars = page_chars
+        self.relevant_fraction = relevant_fraction
+        self.slow_fraction = slow_fraction
+        self.slow_latency = slow_latency
+        self._queries: dict[str, str] = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.search_calls = 0
+        self.extract_calls = 0
+        self.extracted_urls = 0
+        self.slow_searches = 0
+        self.search_started: dict[str, float] = {}   # Query -> perf_counter da primeira busca
+
+    def _url(self, query: str, rank: int) -> str:
+        digest = hashlib.sha256(f"{query}|{rank}".encode()).digest()
+        return f"https://example.com/page/{int.from_bytes(digest[:4], 'big') % self.url_pool}"
+
+    def _page(self, url: str) -> str:
+        """raw_content da página, citando a query de origem se for relevante"""
+        page = (_PARAGRAPH * (self.page_chars // len(_PARAGRAPH) + 1))[:self.page_chars]
+        query = self._queries.get(url)
+        digest = hashlib.sha256(url.encode()).digest()
+        if query is None or digest[0] / 256 >= self.relevant_fraction:
+            return f"{url}\n{page}"
+        middle = len(page) // 2
+        passage = f"\n\n{query.rstrip('?')} is explained in detail here. {query.rstrip('?')} depends on data and compute.\n\n"
+        return f"{url}\n{page[:middle]}{passage}{page[middle:]}"
+
+    def _is_slow(self, query: str) -> bool:
+        digest = hashlib.sha256(f"slow|{query}".encode()).digest()
+        return digest[0] / 256 < self.slow_fraction
+
+    def search(self, query: str, max_results: int = 1, **kwargs) -> dict:
+        slow = self._is_slow(query)
+        with self._lock:
+            self.search_started.setdefault(query, time.perf_counter())
+            self.search_calls += 1
+            self.slow_searches += slow
+            urls = [self._url(query, rank) for rank in range(max_results)]
+            for url in urls:
+                self._queries.setdefault(url, query)
+        time.sleep(self.search_latency + (self.slow_latency if slow else 0.0))
+        return {
+            "query": query,
+            "results": [
+                {"url": url, "title": f"{query} (#{rank + 1})", "content": query}
+                for rank, url in enumerate(urls)
+            ],
+        }
+
+    def extract(self, urls, **kwargs) -> dict:
+        urls = [urls] if isinstance(urls, str) else list(urls)
+        with self._lock:
+            self.extract_calls += 1
+            self.extracted_urls += len(urls)
+            failed = {url for url in urls if self._random.random() < self.failure_rate}
+        time.sleep(self.extract_latency)
+        return {
+            "results": [{"url": url, "raw_content": self._page(url)} for url in urls if url not in failed],
+            "failed_results": [{"url": url, "error": "injected failure"} for url in urls if url in failed],
+        }
+
+    def first_search(self, text: str) -> Optional[float]:
+        """perf_counter da primeira busca cuja query contém text (None se não houve)"""
+        with self._lock:
+            return min((t for query, t in self.search_started.items() if text in query), default=None)
+
+    def stats(self) -> dict:
+        """Chamadas recebidas"""
+        with self._lock:
+            return {
+                "search_calls": self.search_calls,
+                "extract_calls": self.extract_calls,
+                "extracted_urls": self.extracted_urls,
+                "slow_searches": self.slow_searches,
+            }
+
+
+__all__ = ["FakeTavilyClient"]
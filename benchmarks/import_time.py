@@ -0,0 +1,111 @@
+"""
+Benchmark do tempo de importação e de rerun do perplexity.py
+
+Uso:
+    python -m benchmarks.import_time --runs 5
+    python -m benchmarks.import_time --max-import 1.5   # falha (exit 1) acima do limite
+
+Cada medida roda em um processo novo:
+
+- import: `import perplexity` (o que todo processo e todo teste pagam)
+- first_graph: import + primeiro acesso a perplexity.graph (clientes e compilação)
+- rerun: nova execução do script com os módulos já importados, como o
+  Streamlit faz a cada interação (sem a parte de UI do __main__)
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_SCRIPTS = {
+    "import": """
+import time
+started = time.perf_counter()
+import perplexity
+print(time.perf_counter() - started)
+""",
+    "first_graph": """
+import time
+started = time.perf_counter()
+import perplexity
+perplexity.graph
+print(time.perf_counter() - started)
+""",
+    "rerun": """
+import runpy, time
+runpy.run_path("perplexity.py", run_name="rerun")
+started = time.perf_counter()
+runpy.run_path("perplexity.py", run_name="rerun")
+print(time.perf_counter() - started)
+""",
+}
+
+
+def measure(name: str, runs: int) -> dict[str, float]:
+    """
+    Medir um cenário em processos novos
+
+    Args:
+        name: Chave de _SCRIPTS
+        runs: Repetições
+
+    Returns:
+        Mediana, mínimo e máximo em segundos
+    """
+    env = {**os.environ, "LOG_LEVEL": "WARNING"}
+    samples = []
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, "-c", _SCRIPTS[name]], cwd=ROOT, env=env,
+                                capture_output=True, text=True, check=True)
+        samples.append(float(result.stdout.strip().splitlines()[-1]))
+    return {"median": statistics.median(samples), "min": min(samples), "max": max(samples)}
+
+
+def heavy_modules() -> dict[str, bool]:
+    """Módulos/objetos que não devem ser carregados por um simples import"""
+    script = (
+        "import json, sys, perplexity; "
+        "print(json.dumps({'streamlit': 'streamlit' in sys.modules, "
+        "'graph': 'graph' in vars(perplexity), 'llm': 'llm' in vars(perplexity)}))"
+    )
+    result = subprocess.run([sys.executable, "-c", script], cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def parse_args(argv: Optional[list[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Processos por cenário")
+    parser.add_argument("--max-import", type=float, help="Limite (s) da mediana de import")
+    parser.add_argument("--max-rerun", type=float, help="Limite (s) da mediana de rerun")
+    parser.add_argument("--output", help="Arquivo JSON do relatório")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    args = parse_args(argv)
+    report = {name: measure(name, args.runs) for name in _SCRIPTS}
+    report["loaded_on_import"] = heavy_modules()
+    for name in _SCRIPTS:
+        stats = report[name]
+        print(f"{name:<12} mediana {stats['median']:.3f}s  (min {stats['min']:.3f}s, max {stats['max']:.3f}s)")
+    print(f"Carregado no import: {report['loaded_on_import']}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    failed = False
+    for name, limit in (("import", args.max_import), ("rerun", args.max_rerun)):
+        if limit is not None and report[name]["median"] > limit:
+            print(f"❌ {name}: {report[name]['median']:.3f}s acima do limite de {limit:.3f}s")
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
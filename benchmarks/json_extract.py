@@ -0,0 +1,142 @@
+"""
+Benchmark da extração de JSON: regex gulosa antiga x scanner de json_extract.py
+
+Uso:
+    python -m benchmarks.json_extract --samples 50 --size 20000
+
+Para cada cenário gera respostas adversariais (raciocínio <think> longo com
+chaves, exemplos antes da resposta, objeto seguido de texto com chaves, chaves
+que nunca fecham) e mede acerto (o objeto escolhido é o esperado) e
+tempo por resposta dos dois extratores. A coluna "stream" mostra que fração
+da resposta o StreamingJsonExtractor lê antes de encontrar o objeto.
+"""
+
+import argparse
+import json
+import random
+import re
+import sys
+import time
+from typing import Callable, Optional
+
+from json_extract import StreamingJsonExtractor, extract_json
+
+
+def legacy_extract_json(content: str) -> Optional[dict]:
+    """Implementação anterior de llm_client._extract_json"""
+    json_match = re.search(r'\{.*\}', content, re.DOTALL)
+    if json_match:
+        try:
+            return json.loads(json_match.group(0))
+        except ValueError:
+            pass
+    try:
+        return json.loads(content)
+    except ValueError:
+        return None
+
+
+def _prose(rng: random.Random, size: int) -> str:
+    words = ["o", "modelo", "{x}", "formato", "chave", "}", "{", '"aspas"', "valor", "\\"]
+    out, length = [], 0
+    while length < size:
+        word = rng.choice(words)
+        out.append(word)
+        length += len(word) + 1
+    return " ".join(out)
+
+
+def _answer(rng: random.Random) -> dict:
+    return {"queries": [f"consulta {rng.randint(0, 999)} {{chave}}" for _ in range(3)]}
+
+
+def _think_longo(rng: random.Random, size: int) -> tuple[str, dict]:
+    answer = _answer(rng)
+    return f"<think>{_prose(rng, size)} {json.dumps({'rascunho': 1})}</think>\n{json.dumps(answer)}", answer
+
+
+def _exemplo_antes(rng: random.Random, size: int) -> tuple[str, dict]:
+    answer = _answer(rng)
+    return f'Formato: {{"queries": "lista de consultas"}} {_prose(rng, size)}\nResposta: {json.dumps(answer)}', answer
+
+
+def _texto_depois(rng: random.Random, size: int) -> tuple[str, dict]:
+    answer = _answer(rng)
+    return f"{json.dumps(answer)}\n\nObservações: {_prose(rng, size)} {{fim}}", answer
+
+
+def _truncada(rng: random.Random, size: int) -> tuple[str, None]:
+    # Raciocínio cortado por max_tokens: nenhuma chave fecha (pior caso da regex {.*})
+    return "<think>" + "{ " * (size // 2) + f'{{"queries": ["consulta {rng.randint(0, 999)}', None
+
+
+_SCENARIOS: dict[str, Callable[[random.Random, int], tuple[str, Optional[dict]]]] = {
+    "think_longo": _think_longo,
+    "exemplo_antes": _exemplo_antes,
+    "texto_depois": _texto_depois,
+    "truncada": _truncada,
+}
+
+
+def _validate(value: dict) -> bool:
+    return isinstance(value.get("queries"), list)
+
+
+def measure(scenario: str, samples: int, size: int, seed: int = 0) -> dict[str, float]:
+    """
+    Medir acerto e tempo dos extratores em um cenário
+
+    Args:
+        scenario: Chave de _SCENARIOS
+        samples: Respostas geradas
+        size: Tamanho aproximado do texto adversarial (caracteres)
+        seed: Semente do gerador
+
+    Returns:
+        Acerto (fração) e µs por resposta de cada extrator, e fração lida no stream
+    """
+    rng = random.Random(seed)
+    cases = [_SCENARIOS[scenario](rng, size) for _ in range(samples)]
+    report = {}
+    for name, extract in (("legacy", legacy_extract_json), ("scanner", lambda c: extract_json(c, _validate))):
+        started = time.perf_counter()
+        results = [extract(content) for content, _ in cases]
+        elapsed = time.perf_counter() - started
+        report[f"{name}_ok"] = sum(result == answer for result, (_, answer) in zip(results, cases)) / samples
+        report[f"{name}_us"] = elapsed / samples * 1e6
+
+    read = []
+    for content, answer in cases:
+        extractor = StreamingJsonExtractor(_validate)
+        position = 0
+        while position < len(content):
+            position += 16
+            if extractor.feed(content[position - 16:position]) is not None:
+                break
+        read.append(min(position, len(content)) / len(content))
+    report["stream_read"] = sum(read) / samples
+    return report
+
+
+def parse_args(argv: Optional[list[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", type=int, default=50, help="Respostas por cenário")
+    parser.add_argument("--size", type=int, default=20000, help="Caracteres de texto adversarial por resposta")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    args = parse_args(argv)
+    print(f"{args.samples} respostas por cenário, ~{args.size} caracteres de texto adversarial")
+    for scenario in _SCENARIOS:
+        r = measure(scenario, args.samples, args.size, args.seed)
+        print(
+            f"  {scenario:<15} legacy {r['legacy_ok']:5.0%} {r['legacy_us']:10.1f} µs   "
+            f"scanner {r['scanner_ok']:5.0%} {r['scanner_us']:8.1f} µs   stream lê {r['stream_read']:4.0%}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+"""
+Micro-benchmark do custo de uma chamada de log na thread que registra
+
+Uso:
+    python -m benchmarks.logging_overhead --calls 20000 --threads 8
+
+Compara os handlers síncronos antigos (StreamHandler + FileHandler, escrita
+e flush a cada registro) com a fila de log_pipeline.py, nos níveis INFO e
+DEBUG, com mensagens em f-string e no estilo %. O "console" vai para um
+arquivo temporário para não medir o terminal.
+"""
+
+import argparse
+import logging
+import os
+import queue
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+from log_pipeline import BatchWriter, DeferredQueueHandler
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
+def _handlers(directory: str) -> list[logging.Handler]:
+    console = logging.StreamHandler(open(os.path.join(directory, "console.log"), "w", encoding="utf-8"))
+    file_handler = logging.FileHandler(os.path.join(directory, "file.log"), encoding="utf-8")
+    for handler in (console, file_handler):
+        handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    return [console, file_handler]
+
+
+def _calls(logger: logging.Logger, method: str, style: str) -> Callable[[int], None]:
+    log = getattr(logger, method)
+    model, payload = "Phi-4-mini-instruct-generic-gpu:5", {"prompt_tokens": 512, "completion_tokens": 64}
+
+    if style == "fstring":
+        def run(n: int) -> None:
+            for i in range(n):
+                log(f"Tokens ({model}): {payload} chamada {i}")
+    else:
+        def run(n: int) -> None:
+            for i in range(n):
+                log("Tokens (%s): %s chamada %s", model, payload, i)
+    return run
+
+
+def measure(backend: str, level: int, method: str, style: str, calls: int, threads: int) -> dict[str, float]:
+    """
+    Medir o custo por chamada na thread produtora
+
+    Args:
+        backend: "sync" (handlers no logger) ou "queue" (log_pipeline)
+        level: Nível do logger
+        method: "info" ou "debug"
+        style: "fstring" ou "percent"
+        calls: Chamadas por thread
+        threads: Threads registrando ao mesmo tempo
+
+    Returns:
+        Microssegundos por chamada (produtor) e tempo até tudo estar no disco
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        logger = logging.getLogger(f"bench.{backend}.{method}.{style}.{level}")
+        logger.propagate = False
+        logger.setLevel(level)
+        handlers = _handlers(directory)
+        writer = None
+        if backend == "queue":
+            log_queue = queue.SimpleQueue()
+            writer = BatchWriter(log_queue, handlers)
+            writer.start()
+            logger.addHandler(DeferredQueueHandler(log_queue))
+        else:
+            for handler in handlers:
+                logger.addHandler(handler)
+
+        run = _calls(logger, method, style)
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(run, [calls] * threads))
+        produced = time.perf_counter() - started
+        if writer is not None:
+            writer.stop()
+        else:
+            for handler in handlers:
+                handler.close()
+        drained = time.perf_counter() - started
+        logger.handlers.clear()
+
+    total = calls * threads
+    return {"us_per_call": produced / total * 1e6, "drained_s": drained}
+
+
+def parse_args(argv: Optional[list[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=20000, help="Chamadas por thread")
+    parser.add_argument("--threads", type=int, default=8, help="Threads registrando ao mesmo tempo")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    args = parse_args(argv)
+    scenarios = [
+        ("INFO, info emitido", logging.INFO, "info"),
+        ("INFO, debug descartado", logging.INFO, "debug"),
+        ("DEBUG, debug emitido", logging.DEBUG, "debug"),
+    ]
+    print(f"{args.calls} chamadas x {args.threads} threads; µs por chamada na thread produtora (tempo até o disco)")
+    for name, level, method in scenarios:
+        for style in ("fstring", "percent"):
+            row = []
+            for backend in ("sync", "queue"):
+                result = measure(backend, level, method, style, args.calls, args.threads)
+                row.append(f"{backend} {result['us_per_call']:7.2f} µs ({result['drained_s']:.2f}s)")
+            print(f"  {name:<24} {style:<8} " + "  ".join(row))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,355 @@
+"""
+Benchmark ponta a ponta do pipeline contra Foundry e Tavily falsos
+
+Uso:
+    python -m benchmarks.run_pipeline --questions 20 --concurrency 4 --output bench.json
+    python -m benchmarks.run_pipeline --mode async --baseline bench.json
+
+Reporta latência p50/p95/p99 por pergunta, tempo até a primeira busca Tavily,
+tempo por nó do grafo, perguntas por segundo e pico de memória, e grava tudo
+em JSON para comparar commits.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from benchmarks.fake_foundry import FakeFoundryConfig, FakeFoundryServer
+from benchmarks.fake_tavily import FakeTavilyClient
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """
+    Percentil com interpolação linear
+
+    Args:
+        values: Amostras
+        pct: Percentil entre 0 e 100
+
+    Returns:
+        Valor do percentil (0.0 sem amostras)
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(values: list[float]) -> dict[str, float]:
+    """Resumo estatístico de uma lista de durações"""
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values) if values else 0.0,
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values, default=0.0),
+        "total": sum(values),
+    }
+
+
+class NodeTimer(BaseCallbackHandler):
+    """Callback LangChain que mede a duração de cada execução de nó do grafo"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._started: dict[Any, tuple[str, float]] = {}
+        self.durations: dict[str, list[float]] = {}
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        node = (metadata or {}).get("langgraph_node")
+        # Só o runnable do nó em si: edges condicionais e o RunnableLambda
+        # interno herdam o metadata e o nome do nó
+        if not node or kwargs.get("name") != node:
+            return
+        with self._lock:
+            parent = self._started.get(parent_run_id)
+            if parent is None or parent[0] != node:
+                self._started[run_id] = (node, time.perf_counter())
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        with self._lock:
+            started = self._started.pop(run_id, None)
+            if started:
+                node, start = started
+                self.durations.setdefault(node, []).append(time.perf_counter() - start)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        with self._lock:
+            self._started.pop(run_id, None)
+
+
+def memory_peak_mb() -> float:
+    """Pico de memória residente do processo em MB"""
+    try:
+        import resource
+    except ImportError:  # Windows
+        import tracemalloc
+        return tracemalloc.get_traced_memory()[1] / 1e6 if tracemalloc.is_tracing() else 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reporta em KB, macOS em bytes
+    return peak / 1e6 if sys.platform == "darwin" else peak / 1e3
+
+
+def git_commit() -> Optional[str]:
+    """Commit atual, para identificar o resultado"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _prepare_pipeline(args: argparse.Namespace, server: FakeFoundryServer):
+    """Importar perplexity apontando para o servidor falso e injetar o Tavily falso"""
+    os.environ["FOUNDRY_ENDPOINT"] = server.url
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    if args.summary_mode:
+        os.environ["SUMMARY_MODE"] = args.summary_mode
+    if args.summary_batch:
+        os.environ["SUMMARY_BATCH_ENABLED"] = "true"
+    if args.collection:
+        os.environ["COLLECTION_MODE"] = args.collection
+    if args.late_results:
+        os.environ["COLLECTION_LATE_RESULTS"] = args.late_results
+    if args.deadline is not None:
+        os.environ["COLLECTION_DEADLINE"] = str(args.deadline)
+    if args.structured_mode:
+        os.environ["STRUCTURED_OUTPUT_MODE"] = args.structured_mode
+    if args.no_prefetch:
+        os.environ["QUERY_PREFETCH_ENABLED"] = "false"
+    if "config" in sys.modules:
+        raise RuntimeError("config já importado: rode o benchmark em um processo novo")
+    import perplexity
+    from utils import CachedTavilyClient
+
+    tavily = FakeTavilyClient(
+        search_latency=args.tavily_latency,
+        extract_latency=args.tavily_latency,
+        failure_rate=args.tavily_failure_rate,
+        slow_fraction=args.tavily_slow_fraction,
+        slow_latency=args.tavily_slow_latency,
+        seed=args.seed,
+    )
+    perplexity.set_tavily(CachedTavilyClient(tavily))
+    return perplexity, tavily
+
+
+def _config(timer: NodeTimer) -> dict:
+    """Config de uma pergunta: thread própria caso CHECKPOINT_ENABLED esteja ativo"""
+    return {"callbacks": [timer], "configurable": {"thread_id": uuid.uuid4().hex}}
+
+
+def _run_sync(graph, questions: list[str], concurrency: int, timer: NodeTimer, starts: dict[str, float]) -> tuple[list[float], int]:
+    """Executar as perguntas com graph.invoke em um pool de threads (início de cada uma em starts)"""
+    from scheduler import scheduling_context
+
+    def run(indexed: tuple[int, str]) -> Optional[float]:
+        i, question = indexed
+        started = starts[question] = time.perf_counter()
+        try:
+            with scheduling_context(session_id=f"bench-{i}", interactive=False):
+                graph.invoke({"user_input": question}, config=_config(timer))
+            return time.perf_counter() - started
+        except Exception as e:
+            print(f"❌ {question}: {e}", file=sys.stderr)
+            return None
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(run, enumerate(questions)))
+    latencies = [r for r in results if r is not None]
+    return latencies, len(results) - len(latencies)
+
+
+def _run_async(graph, questions: list[str], concurrency: int, timer: NodeTimer, starts: dict[str, float]) -> tuple[list[float], int]:
+    """Executar as perguntas com graph.ainvoke em um único event loop (início de cada uma em starts)"""
+    from scheduler import scheduling_context
+
+    async def run_all() -> list[Optional[float]]:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run(i: int, question: str) -> Optional[float]:
+            async with semaphore:
+                started = starts[question] = time.perf_counter()
+                try:
+                    with scheduling_context(session_id=f"bench-{i}", interactive=False):
+                        await graph.ainvoke({"user_input": question}, config=_config(timer))
+                    return time.perf_counter() - started
+                except Exception as e:
+                    print(f"❌ {question}: {e}", file=sys.stderr)
+                    return None
+
+        return await asyncio.gather(*(run(i, q) for i, q in enumerate(questions)))
+
+    results = asyncio.run(run_all())
+    latencies = [r for r in results if r is not None]
+    return latencies, len(results) - len(latencies)
+
+
+def time_to_first_search(tavily: FakeTavilyClient, starts: dict[str, float]) -> list[float]:
+    """
+    Segundos entre o início de cada pergunta e a primeira busca Tavily dela
+
+    As queries do Foundry falso contêm a pergunta (ver fake_foundry.respond).
+    """
+    firsts = {question: tavily.first_search(question) for question in starts}
+    return [first - starts[question] for question, first in firsts.items() if first is not None]
+
+
+def run_benchmark(args: argparse.Namespace) -> dict:
+    """
+    Executar o benchmark e montar o relatório
+
+    Args:
+        args: Argumentos da linha de comando
+
+    Returns:
+        Relatório serializável em JSON
+    """
+    config = FakeFoundryConfig(
+        latency=args.latency,
+        tokens_per_second=args.tokens_per_second,
+        completion_tokens=args.completion_tokens,
+        failure_rate=args.failure_rate,
+        seed=args.seed,
+        response_format=not args.no_response_format,
+        malformed_rate=args.malformed_rate,
+    )
+    with FakeFoundryServer(config) as server:
+        perplexity, tavily = _prepare_pipeline(args, server)
+        questions = [f"Benchmark question {i}: how are LLMs trained?" for i in range(args.questions)]
+        timer = NodeTimer()
+        runner = _run_async if args.mode == "async" else _run_sync
+
+        starts: dict[str, float] = {}
+        started = time.perf_counter()
+        latencies, failures = runner(perplexity.graph, questions, args.concurrency, timer, starts)
+        wall_time = time.perf_counter() - started
+        foundry = server.stats()
+
+        return {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "config": vars(args),
+            "questions": len(questions),
+            "failures": failures,
+            "wall_time": wall_time,
+            "questions_per_second": len(latencies) / wall_time if wall_time else 0.0,
+            "latency": summarize(latencies),
+            "time_to_first_search": summarize(time_to_first_search(tavily, starts)),
+            "nodes": {node: summarize(values) for node, values in sorted(timer.durations.items())},
+            "memory_peak_mb": memory_peak_mb(),
+            "model_calls_per_question": foundry["requests"] / len(questions) if questions else 0.0,
+            "prompt_tokens_per_question": foundry["prompt_tokens"] / len(questions) if questions else 0.0,
+            "token_usage": {
+                "llm": perplexity.llm.token_usage(),
+                "reasoning_llm": perplexity.reasoning_llm.token_usage(),
+            },
+            "structured": {
+                "llm": perplexity.llm.structured_stats(),
+                "reasoning_llm": perplexity.reasoning_llm.structured_stats(),
+            },
+            "resilience": {
+                "llm": perplexity.llm.resilience.stats(),
+                "reasoning_llm": perplexity.reasoning_llm.resilience.stats(),
+            },
+            "foundry": foundry,
+            "tavily": tavily.stats(),
+            "scheduler": perplexity.model_scheduler.stats() if perplexity.model_scheduler else {},
+        }
+
+
+def compare(report: dict, baseline: dict) -> None:
+    """Imprimir a variação das métricas principais em relação a um relatório anterior"""
+    rows = [
+        ("p50", report["latency"]["p50"], baseline["latency"]["p50"]),
+        ("p95", report["latency"]["p95"], baseline["latency"]["p95"]),
+        ("p99", report["latency"]["p99"], baseline["latency"]["p99"]),
+        ("first search", report["time_to_first_search"]["p50"], baseline.get("time_to_first_search", {}).get("p50", 0.0)),
+        ("questions/s", report["questions_per_second"], baseline["questions_per_second"]),
+        ("calls/question", report["model_calls_per_question"], baseline.get("model_calls_per_question", 0.0)),
+        ("memory MB", report["memory_peak_mb"], baseline["memory_peak_mb"]),
+    ]
+    print(f"\nComparação com {baseline.get('commit')}:")
+    for name, current, previous in rows:
+        change = (current - previous) / previous * 100 if previous else 0.0
+        print(f"  {name:<12} {previous:>10.3f} → {current:>10.3f}  ({change:+.1f}%)")
+
+
+def print_report(report: dict) -> None:
+    """Imprimir um resumo legível do relatório"""
+    latency = report["latency"]
+    print(f"Perguntas: {report['questions']} (falhas: {report['failures']}) em {report['wall_time']:.2f}s")
+    print(f"Throughput: {report['questions_per_second']:.2f} perguntas/s")
+    print(f"Chamadas ao modelo por pergunta: {report['model_calls_per_question']:.1f} "
+          f"({report['prompt_tokens_per_question']:.0f} tokens de prompt)")
+    print(f"Latência: p50 {latency['p50']:.3f}s  p95 {latency['p95']:.3f}s  p99 {latency['p99']:.3f}s")
+    first = report["time_to_first_search"]
+    print(f"Primeira busca: p50 {first['p50']:.3f}s  p95 {first['p95']:.3f}s")
+    for node, stats in report["nodes"].items():
+        print(f"  {node:<22} n={stats['count']:<4} mean {stats['mean']:.3f}s  p95 {stats['p95']:.3f}s")
+    for path, stats in report.get("structured", {}).get("llm", {}).items():
+        if stats["calls"]:
+            print(f"  structured {path:<11} n={stats['calls']:<4} mean {stats['mean_latency_s']:.3f}s  "
+                  f"correções {stats['retry_rate']:.0%}  falhas {stats['failures']}")
+    print(f"Memória (pico): {report['memory_peak_mb']:.1f} MB")
+    print(f"Foundry: {report['foundry']}")
+
+
+def parse_args(argv: Optional[list[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=20, help="Perguntas a executar")
+    parser.add_argument("--concurrency", type=int, default=4, help="Pipelines simultâneos")
+    parser.add_argument("--mode", choices=["sync", "async"], default="sync", help="graph.invoke ou graph.ainvoke")
+    parser.add_argument("--latency", type=float, default=0.05, help="Tempo até o primeiro token do Foundry falso (s)")
+    parser.add_argument("--tokens-per-second", type=float, default=500.0, help="Velocidade de geração simulada")
+    parser.add_argument("--completion-tokens", type=int, default=64, help="Tokens por resposta de texto")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fração de requisições ao Foundry que falham")
+    parser.add_argument("--tavily-latency", type=float, default=0.05, help="Latência do Tavily falso (s)")
+    parser.add_argument("--tavily-failure-rate", type=float, default=0.0, help="Fração de extracts que falham")
+    parser.add_argument("--tavily-slow-fraction", type=float, default=0.0, help="Fração das queries com search lento")
+    parser.add_argument("--tavily-slow-latency", type=float, default=2.0, help="Latência extra do search lento (s)")
+    parser.add_argument("--summary-mode", choices=["llm", "extractive", "hybrid"], help="SUMMARY_MODE (default: config.py)")
+    parser.add_argument("--summary-batch", action="store_true", help="SUMMARY_BATCH_ENABLED=true")
+    parser.add_argument("--collection", choices=["all", "quorum"], help="COLLECTION_MODE (default: config.py)")
+    parser.add_argument("--late-results", choices=["drop", "refine"], help="COLLECTION_LATE_RESULTS (default: config.py)")
+    parser.add_argument("--deadline", type=float, help="COLLECTION_DEADLINE em segundos")
+    parser.add_argument("--structured-mode", choices=["auto", "json_schema", "prompt"], help="STRUCTURED_OUTPUT_MODE (default: config.py)")
+    parser.add_argument("--no-response-format", action="store_true", help="Foundry falso recusa response_format (HTTP 400)")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="Fração das respostas JSON sem response_format que chegam cortadas")
+    parser.add_argument("--no-prefetch", action="store_true", help="QUERY_PREFETCH_ENABLED=false (buscas só depois da lista de queries)")
+    parser.add_argument("--seed", type=int, default=42, help="Semente da injeção de falhas")
+    parser.add_argument("--output", default="bench_results.json", help="Arquivo JSON do relatório")
+    parser.add_argument("--baseline", help="Relatório anterior para comparação")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    args = parse_args(argv)
+    report = run_benchmark(args)
+    print_report(report)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            compare(report, json.load(f))
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n📄 Relatório salvo em {args.output}")
+    return 1 if report["failures"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
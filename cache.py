@@ -0,0 +1,405 @@
+"""
+Cache de respostas com tier em memória (LRU) e tier persistente (SQLite)
+
+As chaves são hashes de conteúdo (modelo, mensagens, temperatura, max_tokens),
+então a mesma pergunta ou a mesma página resumida para a mesma query reaproveita
+a resposta entre execuções.
+"""
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+try:
+    from config import (
+        LLM_CACHE_ENABLED, LLM_CACHE_MAX_ENTRIES, LLM_CACHE_MAX_BYTES,
+        LLM_CACHE_PATH, LLM_CACHE_TTL, LLM_CACHE_DISK_MAX_ENTRIES, LLM_CACHE_DISK_MAX_BYTES,
+        LLM_CACHE_GC_INTERVAL
+    )
+except ImportError:
+    LLM_CACHE_ENABLED = False
+    LLM_CACHE_MAX_ENTRIES = 1024
+    LLM_CACHE_MAX_BYTES = 32 * 1024 * 1024
+    LLM_CACHE_PATH = None
+    LLM_CACHE_TTL = 7 * 24 * 3600
+    LLM_CACHE_DISK_MAX_ENTRIES = 50_000
+    LLM_CACHE_DISK_MAX_BYTES = 256 * 1024 * 1024
+    LLM_CACHE_GC_INTERVAL = 300
+
+logger = logging.getLogger(__name__)
+
+
+def make_cache_key(*parts: Any) -> str:
+    """
+    Gerar chave determinística a partir de valores serializáveis em JSON.
+
+    Args:
+        parts: Valores que identificam a requisição
+
+    Returns:
+        Hash SHA-256 hexadecimal
+    """
+    raw = json.dumps(parts, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class LRUCache:
+    """Cache LRU thread-safe limitado por número de entradas e por bytes"""
+
+    def __init__(self, max_entries: int = 1024, max_bytes: Optional[int] = None, ttl: Optional[float] = None):
+        """
+        Inicializar cache em memória
+
+        Args:
+            max_entries: Máximo de entradas mantidas
+            max_bytes: Máximo de bytes (UTF-8) dos valores (None = sem limite)
+            ttl: Tempo de vida de cada entrada em segundos (None = sem expiração)
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._data: OrderedDict[str, tuple[str, int, float]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Buscar valor e marcá-lo como usado recentemente
+
+        Args:
+            key: Chave da entrada
+
+        Returns:
+            Valor ou None se ausente/expirado
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, size, stored_at = entry
+            if self.ttl is not None and time.time() - stored_at > self.ttl:
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: str) -> None:
+        """
+        Armazenar valor, removendo as entradas menos usadas se necessário
+
+        Args:
+            key: Chave da entrada
+            value: Valor a armazenar
+        """
+        size = len(value.encode("utf-8"))
+        if self.max_bytes is not None and size > self.max_bytes:
+            logger.debug(f"Valor de {size} bytes excede o cache, ignorado")
+            return
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (value, size, time.time())
+            self._bytes += size
+            while len(self._data) > self.max_entries or (
+                self.max_bytes is not None and self._bytes > self.max_bytes
+            ):
+                oldest = next(iter(self._data))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _remove(self, key: str) -> None:
+        """Remover entrada (chamar com o lock adquirido)"""
+        _, size, _ = self._data.pop(key)
+        self._bytes -= size
+
+    def clear(self) -> None:
+        """Remover todas as entradas"""
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict[str, int]:
+        """Retornar contadores e ocupação do cache"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "entries": len(self._data),
+                "bytes": self._bytes,
+            }
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SQLiteCache:
+    """
+    Tier persistente de cache em um arquivo SQLite, com TTL
+
+    Entradas vencidas e, acima de max_entries/max_bytes, as gravadas há mais
+    tempo são removidas ao abrir o arquivo e, no máximo a cada gc_interval
+    segundos, nas gravações.
+    """
+
+    def __init__(self, path: str, ttl: Optional[float] = None, max_entries: Optional[int] = LLM_CACHE_DISK_MAX_ENTRIES, max_bytes: Optional[int] = LLM_CACHE_DISK_MAX_BYTES, gc_interval: float = LLM_CACHE_GC_INTERVAL):
+        """
+        Abrir (ou criar) o arquivo de cache
+
+        Args:
+            path: Caminho do arquivo SQLite
+            ttl: Tempo de vida das entradas em segundos (None = sem expiração)
+            max_entries: Máximo de entradas no arquivo (None = sem limite)
+            max_bytes: Máximo de bytes dos valores (None = sem limite)
+            gc_interval: Intervalo mínimo entre limpezas automáticas, em segundos
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.gc_interval = gc_interval
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cache_created_at ON cache (created_at)")
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+        self._last_gc = 0.0
+        self.collect_garbage()
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Buscar valor no arquivo
+
+        Args:
+            key: Chave da entrada
+
+        Returns:
+            Valor ou None se ausente/expirado
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            value, created_at = row
+            if self.ttl is not None and time.time() - created_at > self.ttl:
+                self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                self._conn.commit()
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: str) -> None:
+        """
+        Gravar valor no arquivo
+
+        Args:
+            key: Chave da entrada
+            value: Valor a armazenar
+        """
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, created_at) VALUES (?, ?, ?)",
+                (key, value, time.time())
+            )
+            self._conn.commit()
+        if time.monotonic() - self._last_gc >= self.gc_interval:
+            self.collect_garbage()
+
+    def purge_expired(self) -> int:
+        """
+        Remover entradas expiradas
+
+        Returns:
+            Número de entradas removidas
+        """
+        if self.ttl is None:
+            return 0
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM cache WHERE created_at < ?", (time.time() - self.ttl,)
+            )
+            self._conn.commit()
+            self.expirations += cursor.rowcount
+            return cursor.rowcount
+
+    def trim(self) -> int:
+        """
+        Remover as entradas gravadas há mais tempo acima de max_entries/max_bytes
+
+        Returns:
+            Número de entradas removidas
+        """
+        if self.max_entries is None and self.max_bytes is None:
+            return 0
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, LENGTH(CAST(value AS BLOB)) FROM cache ORDER BY created_at DESC"
+            ).fetchall()
+            kept, total, removed = 0, 0, []
+            for key, size in rows:
+                if (self.max_entries is not None and kept >= self.max_entries) or \
+                        (self.max_bytes is not None and total + size > self.max_bytes):
+                    removed.append((key,))
+                    continue
+                kept += 1
+                total += size
+            if removed:
+                self._conn.executemany("DELETE FROM cache WHERE key = ?", removed)
+                self._conn.commit()
+                self.evictions += len(removed)
+            return len(removed)
+
+    def collect_garbage(self) -> dict[str, int]:
+        """
+        Remover entradas vencidas e as excedentes
+
+        Returns:
+            Dict com entradas removidas por idade e por tamanho
+        """
+        self._last_gc = time.monotonic()
+        result = {"expired": self.purge_expired(), "evicted": self.trim()}
+        if any(result.values()):
+            logger.info(f"🧹 Cache LLM em disco: {result['expired']} entradas vencidas e {result['evicted']} excedentes removidas")
+        return result
+
+    def stats(self) -> dict[str, int]:
+        """Retornar contadores do tier persistente"""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "expirations": self.expirations,
+            "evictions": self.evictions,
+            "entries": entries,
+        }
+
+    def close(self) -> None:
+        """Fechar a conexão com o arquivo"""
+        with self._lock:
+            self._conn.close()
+
+
+class LLMResponseCache:
+    """Cache de respostas LLM: LRU em memória na frente de um SQLite opcional"""
+
+    def __init__(self, max_entries: int = LLM_CACHE_MAX_ENTRIES, max_bytes: Optional[int] = LLM_CACHE_MAX_BYTES, path: Optional[str] = None, ttl: Optional[float] = LLM_CACHE_TTL):
+        """
+        Inicializar cache de respostas
+
+        Args:
+            max_entries: Máximo de entradas no tier em memória
+            max_bytes: Máximo de bytes no tier em memória
+            path: Arquivo SQLite do tier persistente (None = só memória)
+            ttl: Tempo de vida das entradas em segundos
+        """
+        self.memory = LRUCache(max_entries=max_entries, max_bytes=max_bytes, ttl=ttl)
+        self.disk = SQLiteCache(path, ttl=ttl) if path else None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(model: str, messages: list[dict], temperature: float, max_tokens: int, **extra: Any) -> str:
+        """
+        Gerar chave de cache para uma chamada de chat completion
+
+        Args:
+            model: ID do modelo
+            messages: Mensagens enviadas
+            temperature: Temperatura da geração
+            max_tokens: Limite de tokens da resposta
+            extra: Outros parâmetros que alteram a resposta (ex: schema)
+
+        Returns:
+            Chave de cache
+        """
+        return make_cache_key(model, messages, temperature, max_tokens, extra)
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Buscar resposta em memória e, se ausente, no tier persistente
+
+        Args:
+            key: Chave gerada por key()
+
+        Returns:
+            Resposta armazenada ou None
+        """
+        value = self.memory.get(key)
+        if value is None and self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                # Promover para memória
+                self.memory.set(key, value)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        """
+        Armazenar resposta nos dois tiers
+
+        Args:
+            key: Chave gerada por key()
+            value: Resposta a armazenar
+        """
+        self.memory.set(key, value)
+        if self.disk is not None:
+            self.disk.set(key, value)
+
+    def stats(self) -> dict[str, Any]:
+        """Retornar contadores agregados e por tier"""
+        with self._lock:
+            stats: dict[str, Any] = {"hits": self.hits, "misses": self.misses}
+        memory = self.memory.stats()
+        stats["evictions"] = memory["evictions"]
+        stats["memory"] = memory
+        if self.disk is not None:
+            stats["disk"] = self.disk.stats()
+        return stats
+
+
+def create_llm_cache() -> Optional[LLMResponseCache]:
+    """
+    Criar o cache de respostas a partir de config.py
+
+    Returns:
+        LLMResponseCache ou None se LLM_CACHE_ENABLED for False
+    """
+    if not LLM_CACHE_ENABLED:
+        return None
+    logger.info(f"✅ Cache de respostas LLM habilitado (disco: {LLM_CACHE_PATH or 'não'})")
+    return LLMResponseCache(path=LLM_CACHE_PATH)
+
+
+__all__ = ["make_cache_key", "LRUCache", "SQLiteCache", "LLMResponseCache", "create_llm_cache"]
@@ -0,0 +1,376 @@
+"""
+Checkpointer SQLite do grafo LangGraph
+
+Cada superstep do grafo grava um checkpoint com o estado completo, e cada
+nó concluído grava suas saídas (pending writes). Se a execução falhar ou
+for interrompida, graph.invoke(None, config) com o mesmo thread_id continua
+do último checkpoint: ramos single_search já concluídos não são refeitos.
+
+Threads antigas são removidas por idade (CHECKPOINT_MAX_AGE) e, se o
+arquivo passar de CHECKPOINT_MAX_BYTES, das mais antigas para as mais novas.
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+from typing import Any, AsyncIterator, Iterator, Optional, Sequence
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+
+try:
+    from config import (
+        CHECKPOINT_ENABLED, CHECKPOINT_PATH, CHECKPOINT_MAX_AGE, CHECKPOINT_MAX_BYTES, CHECKPOINT_GC_INTERVAL
+    )
+except ImportError:
+    CHECKPOINT_ENABLED = False
+    CHECKPOINT_PATH = "checkpoints.sqlite"
+    CHECKPOINT_MAX_AGE = 7 * 24 * 3600
+    CHECKPOINT_MAX_BYTES = 256 * 1024 * 1024
+    CHECKPOINT_GC_INTERVAL = 600.0
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    checkpoint_id TEXT NOT NULL,
+    parent_checkpoint_id TEXT,
+    checkpoint_type TEXT NOT NULL,
+    checkpoint BLOB NOT NULL,
+    metadata_type TEXT NOT NULL,
+    metadata BLOB NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    value_type TEXT NOT NULL,
+    value BLOB NOT NULL,
+    task_path TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+CREATE INDEX IF NOT EXISTS checkpoints_created_at ON checkpoints (thread_id, created_at);
+"""
+
+
+class SQLiteCheckpointSaver(BaseCheckpointSaver[str]):
+    """BaseCheckpointSaver do LangGraph persistido em um arquivo SQLite"""
+
+    def __init__(self, path: str = CHECKPOINT_PATH, max_age: Optional[float] = CHECKPOINT_MAX_AGE, max_bytes: Optional[int] = CHECKPOINT_MAX_BYTES, gc_interval: float = CHECKPOINT_GC_INTERVAL):
+        """
+        Abrir (ou criar) o arquivo de checkpoints
+
+        Args:
+            path: Caminho do arquivo SQLite (":memory:" para testes)
+            max_age: Idade máxima de uma thread em segundos (None = sem limite)
+            max_bytes: Tamanho máximo dos checkpoints em bytes (None = sem limite)
+            gc_interval: Intervalo mínimo entre coletas automáticas, em segundos
+        """
+        super().__init__()
+        self.path = path
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.gc_interval = gc_interval
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        # auto_vacuum só vale para arquivos novos; devolve ao disco o espaço liberado pela coleta
+        self._conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+        self._last_gc = 0.0
+        self.collect_garbage()
+
+    # ------------------------------------------------------------------
+    # Leitura
+    # ------------------------------------------------------------------
+
+    def _tuple(self, thread_id: str, checkpoint_ns: str, row: tuple) -> CheckpointTuple:
+        """Montar o CheckpointTuple de uma linha de checkpoints (chamar com o lock)"""
+        checkpoint_id, parent_id, checkpoint_type, checkpoint, metadata_type, metadata = row
+        writes = self._conn.execute(
+            "SELECT task_id, channel, value_type, value FROM writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id)
+        ).fetchall()
+
+        def config(checkpoint_id: str) -> RunnableConfig:
+            return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id}}
+
+        return CheckpointTuple(
+            config=config(checkpoint_id),
+            checkpoint=self.serde.loads_typed((checkpoint_type, checkpoint)),
+            metadata=self.serde.loads_typed((metadata_type, metadata)),
+            parent_config=config(parent_id) if parent_id else None,
+            pending_writes=[
+                (task_id, channel, self.serde.loads_typed((value_type, value)))
+                for task_id, channel, value_type, value in writes
+            ],
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        """
+        Checkpoint indicado em config (checkpoint_id) ou o mais recente da thread
+
+        Args:
+            config: Config com thread_id e, opcionalmente, checkpoint_ns e checkpoint_id
+
+        Returns:
+            CheckpointTuple ou None se a thread não tiver checkpoints
+        """
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        columns = "checkpoint_id, parent_checkpoint_id, checkpoint_type, checkpoint, metadata_type, metadata"
+        with self._lock:
+            if checkpoint_id := get_checkpoint_id(config):
+                row = self._conn.execute(
+                    f"SELECT {columns} FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    (thread_id, checkpoint_ns, checkpoint_id)
+                ).fetchone()
+            else:
+                row = self._conn.execute(
+                    f"SELECT {columns} FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+                    "ORDER BY checkpoint_id DESC LIMIT 1",
+                    (thread_id, checkpoint_ns)
+                ).fetchone()
+            return self._tuple(thread_id, checkpoint_ns, row) if row else None
+
+    def list(self, config: Optional[RunnableConfig], *, filter: Optional[dict[str, Any]] = None, before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> Iterator[CheckpointTuple]:
+        """
+        Checkpoints do mais novo para o mais antigo
+
+        Args:
+            config: Config com thread_id (None = todas as threads)
+            filter: Valores exigidos no metadata
+            before: Só checkpoints anteriores ao checkpoint_id desta config
+            limit: Máximo de checkpoints
+
+        Yields:
+            CheckpointTuple
+        """
+        query = ("SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, checkpoint_type, "
+                 "checkpoint, metadata_type, metadata FROM checkpoints")
+        clauses, params = [], []
+        if config is not None:
+            clauses.append("thread_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            if (checkpoint_ns := config["configurable"].get("checkpoint_ns")) is not None:
+                clauses.append("checkpoint_ns = ?")
+                params.append(checkpoint_ns)
+            if checkpoint_id := get_checkpoint_id(config):
+                clauses.append("checkpoint_id = ?")
+                params.append(checkpoint_id)
+        if before is not None and (before_id := get_checkpoint_id(before)):
+            clauses.append("checkpoint_id < ?")
+            params.append(before_id)
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY checkpoint_id DESC"
+
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+            tuples = []
+            for thread_id, checkpoint_ns, *row in rows:
+                if limit is not None and len(tuples) >= limit:
+                    break
+                item = self._tuple(thread_id, checkpoint_ns, tuple(row))
+                if filter and any(item.metadata.get(key) != value for key, value in filter.items()):
+                    continue
+                tuples.append(item)
+        yield from tuples
+
+    # ------------------------------------------------------------------
+    # Escrita
+    # ------------------------------------------------------------------
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata, new_versions: ChannelVersions) -> RunnableConfig:
+        """
+        Gravar um checkpoint (estado completo do superstep)
+
+        Args:
+            config: Config da thread (checkpoint_id atual é o pai)
+            checkpoint: Checkpoint a gravar
+            metadata: Metadata do checkpoint
+            new_versions: Versões dos canais alterados (não usado: o estado vai inteiro)
+
+        Returns:
+            Config apontando para o checkpoint gravado
+        """
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_type, checkpoint_data = self.serde.dumps_typed(checkpoint)
+        metadata_type, metadata_data = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (thread_id, checkpoint_ns, checkpoint["id"], config["configurable"].get("checkpoint_id"),
+                 checkpoint_type, checkpoint_data, metadata_type, metadata_data, time.time())
+            )
+            self._conn.commit()
+        self._maybe_collect_garbage()
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint["id"]}}
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[tuple[str, Any]], task_id: str, task_path: str = "") -> None:
+        """
+        Gravar as saídas de um nó concluído (reaproveitadas ao retomar)
+
+        Args:
+            config: Config do checkpoint ao qual as saídas pertencem
+            writes: Pares (canal, valor)
+            task_id: Identificador da tarefa
+            task_path: Caminho da tarefa no grafo
+        """
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        # Canais especiais (erro, interrupção) substituem o valor anterior; os
+        # demais são gravados uma vez por tarefa
+        verb = "INSERT OR REPLACE" if all(channel in WRITES_IDX_MAP for channel, _ in writes) else "INSERT OR IGNORE"
+        rows = []
+        for idx, (channel, value) in enumerate(writes):
+            value_type, value_data = self.serde.dumps_typed(value)
+            rows.append((thread_id, checkpoint_ns, checkpoint_id, task_id, WRITES_IDX_MAP.get(channel, idx),
+                         channel, value_type, value_data, task_path))
+        with self._lock:
+            self._conn.executemany(f"{verb} INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self._conn.commit()
+
+    def delete_thread(self, thread_id: str) -> None:
+        """
+        Remover checkpoints e saídas de uma thread
+
+        Args:
+            thread_id: Thread a remover
+        """
+        with self._lock:
+            self._delete_threads([thread_id])
+            self._conn.commit()
+
+    def get_next_version(self, current: Optional[str], channel: None) -> str:
+        """Versão seguinte de um canal (inteiro crescente, comparável como texto)"""
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}"
+
+    # ------------------------------------------------------------------
+    # Versões assíncronas (SQLite é local e rápido: rodam no próprio loop)
+    # ------------------------------------------------------------------
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return self.get_tuple(config)
+
+    async def alist(self, config: Optional[RunnableConfig], *, filter: Optional[dict[str, Any]] = None, before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> AsyncIterator[CheckpointTuple]:
+        for item in self.list(config, filter=filter, before=before, limit=limit):
+            yield item
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata, new_versions: ChannelVersions) -> RunnableConfig:
+        return self.put(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[tuple[str, Any]], task_id: str, task_path: str = "") -> None:
+        self.put_writes(config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        self.delete_thread(thread_id)
+
+    # ------------------------------------------------------------------
+    # Coleta de lixo
+    # ------------------------------------------------------------------
+
+    def _delete_threads(self, thread_ids: Sequence[str]) -> None:
+        """Remover threads (chamar com o lock, sem commit)"""
+        for table in ("checkpoints", "writes"):
+            self._conn.executemany(f"DELETE FROM {table} WHERE thread_id = ?", [(tid,) for tid in thread_ids])
+
+    def _maybe_collect_garbage(self) -> None:
+        if time.monotonic() - self._last_gc >= self.gc_interval:
+            self.collect_garbage()
+
+    def collect_garbage(self) -> dict[str, int]:
+        """
+        Remover threads antigas e, acima de max_bytes, as menos recentes
+
+        A unidade é a thread inteira: apagar checkpoints do meio quebraria a
+        cadeia de pais de uma execução que ainda pode ser retomada.
+
+        Returns:
+            Dict com threads removidas por idade e por tamanho
+        """
+        self._last_gc = time.monotonic()
+        with self._lock:
+            threads = self._conn.execute(
+                "SELECT c.thread_id, MAX(c.created_at), SUM(LENGTH(c.checkpoint) + LENGTH(c.metadata)) "
+                "+ COALESCE((SELECT SUM(LENGTH(w.value)) FROM writes w WHERE w.thread_id = c.thread_id), 0) "
+                "FROM checkpoints c GROUP BY c.thread_id ORDER BY MAX(c.created_at)"
+            ).fetchall()
+            expired = []
+            if self.max_age is not None:
+                cutoff = time.time() - self.max_age
+                expired = [thread_id for thread_id, updated_at, _ in threads if updated_at < cutoff]
+            expired_set = set(expired)
+            remaining = [(thread_id, size) for thread_id, _, size in threads if thread_id not in expired_set]
+            oversized = []
+            if self.max_bytes is not None:
+                total = sum(size for _, size in remaining)
+                # Mantém sempre a thread mais recente (pode ser a execução atual)
+                for thread_id, size in remaining[:-1]:
+                    if total <= self.max_bytes:
+                        break
+                    oversized.append(thread_id)
+                    total -= size
+            if expired or oversized:
+                self._delete_threads(expired + oversized)
+                self._conn.commit()
+                self._conn.execute("PRAGMA incremental_vacuum")
+        if expired or oversized:
+            logger.info(f"🧹 Checkpoints: {len(expired)} thread(s) expirada(s), {len(oversized)} removida(s) por tamanho")
+        return {"expired": len(expired), "oversized": len(oversized)}
+
+    def stats(self) -> dict[str, int]:
+        """Threads, checkpoints e bytes gravados"""
+        with self._lock:
+            threads, checkpoints, size = self._conn.execute(
+                "SELECT COUNT(DISTINCT thread_id), COUNT(*), COALESCE(SUM(LENGTH(checkpoint) + LENGTH(metadata)), 0) FROM checkpoints"
+            ).fetchone()
+            writes_size = self._conn.execute("SELECT COALESCE(SUM(LENGTH(value)), 0) FROM writes").fetchone()[0]
+        return {"threads": threads, "checkpoints": checkpoints, "bytes": size + writes_size}
+
+    def close(self) -> None:
+        """Fechar a conexão com o arquivo"""
+        with self._lock:
+            self._conn.close()
+
+
+def create_checkpointer() -> Optional[SQLiteCheckpointSaver]:
+    """
+    Criar o checkpointer a partir de config.py
+
+    Returns:
+        SQLiteCheckpointSaver ou None se CHECKPOINT_ENABLED for False
+    """
+    if not CHECKPOINT_ENABLED:
+        return None
+    logger.info(f"✅ Checkpoints das execuções em {CHECKPOINT_PATH}")
+    return SQLiteCheckpointSaver(CHECKPOINT_PATH)
+
+
+__all__ = ["SQLiteCheckpointSaver", "create_checkpointer"]
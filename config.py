@@ -2,7 +2,6 @@
 
 import os
 import logging
-import sys
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -28,58 +27,245 @@ REASONING_MAX_TOKENS = 512
 REASONING_TEMPERATURE = 0.3
 REASONING_TIMEOUT = 300
 
+# ============================================================================
+# AQUECIMENTO DOS MODELOS
+# ============================================================================
+# O primeiro pedido a um modelo ocioso paga a carga dele na memória (daí os
+# timeouts acima). A UI, a API e o batch carregam os dois modelos em
+# background ao subir e mandam um pedido de 1 token aos modelos que ficam
+# WARMUP_KEEPALIVE_INTERVAL segundos sem uso, para o Foundry não descarregá-los
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() in ("1", "true", "yes")
+WARMUP_KEEPALIVE_INTERVAL = 240            # Segundos sem uso até o próximo ping (0 = só carregar)
+WARMUP_RETRY_INTERVAL = 10                 # Espera após uma carga que falhou (Foundry ainda subindo)
+WARMUP_PROMPT = "Hi"
+
+# ============================================================================
+# STRUCTURED OUTPUT
+# ============================================================================
+# "auto": envia o JSON schema em response_format e detecta (uma vez por
+# endpoint) se o servidor aceita; "json_schema": sempre envia; "prompt": só a
+# instrução de JSON no prompt
+STRUCTURED_OUTPUT_MODE = os.getenv("STRUCTURED_OUTPUT_MODE", "auto").lower()
+STRUCTURED_REPAIR_ATTEMPTS = 2             # Pedidos de correção do JSON inválido (0 = falha direto)
+STRUCTURED_REPAIR_MAX_CHARS = 4000         # Trecho quebrado reenviado no pedido de correção
+# Structured output por streaming: a conexão é encerrada assim que chega um
+# objeto JSON completo e válido para o schema (o resto da geração é descartado)
+STRUCTURED_STREAMING = os.getenv("STRUCTURED_STREAMING", "false").lower() in ("1", "true", "yes")
+
+# ============================================================================
+# JANELA DE CONTEXTO E TOKENS
+# ============================================================================
+# Tokens de contexto (prompt + resposta) de cada modelo no Foundry Local
+MODEL_CONTEXT_TOKENS = {
+    LLM_MODEL: 8192,
+    REASONING_MODEL: 8192,
+}
+DEFAULT_CONTEXT_TOKENS = 4096              # Modelos fora de MODEL_CONTEXT_TOKENS
+PROMPT_SAFETY_MARGIN_TOKENS = 64           # Folga para diferenças entre tokenizers
+TOKENIZER = os.getenv("TOKENIZER", "tiktoken").lower()   # "tiktoken" ou "chars" (estimativa)
+TOKENIZER_ENCODING = "cl100k_base"         # Encoding do tiktoken
+TOKENIZER_CHARS_PER_TOKEN = 4.0            # Estimativa usada sem tiktoken
+FINAL_RESULT_MIN_TOKENS = 64               # Resultado reduzido abaixo disso é descartado do prompt final
+
+# ============================================================================
+# HTTP CONNECTION POOL
+# ============================================================================
+# Cada cliente AzureFoundryLocalLLM mantém sua própria sessão HTTP com pool
+# de conexões keep-alive, compartilhada entre as threads do LangGraph.
+HTTP_POOL_CONNECTIONS = 4      # Número de hosts distintos mantidos no pool
+HTTP_POOL_MAXSIZE = 8          # Conexões simultâneas reutilizáveis por host
+HTTP_POOL_BLOCK = False        # Bloquear ao atingir HTTP_POOL_MAXSIZE (limite rígido por host)
+HTTP_KEEP_ALIVE = True         # False envia "Connection: close" em cada requisição
+
+# ============================================================================
+# RESILIÊNCIA DAS CHAMADAS AO FOUNDRY
+# ============================================================================
+# Retry com backoff exponencial e jitter em 5xx/429, conexão resetada e timeout
+LLM_RETRY_ATTEMPTS = int(os.getenv("LLM_RETRY_ATTEMPTS", "3"))   # Tentativas no total (1 = sem retry)
+LLM_RETRY_BASE_DELAY = 0.5                 # Espera máxima (s) antes do primeiro retry; dobra a cada tentativa
+LLM_RETRY_MAX_DELAY = 8.0                  # Teto da espera entre tentativas
+# Hedge: chamada sem streaming que passa do percentil de latência recebe uma
+# segunda requisição igual; vale a primeira resposta (dobra a carga nas lentas)
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "false").lower() in ("1", "true", "yes")
+LLM_HEDGE_PERCENTILE = 95.0                # Percentil que dispara o hedge
+LLM_HEDGE_MIN_SAMPLES = 20                 # Chamadas observadas antes de usar o hedge
+LLM_HEDGE_MIN_DELAY = 0.5                  # Espera mínima (s) antes do hedge
+LLM_HEDGE_WORKERS = 16                     # Threads que disparam hedges no modo síncrono (todas as chamadas)
+# Circuit breaker por endpoint/modelo: falha imediata enquanto o Foundry
+# reinicia ou carrega o modelo
+CIRCUIT_BREAKER_ENABLED = True
+CIRCUIT_FAILURE_THRESHOLD = 5              # Falhas transitórias seguidas que abrem o circuito
+CIRCUIT_RESET_TIMEOUT = 15.0               # Segundos aberto antes da chamada de teste
+
+# ============================================================================
+# LLM RESPONSE CACHE
+# ============================================================================
+# Opt-in: respostas indexadas por hash de (modelo, mensagens, temperatura, max_tokens)
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+LLM_CACHE_MAX_ENTRIES = 1024               # Entradas no LRU em memória
+LLM_CACHE_MAX_BYTES = 32 * 1024 * 1024     # Bytes no LRU em memória
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH")   # Arquivo SQLite persistente (None = só memória)
+LLM_CACHE_TTL = 7 * 24 * 3600              # Validade das entradas em segundos
+LLM_CACHE_DISK_MAX_ENTRIES = 50_000        # Entradas no arquivo SQLite
+LLM_CACHE_DISK_MAX_BYTES = 256 * 1024 * 1024   # Bytes das respostas no arquivo SQLite
+LLM_CACHE_GC_INTERVAL = 300                # Intervalo mínimo (s) entre limpezas do arquivo
+
+# ============================================================================
+# CHECKPOINTS DAS EXECUÇÕES
+# ============================================================================
+# Opt-in: o grafo grava o estado a cada superstep em SQLite; uma execução que
+# falhou continua com graph.invoke(None, {"configurable": {"thread_id": ...}})
+CHECKPOINT_ENABLED = os.getenv("CHECKPOINT_ENABLED", "false").lower() in ("1", "true", "yes")
+CHECKPOINT_PATH = os.getenv("CHECKPOINT_PATH", "checkpoints.sqlite")
+CHECKPOINT_MAX_AGE = 7 * 24 * 3600         # Threads sem atividade há mais tempo são removidas (s)
+CHECKPOINT_MAX_BYTES = 256 * 1024 * 1024   # Acima disso, remove as threads menos recentes
+CHECKPOINT_GC_INTERVAL = 600               # Intervalo mínimo entre coletas (s)
+
+# ============================================================================
+# MODEL SCHEDULER
+# ============================================================================
+# Limita chamadas simultâneas por modelo; a fila é priorizada (final_writer
+# antes das sumarizações, interativo antes de batch) e justa entre sessões
+SCHEDULER_ENABLED = True
+SCHEDULER_MAX_IN_FLIGHT = {
+    LLM_MODEL: 2,
+    REASONING_MODEL: 1,
+}
+SCHEDULER_DEFAULT_MAX_IN_FLIGHT = 1        # Modelos fora de SCHEDULER_MAX_IN_FLIGHT
+SCHEDULER_MAX_QUEUE = 64                   # Chamadas aguardando por modelo
+SCHEDULER_QUEUE_TIMEOUT = 600              # Espera máxima na fila em segundos
+
 # ============================================================================
 # TAVILY SEARCH SETTINGS
 # ============================================================================
 TAVILY_MAX_RESULTS = 1
 MAX_RAW_CHARS = 4000
 
+# Extração em lote: URLs de todos os ramos single_search são agrupadas
+TAVILY_EXTRACT_BATCH_SIZE = 20             # URLs por chamada de extract (limite do Tavily)
+TAVILY_EXTRACT_BATCH_WAIT = 0.05           # Janela (s) para juntar URLs de outros ramos
+TAVILY_EXTRACT_WORKERS = 4                 # Lotes/URLs extraídos em paralelo
+
+# Prefetch: cada query é buscada (e suas páginas enviadas à extração) assim
+# que a string dela fecha no stream de build_first_queries, antes de o modelo
+# terminar a lista
+QUERY_PREFETCH_ENABLED = os.getenv("QUERY_PREFETCH_ENABLED", "true").lower() in ("1", "true", "yes")
+QUERY_PREFETCH_WORKERS = 8                 # Buscas antecipadas simultâneas (todas as execuções)
+
+# Cache de search/extract (stale-while-revalidate)
+TAVILY_SEARCH_TTL = 6 * 3600               # Validade dos resultados de search
+TAVILY_EXTRACT_TTL = 24 * 3600             # Validade do raw_content extraído
+TAVILY_STALE_TTL = 3600                    # Janela em que entradas vencidas ainda são servidas
+TAVILY_CACHE_MAX_ENTRIES = 512             # Entradas no tier em memória
+TAVILY_CACHE_MAX_BYTES = 64 * 1024 * 1024  # Bytes no tier em memória
+TAVILY_CACHE_PATH = os.getenv("TAVILY_CACHE_PATH")  # Arquivo TinyDB persistente (None = só memória)
+TAVILY_CACHE_DISK_MAX_ENTRIES = 10_000     # Entradas no arquivo TinyDB
+TAVILY_CACHE_DISK_MAX_BYTES = 256 * 1024 * 1024  # Bytes (JSON) no arquivo TinyDB
+TAVILY_CACHE_FLUSH_EVERY = 50              # Gravações acumuladas antes de reescrever o arquivo
+TAVILY_CACHE_FLUSH_INTERVAL = 30.0         # Segundos máximos entre reescritas do arquivo
+
+# ============================================================================
+# RANKING DE TRECHOS
+# ============================================================================
+# Em vez de cortar raw_content nos primeiros MAX_RAW_CHARS, os chunks mais
+# relevantes para a pergunta e a query (BM25) preenchem o orçamento
+RANKING_ENABLED = True
+RANKING_CHUNK_CHARS = 600                  # Tamanho máximo de cada chunk
+RANKING_MAX_INPUT_CHARS = 200_000          # Texto considerado por página (limita CPU)
+RANKING_BM25_K1 = 1.5                      # Saturação da frequência do termo
+RANKING_BM25_B = 0.75                      # Normalização pelo tamanho do chunk
+
+# ============================================================================
+# SUMARIZAÇÃO
+# ============================================================================
+# "llm": um resumo do LLM por página (padrão)
+# "extractive": frases mais relevantes da página, sem chamada ao LLM
+# "hybrid": extrativo quando cobre bem a query, LLM caso contrário
+SUMMARY_MODE = os.getenv("SUMMARY_MODE", "llm").lower()
+SUMMARY_EXTRACTIVE_SENTENCES = 6           # Frases no resumo extrativo
+SUMMARY_EXTRACTIVE_MAX_CHARS = 1200        # Tamanho máximo do resumo extrativo
+SUMMARY_HYBRID_THRESHOLD = 0.6             # Cobertura mínima dos termos da query para dispensar o LLM
+
+# Sumarização em lote: páginas de todos os ramos resumidas em uma só chamada
+SUMMARY_BATCH_ENABLED = os.getenv("SUMMARY_BATCH_ENABLED", "false").lower() in ("1", "true", "yes")
+SUMMARY_BATCH_SIZE = 5                     # Máximo de páginas por chamada
+SUMMARY_BATCH_WAIT = 0.1                   # Janela (s) para juntar páginas de outros ramos
+SUMMARY_BATCH_CONTEXT_TOKENS = MODEL_CONTEXT_TOKENS[LLM_MODEL]   # Janela de contexto (prompt + resposta)
+SUMMARY_BATCH_ITEM_TOKENS = 256            # Tokens de resposta reservados por página
+
+# ============================================================================
+# COLETA DOS RAMOS DE BUSCA
+# ============================================================================
+# "all": final_writer espera todos os ramos single_search (padrão)
+# "quorum": final_writer começa com COLLECTION_QUORUM dos ramos concluídos ou
+# após COLLECTION_DEADLINE segundos (com ao menos um ramo concluído)
+COLLECTION_MODE = os.getenv("COLLECTION_MODE", "all").lower()
+COLLECTION_QUORUM = float(os.getenv("COLLECTION_QUORUM", "0.6"))      # Fração dos ramos
+COLLECTION_DEADLINE = float(os.getenv("COLLECTION_DEADLINE", "15"))   # Segundos desde o início das buscas
+# Ramos atrasados: "drop" cancela e descarta; "refine" deixa terminar e revisa
+# a resposta com os resultados novos (refine_writer)
+COLLECTION_LATE_RESULTS = os.getenv("COLLECTION_LATE_RESULTS", "drop").lower()
+COLLECTION_REFINE_WAIT = 30.0              # Espera máxima (s) pelos ramos atrasados no refine
+COLLECTION_WORKERS = 32                    # Threads dos ramos no modo síncrono (graph.invoke)
+
+# ============================================================================
+# TRACING
+# ============================================================================
+# Spans por nó do grafo, extração, sumarização e chamada ao Foundry
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "false").lower() in ("1", "true", "yes")
+TRACE_PATH = os.getenv("TRACE_PATH", "traces.jsonl")   # Arquivo JSONL de spans
+TRACE_OTEL_ENABLED = os.getenv("TRACE_OTEL_ENABLED", "false").lower() in ("1", "true", "yes")  # Espelhar no OpenTelemetry
+
 # ============================================================================
 # STREAMLIT SETTINGS
 # ============================================================================
 DEFAULT_QUERY = "How is the process of building a LLM?"
 STREAMLIT_TITLE = "🌎 Local Perplexity"
 
+# ============================================================================
+# API HTTP (server.py)
+# ============================================================================
+API_HOST = os.getenv("API_HOST", "127.0.0.1")
+API_PORT = int(os.getenv("API_PORT", "8000"))
+API_WORKERS = int(os.getenv("API_WORKERS", "4"))   # Perguntas executadas ao mesmo tempo
+API_MAX_QUEUE = 64                         # Perguntas aguardando worker (acima disso: 429)
+API_JOB_TTL = 3600                         # Segundos que um job encerrado fica consultável
+API_MAX_JOBS = 1000                        # Jobs guardados em memória (os encerrados mais antigos saem)
+
 # ============================================================================
 # LOGGING CONFIGURATION
 # ============================================================================
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
 LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+LOG_FILE = os.getenv("LOG_FILE", "perplexity.log")   # Vazio = só console
+LOG_MAX_BYTES = 10 * 1024 * 1024           # Tamanho que faz o arquivo girar
+LOG_BACKUP_COUNT = 5                       # Arquivos antigos mantidos (perplexity.log.1, ...)
+LOG_JSON = os.getenv("LOG_JSON", "false").lower() in ("1", "true", "yes")   # Arquivo em JSON lines
+LOG_QUEUE_BATCH = 256                      # Registros escritos por flush
+# Loggers dos módulos do projeto ligados à fila (além de "perplexity")
+LOG_MODULES = (
+    "llm_client", "cache", "batching", "checkpoint", "ranking", "resilience", "run_context",
+    "scheduler", "server", "tokens", "tracing", "utils", "warmup",
+)
 
 
 def setup_logging(level: str = LOG_LEVEL) -> logging.Logger:
     """
     Configurar logging estruturado para o projeto.
     
+    Os loggers só enfileiram os registros; uma thread grava no console e no
+    arquivo em lotes (ver log_pipeline.py).
+    
     Args:
         level: Nível de logging (DEBUG, INFO, WARNING, ERROR)
         
     Returns:
         Logger configurado
     """
-    logger = logging.getLogger("perplexity")
-    
-    # Não adicionar handlers duplicados
-    if logger.handlers:
-        return logger
-    
-    logger.setLevel(getattr(logging, level))
+    from log_pipeline import start_log_pipeline
     
-    # Console handler
-    console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setLevel(getattr(logging, level))
-    console_formatter = logging.Formatter(LOG_FORMAT)
-    console_handler.setFormatter(console_formatter)
-    logger.addHandler(console_handler)
-    
-    # File handler
-    file_handler = logging.FileHandler("perplexity.log")
-    file_handler.setLevel(getattr(logging, level))
-    file_formatter = logging.Formatter(LOG_FORMAT)
-    file_handler.setFormatter(console_formatter)
-    logger.addHandler(file_handler)
-    
-    return logger
+    start_log_pipeline(("perplexity",) + LOG_MODULES, level, json_lines=LOG_JSON, log_file=LOG_FILE or None)
+    return logging.getLogger("perplexity")
 
 
 # ============================================================================
@@ -99,6 +285,21 @@ def validate_config() -> bool:
         logger.error("❌ FOUNDRY_ENDPOINT não está configurado")
         return False
     
+    if SUMMARY_MODE not in ("llm", "extractive", "hybrid"):
+        logger.error(f"❌ SUMMARY_MODE inválido: {SUMMARY_MODE} (use llm, extractive ou hybrid)")
+        return False
+    
+    if STRUCTURED_OUTPUT_MODE not in ("auto", "json_schema", "prompt"):
+        logger.error(f"❌ STRUCTURED_OUTPUT_MODE inválido: {STRUCTURED_OUTPUT_MODE} (use auto, json_schema ou prompt)")
+        return False
+    
+    if COLLECTION_MODE not in ("all", "quorum") or COLLECTION_LATE_RESULTS not in ("drop", "refine"):
+        logger.error(
+            f"❌ Coleta inválida: COLLECTION_MODE={COLLECTION_MODE} (all ou quorum), "
+            f"COLLECTION_LATE_RESULTS={COLLECTION_LATE_RESULTS} (drop ou refine)"
+        )
+        return False
+    
     logger.info(f"✅ Configuração carregada com sucesso")
     logger.debug(f"  - Endpoint: {FOUNDRY_ENDPOINT}")
     logger.debug(f"  - Modelo Principal: {LLM_MODEL}")
@@ -107,9 +308,6 @@ def validate_config() -> bool:
     return True
 
 
-# Inicializar logging ao importar o módulo
-_logger = setup_logging()
-
 __all__ = [
     "FOUNDRY_ENDPOINT",
     "FOUNDRY_API_KEY",
@@ -121,11 +319,110 @@ __all__ = [
     "REASONING_MAX_TOKENS",
     "REASONING_TEMPERATURE",
     "REASONING_TIMEOUT",
+    "WARMUP_ENABLED",
+    "WARMUP_KEEPALIVE_INTERVAL",
+    "WARMUP_RETRY_INTERVAL",
+    "WARMUP_PROMPT",
+    "STRUCTURED_OUTPUT_MODE",
+    "STRUCTURED_REPAIR_ATTEMPTS",
+    "STRUCTURED_REPAIR_MAX_CHARS",
+    "STRUCTURED_STREAMING",
+    "MODEL_CONTEXT_TOKENS",
+    "DEFAULT_CONTEXT_TOKENS",
+    "PROMPT_SAFETY_MARGIN_TOKENS",
+    "FINAL_RESULT_MIN_TOKENS",
+    "TOKENIZER",
+    "TOKENIZER_ENCODING",
+    "TOKENIZER_CHARS_PER_TOKEN",
+    "HTTP_POOL_CONNECTIONS",
+    "HTTP_POOL_MAXSIZE",
+    "HTTP_POOL_BLOCK",
+    "HTTP_KEEP_ALIVE",
+    "SCHEDULER_ENABLED",
+    "SCHEDULER_MAX_IN_FLIGHT",
+    "SCHEDULER_DEFAULT_MAX_IN_FLIGHT",
+    "SCHEDULER_MAX_QUEUE",
+    "SCHEDULER_QUEUE_TIMEOUT",
+    "LLM_RETRY_ATTEMPTS",
+    "LLM_RETRY_BASE_DELAY",
+    "LLM_RETRY_MAX_DELAY",
+    "LLM_HEDGE_ENABLED",
+    "LLM_HEDGE_PERCENTILE",
+    "LLM_HEDGE_MIN_SAMPLES",
+    "LLM_HEDGE_MIN_DELAY",
+    "LLM_HEDGE_WORKERS",
+    "CIRCUIT_BREAKER_ENABLED",
+    "CIRCUIT_FAILURE_THRESHOLD",
+    "CIRCUIT_RESET_TIMEOUT",
+    "LLM_CACHE_ENABLED",
+    "LLM_CACHE_MAX_ENTRIES",
+    "LLM_CACHE_MAX_BYTES",
+    "LLM_CACHE_PATH",
+    "LLM_CACHE_TTL",
+    "LLM_CACHE_DISK_MAX_ENTRIES",
+    "LLM_CACHE_DISK_MAX_BYTES",
+    "LLM_CACHE_GC_INTERVAL",
+    "CHECKPOINT_ENABLED",
+    "CHECKPOINT_PATH",
+    "CHECKPOINT_MAX_AGE",
+    "CHECKPOINT_MAX_BYTES",
+    "CHECKPOINT_GC_INTERVAL",
     "TAVILY_MAX_RESULTS",
     "MAX_RAW_CHARS",
+    "TAVILY_EXTRACT_BATCH_SIZE",
+    "TAVILY_EXTRACT_BATCH_WAIT",
+    "TAVILY_EXTRACT_WORKERS",
+    "QUERY_PREFETCH_ENABLED",
+    "QUERY_PREFETCH_WORKERS",
+    "TAVILY_SEARCH_TTL",
+    "TAVILY_EXTRACT_TTL",
+    "TAVILY_STALE_TTL",
+    "TAVILY_CACHE_MAX_ENTRIES",
+    "TAVILY_CACHE_MAX_BYTES",
+    "TAVILY_CACHE_PATH",
+    "TAVILY_CACHE_DISK_MAX_ENTRIES",
+    "TAVILY_CACHE_DISK_MAX_BYTES",
+    "TAVILY_CACHE_FLUSH_EVERY",
+    "TAVILY_CACHE_FLUSH_INTERVAL",
+    "RANKING_ENABLED",
+    "RANKING_CHUNK_CHARS",
+    "RANKING_MAX_INPUT_CHARS",
+    "RANKING_BM25_K1",
+    "RANKING_BM25_B",
+    "SUMMARY_MODE",
+    "SUMMARY_EXTRACTIVE_SENTENCES",
+    "SUMMARY_EXTRACTIVE_MAX_CHARS",
+    "SUMMARY_HYBRID_THRESHOLD",
+    "SUMMARY_BATCH_ENABLED",
+    "SUMMARY_BATCH_SIZE",
+    "SUMMARY_BATCH_WAIT",
+    "SUMMARY_BATCH_CONTEXT_TOKENS",
+    "SUMMARY_BATCH_ITEM_TOKENS",
+    "COLLECTION_MODE",
+    "COLLECTION_QUORUM",
+    "COLLECTION_DEADLINE",
+    "COLLECTION_LATE_RESULTS",
+    "COLLECTION_REFINE_WAIT",
+    "COLLECTION_WORKERS",
+    "TRACING_ENABLED",
+    "TRACE_PATH",
+    "TRACE_OTEL_ENABLED",
     "DEFAULT_QUERY",
     "STREAMLIT_TITLE",
+    "API_HOST",
+    "API_PORT",
+    "API_WORKERS",
+    "API_MAX_QUEUE",
+    "API_JOB_TTL",
+    "API_MAX_JOBS",
     "LOG_LEVEL",
+    "LOG_FORMAT",
+    "LOG_FILE",
+    "LOG_MAX_BYTES",
+    "LOG_BACKUP_COUNT",
+    "LOG_JSON",
+    "LOG_QUEUE_BATCH",
+    "LOG_MODULES",
     "setup_logging",
     "validate_config",
 ]
@@ -0,0 +1,8 @@
+"""
+Configuração comum dos testes
+"""
+
+import os
+
+# Sem arquivo de log: os testes que sobem o logging (setup_logging) só usam o console
+os.environ["LOG_FILE"] = ""
@@ -0,0 +1,369 @@
+"""
+Extração de objetos JSON de respostas de LLM
+
+As respostas "estruturadas" dos modelos locais vêm com texto em volta do
+JSON: blocos <think> do DeepSeek-R1, frases de introdução, exemplos entre
+chaves, cercas ```json e às vezes um segundo objeto. Uma regex gulosa
+{.*} pega do primeiro "{" ao último "}" e junta tudo isso.
+
+JsonScanner percorre o texto uma vez com duas regex compiladas: fora de um
+objeto pula direto para o próximo "{" seguido de aspas; dentro dele consome
+cada string JSON inteira (com escapes) de uma vez e registra cada par de
+chaves balanceado. Os candidatos são testados na ordem em que começam (o
+objeto externo antes dos internos) e vale o primeiro que for JSON válido e
+passar na validação do chamador (ex: o schema Pydantic). O scanner aceita o
+texto em pedaços e só guarda o objeto ainda aberto, então a busca para no
+primeiro objeto aceito e um stream pode ser encerrado assim que ele fecha
+(StreamingJsonExtractor).
+"""
+
+import json
+import re
+from typing import Callable, Generator, Iterator, Optional
+
+# "{" só abre um objeto se vier seguido de uma chave, de "}" ou do fim do texto
+# (ainda indefinido); {x} e "{ " na prosa são ignorados sem custo
+_OBJECT_START = re.compile(r'\{(?=\s*(["}]|\Z))')
+# Dentro de um objeto: string completa (pulada de uma vez), chave ou aspas sem fechamento
+_OBJECT_TOKEN = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"|[{}"]', re.DOTALL)
+_THINK_OPEN = "<think>"
+_THINK_CLOSE = "</think>"
+_SCAN_CHUNK = 1024     # Caracteres entregues ao scanner por vez em iter_json_objects
+_MAX_RESCANS = 32     # Novas varreduras após chaves soltas (limita o pior caso)
+# Próximo item de um array: string completa, com a vírgula antes dela
+_ARRAY_ITEM = re.compile(r'\s*,?\s*("[^"\\]*(?:\\.[^"\\]*)*")')
+_ARRAY_OTHER = re.compile(r'\s*,?\s*[^\s,"]')   # Fim do array ou item que não é string
+_KEY_OVERLAP = 64     # Chave dividida entre tokens: procurar de novo no final do texto anterior
+
+
+def strip_reasoning(text: str) -> str:
+    """
+    Remover o raciocínio antes da resposta (<think>...</think>)
+
+    Alguns servidores omitem a tag de abertura; vale o texto depois do primeiro
+    </think>. Sem </think> (raciocínio truncado), o texto volta inteiro.
+
+    Args:
+        text: Resposta do modelo
+
+    Returns:
+        Texto da resposta sem o raciocínio
+    """
+    end = text.find(_THINK_CLOSE)
+    return text[end + len(_THINK_CLOSE):] if end >= 0 else text
+
+
+class JsonScanner:
+    """
+    Scanner incremental de pares de chaves balanceados (fora de strings)
+
+    As posições são contadas desde o início de tudo que foi recebido, mas o
+    texto anterior ao objeto aberto é descartado no feed seguinte: os trechos
+    devolvidos por feed devem ser lidos (get) antes de chamar feed de novo.
+    """
+
+    def __init__(self):
+        self._text = ""
+        self._base = 0       # Posição de self._text[0] no texto recebido
+        self._position = 0   # Próximo caractere a examinar em self._text
+        self._stack: list[int] = []
+
+    def feed(self, chunk: str) -> list[tuple[int, int, int]]:
+        """
+        Acrescentar texto e devolver os objetos que fecharam nele
+
+        Args:
+            chunk: Próximo pedaço do texto
+
+        Returns:
+            Lista de (início, fim, profundidade) na ordem em que fecharam;
+            profundidade 0 é um objeto de nível superior
+        """
+        if not self._stack and self._position:
+            self._base += self._position
+            self._text = self._text[self._position:]
+            self._position = 0
+        self._text += chunk
+        text, stack, closed = self._text, self._stack, []
+        position = self._position
+        while True:
+            if not stack:
+                match = _OBJECT_START.search(text, position)
+                if match is None:
+                    position = len(text)
+                    break
+                if not match.group(1):
+                    position = match.start()   # Decidir quando chegar mais texto
+                    break
+                stack.append(match.start())
+            else:
+                match = _OBJECT_TOKEN.search(text, position)
+                if match is None:
+                    position = len(text)
+                    break
+                token = match.group()
+                if token == '"':
+                    position = match.start()   # String ainda aberta: retomar dela
+                    break
+                if token == "{":
+                    stack.append(match.start())
+                elif token == "}":
+                    start = stack.pop()
+                    closed.append((self._base + start, self._base + match.end(), len(stack)))
+            position = match.end()
+        self._position = position
+        return closed
+
+    def get(self, start: int, end: int) -> str:
+        """Texto de um trecho devolvido pelo último feed"""
+        return self._text[start - self._base:end - self._base]
+
+    @property
+    def depth(self) -> int:
+        """Objetos abertos ainda não fechados"""
+        return len(self._stack)
+
+    @property
+    def unclosed(self) -> Optional[int]:
+        """Início do objeto de nível superior ainda aberto (None se não houver)"""
+        return self._base + self._stack[0] if self._stack else None
+
+
+def _scan(text: str, offset: int) -> Generator[dict, None, Optional[int]]:
+    """
+    Objetos de text[offset:], liberados a cada objeto de nível superior que fecha
+
+    Returns:
+        Posição de uma chave que não abre JSON válido (varrer de novo depois
+        dela) ou None se o texto terminou sem problemas
+    """
+    scanner = JsonScanner()
+    pending: list[tuple[int, int, int]] = []
+    for chunk_start in range(offset, len(text), _SCAN_CHUNK):
+        pending += scanner.feed(text[chunk_start:chunk_start + _SCAN_CHUNK])
+        last = max((i for i, span in enumerate(pending) if span[2] == 0), default=-1)
+        if last < 0:
+            continue
+        done, pending = pending[:last + 1], pending[last + 1:]
+        # Um objeto externo fecha depois dos internos, mas começa antes
+        for start, end, depth in sorted(done):
+            try:
+                value = json.loads(scanner.get(start, end))
+            except ValueError:
+                if depth == 0:
+                    return offset + start
+                continue
+            if isinstance(value, dict):
+                yield value
+    return None if scanner.unclosed is None else offset + scanner.unclosed
+
+
+def iter_json_objects(text: str) -> Iterator[dict]:
+    """
+    Objetos JSON do texto, do externo para os internos e da esquerda para a direita
+
+    Uma chave solta na prosa (ex: '{"' ou '{"formato...') pode nunca fechar ou
+    fechar em um "}" de outro objeto, engolindo o que vem depois. Nesses casos
+    o texto depois dela é varrido de novo, até _MAX_RESCANS vezes.
+
+    Args:
+        text: Texto com JSON embutido
+
+    Yields:
+        Dicts que são JSON válido
+    """
+    offset = 0
+    for _ in range(_MAX_RESCANS + 1):
+        rescan = yield from _scan(text, offset)
+        if rescan is None:
+            return
+        offset = rescan + 1
+
+
+def extract_json(content: str, validate: Optional[Callable[[dict], bool]] = None) -> Optional[dict]:
+    """
+    Primeiro objeto JSON válido (e aceito por validate) da resposta
+
+    Args:
+        content: Resposta do modelo
+        validate: Função que diz se o objeto serve (ex: valida o schema)
+
+    Returns:
+        Dict ou None se nenhum objeto servir
+    """
+    text = strip_reasoning(content)
+    for value in iter_json_objects(text):
+        if validate is None or validate(value):
+            return value
+    if text is not content:
+        # O JSON pode ter ficado dentro do raciocínio
+        for value in iter_json_objects(content):
+            if validate is None or validate(value):
+                return value
+    return None
+
+
+def json_fragment(content: str, max_chars: int) -> str:
+    """
+    Trecho da resposta a reenviar em um pedido de correção do JSON
+
+    Args:
+        content: Resposta que não pôde ser validada
+        max_chars: Tamanho máximo do trecho
+
+    Returns:
+        Texto a partir da primeira chave da resposta (sem o raciocínio), ou ""
+        se a resposta não tiver nenhum objeto para corrigir
+    """
+    text = strip_reasoning(content)
+    start = text.find("{")
+    return text[start:start + max_chars].rstrip() if start >= 0 else ""
+
+
+class _AnswerFilter:
+    """Separar, token a token, a resposta do raciocínio <think>...</think> inicial"""
+
+    def __init__(self):
+        self._head = ""   # Início da resposta ou final do raciocínio (procura do </think>)
+        self._thinking = False
+        self.started = False
+
+    def feed(self, token: str) -> Optional[str]:
+        """
+        Texto da resposta neste token
+
+        Returns:
+            Todo o texto da resposta acumulado no token em que ela começa,
+            depois só o token; None enquanto ainda é raciocínio
+        """
+        if self.started:
+            return token
+        self._head += token
+        if not self._thinking:
+            head = self._head.lstrip()
+            if len(head) < len(_THINK_OPEN) and _THINK_OPEN.startswith(head):
+                return None   # Ainda não dá para saber se começa com <think>
+            if not head.startswith(_THINK_OPEN):
+                self.started = True
+                return self._head
+            self._thinking = True
+        end = self._head.find(_THINK_CLOSE)
+        if end < 0:
+            # Guardar só o bastante para achar um </think> dividido entre tokens
+            self._head = self._head[-(len(_THINK_CLOSE) - 1):]
+            return None
+        self.started = True
+        return self._head[end + len(_THINK_CLOSE):]
+
+
+class StreamingJsonExtractor:
+    """
+    Detectar, durante o stream, o primeiro objeto válido
+
+    O texto dentro de <think>...</think> no início da resposta é ignorado
+    até o bloco fechar.
+    """
+
+    def __init__(self, validate: Optional[Callable[[dict], bool]] = None):
+        """
+        Args:
+            validate: Função que diz se o objeto serve (ex: valida o schema)
+        """
+        self.validate = validate
+        self._tokens: list[str] = []
+        self._answer = _AnswerFilter()
+        self._scanner = JsonScanner()
+
+    @property
+    def content(self) -> str:
+        """Texto recebido até agora"""
+        return "".join(self._tokens)
+
+    def feed(self, token: str) -> Optional[dict]:
+        """
+        Acrescentar um token
+
+        Args:
+            token: Próximo pedaço da resposta
+
+        Returns:
+            O objeto assim que ele fecha, ou None
+        """
+        self._tokens.append(token)
+        token = self._answer.feed(token)
+        if token is None:
+            return None
+
+        # Sem validação, um objeto interno não pode ser confundido com a resposta
+        spans = [span for span in self._scanner.feed(token) if self.validate is not None or span[2] == 0]
+        for start, end, _ in sorted(spans):
+            try:
+                value = json.loads(self._scanner.get(start, end))
+            except ValueError:
+                continue
+            if isinstance(value, dict) and (self.validate is None or self.validate(value)):
+                return value
+        return None
+
+
+class StreamingArrayItems:
+    """
+    Strings de um array JSON ("chave": [...]) liberadas conforme fecham no stream
+
+    Permite agir sobre cada item (ex: disparar a busca de uma query) antes de
+    o modelo terminar de gerar o objeto. Só a primeira ocorrência da chave
+    na resposta (fora do <think>) é lida; um item que não seja string
+    encerra a leitura.
+    """
+
+    def __init__(self, key: str):
+        """
+        Args:
+            key: Chave do array no objeto (ex: "queries")
+        """
+        self._key = re.compile(r'"%s"\s*:\s*\[' % re.escape(key))
+        self._answer = _AnswerFilter()
+        self._text = ""
+        self._searched = 0                   # Texto já procurado pela chave
+        self._position: Optional[int] = None  # Próximo item (None até achar a chave)
+        self.done = False
+
+    def feed(self, token: str) -> list[str]:
+        """
+        Acrescentar um token
+
+        Args:
+            token: Próximo pedaço da resposta
+
+        Returns:
+            Itens que fecharam neste token, na ordem do array
+        """
+        if self.done:
+            return []
+        token = self._answer.feed(token)
+        if token is None:
+            return []
+        self._text += token
+        if self._position is None:
+            match = self._key.search(self._text, max(0, self._searched - _KEY_OVERLAP))
+            self._searched = len(self._text)
+            if match is None:
+                return []
+            self._position = match.end()
+
+        items = []
+        while True:
+            match = _ARRAY_ITEM.match(self._text, self._position)
+            if match is None:
+                if _ARRAY_OTHER.match(self._text, self._position):
+                    self.done = True   # "]" ou item que não é string
+                break
+            items.append(json.loads(match.group(1)))
+            self._position = match.end()
+        # Só o item ainda incompleto precisa ficar guardado
+        self._text = self._text[self._position:]
+        self._position = 0
+        return items
+
+
+__all__ = ["JsonScanner", "StreamingArrayItems", "StreamingJsonExtractor", "extract_json", "iter_json_objects", "json_fragment", "strip_reasoning"]
@@ -4,26 +4,192 @@ Wrapper para compatibilidade com LangChain
 """
 
 from pydantic import BaseModel
-from typing import Type, TypeVar, Optional
+from contextlib import nullcontext
+from functools import lru_cache
+from typing import AsyncIterator, Callable, ContextManager, Iterable, Iterator, Type, TypeVar, Optional
+import asyncio
 import json
-import re
 import logging
+import socket
+import threading
+import time
+import weakref
+import httpx
 import requests
+from requests.adapters import HTTPAdapter
 import os
 
+from cache import LLMResponseCache
+from json_extract import StreamingJsonExtractor, extract_json, json_fragment
+from resilience import Resilience, create_resilience, current_attempt
+from scheduler import ModelScheduler, Priority
+from tracing import span
+from tokens import context_limit, count_tokens
+
 # Importar configuração
 try:
-    from config import FOUNDRY_ENDPOINT, FOUNDRY_API_KEY
+    from config import (
+        FOUNDRY_ENDPOINT, FOUNDRY_API_KEY,
+        HTTP_POOL_CONNECTIONS, HTTP_POOL_MAXSIZE, HTTP_POOL_BLOCK, HTTP_KEEP_ALIVE,
+        STRUCTURED_OUTPUT_MODE, STRUCTURED_REPAIR_ATTEMPTS, STRUCTURED_REPAIR_MAX_CHARS, STRUCTURED_STREAMING
+    )
 except ImportError:
     FOUNDRY_ENDPOINT = os.getenv("FOUNDRY_ENDPOINT", "http://127.0.0.1:52576")
     FOUNDRY_API_KEY = os.getenv("FOUNDRY_API_KEY", "local")
+    HTTP_POOL_CONNECTIONS = 4
+    HTTP_POOL_MAXSIZE = 8
+    HTTP_POOL_BLOCK = False
+    HTTP_KEEP_ALIVE = True
+    STRUCTURED_OUTPUT_MODE = "auto"
+    STRUCTURED_REPAIR_ATTEMPTS = 2
+    STRUCTURED_REPAIR_MAX_CHARS = 4000
+    STRUCTURED_STREAMING = False
 
 logger = logging.getLogger(__name__)
 
 T = TypeVar('T', bound=BaseModel)
 
 
-def _make_request(url: str, payload: dict, headers: dict, timeout: int) -> dict:
+class _Release:
+    """Contexto que devolve uma vaga já obtida do escalonador"""
+    
+    def __init__(self, scheduler: ModelScheduler, model: str):
+        self.scheduler = scheduler
+        self.model = model
+    
+    def __enter__(self) -> None:
+        return None
+    
+    def __exit__(self, *exc) -> None:
+        self.scheduler.release(self.model)
+
+
+class _PoolStatsAdapter(HTTPAdapter):
+    """HTTPAdapter que contabiliza requisições e conexões TCP abertas"""
+    
+    def __init__(self, *args, **kwargs):
+        self._stats_lock = threading.Lock()
+        self._requests = 0
+        self._connects = 0
+        self._connections = weakref.WeakSet()
+        self._active: dict[int, object] = {}   # thread -> conexão com requisição em andamento
+        super().__init__(*args, **kwargs)
+    
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        adapter = self
+        
+        def counting(connection_cls):
+            class CountingConnection(connection_cls):
+                def connect(self):
+                    with adapter._stats_lock:
+                        adapter._connects += 1
+                        adapter._connections.add(self)
+                    return super().connect()
+                
+                def request(self, *args, **kwargs):
+                    with adapter._stats_lock:
+                        adapter._active[threading.get_ident()] = self
+                    return super().request(*args, **kwargs)
+            return CountingConnection
+        
+        def tracking(pool_cls):
+            class TrackingPool(pool_cls):
+                ConnectionCls = counting(pool_cls.ConnectionCls)
+                
+                def _put_conn(self, conn):
+                    # A conexão voltou ao pool: não pertence mais à requisição da thread
+                    with adapter._stats_lock:
+                        for thread_id, active in list(adapter._active.items()):
+                            if active is conn:
+                                del adapter._active[thread_id]
+                    return super()._put_conn(conn)
+            TrackingPool.__name__ = pool_cls.__name__
+            return TrackingPool
+        
+        # Trocar a classe de conexão de cada pool para contar cada connect()
+        # real, inclusive reconexões feitas pelo urllib3 no mesmo objeto, e
+        # saber qual conexão cada thread está usando (abort_request)
+        self.poolmanager.pool_classes_by_scheme = {
+            scheme: tracking(pool_cls)
+            for scheme, pool_cls in self.poolmanager.pool_classes_by_scheme.items()
+        }
+    
+    def send(self, request, **kwargs):
+        with self._stats_lock:
+            self._requests += 1
+        return super().send(request, **kwargs)
+    
+    def abort(self) -> None:
+        """Derrubar todas as conexões abertas, inclusive as que esperam uma resposta"""
+        with self._stats_lock:
+            connections = list(self._connections)
+        for connection in connections:
+            _shutdown(connection)
+    
+    def abort_request(self, thread_id: int) -> None:
+        """Derrubar a conexão da requisição em andamento na thread (sem efeito se ela já voltou ao pool)"""
+        with self._stats_lock:
+            # Sob o lock: a conexão não volta ao pool para outra thread no meio do shutdown
+            _shutdown(self._active.pop(thread_id, None))
+    
+    def stats(self) -> dict[str, int]:
+        """Retornar contadores de requisições, conexões novas e reutilizadas"""
+        with self._stats_lock:
+            requests_count, connects = self._requests, self._connects
+        return {
+            "requests": requests_count,
+            "new_connections": connects,
+            "reused_connections": max(0, requests_count - connects),
+        }
+
+
+def _shutdown(connection) -> None:
+    """Derrubar a conexão urllib3 (shutdown acorda a thread bloqueada no recv; close sozinho não)"""
+    sock = getattr(connection, "sock", None)
+    if sock is None:
+        return
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+
+def _create_session(
+    pool_connections: int = HTTP_POOL_CONNECTIONS,
+    pool_maxsize: int = HTTP_POOL_MAXSIZE,
+    pool_block: bool = HTTP_POOL_BLOCK,
+    keep_alive: bool = HTTP_KEEP_ALIVE
+) -> requests.Session:
+    """
+    Criar sessão HTTP com pool de conexões keep-alive.
+    
+    A sessão pode ser compartilhada entre threads: o pool do urllib3 é
+    thread-safe e cada requisição pega uma conexão livre do pool.
+    
+    Args:
+        pool_connections: Número de hosts mantidos no pool
+        pool_maxsize: Máximo de conexões reutilizáveis por host
+        pool_block: Bloquear quando todas as conexões do host estão em uso
+        keep_alive: Manter conexões abertas entre requisições
+        
+    Returns:
+        Sessão configurada
+    """
+    session = requests.Session()
+    adapter = _PoolStatsAdapter(
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        pool_block=pool_block
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    if not keep_alive:
+        session.headers["Connection"] = "close"
+    return session
+
+
+def _make_request(url: str, payload: dict, headers: dict, timeout: int, session: Optional[requests.Session] = None) -> dict:
     """
     Fazer requisição HTTP ao API do Foundry.
     
@@ -32,6 +198,7 @@ def _make_request(url: str, payload: dict, headers: dict, timeout: int) -> dict:
         payload: Payload JSON
         headers: Headers HTTP
         timeout: Timeout em segundos
+        session: Sessão HTTP com pool de conexões (default: conexão avulsa)
         
     Returns:
         Response JSON parseado
@@ -39,44 +206,183 @@ def _make_request(url: str, payload: dict, headers: dict, timeout: int) -> dict:
     Raises:
         requests.HTTPError: Se a requisição falhar
     """
-    response = requests.post(url, json=payload, headers=headers, timeout=timeout)
+    http = session if session is not None else requests
+    response = http.post(url, json=payload, headers=headers, timeout=timeout)
     
     if not response.ok:
-        logger.error(f"HTTP {response.status_code}: {response.text[:500]}")
+        logger.error("HTTP %s: %s", response.status_code, response.text[:500])
     
     response.raise_for_status()
     return response.json()
 
 
-def _extract_json(content: str) -> Optional[dict]:
+def _abandon_async_client(client: httpx.AsyncClient) -> None:
     """
-    Extrair JSON de resposta LLM.
+    Derrubar as conexões de um cliente cujo event loop já fechou
     
-    Tenta em ordem:
-    1. Regex para {...}
-    2. Parse direto do conteúdo
+    aclose() precisaria do loop do cliente; sem ele, os sockets do pool são
+    desligados diretamente e o resto é liberado pelo coletor de lixo.
     
     Args:
-        content: Conteúdo da resposta LLM
+        client: Cliente do loop encerrado
+    """
+    pool = getattr(client._transport, "_pool", None)
+    for connection in list(getattr(pool, "connections", [])):
+        stream = getattr(getattr(connection, "_connection", None), "_network_stream", None)
+        sock = stream.get_extra_info("socket") if stream is not None else None
+        if sock is None:
+            continue
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+def _create_async_client(
+    pool_maxsize: int = HTTP_POOL_MAXSIZE,
+    pool_block: bool = HTTP_POOL_BLOCK,
+    keep_alive: bool = HTTP_KEEP_ALIVE
+) -> httpx.AsyncClient:
+    """
+    Criar cliente HTTP assíncrono com os mesmos limites do pool síncrono.
+    
+    Args:
+        pool_maxsize: Conexões mantidas abertas por host
+        pool_block: Limitar conexões simultâneas a pool_maxsize
+        keep_alive: Manter conexões abertas entre requisições
         
     Returns:
-        Dict parseado ou None se falhar
+        Cliente httpx configurado
     """
-    # Tentativa 1: Procurar por JSON no formato {...}
-    json_match = re.search(r'\{.*\}', content, re.DOTALL)
-    if json_match:
-        try:
-            json_str = json_match.group(0)
-            return json.loads(json_str)
-        except (json.JSONDecodeError, ValueError) as e:
-            logger.debug(f"Erro ao parsear JSON extraído: {e}")
+    limits = httpx.Limits(
+        max_connections=pool_maxsize if pool_block else None,
+        max_keepalive_connections=pool_maxsize if keep_alive else 0
+    )
+    return httpx.AsyncClient(limits=limits)
+
+
+async def _make_async_request(client: httpx.AsyncClient, url: str, payload: dict, headers: dict, timeout: int) -> dict:
+    """
+    Fazer requisição HTTP assíncrona ao API do Foundry.
+    
+    Args:
+        client: Cliente httpx do event loop atual
+        url: URL do endpoint
+        payload: Payload JSON
+        headers: Headers HTTP
+        timeout: Timeout em segundos
+        
+    Returns:
+        Response JSON parseado
+        
+    Raises:
+        httpx.HTTPStatusError: Se a requisição falhar
+    """
+    response = await client.post(url, json=payload, headers=headers, timeout=timeout)
+    
+    if response.is_error:
+        logger.error("HTTP %s: %s", response.status_code, response.text[:500])
+    
+    response.raise_for_status()
+    return response.json()
+
+
+def _parse_sse_line(line: str) -> Optional[str]:
+    """
+    Extrair o texto de uma linha server-sent-event do chat completions.
     
-    # Tentativa 2: Parse direto do conteúdo
+    Args:
+        line: Linha do stream (ex: 'data: {"choices": [...]}')
+        
+    Returns:
+        Token de texto, "" para linhas sem conteúdo ou None no fim do stream
+    """
+    if not line.startswith("data:"):
+        # Linhas em branco separam eventos; ":" são comentários/keep-alive
+        return ""
+    data = line[len("data:"):].strip()
+    if data == "[DONE]":
+        return None
     try:
-        return json.loads(content)
+        chunk = json.loads(data)
     except (json.JSONDecodeError, ValueError) as e:
-        logger.debug(f"Erro ao parsear conteúdo como JSON: {e}")
-        return None
+        logger.debug("Chunk SSE inválido ignorado: %s", e)
+        return ""
+    choices = chunk.get("choices") or [{}]
+    delta = choices[0].get("delta") or choices[0].get("message") or {}
+    return delta.get("content") or ""
+
+
+def _iter_sse_tokens(lines: Iterable[bytes]) -> Iterator[str]:
+    """
+    Converter linhas brutas do stream SSE em tokens de texto.
+    
+    Args:
+        lines: Linhas em bytes do corpo da resposta
+        
+    Yields:
+        Tokens de texto na ordem de chegada
+    """
+    for raw_line in lines:
+        token = _parse_sse_line(raw_line.decode("utf-8", errors="replace"))
+        if token is None:
+            return
+        if token:
+            yield token
+
+
+def _extract_json(content: str, validate: Optional[Callable[[dict], bool]] = None) -> Optional[dict]:
+    """
+    Extrair JSON de resposta LLM.
+    
+    Ignora o raciocínio (<think>...</think>) e percorre o texto uma única vez
+    em busca de objetos com chaves balanceadas (ver json_extract.py).
+    
+    Args:
+        content: Conteúdo da resposta LLM
+        validate: Função que diz se o objeto serve (ex: valida o schema)
+        
+    Returns:
+        Primeiro dict aceito ou None se falhar
+    """
+    parsed = extract_json(content, validate)
+    if parsed is None:
+        logger.debug("Nenhum objeto JSON válido na resposta (%d caracteres)", len(content))
+    return parsed
+
+
+# Status com que servidores OpenAI-compatíveis recusam um parâmetro desconhecido
+_REJECTED_PARAMETER_STATUS = frozenset({400, 415, 422, 501})
+
+# Endpoint -> aceita response_format json_schema (detectado na primeira chamada)
+_response_format_support: dict[str, bool] = {}
+_response_format_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def _response_format(schema: Type[BaseModel]) -> dict:
+    """Parâmetro response_format do schema (serializado uma vez por classe)"""
+    return {"type": "json_schema", "json_schema": {"name": schema.__name__, "schema": schema.model_json_schema()}}
+
+
+@lru_cache(maxsize=None)
+def _schema_json(schema: Type[BaseModel]) -> str:
+    """JSON schema compacto usado no pedido de correção"""
+    return json.dumps(schema.model_json_schema(), ensure_ascii=False, separators=(",", ":"))
+
+
+def response_format_supported(endpoint: str) -> Optional[bool]:
+    """
+    Se o endpoint aceita response_format json_schema
+    
+    Args:
+        endpoint: URL base do servidor
+        
+    Returns:
+        True/False depois da primeira chamada estruturada, None antes
+    """
+    with _response_format_lock:
+        return _response_format_support.get(endpoint.rstrip('/'))
 
 
 class MessageResponse:
@@ -88,7 +394,7 @@ class MessageResponse:
 class AzureFoundryLocalLLM:
     """Wrapper para Azure AI Foundry Local com compatibilidade LangChain"""
     
-    def __init__(self, model: str, endpoint: str = None, max_tokens: int = 512, temperature: float = 0.7, structured_temperature: float = 0.3, timeout: int = 120):
+    def __init__(self, model: str, endpoint: str = None, max_tokens: int = 512, temperature: float = 0.7, structured_temperature: float = 0.3, timeout: int = 120, pool_connections: int = HTTP_POOL_CONNECTIONS, pool_maxsize: int = HTTP_POOL_MAXSIZE, pool_block: bool = HTTP_POOL_BLOCK, keep_alive: bool = HTTP_KEEP_ALIVE, cache: Optional[LLMResponseCache] = None, scheduler: Optional[ModelScheduler] = None, resilience: Optional[Resilience] = None, structured_streaming: bool = STRUCTURED_STREAMING, structured_output_mode: str = STRUCTURED_OUTPUT_MODE, repair_attempts: int = STRUCTURED_REPAIR_ATTEMPTS):
         """
         Inicializar cliente Azure Foundry Local
         
@@ -96,6 +402,16 @@ class AzureFoundryLocalLLM:
             model: ID do modelo (ex: "Phi-4-mini-instruct-generic-gpu:5")
             endpoint: URL do servidor Foundry (default: FOUNDRY_ENDPOINT)
             timeout: Timeout em segundos (default: 120)
+            pool_connections: Hosts mantidos no pool (default: HTTP_POOL_CONNECTIONS)
+            pool_maxsize: Conexões reutilizáveis por host (default: HTTP_POOL_MAXSIZE)
+            pool_block: Bloquear ao esgotar o pool (default: HTTP_POOL_BLOCK)
+            keep_alive: Reutilizar conexões entre chamadas (default: HTTP_KEEP_ALIVE)
+            cache: Cache de respostas compartilhável entre clientes (default: desabilitado)
+            scheduler: Escalonador que limita chamadas simultâneas por modelo (default: sem limite)
+            resilience: Retry, hedge e circuit breaker (default: config.py, circuito compartilhado por endpoint/modelo)
+            structured_streaming: Receber structured output por streaming e encerrar no primeiro objeto válido (default: STRUCTURED_STREAMING)
+            structured_output_mode: "auto", "json_schema" ou "prompt" (default: STRUCTURED_OUTPUT_MODE)
+            repair_attempts: Pedidos de correção de JSON inválido por chamada (default: STRUCTURED_REPAIR_ATTEMPTS)
         """
         self.model = model
         self.max_tokens = max_tokens
@@ -107,53 +423,431 @@ class AzureFoundryLocalLLM:
         self.endpoint = endpoint.rstrip('/')
         self.api_url = f"{self.endpoint}/v1/chat/completions"
         self.api_key = FOUNDRY_API_KEY
-        logger.info(f"✅ Conectado ao Foundry em {endpoint}")
+        self.session = _create_session(pool_connections, pool_maxsize, pool_block, keep_alive)
+        self._pool_maxsize = pool_maxsize
+        self._pool_block = pool_block
+        self._keep_alive = keep_alive
+        # Um httpx.AsyncClient por event loop (o pool do httpx fica preso ao loop)
+        self._async_clients: dict[asyncio.AbstractEventLoop, httpx.AsyncClient] = {}
+        self._async_lock = threading.Lock()
+        self.cache = cache
+        self.scheduler = scheduler
+        self.resilience = resilience if resilience is not None else create_resilience(self.endpoint, model)
+        self.structured_streaming = structured_streaming
+        self.structured_output_mode = structured_output_mode
+        self.repair_attempts = repair_attempts
+        self._usage_lock = threading.Lock()
+        self._usage = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0}
+        self._structured = {
+            path: {"calls": 0, "repaired": 0, "repairs": 0, "failures": 0, "seconds": 0.0}
+            for path in ("json_schema", "prompt")
+        }
+        logger.info("✅ Conectado ao Foundry em %s", endpoint)
     
-    def invoke(self, prompt: str) -> MessageResponse:
+    def token_usage(self) -> dict[str, int]:
+        """Retornar chamadas ao modelo e tokens de prompt/resposta acumulados"""
+        with self._usage_lock:
+            return dict(self._usage)
+    
+    def structured_stats(self) -> dict[str, dict[str, float]]:
         """
-        Executar prompt simples
+        Chamadas estruturadas por caminho (json_schema ou prompt)
+        
+        Returns:
+            Por caminho: calls, repairs (pedidos de correção), retry_rate (fração
+            das chamadas que precisou de correção), failures e mean_latency_s
+        """
+        with self._usage_lock:
+            return {
+                path: {
+                    "calls": stats["calls"],
+                    "repairs": stats["repairs"],
+                    "retry_rate": stats["repaired"] / stats["calls"] if stats["calls"] else 0.0,
+                    "failures": stats["failures"],
+                    "mean_latency_s": stats["seconds"] / stats["calls"] if stats["calls"] else 0.0,
+                }
+                for path, stats in self._structured.items()
+            }
+    
+    def pool_stats(self) -> dict[str, int]:
+        """
+        Estatísticas do pool de conexões HTTP deste cliente
+        
+        Returns:
+            Dict com requests, new_connections e reused_connections
+        """
+        # O mesmo adapter está montado em http:// e https://
+        return self.session.get_adapter(self.api_url).stats()
+    
+    def close(self) -> None:
+        """Fechar a sessão HTTP e liberar as conexões do pool (e dos loops já encerrados)"""
+        self.session.close()
+        with self._async_lock:
+            self._prune_async_clients_locked()
+    
+    def _headers(self) -> dict[str, str]:
+        """Headers HTTP comuns a todas as chamadas"""
+        return {
+            "Content-Type": "application/json",
+            "Accept": "application/json",
+            "api-key": self.api_key,
+        }
+    
+    def _build_payload(self, prompt: str, temperature: float, max_tokens: Optional[int] = None) -> dict:
+        """
+        Montar payload de chat completion
         
         Args:
             prompt: Texto do prompt
+            temperature: Temperatura da geração
+            max_tokens: Limite de tokens gerados (default: self.max_tokens)
             
         Returns:
-            MessageResponse com o conteúdo da resposta
+            Payload JSON
         """
-        try:
-            logger.debug(f"Invoking model: {self.model}")
+        return {
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": temperature,
+            "max_tokens": max_tokens or self.max_tokens
+        }
+    
+    @staticmethod
+    def _structured_prompt(prompt: str) -> str:
+        """Adicionar instrução explícita para JSON ao prompt"""
+        return f"""{prompt}
+
+CRITICAL: Respond ONLY with a valid JSON object. No other text before or after."""
+    
+    @staticmethod
+    def _repair_prompt(fragment: str, schema: Type[BaseModel], error: str) -> str:
+        """Pedido de correção com apenas o trecho quebrado (sem o prompt original)"""
+        return f"""The JSON below is invalid or does not match the schema.
+
+Error: {error}
+
+JSON schema:
+{_schema_json(schema)}
+
+Broken JSON:
+{fragment}
+
+CRITICAL: Respond ONLY with the corrected JSON object. No other text before or after."""
+    
+    @staticmethod
+    def _schema_validator(schema: Type[T]) -> tuple[Callable[[dict], bool], list, list[str]]:
+        """
+        Validador de candidatos para a extração de JSON
+        
+        Args:
+            schema: Pydantic model para parsing
             
-            payload = {
-                "model": self.model,
-                "messages": [{"role": "user", "content": prompt}],
-                "temperature": self.temperature,
-                "max_tokens": self.max_tokens
-            }
+        Returns:
+            (validate, resultados, erros): validate guarda a instância aceita em
+            resultados e o motivo de cada rejeição em erros
+        """
+        results, errors = [], []
+        
+        def validate(value: dict) -> bool:
+            try:
+                results.append(schema(**value))
+            except Exception as e:
+                logger.debug("Objeto JSON rejeitado pelo schema %s: %s", schema.__name__, e)
+                errors.append(str(e))
+                return False
+            return True
+        
+        return validate, results, errors
+    
+    @staticmethod
+    def _parse_structured(content: str, schema: Type[T]) -> T:
+        """
+        Extrair da resposta o primeiro objeto JSON válido para o schema
+        
+        Args:
+            content: Conteúdo da resposta LLM
+            schema: Pydantic model para parsing
             
-            headers = {
-                "Content-Type": "application/json",
-                "Accept": "application/json",
-                "api-key": self.api_key,
-            }
+        Returns:
+            Instância do schema
+            
+        Raises:
+            ValueError: Se não conseguir parsear o JSON (a mensagem traz o motivo)
+        """
+        logger.debug("Raw response: %.100s...", content)
+        validate, results, errors = AzureFoundryLocalLLM._schema_validator(schema)
+        if _extract_json(content, validate) is not None:
+            logger.debug("✅ Structured output parseado com sucesso")
+            return results[-1]
+        
+        # Se falhar, lançar erro
+        logger.warning("Não foi possível parsear resposta como JSON: %.200s", content)
+        if errors:
+            raise ValueError(f"JSON não corresponde ao schema {schema.__name__}: {errors[-1]}")
+        raise ValueError("Não foi possível parsear resposta como JSON: nenhum objeto JSON completo")
+    
+    def _prompt_tokens(self, payload: dict) -> int:
+        """
+        Contar os tokens do prompt e avisar se não couberem na janela do modelo
+        
+        Args:
+            payload: Payload de chat completion
+            
+        Returns:
+            Tokens do prompt
+        """
+        prompt_tokens = sum(count_tokens(message["content"], self.model) for message in payload["messages"])
+        limit = context_limit(self.model)
+        if prompt_tokens + payload["max_tokens"] > limit:
+            logger.warning(
+                "⚠️ Prompt de %s tokens + %s de resposta excede a janela de %s tokens de %s",
+                prompt_tokens, payload["max_tokens"], limit, self.model
+            )
+        return prompt_tokens
+    
+    def _record_exchange(self, s, payload: dict, content: str, prompt_tokens: int, usage: Optional[dict] = None) -> None:
+        """
+        Registrar tokens de prompt/resposta da chamada (e bytes no span)
+        
+        Args:
+            s: Span da chamada (no-op com tracing desabilitado)
+            payload: Payload enviado
+            content: Texto recebido
+            prompt_tokens: Tokens do prompt contados localmente
+            usage: Bloco "usage" da resposta, se o servidor o enviar
+        """
+        usage = usage or {}
+        prompt_tokens = usage.get("prompt_tokens") or prompt_tokens
+        completion_tokens = usage.get("completion_tokens") or count_tokens(content, self.model)
+        with self._usage_lock:
+            self._usage["calls"] += 1
+            self._usage["prompt_tokens"] += prompt_tokens
+            self._usage["completion_tokens"] += completion_tokens
+        logger.debug("Tokens (%s): prompt=%s completion=%s", self.model, prompt_tokens, completion_tokens)
+        if s.recording:
+            s.set(
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                request_bytes=len(json.dumps(payload)),
+                response_bytes=len(content.encode())
+            )
+    
+    def _slot(self, priority: int):
+        """Vaga no escalonador durante a chamada HTTP (sem efeito se desabilitado)"""
+        if self.scheduler is None:
+            return nullcontext()
+        return self.scheduler.slot(self.model, priority)
+    
+    def _aslot(self, priority: int):
+        """Versão assíncrona de _slot"""
+        if self.scheduler is None:
+            return nullcontext()
+        return self.scheduler.aslot(self.model, priority)
+    
+    def _post(self, payload: dict) -> dict:
+        """Uma tentativa da chamada sem streaming (só a troca HTTP, sem vaga no escalonador)"""
+        attempt = current_attempt()
+        if attempt is None:
+            return _make_request(self.api_url, payload, self._headers(), self.timeout, self.session)
+        if not attempt.hedge:
+            # Requisição original de uma chamada hedged: conexão do pool,
+            # derrubada só se a cópia responder antes
+            adapter = self.session.get_adapter(self.api_url)
+            attempt.on_abort(lambda thread_id=threading.get_ident(): adapter.abort_request(thread_id))
+            return _make_request(self.api_url, payload, self._headers(), self.timeout, self.session)
+        # Cópia hedge: conexão própria, fora do pool, derrubada se a original vencer
+        session = _create_session(1, 1, keep_alive=False)
+        attempt.on_abort(session.get_adapter(self.api_url).abort)
+        try:
+            return _make_request(self.api_url, payload, self._headers(), self.timeout, session)
+        finally:
+            session.close()
+    
+    async def _apost(self, payload: dict) -> dict:
+        """Versão assíncrona de _post (a requisição perdedora do hedge é cancelada)"""
+        return await _make_async_request(self._get_async_client(), self.api_url, payload, self._headers(), self.timeout)
+    
+    def _hedge_slot(self, priority: int) -> Optional[ContextManager]:
+        """
+        Vaga extra para a cópia hedge, só se houver uma livre agora
+        
+        Returns:
+            Contexto que devolve a vaga, ou None (sem hedge): com limite 1 no
+            modelo a vaga é sempre da requisição original
+        """
+        if self.scheduler is None:
+            return nullcontext()
+        if not self.scheduler.try_acquire(self.model, priority):
+            return None
+        return _Release(self.scheduler, self.model)
+    
+    def _request(self, payload: dict, priority: int) -> dict:
+        """
+        Chamada sem streaming com retry, hedge e circuit breaker
+        
+        A vaga no escalonador é tomada uma vez para a chamada inteira e a
+        latência que dispara o hedge mede só a troca HTTP, não a fila. A cópia
+        hedge precisa de uma segunda vaga livre no modelo.
+        """
+        hedge_slot = lambda: self._hedge_slot(priority)
+        with self._slot(priority):
+            return self.resilience.call(lambda: self._post(payload), hedge=True, hedge_slot=hedge_slot)
+    
+    async def _arequest(self, payload: dict, priority: int) -> dict:
+        """Versão assíncrona de _request"""
+        hedge_slot = lambda: self._hedge_slot(priority)
+        async with self._aslot(priority):
+            return await self.resilience.acall(lambda: self._apost(payload), hedge=True, hedge_slot=hedge_slot)
 
-            data = _make_request(self.api_url, payload, headers, self.timeout)
-            content = data["choices"][0]["message"]["content"]
-            logger.debug(f"Response length: {len(content)} chars")
-            return MessageResponse(content)
+    def ping(self, prompt: str = "Hi") -> float:
+        """
+        Pedido mínimo que obriga o Foundry a carregar o modelo (aquecimento e keep-alive)
+
+        Gera 1 token, sem cache, retry nem circuit breaker: uma carga lenta ou
+        uma falha aqui não contam como falha das chamadas do pipeline, nem
+        entram em token_usage.
+
+        Args:
+            prompt: Texto do pedido
+
+        Returns:
+            Segundos até a resposta (inclui a carga do modelo, se ele não estava na memória)
+        """
+        payload = self._build_payload(prompt, 0.0, max_tokens=1)
+        with span("llm.ping", model=self.model) as s:
+            started = time.perf_counter()
+            with self._slot(Priority.SUMMARY):
+                self._post(payload)
+            seconds = time.perf_counter() - started
+            s.set(seconds=round(seconds, 3))
+        return seconds
+
+    def _open_stream(self, payload: dict) -> requests.Response:
+        """
+        Abrir a resposta em streaming, levantando erro HTTP antes do primeiro token
+        
+        Args:
+            payload: Payload com stream=True
+            
+        Returns:
+            Resposta com o corpo SSE ainda não lido
+        """
+        response = self.session.post(self.api_url, json=payload, headers=self._stream_headers(), timeout=self.timeout, stream=True)
+        if not response.ok:
+            logger.error("HTTP %s: %s", response.status_code, response.text[:500])
+            response.close()
+            response.raise_for_status()
+        return response
+    
+    async def _aopen_stream(self, client: httpx.AsyncClient, payload: dict) -> httpx.Response:
+        """Versão assíncrona de _open_stream"""
+        request = client.build_request("POST", self.api_url, json=payload, headers=self._stream_headers(), timeout=self.timeout)
+        response = await client.send(request, stream=True)
+        if response.is_error:
+            await response.aread()
+            logger.error("HTTP %s: %s", response.status_code, response.text[:500])
+            await response.aclose()
+            response.raise_for_status()
+        return response
+    
+    def _cache_key(self, payload: dict, schema: Optional[Type[BaseModel]] = None) -> Optional[str]:
+        """
+        Chave de cache do payload (None se o cache estiver desabilitado)
+        
+        Args:
+            payload: Payload de chat completion
+            schema: Pydantic model da resposta estruturada, se houver
+            
+        Returns:
+            Chave de cache ou None
+        """
+        if self.cache is None:
+            return None
+        extra = {"schema": f"{schema.__module__}.{schema.__qualname__}"} if schema else {}
+        return self.cache.key(
+            payload["model"], payload["messages"], payload["temperature"], payload["max_tokens"], **extra
+        )
+    
+    def _cache_get(self, key: Optional[str]) -> Optional[str]:
+        """Buscar resposta no cache"""
+        if key is None:
+            return None
+        value = self.cache.get(key)
+        if value is not None:
+            logger.debug("Cache hit: %s", self.model)
+        return value
+    
+    def _cache_set(self, key: Optional[str], value: str) -> None:
+        """Armazenar resposta no cache"""
+        if key is not None:
+            self.cache.set(key, value)
+    
+    def _structured_from_cache(self, key: Optional[str], schema: Type[T]) -> Optional[T]:
+        """
+        Reconstruir resposta estruturada a partir do JSON já validado no cache
+        
+        Args:
+            key: Chave de cache
+            schema: Pydantic model da resposta
+            
+        Returns:
+            Instância do schema ou None em cache miss
+        """
+        value = self._cache_get(key)
+        if value is None:
+            return None
+        # O JSON foi gravado por model_dump_json de uma instância válida: não há
+        # extração por regex e o parse é feito direto pelo pydantic-core
+        return schema.model_validate_json(value)
+    
+    def invoke(self, prompt: str, priority: int = Priority.NORMAL) -> MessageResponse:
+        """
+        Executar prompt simples
+        
+        Args:
+            prompt: Texto do prompt
+            priority: Prioridade na fila do escalonador
+            
+        Returns:
+            MessageResponse com o conteúdo da resposta
+        """
+        try:
+            logger.debug("Invoking model: %s", self.model)
+            with span("llm.invoke", model=self.model, priority=int(priority)) as s:
+                payload = self._build_payload(prompt, self.temperature)
+                key = self._cache_key(payload)
+                cached = self._cache_get(key)
+                if cached is not None:
+                    s.set(cache_hit=True)
+                    return MessageResponse(cached)
+                
+                prompt_tokens = self._prompt_tokens(payload)
+                data = self._request(payload, priority)
+                content = data["choices"][0]["message"]["content"]
+                logger.debug("Response length: %s chars", len(content))
+                self._record_exchange(s, payload, content, prompt_tokens, data.get("usage"))
+                self._cache_set(key, content)
+                return MessageResponse(content)
             
         except requests.exceptions.HTTPError as e:
-            logger.error(f"HTTP Error ao invocar modelo {self.model}: {e}")
+            logger.error("HTTP Error ao invocar modelo %s: %s", self.model, e)
             raise
         except Exception as e:
-            logger.error(f"Erro ao invocar modelo {self.model}: {e}")
+            logger.error("Erro ao invocar modelo %s: %s", self.model, e)
             raise
     
-    def invoke_structured(self, prompt: str, schema: Type[T]) -> T:
+    def invoke_structured(self, prompt: str, schema: Type[T], priority: int = Priority.NORMAL, max_tokens: Optional[int] = None, on_token: Optional[Callable[[str], None]] = None) -> T:
         """
         Executar prompt com structured output (JSON)
         
         Args:
             prompt: Texto do prompt
             schema: Pydantic model para parsing da resposta
+            priority: Prioridade na fila do escalonador
+            max_tokens: Limite de tokens gerados (default: self.max_tokens)
+            on_token: Chamado com cada token recebido; força o streaming (ex:
+                agir sobre os itens da resposta antes de ela terminar). Em cache
+                hit não é chamado
             
         Returns:
             Instância do schema com dados parseados
@@ -162,52 +856,481 @@ class AzureFoundryLocalLLM:
             ValueError: Se não conseguir parsear o JSON
         """
         try:
-            logger.debug(f"Invoking structured model: {self.model}")
+            logger.debug("Invoking structured model: %s", self.model)
+            with span("llm.invoke_structured", model=self.model, schema=schema.__name__, priority=int(priority)) as s:
+                payload = self._build_payload(self._structured_prompt(prompt), self.structured_temperature, max_tokens)
+                key = self._cache_key(payload, schema)
+                cached = self._structured_from_cache(key, schema)
+                if cached is not None:
+                    s.set(cache_hit=True)
+                    return cached
+                
+                result = self._structured_call(s, payload, schema, priority, on_token)
+                self._cache_set(key, result.model_dump_json())
+                return result
+                
+        except requests.exceptions.HTTPError as e:
+            logger.error("HTTP Error ao invocar modelo estruturado: %s", e)
+            raise
+        except Exception as e:
+            logger.error("Erro ao invocar modelo estruturado: %s", e)
+            raise
+    
+    def _structured_path(self) -> str:
+        """Caminho da próxima chamada estruturada ("json_schema" ou "prompt")"""
+        if self.structured_output_mode == "auto":
+            return "prompt" if response_format_supported(self.endpoint) is False else "json_schema"
+        return self.structured_output_mode
+    
+    def _rejected_response_format(self, error: Exception) -> bool:
+        """Erro HTTP que indica servidor sem suporte a response_format (só no modo auto)"""
+        response = getattr(error, "response", None)
+        return (
+            self.structured_output_mode == "auto"
+            and response is not None
+            and response.status_code in _REJECTED_PARAMETER_STATUS
+        )
+    
+    def _set_response_format_support(self, supported: bool) -> None:
+        """Registrar (uma vez por endpoint) se response_format é aceito"""
+        with _response_format_lock:
+            if self.endpoint in _response_format_support:
+                return
+            _response_format_support[self.endpoint] = supported
+        if supported:
+            logger.info("✅ %s aceita response_format json_schema", self.endpoint)
+        else:
+            logger.warning("⚠️ %s não aceita response_format; usando JSON pelo prompt com correção", self.endpoint)
+    
+    def _repair_payload(self, payload: dict, content: str, schema: Type[BaseModel], error: str) -> Optional[dict]:
+        """Payload do pedido de correção (None se a resposta não tiver JSON a corrigir)"""
+        fragment = json_fragment(content, STRUCTURED_REPAIR_MAX_CHARS)
+        if not fragment:
+            return None
+        repair = self._build_payload(self._repair_prompt(fragment, schema, error), self.structured_temperature, payload["max_tokens"])
+        if "response_format" in payload:
+            repair["response_format"] = payload["response_format"]
+        return repair
+    
+    def _record_structured(self, s, path: str, seconds: float, repairs: int, ok: bool) -> None:
+        """Acumular latência e correções por caminho (ver structured_stats)"""
+        with self._usage_lock:
+            stats = self._structured[path]
+            stats["calls"] += 1
+            stats["repaired"] += repairs > 0
+            stats["repairs"] += repairs
+            stats["failures"] += not ok
+            stats["seconds"] += seconds
+        s.set(structured_path=path, repairs=repairs)
+    
+    def _structured_attempt(self, s, payload: dict, schema: Type[T], priority: int, on_token: Optional[Callable[[str], None]] = None) -> tuple[str, Optional[T], str]:
+        """
+        Uma requisição estruturada
+        
+        Returns:
+            (conteúdo, instância do schema ou None, motivo da falha)
+        """
+        prompt_tokens = self._prompt_tokens(payload)
+        if self.structured_streaming or on_token is not None:
+            content, completion_tokens, result = self._stream_structured(payload, schema, priority, on_token)
+            self._record_exchange(s, payload, content, prompt_tokens, {"completion_tokens": completion_tokens})
+            s.set(early_stop=result is not None)
+            if result is not None:
+                return content, result, ""
+        else:
+            data = self._request(payload, priority)
+            content = data["choices"][0]["message"]["content"]
+            self._record_exchange(s, payload, content, prompt_tokens, data.get("usage"))
+        try:
+            return content, self._parse_structured(content, schema), ""
+        except ValueError as e:
+            return content, None, str(e)
+    
+    def _structured_call(self, s, payload: dict, schema: Type[T], priority: int, on_token: Optional[Callable[[str], None]] = None) -> T:
+        """
+        Chamada estruturada com response_format (se aceito) e correção do JSON inválido
+        
+        No modo auto, a primeira chamada a um endpoint envia o JSON schema em
+        response_format; se o servidor recusar o parâmetro, a chamada é refeita
+        sem ele e o endpoint passa a usar só o prompt. Uma resposta com JSON
+        inválido gera até repair_attempts pedidos de correção contendo apenas o
+        trecho quebrado, o erro e o schema.
+        
+        Raises:
+            ValueError: Se o JSON continuar inválido após as correções
+        """
+        path = self._structured_path()
+        started = time.perf_counter()
+        result, repairs = None, 0
+        try:
+            if path == "json_schema":
+                payload = {**payload, "response_format": _response_format(schema)}
+                try:
+                    content, result, error = self._structured_attempt(s, payload, schema, priority, on_token)
+                    self._set_response_format_support(True)
+                except requests.exceptions.HTTPError as e:
+                    if not self._rejected_response_format(e):
+                        raise
+                    path = "prompt"
+                    payload = {key: value for key, value in payload.items() if key != "response_format"}
+                    content, result, error = self._structured_attempt(s, payload, schema, priority, on_token)
+                    self._set_response_format_support(False)
+            else:
+                content, result, error = self._structured_attempt(s, payload, schema, priority, on_token)
             
-            # Adicionar instrução explícita para JSON
-            structured_prompt = f"""{prompt}
-
-CRITICAL: Respond ONLY with a valid JSON object. No other text before or after."""
+            while result is None and repairs < self.repair_attempts:
+                repair = self._repair_payload(payload, content, schema, error)
+                if repair is None:
+                    break
+                repairs += 1
+                logger.warning("🔧 JSON inválido de %s (%s); pedido de correção %d/%d", self.model, error, repairs, self.repair_attempts)
+                content, result, error = self._structured_attempt(s, repair, schema, priority, on_token)
+        finally:
+            self._record_structured(s, path, time.perf_counter() - started, repairs, result is not None)
+        if result is None:
+            raise ValueError(error)
+        return result
+    
+    def _stream_structured(self, payload: dict, schema: Type[T], priority: int, on_token: Optional[Callable[[str], None]] = None) -> tuple[str, int, Optional[T]]:
+        """
+        Receber a resposta estruturada por streaming, parando no primeiro objeto válido
+        
+        Ao sair do bloco a conexão é fechada e o servidor interrompe a geração
+        (o texto depois do JSON não é gerado nem lido).
+        
+        Args:
+            payload: Payload de chat completion (sem stream)
+            schema: Pydantic model da resposta
+            priority: Prioridade na fila do escalonador
+            on_token: Chamado com cada token antes do parse
             
-            payload = {
-                "model": self.model,
-                "messages": [{"role": "user", "content": structured_prompt}],
-                "temperature": self.structured_temperature,
-                "max_tokens": self.max_tokens
-            }
+        Returns:
+            (conteúdo recebido, tokens recebidos, instância do schema ou None se
+            nenhum objeto válido fechou durante o stream)
+        """
+        payload = {**payload, "stream": True}
+        validate, results, _ = self._schema_validator(schema)
+        extractor = StreamingJsonExtractor(validate)
+        tokens = 0
+        with self._slot(priority), self.resilience.call(lambda: self._open_stream(payload)) as response:
+            for token in _iter_sse_tokens(response.iter_lines()):
+                tokens += 1
+                if on_token is not None:
+                    on_token(token)
+                if extractor.feed(token) is not None:
+                    logger.debug("Objeto JSON completo após %d tokens: encerrando stream", tokens)
+                    return extractor.content, tokens, results[-1]
+        return extractor.content, tokens, None
+    
+    def _get_async_client(self) -> httpx.AsyncClient:
+        """
+        Retornar o httpx.AsyncClient do event loop atual
+        
+        O pool do httpx fica preso ao loop que o criou, então cada loop tem o
+        seu cliente (ex: servidor e batch em threads diferentes, ou um
+        asyncio.run por interação no Streamlit). Os clientes de loops já
+        encerrados são fechados quando um novo cliente é criado.
+        
+        Returns:
+            Cliente assíncrono com pool de conexões
+        """
+        loop = asyncio.get_running_loop()
+        with self._async_lock:
+            client = self._async_clients.get(loop)
+            if client is None:
+                self._prune_async_clients_locked()
+                client = _create_async_client(self._pool_maxsize, self._pool_block, self._keep_alive)
+                self._async_clients[loop] = client
+            return client
+    
+    def _prune_async_clients_locked(self) -> None:
+        """Fechar os clientes de loops encerrados (chamar com _async_lock)"""
+        for loop in [loop for loop in self._async_clients if loop.is_closed()]:
+            _abandon_async_client(self._async_clients.pop(loop))
+    
+    async def aclose(self) -> None:
+        """Fechar o cliente assíncrono do event loop atual"""
+        with self._async_lock:
+            client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+    
+    async def ainvoke(self, prompt: str, priority: int = Priority.NORMAL) -> MessageResponse:
+        """
+        Executar prompt simples sem bloquear o event loop
+        
+        Args:
+            prompt: Texto do prompt
+            priority: Prioridade na fila do escalonador
             
-            headers = {
-                "Content-Type": "application/json",
-                "Accept": "application/json",
-                "api-key": self.api_key,
-            }
-
-            data = _make_request(self.api_url, payload, headers, self.timeout)
-            content = data["choices"][0]["message"]["content"]
-            logger.debug(f"Raw response: {content[:100]}...")
+        Returns:
+            MessageResponse com o conteúdo da resposta
+        """
+        try:
+            logger.debug("Invoking model (async): %s", self.model)
+            with span("llm.invoke", model=self.model, priority=int(priority)) as s:
+                payload = self._build_payload(prompt, self.temperature)
+                key = self._cache_key(payload)
+                cached = self._cache_get(key)
+                if cached is not None:
+                    s.set(cache_hit=True)
+                    return MessageResponse(cached)
+                
+                prompt_tokens = self._prompt_tokens(payload)
+                data = await self._arequest(payload, priority)
+                content = data["choices"][0]["message"]["content"]
+                logger.debug("Response length: %s chars", len(content))
+                self._record_exchange(s, payload, content, prompt_tokens, data.get("usage"))
+                self._cache_set(key, content)
+                return MessageResponse(content)
             
-            # Tentar extrair e parsear JSON
-            parsed_json = _extract_json(content)
+        except httpx.HTTPStatusError as e:
+            logger.error("HTTP Error ao invocar modelo %s: %s", self.model, e)
+            raise
+        except Exception as e:
+            logger.error("Erro ao invocar modelo %s: %s", self.model, e)
+            raise
+    
+    async def ainvoke_structured(self, prompt: str, schema: Type[T], priority: int = Priority.NORMAL, max_tokens: Optional[int] = None, on_token: Optional[Callable[[str], None]] = None) -> T:
+        """
+        Executar prompt com structured output (JSON) sem bloquear o event loop
+        
+        Args:
+            prompt: Texto do prompt
+            schema: Pydantic model para parsing da resposta
+            priority: Prioridade na fila do escalonador
+            max_tokens: Limite de tokens gerados (default: self.max_tokens)
+            on_token: Chamado com cada token recebido; força o streaming (ex:
+                agir sobre os itens da resposta antes de ela terminar). Em cache
+                hit não é chamado
             
-            if parsed_json:
-                try:
-                    result = schema(**parsed_json)
-                    logger.debug(f"✅ Structured output parseado com sucesso")
-                    return result
-                except Exception as e:
-                    logger.warning(f"Erro ao validar JSON contra schema: {e}")
-            
-            # Se falhar, lançar erro
-            logger.error(f"Não foi possível parsear resposta como JSON: {content[:200]}")
-            raise ValueError(f"Não foi possível parsear resposta como JSON")
+        Returns:
+            Instância do schema com dados parseados
+            
+        Raises:
+            ValueError: Se não conseguir parsear o JSON
+        """
+        try:
+            logger.debug("Invoking structured model (async): %s", self.model)
+            with span("llm.invoke_structured", model=self.model, schema=schema.__name__, priority=int(priority)) as s:
+                payload = self._build_payload(self._structured_prompt(prompt), self.structured_temperature, max_tokens)
+                key = self._cache_key(payload, schema)
+                cached = self._structured_from_cache(key, schema)
+                if cached is not None:
+                    s.set(cache_hit=True)
+                    return cached
                 
-        except requests.exceptions.HTTPError as e:
-            logger.error(f"HTTP Error ao invocar modelo estruturado: {e}")
+                result = await self._astructured_call(s, payload, schema, priority, on_token)
+                self._cache_set(key, result.model_dump_json())
+                return result
+                
+        except httpx.HTTPStatusError as e:
+            logger.error("HTTP Error ao invocar modelo estruturado: %s", e)
             raise
         except Exception as e:
-            logger.error(f"Erro ao invocar modelo estruturado: {e}")
+            logger.error("Erro ao invocar modelo estruturado: %s", e)
             raise
     
+    async def _astructured_attempt(self, s, payload: dict, schema: Type[T], priority: int, on_token: Optional[Callable[[str], None]] = None) -> tuple[str, Optional[T], str]:
+        """Versão assíncrona de _structured_attempt"""
+        prompt_tokens = self._prompt_tokens(payload)
+        if self.structured_streaming or on_token is not None:
+            content, completion_tokens, result = await self._astream_structured(payload, schema, priority, on_token)
+            self._record_exchange(s, payload, content, prompt_tokens, {"completion_tokens": completion_tokens})
+            s.set(early_stop=result is not None)
+            if result is not None:
+                return content, result, ""
+        else:
+            data = await self._arequest(payload, priority)
+            content = data["choices"][0]["message"]["content"]
+            self._record_exchange(s, payload, content, prompt_tokens, data.get("usage"))
+        try:
+            return content, self._parse_structured(content, schema), ""
+        except ValueError as e:
+            return content, None, str(e)
+    
+    async def _astructured_call(self, s, payload: dict, schema: Type[T], priority: int, on_token: Optional[Callable[[str], None]] = None) -> T:
+        """Versão assíncrona de _structured_call"""
+        path = self._structured_path()
+        started = time.perf_counter()
+        result, repairs = None, 0
+        try:
+            if path == "json_schema":
+                payload = {**payload, "response_format": _response_format(schema)}
+                try:
+                    content, result, error = await self._astructured_attempt(s, payload, schema, priority, on_token)
+                    self._set_response_format_support(True)
+                except httpx.HTTPStatusError as e:
+                    if not self._rejected_response_format(e):
+                        raise
+                    path = "prompt"
+                    payload = {key: value for key, value in payload.items() if key != "response_format"}
+                    content, result, error = await self._astructured_attempt(s, payload, schema, priority, on_token)
+                    self._set_response_format_support(False)
+            else:
+                content, result, error = await self._astructured_attempt(s, payload, schema, priority, on_token)
+            
+            while result is None and repairs < self.repair_attempts:
+                repair = self._repair_payload(payload, content, schema, error)
+                if repair is None:
+                    break
+                repairs += 1
+                logger.warning("🔧 JSON inválido de %s (%s); pedido de correção %d/%d", self.model, error, repairs, self.repair_attempts)
+                content, result, error = await self._astructured_attempt(s, repair, schema, priority, on_token)
+        finally:
+            self._record_structured(s, path, time.perf_counter() - started, repairs, result is not None)
+        if result is None:
+            raise ValueError(error)
+        return result
+    
+    async def _astream_structured(self, payload: dict, schema: Type[T], priority: int, on_token: Optional[Callable[[str], None]] = None) -> tuple[str, int, Optional[T]]:
+        """Versão assíncrona de _stream_structured"""
+        payload = {**payload, "stream": True}
+        validate, results, _ = self._schema_validator(schema)
+        extractor = StreamingJsonExtractor(validate)
+        tokens = 0
+        client = self._get_async_client()
+        async with self._aslot(priority):
+            response = await self.resilience.acall(lambda: self._aopen_stream(client, payload))
+            try:
+                async for line in response.aiter_lines():
+                    token = _parse_sse_line(line)
+                    if token is None:
+                        break
+                    if not token:
+                        continue
+                    tokens += 1
+                    if on_token is not None:
+                        on_token(token)
+                    if extractor.feed(token) is not None:
+                        logger.debug("Objeto JSON completo após %d tokens: encerrando stream", tokens)
+                        return extractor.content, tokens, results[-1]
+            finally:
+                await response.aclose()
+        return extractor.content, tokens, None
+    
+    def _stream_headers(self) -> dict[str, str]:
+        """Headers HTTP para respostas em server-sent events"""
+        return {**self._headers(), "Accept": "text/event-stream"}
+    
+    def _log_ttft(self, started: float) -> float:
+        """Registrar e retornar o tempo até o primeiro token"""
+        ttft = time.perf_counter() - started
+        logger.info("⏱️ Time to first token (%s): %.2fs", self.model, ttft)
+        return ttft
+    
+    def stream(self, prompt: str, priority: int = Priority.NORMAL) -> Iterator[str]:
+        """
+        Executar prompt simples recebendo os tokens conforme são gerados
+        
+        Args:
+            prompt: Texto do prompt
+            priority: Prioridade na fila do escalonador
+            
+        Yields:
+            Tokens de texto na ordem de geração
+        """
+        logger.debug("Streaming model: %s", self.model)
+        with span("llm.stream", activate=False, model=self.model, priority=int(priority)) as s:
+            payload = self._build_payload(prompt, self.temperature)
+            # Mesma chave de invoke: uma resposta em cache serve aos dois caminhos
+            key = self._cache_key(payload)
+            cached = self._cache_get(key)
+            if cached is not None:
+                s.set(cache_hit=True)
+                yield cached
+                return
+        
+            prompt_tokens = self._prompt_tokens(payload)
+            payload["stream"] = True
+            tokens = []
+            started = time.perf_counter()
+            ttft = None
+        
+            try:
+                # Só a abertura é repetida: depois do primeiro token o erro é propagado
+                with self._slot(priority), self.resilience.call(lambda: self._open_stream(payload)) as response:
+                    for token in _iter_sse_tokens(response.iter_lines()):
+                        if ttft is None:
+                            ttft = self._log_ttft(started)
+                        tokens.append(token)
+                        yield token
+                    
+            except requests.exceptions.HTTPError as e:
+                logger.error("HTTP Error ao fazer streaming do modelo %s: %s", self.model, e)
+                raise
+            except Exception as e:
+                logger.error("Erro ao fazer streaming do modelo %s: %s", self.model, e)
+                raise
+        
+            logger.debug("Stream concluído em %.2fs", time.perf_counter() - started)
+            content = "".join(tokens)
+            # Cada evento SSE traz um token
+            self._record_exchange(s, payload, content, prompt_tokens, {"completion_tokens": len(tokens)})
+            s.set(ttft_ms=round((ttft or 0.0) * 1000, 3))
+            self._cache_set(key, content)
+    
+    async def astream(self, prompt: str, priority: int = Priority.NORMAL) -> AsyncIterator[str]:
+        """
+        Versão assíncrona de stream
+        
+        Args:
+            prompt: Texto do prompt
+            priority: Prioridade na fila do escalonador
+            
+        Yields:
+            Tokens de texto na ordem de geração
+        """
+        logger.debug("Streaming model (async): %s", self.model)
+        with span("llm.stream", activate=False, model=self.model, priority=int(priority)) as s:
+            payload = self._build_payload(prompt, self.temperature)
+            # Mesma chave de invoke: uma resposta em cache serve aos dois caminhos
+            key = self._cache_key(payload)
+            cached = self._cache_get(key)
+            if cached is not None:
+                s.set(cache_hit=True)
+                yield cached
+                return
+        
+            prompt_tokens = self._prompt_tokens(payload)
+            payload["stream"] = True
+            tokens = []
+            started = time.perf_counter()
+            ttft = None
+        
+            try:
+                client = self._get_async_client()
+                # Só a abertura é repetida: depois do primeiro token o erro é propagado
+                async with self._aslot(priority):
+                    response = await self.resilience.acall(lambda: self._aopen_stream(client, payload))
+                    try:
+                        async for line in response.aiter_lines():
+                            token = _parse_sse_line(line)
+                            if token is None:
+                                break
+                            if not token:
+                                continue
+                            if ttft is None:
+                                ttft = self._log_ttft(started)
+                            tokens.append(token)
+                            yield token
+                    finally:
+                        await response.aclose()
+                    
+            except httpx.HTTPStatusError as e:
+                logger.error("HTTP Error ao fazer streaming do modelo %s: %s", self.model, e)
+                raise
+            except Exception as e:
+                logger.error("Erro ao fazer streaming do modelo %s: %s", self.model, e)
+                raise
+        
+            logger.debug("Stream concluído em %.2fs", time.perf_counter() - started)
+            content = "".join(tokens)
+            # Cada evento SSE traz um token
+            self._record_exchange(s, payload, content, prompt_tokens, {"completion_tokens": len(tokens)})
+            s.set(ttft_ms=round((ttft or 0.0) * 1000, 3))
+            self._cache_set(key, content)
+    
     def with_structured_output(self, schema: Type[T]):
         """
         Retornar runnable com structured output (compatível LangChain)
@@ -218,7 +1341,7 @@ CRITICAL: Respond ONLY with a valid JSON object. No other text before or after."
         Returns:
             StructuredRunnable
         """
-        logger.debug(f"Creating structured runnable for schema: {schema.__name__}")
+        logger.debug("Creating structured runnable for schema: %s", schema.__name__)
         return StructuredRunnable(self, schema)
 
 
@@ -236,14 +1359,30 @@ class StructuredRunnable:
         self.llm = llm
         self.schema = schema
     
-    def invoke(self, prompt: str) -> T:
+    def invoke(self, prompt: str, priority: int = Priority.NORMAL, on_token: Optional[Callable[[str], None]] = None) -> T:
         """
         Invocar com structured output
         
         Args:
             prompt: Texto do prompt
+            priority: Prioridade na fila do escalonador
+            on_token: Chamado com cada token da resposta (força o streaming)
+            
+        Returns:
+            Instância do schema
+        """
+        return self.llm.invoke_structured(prompt, self.schema, priority, on_token=on_token)
+    
+    async def ainvoke(self, prompt: str, priority: int = Priority.NORMAL, on_token: Optional[Callable[[str], None]] = None) -> T:
+        """
+        Invocar com structured output sem bloquear o event loop
+        
+        Args:
+            prompt: Texto do prompt
+            priority: Prioridade na fila do escalonador
+            on_token: Chamado com cada token da resposta (força o streaming)
             
         Returns:
             Instância do schema
         """
-        return self.llm.invoke_structured(prompt, self.schema)
+        return await self.llm.ainvoke_structured(prompt, self.schema, priority, on_token=on_token)
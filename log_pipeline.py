@@ -0,0 +1,203 @@
+"""
+Logging assíncrono: os produtores só enfileiram, uma thread escreve
+
+Os nós do grafo e o cliente do Foundry registram logs de dentro das threads
+dos ramos e do event loop. Com handlers síncronos, cada logger.info espera a
+escrita no stdout e no arquivo. Aqui o logger recebe um QueueHandler que
+apenas coloca o LogRecord em uma fila; a thread "log-writer" retira os
+registros em lotes, formata cada um (a mensagem só é montada nesse momento)
+e faz um único flush por lote em cada destino.
+
+O arquivo gira por tamanho (LOG_MAX_BYTES, LOG_BACKUP_COUNT) e pode ser
+gravado em JSON lines (LOG_JSON=true), um objeto por registro.
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+from typing import Optional, Sequence
+
+try:
+    from config import LOG_FORMAT, LOG_FILE, LOG_MAX_BYTES, LOG_BACKUP_COUNT, LOG_JSON, LOG_QUEUE_BATCH
+except ImportError:
+    LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    LOG_FILE = "perplexity.log"
+    LOG_MAX_BYTES = 10 * 1024 * 1024
+    LOG_BACKUP_COUNT = 5
+    LOG_JSON = False
+    LOG_QUEUE_BATCH = 256
+
+_STOP = object()
+
+
+class JsonFormatter(logging.Formatter):
+    """Um objeto JSON por registro (time, level, logger, message, thread e exception)"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "thread": record.threadName,
+        }
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data["exception"] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler que não formata na thread que registra
+
+    O QueueHandler padrão monta a mensagem em prepare() para poder serializar
+    o registro; a fila aqui é do mesmo processo, então o LogRecord vai
+    intacto e getMessage() roda na thread de escrita. Os argumentos do log
+    não devem ser alterados depois da chamada.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class BatchWriter:
+    """Thread que esvazia a fila em lotes e faz um flush por lote em cada handler"""
+
+    def __init__(self, log_queue: queue.SimpleQueue, handlers: Sequence[logging.Handler], batch_size: int = LOG_QUEUE_BATCH):
+        """
+        Args:
+            log_queue: Fila compartilhada com o DeferredQueueHandler
+            handlers: Destinos (StreamHandler, RotatingFileHandler, ...)
+            batch_size: Máximo de registros escritos antes de um flush
+        """
+        self.queue = log_queue
+        self.handlers = list(handlers)
+        self.batch_size = batch_size
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Escrever o que ainda está na fila e encerrar a thread"""
+        if self._thread is None:
+            return
+        self.queue.put(_STOP)
+        self._thread.join()
+        self._thread = None
+        for handler in self.handlers:
+            handler.close()
+
+    def _run(self) -> None:
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = _STOP in batch
+            self.write([record for record in batch if record is not _STOP])
+            if stop:
+                return
+
+    def write(self, records: list[logging.LogRecord]) -> None:
+        """Formatar e escrever um lote em cada handler, com um flush no fim"""
+        for handler in self.handlers:
+            wrote = False
+            with handler.lock:
+                for record in records:
+                    if record.levelno < handler.level or not handler.filter(record):
+                        continue
+                    try:
+                        line = handler.format(record) + handler.terminator
+                        if _should_rollover(handler, line):
+                            handler.doRollover()
+                        if handler.stream is None:
+                            # FileHandler com delay=True: abre no primeiro registro e após girar
+                            handler.stream = handler._open()
+                        handler.stream.write(line)
+                        wrote = True
+                    except Exception:
+                        handler.handleError(record)
+                if wrote:
+                    handler.stream.flush()
+
+
+def _should_rollover(handler: logging.Handler, line: str) -> bool:
+    """Mesma regra do RotatingFileHandler, sem formatar o registro de novo"""
+    if not isinstance(handler, logging.handlers.RotatingFileHandler) or handler.maxBytes <= 0:
+        return False
+    if handler.stream is None:
+        handler.stream = handler._open()
+    return handler.stream.tell() + len(line) >= handler.maxBytes
+
+
+_writer: Optional[BatchWriter] = None
+_queue_handler: Optional[DeferredQueueHandler] = None
+_lock = threading.Lock()
+
+
+def start_log_pipeline(loggers: Sequence[str], level: str, json_lines: bool = LOG_JSON, log_file: Optional[str] = LOG_FILE) -> DeferredQueueHandler:
+    """
+    Ligar os loggers à fila e iniciar a thread de escrita (uma vez por processo)
+
+    Args:
+        loggers: Nomes dos loggers do projeto
+        level: Nível de logging (DEBUG, INFO, WARNING, ERROR)
+        json_lines: Gravar o arquivo em JSON lines
+        log_file: Arquivo de log (None = só console)
+
+    Returns:
+        Handler instalado nos loggers
+    """
+    global _writer, _queue_handler
+    with _lock:
+        if _queue_handler is None:
+            handlers: list[logging.Handler] = [logging.StreamHandler(sys.stdout)]
+            handlers[0].setFormatter(logging.Formatter(LOG_FORMAT))
+            if log_file:
+                file_handler = logging.handlers.RotatingFileHandler(
+                    log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8", delay=True
+                )
+                file_handler.setFormatter(JsonFormatter() if json_lines else logging.Formatter(LOG_FORMAT))
+                handlers.append(file_handler)
+            for handler in handlers:
+                handler.setLevel(level)
+
+            log_queue = queue.SimpleQueue()
+            _queue_handler = DeferredQueueHandler(log_queue)
+            _writer = BatchWriter(log_queue, handlers)
+            _writer.start()
+            atexit.register(stop_log_pipeline)
+
+        for name in loggers:
+            logger = logging.getLogger(name)
+            logger.setLevel(level)
+            if _queue_handler not in logger.handlers:
+                logger.addHandler(_queue_handler)
+        return _queue_handler
+
+
+def stop_log_pipeline() -> None:
+    """Escrever os registros pendentes e desligar a fila (chamado no atexit)"""
+    global _writer, _queue_handler
+    with _lock:
+        if _writer is None:
+            return
+        for logger in [logging.root, *logging.root.manager.loggerDict.values()]:
+            # PlaceHolder (nome intermediário sem logger) não tem handlers
+            if _queue_handler in getattr(logger, "handlers", []):
+                logger.removeHandler(_queue_handler)
+        _writer.stop()
+        _writer, _queue_handler = None, None
+
+
+__all__ = ["JsonFormatter", "DeferredQueueHandler", "BatchWriter", "start_log_pipeline", "stop_log_pipeline"]
@@ -1,66 +1,385 @@
-from pydantic import BaseModel
+import asyncio
+import contextvars
+import logging
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from llm_client import AzureFoundryLocalLLM
+from cache import create_llm_cache
+from batching import MicroBatcher
+from run_context import BranchCancelled, BranchCollector, QueryPrefetch, UrlRegistry, get_run_context, release_run_context
+from scheduler import Priority, create_model_scheduler, scheduling_context
+from tracing import span
+from ranking import bm25_scores, extractive_summary, select_relevant
+from tokens import count_tokens, pack_by_priority, prompt_budget
+from checkpoint import create_checkpointer
+from json_extract import StreamingArrayItems
+from warmup import ModelWarmer, create_model_warmer
+from langchain_core.runnables import RunnableLambda
+from langgraph.config import get_stream_writer
 from langgraph.graph import START, END, StateGraph
 from langgraph.types import Send
-import streamlit as st
-from typing import Optional
+from typing import Callable, Iterator, NamedTuple, Optional, Sequence
 
 from config import (
     LLM_MODEL, LLM_MAX_TOKENS, LLM_TIMEOUT,
     REASONING_MODEL, REASONING_MAX_TOKENS, REASONING_TIMEOUT,
-    MAX_RAW_CHARS, STREAMLIT_TITLE, DEFAULT_QUERY,
+    MAX_RAW_CHARS, TAVILY_MAX_RESULTS, STREAMLIT_TITLE, DEFAULT_QUERY,
+    TAVILY_EXTRACT_BATCH_SIZE, TAVILY_EXTRACT_BATCH_WAIT, TAVILY_EXTRACT_WORKERS, RANKING_ENABLED,
+    QUERY_PREFETCH_ENABLED, QUERY_PREFETCH_WORKERS,
+    SUMMARY_MODE, SUMMARY_EXTRACTIVE_SENTENCES, SUMMARY_EXTRACTIVE_MAX_CHARS, SUMMARY_HYBRID_THRESHOLD,
+    SUMMARY_BATCH_ENABLED, SUMMARY_BATCH_SIZE, SUMMARY_BATCH_WAIT, SUMMARY_BATCH_CONTEXT_TOKENS,
+    SUMMARY_BATCH_ITEM_TOKENS, FINAL_RESULT_MIN_TOKENS,
+    COLLECTION_MODE, COLLECTION_QUORUM, COLLECTION_DEADLINE, COLLECTION_LATE_RESULTS,
+    COLLECTION_REFINE_WAIT, COLLECTION_WORKERS,
     setup_logging, validate_config
 )
 from schemas import *
 from prompts import *
-from utils import TavilyClient
+from utils import TavilyClient, CachedTavilyClient, match_extract_results
 
-from dotenv import load_dotenv
-load_dotenv()
+# Handlers configurados na primeira inicialização (_init_logging)
+logger = logging.getLogger("perplexity")
 
-# Configurar logging
-logger = setup_logging()
 
-# Validar configuração
-validate_config()
+# ============================================================================
+# OBJETOS PESADOS, CRIADOS NO PRIMEIRO USO
+# ============================================================================
+# Importar o módulo só define funções: clientes, cache, escalonador e grafo
+# são criados no primeiro acesso (perplexity.graph, perplexity.llm, ...) e
+# reaproveitados pelo processo inteiro. Os nós chamam get_llm() e
+# get_reasoning_llm(), que também enxergam substituições feitas com setattr.
+_lazy_lock = threading.RLock()
 
-# Modelos Azure AI Foundry Local
-llm = AzureFoundryLocalLLM(
-    model=LLM_MODEL,
-    max_tokens=LLM_MAX_TOKENS,
-    timeout=LLM_TIMEOUT
-)
-reasoning_llm = AzureFoundryLocalLLM(
-    model=REASONING_MODEL,
-    max_tokens=REASONING_MAX_TOKENS,
-    timeout=REASONING_TIMEOUT
-)
+
+def _lazy(name: str, factory: Callable[[], object]) -> object:
+    """Valor do global name, criado por factory na primeira chamada"""
+    if name not in globals():
+        with _lazy_lock:
+            if name not in globals():
+                globals()[name] = factory()
+    return globals()[name]
+
+
+def _init_logging() -> logging.Logger:
+    """Configurar logging e validar a configuração (uma vez por processo)"""
+    setup_logging()
+    validate_config()
+    return logger
+
+
+def _create_llm(model: str, max_tokens: int, timeout: int) -> AzureFoundryLocalLLM:
+    _lazy("_logging", _init_logging)
+    return AzureFoundryLocalLLM(
+        model=model,
+        max_tokens=max_tokens,
+        timeout=timeout,
+        # Cache de respostas (None se LLM_CACHE_ENABLED for False) e escalonador compartilhados
+        cache=_lazy("llm_cache", create_llm_cache),
+        scheduler=_lazy("model_scheduler", create_model_scheduler)
+    )
+
+
+def get_llm() -> AzureFoundryLocalLLM:
+    """Modelo Azure AI Foundry Local das queries e sumarizações"""
+    return _lazy("llm", lambda: _create_llm(LLM_MODEL, LLM_MAX_TOKENS, LLM_TIMEOUT))
+
+
+def get_reasoning_llm() -> AzureFoundryLocalLLM:
+    """Modelo de raciocínio da resposta final"""
+    return _lazy("reasoning_llm", lambda: _create_llm(REASONING_MODEL, REASONING_MAX_TOKENS, REASONING_TIMEOUT))
+
+
+def get_graph():
+    """Grafo compilado (ver _build_graph)"""
+    return _lazy("graph", _build_graph)
+
+
+def get_warmer() -> Optional[ModelWarmer]:
+    """Aquecimento dos dois modelos (None se WARMUP_ENABLED for False)"""
+    return _lazy("model_warmer", lambda: create_model_warmer([get_llm(), get_reasoning_llm()]))
+
+
+def start_warmup() -> Optional[ModelWarmer]:
+    """
+    Carregar os modelos em background e mantê-los carregados (uma vez por processo)
+
+    Chamado pela UI, pela API e pelo batch ao subir; importar o módulo não
+    aquece nada.
+
+    Returns:
+        ModelWarmer em execução ou None se WARMUP_ENABLED for False
+    """
+    warmer = get_warmer()
+    if warmer is not None:
+        warmer.start()
+    return warmer
+
+
+_LAZY_ATTRIBUTES = {
+    "llm": get_llm,
+    "reasoning_llm": get_reasoning_llm,
+    "llm_cache": lambda: _lazy("llm_cache", create_llm_cache),
+    "model_scheduler": lambda: _lazy("model_scheduler", create_model_scheduler),
+    "graph": get_graph,
+    "model_warmer": get_warmer,
+}
+
+
+def __getattr__(name: str):
+    # PEP 562: chamado só para nomes que ainda não estão no módulo
+    if name in _LAZY_ATTRIBUTES:
+        return _LAZY_ATTRIBUTES[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# Cliente Tavily com cache, criado na primeira busca (exige TAVILY_API_KEY)
+_tavily: Optional[CachedTavilyClient] = None
+_tavily_lock = threading.Lock()
+
+
+def get_tavily() -> CachedTavilyClient:
+    """
+    Retornar o cliente Tavily com cache compartilhado pelo processo.
+    
+    Returns:
+        CachedTavilyClient
+    """
+    global _tavily
+    with _tavily_lock:
+        if _tavily is None:
+            _tavily = CachedTavilyClient(TavilyClient())
+        return _tavily
+
+
+def set_tavily(client: CachedTavilyClient) -> None:
+    """
+    Substituir o cliente Tavily (ex: cliente falso em testes e benchmarks).
+    
+    Args:
+        client: Novo cliente
+    """
+    global _tavily
+    with _tavily_lock:
+        _tavily = client
 
 
 # ============================================================================
 # FUNÇÕES AUXILIARES
 # ============================================================================
 
-def _extract_url_content(tavily: TavilyClient, url: str, max_chars: int) -> str | None:
+def _extract_batch(urls: list[str]) -> dict[str, str | Exception]:
     """
-    Extrair e truncar conteúdo de URL usando Tavily.
+    Extrair várias URLs em uma única chamada Tavily.
+    
+    Handler do batcher de extração: se a chamada em lote falhar por inteiro,
+    cada URL é extraída individualmente em um pool limitado, para que a
+    falha de uma URL não afete as demais.
     
     Args:
-        tavily: Cliente Tavily
-        url: URL para extrair
+        urls: URLs sem duplicatas
+        
+    Returns:
+        Dict url -> raw_content (ou Exception para URLs que falharam)
+    """
+    tavily = get_tavily()
+    try:
+        with span("tavily.extract", urls=len(urls)):
+            extraction = tavily.extract(urls)
+    except Exception as e:
+        if len(urls) == 1:
+            return {urls[0]: e}
+        logger.warning("Extract em lote falhou (%s); extraindo %s URLs individualmente", e, len(urls))
+        with ThreadPoolExecutor(max_workers=TAVILY_EXTRACT_WORKERS) as pool:
+            return dict(zip(urls, pool.map(lambda url: _extract_batch([url])[url], urls)))
+    
+    # Chaves pelas URLs pedidas: o Tavily pode devolver a URL normalizada
+    contents: dict[str, str | Exception] = {
+        url: result.get("raw_content") or ""
+        for url, result in match_extract_results(urls, extraction.get("results", [])).items()
+    }
+    for url, failure in match_extract_results(urls, extraction.get("failed_results", [])).items():
+        contents.setdefault(url, ValueError(failure.get("error") or "extract falhou"))
+    return contents
+
+
+# Junta as URLs de todos os ramos single_search em chamadas de extract em lote
+_extraction_batcher = MicroBatcher(
+    _extract_batch,
+    max_batch_size=TAVILY_EXTRACT_BATCH_SIZE,
+    max_wait=TAVILY_EXTRACT_BATCH_WAIT,
+    max_workers=TAVILY_EXTRACT_WORKERS,
+    name="tavily-extract"
+)
+
+
+def _page_content(url: str, future: Future, max_chars: int, queries: Sequence[str] = ()) -> str | None:
+    """
+    Ler o resultado de uma extração concluída e reduzi-lo ao orçamento.
+    
+    Com queries (e RANKING_ENABLED), mantém os trechos mais relevantes da
+    página; sem elas, os primeiros max_chars caracteres.
+    
+    Args:
+        url: URL extraída
+        future: Future resolvido pelo batcher
         max_chars: Máximo de caracteres a retornar
+        queries: Pergunta do usuário e query de busca
         
     Returns:
-        Conteúdo truncado ou None se não conseguir extrair
+        Conteúdo reduzido ou None se não conseguir extrair
     """
     try:
-        extraction = tavily.extract(url)
-        if extraction.get("results"):
-            content = extraction["results"][0].get("raw_content", "")
-            return content[:max_chars] if content else None
+        content = future.result()
     except Exception as e:
-        logger.warning(f"Erro ao extrair conteúdo de {url}: {e}")
-    return None
+        logger.warning("Erro ao extrair conteúdo de %s: %s", url, e)
+        return None
+    if not content:
+        return None
+    if RANKING_ENABLED and queries:
+        return select_relevant(content, queries, max_chars)
+    return content[:max_chars]
+
+
+def _extraction_futures(urls: list[str], prefetched: Optional[dict[str, Future]]) -> dict[str, Future]:
+    """Futures das extrações, reaproveitando as já disparadas pelo prefetch"""
+    prefetched = prefetched or {}
+    submitted = _extraction_batcher.submit_many([url for url in urls if url not in prefetched])
+    return {url: prefetched[url] if url in prefetched else submitted[url] for url in urls}
+
+
+def _extract_urls_content(urls: list[str], max_chars: int, queries: Sequence[str] = (), prefetched: Optional[dict[str, Future]] = None) -> dict[str, str | None]:
+    """
+    Extrair e reduzir o conteúdo de várias URLs via batcher.
+    
+    Args:
+        urls: URLs para extrair
+        max_chars: Máximo de caracteres por URL
+        queries: Pergunta do usuário e query de busca (ranking de trechos)
+        prefetched: Extrações já enviadas ao batcher pelo prefetch, por URL
+        
+    Returns:
+        Dict url -> conteúdo reduzido (None se não conseguir extrair)
+    """
+    with span("extract_urls", urls=len(urls)) as s:
+        futures = _extraction_futures(urls, prefetched)
+        contents = {url: _page_content(url, future, max_chars, queries) for url, future in futures.items()}
+        s.set(chars=sum(len(content) for content in contents.values() if content))
+        return contents
+
+
+async def _aextract_urls_content(urls: list[str], max_chars: int, queries: Sequence[str] = (), prefetched: Optional[dict[str, Future]] = None) -> dict[str, str | None]:
+    """
+    Versão assíncrona de _extract_urls_content (não ocupa thread esperando).
+    
+    Args:
+        urls: URLs para extrair
+        max_chars: Máximo de caracteres por URL
+        queries: Pergunta do usuário e query de busca (ranking de trechos)
+        prefetched: Extrações já enviadas ao batcher pelo prefetch, por URL
+        
+    Returns:
+        Dict url -> conteúdo reduzido (None se não conseguir extrair)
+    """
+    with span("extract_urls", urls=len(urls)) as s:
+        futures = _extraction_futures(urls, prefetched)
+        await asyncio.gather(*(asyncio.wrap_future(f) for f in futures.values()), return_exceptions=True)
+        contents = {url: _page_content(url, future, max_chars, queries) for url, future in futures.items()}
+        s.set(chars=sum(len(content) for content in contents.values() if content))
+        return contents
+
+
+# Buscas antecipadas de build_first_queries (compartilhado pelas execuções)
+_prefetch_pool = ThreadPoolExecutor(max_workers=QUERY_PREFETCH_WORKERS, thread_name_prefix="prefetch")
+
+
+def _prefetch_search(prefetch: QueryPrefetch, query: str) -> tuple[dict, dict[str, Future]]:
+    """
+    Buscar uma query enquanto as demais ainda são geradas (roda em _prefetch_pool).
+    
+    As páginas encontradas já seguem para o batcher de extração, a menos que
+    a query tenha sido descartada durante a busca.
+    
+    Args:
+        prefetch: Prefetch da execução
+        query: Query de busca
+        
+    Returns:
+        (resposta do search, futures das extrações por URL)
+    """
+    with span("tavily.search", query=query, prefetch=True):
+        results = get_tavily().search(query, max_results=TAVILY_MAX_RESULTS, include_raw_content=False)
+    if not prefetch.wanted(query):
+        return results, {}
+    return results, _extraction_batcher.submit_many([hit["url"] for hit in results["results"]])
+
+
+@contextmanager
+def _query_prefetch(request_id: str) -> Iterator[Optional[QueryPrefetch]]:
+    """
+    Prefetch das buscas durante build_first_queries (None se QUERY_PREFETCH_ENABLED for False).
+    
+    Se a geração falhar ou for cancelada, as buscas disparadas são descartadas.
+    """
+    if not QUERY_PREFETCH_ENABLED:
+        yield None
+        return
+    prefetch = QueryPrefetch(
+        lambda query: _prefetch_pool.submit(contextvars.copy_context().run, _prefetch_search, prefetch, query)
+    )
+    get_run_context(request_id).prefetch = prefetch
+    try:
+        yield prefetch
+    except BaseException:
+        prefetch.cancel()
+        raise
+
+
+def _prefetch_callback(prefetch: Optional[QueryPrefetch]) -> Optional[Callable[[str], None]]:
+    """on_token que dispara a busca de cada query assim que a string dela fecha no stream"""
+    if prefetch is None:
+        return None
+    items = StreamingArrayItems("queries")
+    
+    def on_token(token: str) -> None:
+        for query in items.feed(token):
+            prefetch.submit(query)
+    
+    return on_token
+
+
+def _prefetch_output(prefetch: Optional[QueryPrefetch], queries: list[str], s) -> dict:
+    """
+    Alinhar o prefetch com a lista final de queries.
+    
+    Args:
+        prefetch: Prefetch da execução (ou None)
+        queries: Queries que os ramos vão executar
+        s: Span do nó
+        
+    Returns:
+        Métricas do prefetch para o estado
+    """
+    if prefetch is None:
+        return {}
+    early = len(prefetch)
+    discarded = prefetch.keep(queries)
+    ttfs = prefetch.time_to_first_search()
+    s.set(prefetched=early, prefetch_discarded=discarded, time_to_first_search=round(ttfs, 3) if ttfs is not None else None)
+    if discarded:
+        logger.info("🗑️ %s busca(s) antecipada(s) descartada(s): queries fora da lista final", discarded)
+    return {"metrics": {"prefetched_queries": early, "prefetch_discarded": discarded}}
+
+
+def _prefetched(task: SearchTask) -> Optional[Future]:
+    """Busca antecipada da query do ramo (None sem prefetch)"""
+    if not task.request_id:
+        return None
+    prefetch = get_run_context(task.request_id).prefetch
+    return prefetch.get(task.query) if prefetch is not None else None
 
 
 def _summarize_content(query: str, content: str) -> str:
@@ -74,9 +393,156 @@ def _summarize_content(query: str, content: str) -> str:
     Returns:
         Resumo do conteúdo
     """
-    prompt = resume_search.format(user_input=query, search_results=content)
-    response = llm.invoke(prompt)
-    return response.content
+    with span("summarize", content_chars=len(content)):
+        prompt = resume_search.format(user_input=query, search_results=content)
+        response = get_llm().invoke(prompt, priority=Priority.SUMMARY)
+        return response.content
+
+
+async def _asummarize_content(query: str, content: str) -> str:
+    """
+    Resumir conteúdo usando LLM sem bloquear o event loop.
+    
+    Args:
+        query: Query original
+        content: Conteúdo a resumir
+        
+    Returns:
+        Resumo do conteúdo
+    """
+    with span("summarize", content_chars=len(content)):
+        prompt = resume_search.format(user_input=query, search_results=content)
+        response = await get_llm().ainvoke(prompt, priority=Priority.SUMMARY)
+        return response.content
+
+
+class _SummaryRequest(NamedTuple):
+    """Página a resumir pelo batcher de sumarização"""
+    user_input: str
+    query: str
+    content: str
+
+
+def _format_batch_item(index: int, item: _SummaryRequest) -> str:
+    """Bloco de uma página no prompt de sumarização em lote"""
+    return resume_search_batch_item.format(id=index, query=item.query.replace('"', "'"), content=item.content)
+
+
+def _pack_summary_batches(user_input: str, items: list[_SummaryRequest]) -> list[list[_SummaryRequest]]:
+    """
+    Dividir as páginas em lotes que cabem na janela de contexto do modelo.
+    
+    Cada página ocupa seus tokens no prompt mais SUMMARY_BATCH_ITEM_TOKENS
+    reservados para o resumo na resposta.
+    
+    Args:
+        user_input: Pergunta do usuário (comum às páginas)
+        items: Páginas a resumir
+        
+    Returns:
+        Lotes de no máximo SUMMARY_BATCH_SIZE páginas
+    """
+    overhead = count_tokens(resume_search_batch.format(user_input=user_input, search_results=""), LLM_MODEL)
+    batches: list[list[_SummaryRequest]] = []
+    current: list[_SummaryRequest] = []
+    used = overhead
+    for item in items:
+        cost = count_tokens(_format_batch_item(len(current) + 1, item), LLM_MODEL) + SUMMARY_BATCH_ITEM_TOKENS
+        if current and (len(current) >= SUMMARY_BATCH_SIZE or used + cost > SUMMARY_BATCH_CONTEXT_TOKENS):
+            batches.append(current)
+            current, used = [], overhead
+        current.append(item)
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _summarize_chunk(user_input: str, items: list[_SummaryRequest]) -> dict[_SummaryRequest, str | Exception]:
+    """
+    Resumir um lote de páginas em uma chamada estruturada.
+    
+    Se a resposta não puder ser parseada, o lote é dividido ao meio e cada
+    metade é tentada de novo; páginas que faltarem numa resposta válida são
+    resumidas individualmente com resume_search. Erros HTTP não são
+    repetidos.
+    
+    Args:
+        user_input: Pergunta do usuário
+        items: Páginas do lote
+        
+    Returns:
+        Dict página -> resumo (ou Exception se a página não pôde ser resumida)
+    """
+    if len(items) == 1:
+        item = items[0]
+        try:
+            return {item: _summarize_content(item.query, item.content)}
+        except Exception as e:
+            return {item: e}
+    
+    prompt = resume_search_batch.format(
+        user_input=user_input,
+        search_results="".join(_format_batch_item(i, item) for i, item in enumerate(items, 1))
+    )
+    try:
+        # prompt_tokens fica no span llm.invoke_structured, contado uma vez pelo cliente
+        with span("summarize_batch", items=len(items)):
+            batch = get_llm().invoke_structured(
+                prompt, SummaryBatch, priority=Priority.SUMMARY,
+                max_tokens=SUMMARY_BATCH_ITEM_TOKENS * len(items)
+            )
+        by_id = {summary.id: summary.summary for summary in batch.summaries if summary.summary.strip()}
+    except ValueError as e:
+        # JSON inválido ou fora do schema: lotes menores costumam sair certos
+        logger.warning("Resposta em lote de %s páginas inválida (%s); dividindo o lote", len(items), e)
+        middle = len(items) // 2
+        return {**_summarize_chunk(user_input, items[:middle]), **_summarize_chunk(user_input, items[middle:])}
+    except Exception as e:
+        return {item: e for item in items}
+    
+    results: dict[_SummaryRequest, str | Exception] = {}
+    for i, item in enumerate(items, 1):
+        if i in by_id:
+            results[item] = by_id[i]
+        else:
+            logger.debug("Resumo %s ausente na resposta em lote; resumindo individualmente", i)
+            results.update(_summarize_chunk(user_input, [item]))
+    return results
+
+
+def _summarize_batch(items: list[_SummaryRequest]) -> dict[_SummaryRequest, str | Exception]:
+    """
+    Handler do batcher de sumarização: uma chamada por lote de páginas.
+    
+    Páginas de perguntas diferentes (execuções simultâneas) vão em
+    chamadas separadas, pois o prompt traz a pergunta do usuário.
+    
+    Args:
+        items: Páginas sem duplicatas
+        
+    Returns:
+        Dict página -> resumo (ou Exception)
+    """
+    by_question: dict[str, list[_SummaryRequest]] = {}
+    for item in items:
+        by_question.setdefault(item.user_input, []).append(item)
+    
+    results: dict[_SummaryRequest, str | Exception] = {}
+    for user_input, question_items in by_question.items():
+        for chunk in _pack_summary_batches(user_input, question_items):
+            results.update(_summarize_chunk(user_input, chunk))
+    return results
+
+
+# Junta as páginas de todos os ramos single_search em chamadas de sumarização em lote
+_summary_batcher = MicroBatcher(
+    _summarize_batch,
+    max_batch_size=SUMMARY_BATCH_SIZE * 4,
+    max_wait=SUMMARY_BATCH_WAIT,
+    max_workers=2,
+    name="summaries"
+)
 
 
 def _format_search_results(queries_results: list[QueryResult]) -> str:
@@ -115,30 +581,290 @@ def _format_references(queries_results: list[QueryResult]) -> str:
     )
 
 
+def _reasoning_tokens(text: str) -> int:
+    """Tokens de um texto no tokenizer do modelo de raciocínio"""
+    return count_tokens(text, REASONING_MODEL)
+
+
+def _fit_results(user_input: str, results: list[QueryResult], budget: int) -> list[QueryResult]:
+    """
+    Selecionar os resultados que cabem em budget tokens do prompt.
+    
+    Com muitos ramos o prompt final pode passar da janela e o Foundry
+    trunca ou recusa a requisição. Os resultados são priorizados por BM25
+    contra a pergunta; o primeiro que não couber é reduzido aos trechos mais
+    relevantes e os demais são descartados.
+    
+    Args:
+        user_input: Pergunta do usuário
+        results: Resultados candidatos
+        budget: Tokens disponíveis para os resultados
+        
+    Returns:
+        Resultados mantidos, na ordem original
+    """
+    count = _reasoning_tokens
+    cost = lambda result: count(_format_search_results([result]))
+    if sum(cost(result) for result in results) <= budget:
+        return results
+    
+    def shrink(result: QueryResult, available: int) -> Optional[QueryResult]:
+        overhead = cost(result.model_copy(update={"resume": ""}))
+        if available - overhead < FINAL_RESULT_MIN_TOKENS:
+            return None
+        resume = select_relevant(result.resume, [user_input], available - overhead, length=count)
+        return result.model_copy(update={"resume": resume})
+    
+    priority = bm25_scores([result.resume for result in results], [user_input])
+    kept = pack_by_priority(results, cost, budget, priority=list(priority), shrink=shrink)
+    trimmed = sum(1 for result in kept if result not in results)
+    logger.warning(
+        "⚠️ Prompt final excede %s tokens: %s resultados descartados, %s reduzido(s)",
+        budget, len(results) - len(kept), trimmed
+    )
+    return kept
+
+
+def _final_results(state: ReportState) -> list[QueryResult]:
+    """
+    Selecionar os resultados que cabem na janela de contexto do modelo de raciocínio.
+    
+    Args:
+        state: Estado da aplicação
+        
+    Returns:
+        Resultados mantidos, na ordem original (ver _fit_results)
+    """
+    budget = prompt_budget(REASONING_MODEL, REASONING_MAX_TOKENS)
+    budget -= _reasoning_tokens(build_final_response.format(user_input=state.user_input, search_results=""))
+    return _fit_results(state.user_input, state.queries_results, budget)
+
+
+_REFERENCES_HEADER = "\n\nReferences:\n"
+_REFERENCE_LINE = re.compile(r"^\[(\d+)\] - \[(.*)\]\((.*)\)$")
+
+
+def split_references(final_response: str) -> tuple[str, list[dict]]:
+    """
+    Separar a resposta do bloco de referências anexado por _final_output.
+    
+    Args:
+        final_response: Resposta final do grafo
+        
+    Returns:
+        (texto da resposta, lista de {"index", "title", "url"})
+    """
+    answer, _, block = final_response.partition(_REFERENCES_HEADER)
+    references = []
+    for line in block.splitlines():
+        if match := _REFERENCE_LINE.match(line.strip()):
+            index, title, url = match.groups()
+            references.append({"index": int(index), "title": title, "url": url})
+    return answer, references
+
+
+def _final_prompt(state: ReportState, results: list[QueryResult]) -> str:
+    """
+    Montar prompt da resposta final a partir do estado.
+    
+    Args:
+        state: Estado da aplicação
+        results: Resultados que cabem no prompt (ver _final_results)
+        
+    Returns:
+        Prompt para o modelo de raciocínio
+    """
+    return build_final_response.format(
+        user_input=state.user_input,
+        search_results=_format_search_results(results)
+    )
+
+
+def _stream_writer() -> Callable[[dict], None]:
+    """
+    Retornar o writer de stream "custom" do LangGraph.
+    
+    Fora de uma execução do grafo (ex: nó chamado diretamente) os eventos
+    são descartados.
+    
+    Returns:
+        Função que publica um evento
+    """
+    try:
+        return get_stream_writer()
+    except RuntimeError:
+        return lambda chunk: None
+
+
+class _TokenCollector:
+    """Acumula tokens da resposta final e publica cada um no stream do grafo"""
+    
+    def __init__(self, node: str = "final_writer", ttft_event: str = "ttft"):
+        """
+        Args:
+            node: Nó que gera a resposta (para o log)
+            ttft_event: Chave do evento publicado no primeiro token
+        """
+        self.node = node
+        self.ttft_event = ttft_event
+        self.writer = _stream_writer()
+        self.started = time.perf_counter()
+        self.parts: list[str] = []
+    
+    def add(self, token: str) -> None:
+        if not self.parts:
+            ttft = time.perf_counter() - self.started
+            logger.info("⏱️ %s time to first token: %.2fs", self.node, ttft)
+            self.writer({self.ttft_event: ttft})
+        self.parts.append(token)
+        self.writer({"token": token})
+    
+    @property
+    def content(self) -> str:
+        return "".join(self.parts)
+
+
+def _final_output(state: ReportState, content: str, results: list[QueryResult], release: bool = True) -> dict[str, str]:
+    """
+    Anexar referências à resposta do modelo de raciocínio.
+    
+    Args:
+        state: Estado da aplicação
+        content: Texto gerado pelo modelo
+        results: Resultados enviados no prompt (mesma numeração das citações)
+        release: Encerrar a execução (False se refine_writer ainda vai rodar)
+        
+    Returns:
+        Dict com resposta final e referências
+    """
+    references = _format_references(results)
+    final_response = f"{content}{_REFERENCES_HEADER}{references}"
+    
+    logger.info("✅ Final response generated: %s chars", len(content))
+    if release:
+        _finish_run(state)
+    
+    return {"final_response": final_response}
+
+
+def _finish_run(state: ReportState) -> None:
+    """Registrar as métricas e liberar o contexto da execução"""
+    logger.info("📊 Run metrics: %s", state.metrics)
+    release_run_context(state.request_id)
+    if _tavily is not None:
+        _tavily.log_stats()
+
+
+def _refine_prompt(state: ReportState, collector: Optional[BranchCollector]) -> tuple[str, list[QueryResult], list[QueryResult]]:
+    """
+    Montar o prompt de revisão com os resultados dos ramos atrasados.
+    
+    Os resultados do rascunho mantêm a numeração das citações; os novos
+    (URLs ainda não usadas) vêm depois, no espaço que sobrar da janela.
+    
+    Args:
+        state: Estado com a resposta do final_writer
+        collector: Coleta da execução
+        
+    Returns:
+        (prompt, resultados numerados no prompt, resultados novos)
+    """
+    seen = {result.url for result in state.queries_results}
+    late: dict[str, QueryResult] = {}
+    for result in collector.late_results() if collector is not None else []:
+        if result.url not in seen:
+            late.setdefault(result.url, result)
+    if not late:
+        return "", [], []
+    
+    draft = state.final_response.rpartition(_REFERENCES_HEADER)[0] or state.final_response
+    results = _final_results(state)
+    base = refine_final_response.format(
+        user_input=state.user_input, draft=draft, search_results=_format_search_results(results)
+    )
+    budget = prompt_budget(REASONING_MODEL, REASONING_MAX_TOKENS) - _reasoning_tokens(base)
+    added = _fit_results(state.user_input, list(late.values()), budget)
+    results = results + added
+    prompt = refine_final_response.format(
+        user_input=state.user_input, draft=draft, search_results=_format_search_results(results)
+    )
+    return prompt, results, added
+
+
+def _refine_output(state: ReportState, content: str, results: list[QueryResult], added: list[QueryResult]) -> dict:
+    """
+    Resposta revisada com as referências novas.
+    
+    Args:
+        state: Estado da aplicação
+        content: Texto revisado pelo modelo
+        results: Resultados numerados no prompt
+        added: Resultados dos ramos atrasados usados na revisão
+        
+    Returns:
+        Dict com resposta final, resultados novos e métricas
+    """
+    logger.info("🔁 Resposta revisada com %s resultado(s) atrasado(s)", len(added))
+    return {
+        **_final_output(state, content, results),
+        "queries_results": added,
+        "metrics": {"late_results": len(added)},
+    }
+
+
 # ============================================================================
 # NÓS DO GRAFO LANGGRAPH
 # ============================================================================ 
+
+def build_first_queries(state: ReportState) -> dict:
     """
     Gerar lista de queries de busca a partir da pergunta do usuário.
     
+    A resposta chega por streaming: cada query é buscada assim que sua
+    string fecha (QUERY_PREFETCH_ENABLED), enquanto o modelo gera as demais.
+    
     Args:
         state: Estado da aplicação contendo user_input
         
     Returns:
-        Dict com lista de queries
+        Dict com lista de queries e request_id da execução
     """
-    class QueryList(BaseModel):
-        queries: list[str]
-        
     user_input = state.user_input
     prompt = build_queries.format(user_input=user_input)
+    request_id = state.request_id or uuid.uuid4().hex
     
     try:
-        query_llm = llm.with_structured_output(QueryList)
-        result = query_llm.invoke(prompt)
-        return {"queries": result.queries}
+        with span("build_first_queries", request_id=request_id) as s, _query_prefetch(request_id) as prefetch:
+            query_llm = get_llm().with_structured_output(QueryList)
+            result = query_llm.invoke(prompt, priority=Priority.QUERY, on_token=_prefetch_callback(prefetch))
+            s.set(queries=len(result.queries))
+            return {"queries": result.queries, "request_id": request_id, **_prefetch_output(prefetch, result.queries, s)}
     except Exception as e:
-        logger.error(f"Erro ao gerar queries estruturado: {e}")
+        logger.error("Erro ao gerar queries estruturado: %s", e)
+        raise
+
+
+async def abuild_first_queries(state: ReportState) -> dict:
+    """
+    Versão assíncrona de build_first_queries.
+    
+    Args:
+        state: Estado da aplicação contendo user_input
+        
+    Returns:
+        Dict com lista de queries
+    """
+    prompt = build_queries.format(user_input=state.user_input)
+    request_id = state.request_id or uuid.uuid4().hex
+    
+    try:
+        with span("build_first_queries", request_id=request_id) as s, _query_prefetch(request_id) as prefetch:
+            query_llm = get_llm().with_structured_output(QueryList)
+            result = await query_llm.ainvoke(prompt, priority=Priority.QUERY, on_token=_prefetch_callback(prefetch))
+            s.set(queries=len(result.queries))
+            return {"queries": result.queries, "request_id": request_id, **_prefetch_output(prefetch, result.queries, s)}
+    except Exception as e:
+        logger.error("Erro ao gerar queries estruturado: %s", e)
         raise
 
 def spawn_researchers(state: ReportState) -> list[Send]:
@@ -151,94 +877,671 @@ def spawn_researchers(state: ReportState) -> list[Send]:
     Returns:
         Lista de Send objects para execução paralela
     """
-    return [Send("single_search", query) for query in state.queries]
+    if COLLECTION_MODE == "quorum" and state.request_id:
+        # O prazo da coleta conta a partir daqui
+        get_run_context(state.request_id).collector = BranchCollector(
+            len(state.queries), COLLECTION_QUORUM, COLLECTION_DEADLINE,
+            cancel_late=COLLECTION_LATE_RESULTS == "drop"
+        )
+    return [
+        Send("single_search", SearchTask(query=query, request_id=state.request_id, user_input=state.user_input))
+        for query in state.queries
+    ]
+
+def _claim_urls(registry: UrlRegistry, hits: list[dict]) -> tuple[list[dict], list[Future]]:
+    """
+    Separar os resultados de busca entre os que este ramo processa e os que
+    outro ramo da mesma execução já reivindicou.
+    
+    Args:
+        registry: Registro de URLs da execução
+        hits: Resultados do Tavily search
+        
+    Returns:
+        (resultados a processar, futures das URLs reivindicadas por outros ramos)
+    """
+    owned, waiting = [], []
+    for hit in hits:
+        claimed, future = registry.claim(hit["url"])
+        if claimed:
+            owned.append(hit)
+        else:
+            waiting.append(future)
+    return owned, waiting
+
+
+def _url_registry(task: SearchTask) -> UrlRegistry:
+    """Registro de URLs da execução (isolado se o ramo rodar fora do grafo)"""
+    return get_run_context(task.request_id).urls if task.request_id else UrlRegistry()
+
 
-def single_search(query: str) -> dict[str, list[QueryResult]]:
+def _search_output(query_results: list[QueryResult], reused: list[Optional[QueryResult]], llm_summaries: int) -> dict:
+    """
+    Montar a saída do ramo com as métricas de deduplicação e sumarização.
+    
+    Args:
+        query_results: Resultados processados por este ramo
+        reused: Resultados de URLs processadas por outros ramos
+        llm_summaries: Resumos deste ramo gerados pelo LLM
+        
+    Returns:
+        Dict com queries_results e metrics
+    """
+    saved = sum(1 for result in reused if result is not None)
+    if reused:
+        logger.debug("%s URL(s) repetida(s) entre ramos, %s resumo(s) reaproveitado(s)", len(reused), saved)
+    return {
+        "queries_results": query_results,
+        "metrics": {
+            "duplicate_urls": len(reused),
+            "llm_calls_saved": saved,
+            "llm_summaries": llm_summaries,
+            "extractive_summaries": len(query_results) - llm_summaries,
+        },
+    }
+
+
+def _ranking_queries(task: SearchTask) -> list[str]:
+    """Textos usados para ranquear os trechos das páginas do ramo"""
+    return [text for text in (task.user_input, task.query) if text]
+
+
+def _extractive_resume(task: SearchTask, content: str) -> Optional[str]:
+    """
+    Resumo sem LLM conforme SUMMARY_MODE.
+    
+    Em "extractive" o resumo extrativo é sempre usado; em "hybrid", só se
+    cobrir ao menos SUMMARY_HYBRID_THRESHOLD dos termos da pergunta e da query.
+    
+    Args:
+        task: Tarefa do ramo (pergunta e query)
+        content: Conteúdo reduzido da página
+        
+    Returns:
+        Resumo extrativo ou None se o LLM deve resumir
+    """
+    if SUMMARY_MODE == "llm":
+        return None
+    with span("summarize_extractive") as s:
+        summary, coverage = extractive_summary(
+            content, _ranking_queries(task), SUMMARY_EXTRACTIVE_SENTENCES, SUMMARY_EXTRACTIVE_MAX_CHARS
+        )
+        s.set(coverage=coverage)
+    if SUMMARY_MODE == "extractive":
+        return summary or content[:SUMMARY_EXTRACTIVE_MAX_CHARS]
+    if summary and coverage >= SUMMARY_HYBRID_THRESHOLD:
+        return summary
+    return None
+
+
+def _llm_requests(task: SearchTask, contents: dict[str, str | None]) -> tuple[dict[str, str], dict[str, str]]:
+    """
+    Separar as páginas resolvidas pelo resumo extrativo das que vão ao LLM.
+    
+    Args:
+        task: Tarefa do ramo
+        contents: Conteúdo reduzido por URL (None se a extração falhou)
+        
+    Returns:
+        (resumos extrativos por URL, conteúdos a resumir pelo LLM por URL)
+    """
+    resumes, pending = {}, {}
+    for url, content in contents.items():
+        if not content:
+            continue
+        resume = _extractive_resume(task, content)
+        if resume is None:
+            pending[url] = content
+        else:
+            resumes[url] = resume
+    return resumes, pending
+
+
+def _summarize_pages(task: SearchTask, contents: dict[str, str | None]) -> tuple[dict[str, str], int]:
+    """
+    Resumir as páginas do ramo (extrativo, LLM individual ou LLM em lote).
+    
+    Args:
+        task: Tarefa do ramo
+        contents: Conteúdo reduzido por URL
+        
+    Returns:
+        (resumo por URL, número de páginas resumidas pelo LLM)
+    """
+    resumes, pending = _llm_requests(task, contents)
+    if SUMMARY_BATCH_ENABLED:
+        futures = {
+            url: _summary_batcher.submit(_SummaryRequest(task.user_input or task.query, task.query, content))
+            for url, content in pending.items()
+        }
+        resumes.update({url: future.result() for url, future in futures.items()})
+    else:
+        for url, content in pending.items():
+            resumes[url] = _summarize_content(task.query, content)
+    return resumes, len(pending)
+
+
+async def _asummarize_pages(task: SearchTask, contents: dict[str, str | None]) -> tuple[dict[str, str], int]:
+    """
+    Versão assíncrona de _summarize_pages.
+    
+    Args:
+        task: Tarefa do ramo
+        contents: Conteúdo reduzido por URL
+        
+    Returns:
+        (resumo por URL, número de páginas resumidas pelo LLM)
+    """
+    resumes, pending = _llm_requests(task, contents)
+    if SUMMARY_BATCH_ENABLED:
+        futures = {
+            url: _summary_batcher.submit(_SummaryRequest(task.user_input or task.query, task.query, content))
+            for url, content in pending.items()
+        }
+        summaries = await asyncio.gather(*(asyncio.wrap_future(future) for future in futures.values()))
+        resumes.update(zip(futures, summaries))
+    else:
+        for url, content in pending.items():
+            resumes[url] = await _asummarize_content(task.query, content)
+    return resumes, len(pending)
+
+
+def _resolve_urls(registry: UrlRegistry, owned: list[dict], query_results: list[QueryResult]) -> None:
+    """Publicar no registro o resultado (ou None) de cada URL do ramo"""
+    by_url = {result.url: result for result in query_results}
+    for hit in owned:
+        registry.resolve(hit["url"], by_url.get(hit["url"]))
+
+
+def _search_branch(task: SearchTask, checkpoint: Callable[[], None] = lambda: None) -> dict:
+    """
+    Corpo de single_search: busca, extração e sumarização do ramo.
+    
+    Args:
+        task: Query de busca e request_id da execução
+        checkpoint: Chamado entre as etapas; levanta BranchCancelled se o
+            ramo foi abandonado pela coleta
+        
+    Returns:
+        Dict com lista de QueryResult e métricas
+    """
+    with span("single_search", request_id=task.request_id, query=task.query) as s:
+        tavily = get_tavily()
+        prefetched = _prefetched(task)
+        if prefetched is not None:
+            results, extractions = prefetched.result()
+        else:
+            with span("tavily.search"):
+                results, extractions = tavily.search(task.query, max_results=TAVILY_MAX_RESULTS, include_raw_content=False), {}
+        checkpoint()
+        registry = _url_registry(task)
+        owned, waiting = _claim_urls(registry, results["results"])
+    
+        query_results = []
+        try:
+            contents = _extract_urls_content([hit["url"] for hit in owned], MAX_RAW_CHARS, _ranking_queries(task), extractions)
+            checkpoint()
+            resumes, llm_summaries = _summarize_pages(task, contents)
+            query_results = [
+                QueryResult(title=hit["title"], url=hit["url"], resume=resumes[hit["url"]])
+                for hit in owned if hit["url"] in resumes
+            ]
+        finally:
+            _resolve_urls(registry, owned, query_results)
+    
+        reused = [future.result() for future in waiting]
+        s.set(results=len(query_results), duplicate_urls=len(reused))
+        return _search_output(query_results, reused, llm_summaries)
+
+
+async def _asearch_branch(task: SearchTask) -> dict:
+    """
+    Versão assíncrona de _search_branch (ramos abandonados são cancelados
+    pela task, sem pontos de verificação).
+    
+    A busca Tavily é curta e roda em thread; extração e sumarização,
+    que dominam o tempo, não ocupam thread esperando.
+    
+    Args:
+        task: Query de busca e request_id da execução
+        
+    Returns:
+        Dict com lista de QueryResult e métricas
+    """
+    with span("single_search", request_id=task.request_id, query=task.query) as s:
+        tavily = get_tavily()
+        prefetched = _prefetched(task)
+        if prefetched is not None:
+            # Ramos com a mesma query esperam o mesmo Future: cancelar um não cancela a busca
+            results, extractions = await asyncio.shield(asyncio.wrap_future(prefetched))
+        else:
+            with span("tavily.search"):
+                results = await asyncio.to_thread(tavily.search, task.query, max_results=TAVILY_MAX_RESULTS, include_raw_content=False)
+            extractions = {}
+        registry = _url_registry(task)
+        owned, waiting = _claim_urls(registry, results["results"])
+    
+        query_results = []
+        try:
+            contents = await _aextract_urls_content([hit["url"] for hit in owned], MAX_RAW_CHARS, _ranking_queries(task), extractions)
+            resumes, llm_summaries = await _asummarize_pages(task, contents)
+            query_results = [
+                QueryResult(title=hit["title"], url=hit["url"], resume=resumes[hit["url"]])
+                for hit in owned if hit["url"] in resumes
+            ]
+        finally:
+            _resolve_urls(registry, owned, query_results)
+    
+        reused = await asyncio.gather(*(asyncio.wrap_future(future) for future in waiting))
+        s.set(results=len(query_results), duplicate_urls=len(reused))
+        return _search_output(query_results, reused, llm_summaries)
+
+
+# Ramos atrasados terminam e revisam a resposta no nó refine_writer
+_REFINE_LATE_RESULTS = COLLECTION_MODE == "quorum" and COLLECTION_LATE_RESULTS == "refine"
+
+# Ramos do modo quorum em graph.invoke: o nó retorna quando a coleta é
+# encerrada e o ramo atrasado termina (ou é interrompido) nesta thread
+_branch_pool = ThreadPoolExecutor(max_workers=COLLECTION_WORKERS, thread_name_prefix="branch")
+
+# Ramos atrasados de graph.ainvoke mantidos até terminar (modo refine)
+_late_tasks: set[asyncio.Task] = set()
+
+
+def _run_collector(request_id: Optional[str]) -> Optional[BranchCollector]:
+    """Coleta com quorum da execução (None no modo "all" ou fora do grafo)"""
+    return get_run_context(request_id).collector if request_id else None
+
+
+def _late_output(task: SearchTask) -> dict:
+    """Saída de um ramo abandonado: sem resultados para final_writer"""
+    logger.info("⏭️ Ramo '%s' abandonado: coleta encerrada antes do fim", task.query)
+    return {"metrics": {"late_branches": 1}}
+
+
+def _branch_finished(task: SearchTask, collector: BranchCollector, branch: int, output: Optional[dict], error: Optional[Exception] = None) -> Optional[dict]:
+    """
+    Registrar o fim do ramo na coleta.
+    
+    Args:
+        task: Tarefa do ramo
+        collector: Coleta da execução
+        branch: Identificador do ramo
+        output: Saída do ramo (None se falhou)
+        error: Exceção do ramo
+        
+    Returns:
+        output; erros de ramos abandonados são registrados e descartados
+        
+    Raises:
+        Exception: O erro do ramo, se ele não foi abandonado
+    """
+    on_time = collector.branch_done(branch, output["queries_results"] if output else None)
+    if error is None:
+        return output
+    if on_time:
+        raise error
+    if not isinstance(error, BranchCancelled):
+        logger.warning("⚠️ Ramo atrasado '%s' falhou: %s", task.query, error)
+    return None
+
+
+def _collected_branch(task: SearchTask, collector: BranchCollector, branch: int) -> Optional[dict]:
+    """Executar o ramo registrando o fim na coleta (roda em _branch_pool)"""
+    try:
+        output = _search_branch(task, lambda: collector.raise_if_cancelled(branch))
+    except Exception as e:
+        return _branch_finished(task, collector, branch, None, e)
+    return _branch_finished(task, collector, branch, output)
+
+
+async def _acollected_branch(task: SearchTask, collector: BranchCollector, branch: int) -> Optional[dict]:
+    """Versão assíncrona de _collected_branch"""
+    try:
+        output = await _asearch_branch(task)
+    except asyncio.CancelledError:
+        collector.branch_done(branch, None)
+        raise
+    except Exception as e:
+        return _branch_finished(task, collector, branch, None, e)
+    return _branch_finished(task, collector, branch, output)
+
+
+def single_search(task: SearchTask) -> dict:
     """
     Executar busca web e resumir resultado.
     
+    As URLs encontradas vão para o batcher de extração, que agrupa as URLs
+    de todos os ramos paralelos em chamadas de extract em lote. Uma URL já
+    encontrada por outro ramo da execução não é extraída nem resumida de
+    novo: o ramo espera o resultado do primeiro.
+    
+    No modo de coleta "quorum" o ramo roda em _branch_pool e o nó retorna
+    sem resultados se a coleta for encerrada antes do fim do ramo.
+    
     Args:
-        query: Query de busca
+        task: Query de busca e request_id da execução
         
     Returns:
-        Dict com lista de QueryResult
+        Dict com lista de QueryResult e métricas
     """
-    tavily = TavilyClient()
-    results = tavily.search(query, max_results=1, include_raw_content=False)
+    collector = _run_collector(task.request_id)
+    if collector is None:
+        return _search_branch(task)
     
-    query_results = []
-    for result in results["results"]:
-        url = result["url"]
-        content = _extract_url_content(tavily, url, MAX_RAW_CHARS)
+    branch = collector.register()
+    future = _branch_pool.submit(contextvars.copy_context().run, _collected_branch, task, collector, branch)
+    while True:
+        wait([future, collector.closed], timeout=collector.remaining(), return_when=FIRST_COMPLETED)
+        if future.done():
+            return future.result()
+        if collector.closed.done():
+            if collector.abandon(branch):
+                return _late_output(task)
+            # Terminou entre o encerramento e o abandono: chegou a tempo
+            return future.result()
+        collector.expire()
+
+
+async def asingle_search(task: SearchTask) -> dict:
+    """
+    Versão assíncrona de single_search.
+    
+    No modo de coleta "quorum" o ramo abandonado é cancelado ("drop") ou
+    segue em segundo plano até o refine_writer ("refine").
+    
+    Args:
+        task: Query de busca e request_id da execução
         
-        if content:
-            resume = _summarize_content(query, content)
-            query_results.append(QueryResult(
-                title=result["title"],
-                url=url,
-                resume=resume
-            ))
+    Returns:
+        Dict com lista de QueryResult e métricas
+    """
+    collector = _run_collector(task.request_id)
+    if collector is None:
+        return await _asearch_branch(task)
     
-    return {"queries_results": query_results}
+    branch = collector.register()
+    body = asyncio.ensure_future(_acollected_branch(task, collector, branch))
+    closed = asyncio.wrap_future(collector.closed)
+    try:
+        while True:
+            await asyncio.wait({body, closed}, timeout=collector.remaining(), return_when=asyncio.FIRST_COMPLETED)
+            if body.done():
+                return body.result()
+            if collector.closed.done():
+                if not collector.abandon(branch):
+                    return await body
+                if collector.cancel_late:
+                    body.cancel()
+                else:
+                    _late_tasks.add(body)
+                    body.add_done_callback(_late_tasks.discard)
+                return _late_output(task)
+            collector.expire()
+    except asyncio.CancelledError:
+        body.cancel()
+        raise
     
 
 def final_writer(state: ReportState) -> dict[str, str]:
     """
     Gerar resposta final usando LLM com base nos resultados de busca.
     
+    Os tokens são publicados no stream "custom" do grafo conforme chegam
+    ({"ttft": segundos} no primeiro, {"token": texto} em cada um).
+    
     Args:
         state: Estado da aplicação
         
     Returns:
         Dict com resposta final e referências
     """
-    search_results = _format_search_results(state.queries_results)
-    references = _format_references(state.queries_results)
+    with span("final_writer", request_id=state.request_id, sources=len(state.queries_results)) as s:
+        results = _final_results(state)
+        s.set(prompt_sources=len(results))
+        collector = _TokenCollector()
+        for token in get_reasoning_llm().stream(_final_prompt(state, results), priority=Priority.FINAL):
+            collector.add(token)
+        return _final_output(state, collector.content, results, release=not _REFINE_LATE_RESULTS)
+
+
+async def afinal_writer(state: ReportState) -> dict[str, str]:
+    """
+    Versão assíncrona de final_writer.
     
-    prompt = build_final_response.format(
-        user_input=state.user_input,
-        search_results=search_results
-    )
+    Args:
+        state: Estado da aplicação
+        
+    Returns:
+        Dict com resposta final e referências
+    """
+    with span("final_writer", request_id=state.request_id, sources=len(state.queries_results)) as s:
+        results = _final_results(state)
+        s.set(prompt_sources=len(results))
+        collector = _TokenCollector()
+        async for token in get_reasoning_llm().astream(_final_prompt(state, results), priority=Priority.FINAL):
+            collector.add(token)
+        return _final_output(state, collector.content, results, release=not _REFINE_LATE_RESULTS)
+
+
+def refine_writer(state: ReportState) -> dict:
+    """
+    Revisar a resposta com os resultados dos ramos que terminaram depois do
+    encerramento da coleta (COLLECTION_LATE_RESULTS="refine").
     
-    response = reasoning_llm.invoke(prompt)
-    final_response = f"{response.content}\n\nReferences:\n{references}"
+    Espera os ramos atrasados por até COLLECTION_REFINE_WAIT segundos. Se
+    trouxerem URLs novas, a resposta é reescrita e publicada no stream
+    ({"refine_ttft": segundos} no primeiro token, depois {"token": texto}).
     
-    logger.info(f"✅ Final response generated: {len(response.content)} chars")
+    Args:
+        state: Estado com a resposta do final_writer
+        
+    Returns:
+        Dict com resposta revisada (vazio se não houver resultados novos)
+    """
+    with span("refine_writer", request_id=state.request_id) as s:
+        collector = _run_collector(state.request_id)
+        if collector is not None and collector.abandoned:
+            try:
+                collector.finished.result(timeout=COLLECTION_REFINE_WAIT)
+            except TimeoutError:
+                logger.warning("⚠️ Ramos atrasados não terminaram em %ss", COLLECTION_REFINE_WAIT)
+        prompt, results, added = _refine_prompt(state, collector)
+        s.set(late_results=len(added))
+        if not added:
+            _finish_run(state)
+            return {}
+        writer = _TokenCollector("refine_writer", "refine_ttft")
+        for token in get_reasoning_llm().stream(prompt, priority=Priority.FINAL):
+            writer.add(token)
+        return _refine_output(state, writer.content, results, added)
+
+
+async def arefine_writer(state: ReportState) -> dict:
+    """
+    Versão assíncrona de refine_writer.
     
-    return {"final_response": final_response}
+    Args:
+        state: Estado com a resposta do final_writer
+        
+    Returns:
+        Dict com resposta revisada (vazio se não houver resultados novos)
+    """
+    with span("refine_writer", request_id=state.request_id) as s:
+        collector = _run_collector(state.request_id)
+        if collector is not None and collector.abandoned:
+            try:
+                await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(collector.finished)), COLLECTION_REFINE_WAIT)
+            except asyncio.TimeoutError:
+                logger.warning("⚠️ Ramos atrasados não terminaram em %ss", COLLECTION_REFINE_WAIT)
+        prompt, results, added = _refine_prompt(state, collector)
+        s.set(late_results=len(added))
+        if not added:
+            _finish_run(state)
+            return {}
+        writer = _TokenCollector("refine_writer", "refine_ttft")
+        async for token in get_reasoning_llm().astream(prompt, priority=Priority.FINAL):
+            writer.add(token)
+        return _refine_output(state, writer.content, results, added)
 
 
-builder = StateGraph(ReportState)
-builder.add_node("build_first_queries", build_first_queries)
-builder.add_node("single_search", single_search)
-builder.add_node("final_writer", final_writer)
+def _build_graph():
+    """
+    Montar e compilar o grafo da pesquisa.
+    
+    Cada nó tem versão síncrona e assíncrona: graph.invoke usa a primeira,
+    graph.ainvoke/astream a segunda. Com CHECKPOINT_ENABLED, toda chamada
+    precisa de config com thread_id (run_config).
+    
+    Returns:
+        Grafo LangGraph compilado
+    """
+    builder = StateGraph(ReportState)
+    builder.add_node("build_first_queries", RunnableLambda(build_first_queries, afunc=abuild_first_queries, name="build_first_queries"))
+    builder.add_node("single_search", RunnableLambda(single_search, afunc=asingle_search, name="single_search"))
+    builder.add_node("final_writer", RunnableLambda(final_writer, afunc=afinal_writer, name="final_writer"))
 
-builder.add_edge(START, "build_first_queries")
-builder.add_conditional_edges("build_first_queries", 
-                              spawn_researchers, 
-                              ["single_search"])
-builder.add_edge("single_search", "final_writer")
-builder.add_edge("final_writer", END) 
+    builder.add_edge(START, "build_first_queries")
+    builder.add_conditional_edges("build_first_queries", 
+                                  spawn_researchers, 
+                                  ["single_search"])
+    builder.add_edge("single_search", "final_writer")
+    if _REFINE_LATE_RESULTS:
+        builder.add_node("refine_writer", RunnableLambda(refine_writer, afunc=arefine_writer, name="refine_writer"))
+        builder.add_edge("final_writer", "refine_writer")
+        builder.add_edge("refine_writer", END)
+    else:
+        builder.add_edge("final_writer", END) 
 
-graph = builder.compile()
+    _lazy("_logging", _init_logging)
+    return builder.compile(checkpointer=create_checkpointer())
+
+
+def run_config(thread_id: str, **kwargs) -> dict:
+    """
+    Config de graph.invoke/stream para uma thread de checkpoints
+    
+    Args:
+        thread_id: Identificador da execução (o mesmo para retomá-la)
+        **kwargs: Outras chaves da config (callbacks, ...)
+        
+    Returns:
+        Config do LangGraph
+    """
+    return {**kwargs, "configurable": {**kwargs.get("configurable", {}), "thread_id": thread_id}}
+
+
+def _finished(snapshot) -> bool:
+    """A thread já tem uma execução completa (checkpoint com estado e sem próximos nós)"""
+    return snapshot is not None and bool(snapshot.values) and not snapshot.next
+
+
+def _resume_input(snapshot, user_input: str) -> Optional[dict]:
+    """Entrada do grafo dado o último checkpoint da thread"""
+    if snapshot is None or not snapshot.next:
+        return {"user_input": user_input}
+    # Execução interrompida: sem entrada, o grafo continua do último
+    # checkpoint e só refaz os nós que não terminaram
+    release_run_context(snapshot.values.get("request_id"))
+    logger.info("♻️ Retomando execução em %s", ', '.join(snapshot.next))
+    return None
+
+
+def graph_input(user_input: str, config: Optional[dict] = None) -> Optional[dict]:
+    """
+    Entrada de graph.invoke/stream: a pergunta ou None para retomar a thread
+    
+    Args:
+        user_input: Pergunta do usuário
+        config: Config com thread_id (run_config)
+        
+    Returns:
+        {"user_input": ...} para uma execução nova, None se a thread tiver
+        uma execução inacabada
+    """
+    graph = get_graph()
+    if graph.checkpointer is None or not config:
+        return {"user_input": user_input}
+    snapshot = graph.get_state(config)
+    if _finished(snapshot):
+        # Execução terminada: os reducers somariam os resultados, as métricas
+        # e o request_id antigos à nova execução, então a thread recomeça vazia
+        graph.checkpointer.delete_thread(config["configurable"]["thread_id"])
+    return _resume_input(snapshot, user_input)
+
+
+async def agraph_input(user_input: str, config: Optional[dict] = None) -> Optional[dict]:
+    """
+    Versão assíncrona de graph_input (para graph.ainvoke/astream)
+    
+    Args:
+        user_input: Pergunta do usuário
+        config: Config com thread_id (run_config)
+        
+    Returns:
+        {"user_input": ...} ou None para retomar a thread
+    """
+    graph = get_graph()
+    if graph.checkpointer is None or not config:
+        return {"user_input": user_input}
+    snapshot = await graph.aget_state(config)
+    if _finished(snapshot):
+        await graph.checkpointer.adelete_thread(config["configurable"]["thread_id"])
+    return _resume_input(snapshot, user_input)
 
 
 
 if __name__ == "__main__":
+    import streamlit as st
+    # O Streamlit executa este script de novo a cada interação. O grafo e os
+    # clientes vêm do módulo importado, que fica em sys.modules: são criados
+    # uma vez por processo, com o cache e os pools HTTP preservados.
+    import perplexity as app
+    graph = app.graph
+    warmer = app.start_warmup()
+
     st.title(STREAMLIT_TITLE)
+    if warmer is not None and not warmer.ready():
+        # Perguntas feitas agora funcionam, mas esperam a carga dos modelos
+        models = warmer.status()["models"]
+        st.info("⏳ Loading models: " + ", ".join(f"{model} ({state['state']})" for model, state in models.items()))
     user_input = st.text_input("What's your question?", 
                                value=DEFAULT_QUERY)
 
     if st.button("Search"):
         with st.status("Generating response", expanded=True):
             try:
-                logger.info(f"Iniciando busca para: {user_input}")
-                output = graph.invoke({"user_input": user_input})
+                logger.info("Iniciando busca para: %s", user_input)
+                ttft_metric = st.empty()
+                response_area = st.empty()
+                tokens = []
+                output = {}
+                
+                session_id = st.session_state.setdefault("session_id", uuid.uuid4().hex)
+                # Mesma pergunta após uma falha retoma a thread do último checkpoint
+                threads = st.session_state.setdefault("threads", {})
+                config = app.run_config(threads.setdefault(user_input, uuid.uuid4().hex))
+                
+                with scheduling_context(session_id=session_id, interactive=True):
+                    for mode, chunk in graph.stream(app.graph_input(user_input, config), config,
+                                                    stream_mode=["custom", "values"]):
+                        if mode == "values":
+                            output = chunk
+                        elif "ttft" in chunk:
+                            ttft_metric.metric("Time to first token", f"{chunk['ttft']:.2f}s")
+                        elif "refine_ttft" in chunk:
+                            # Revisão com resultados atrasados substitui o rascunho
+                            tokens = []
+                        elif "token" in chunk:
+                            tokens.append(chunk["token"])
+                            response_area.markdown("".join(tokens))
                 
                 if "final_response" in output:
                     final_response = output["final_response"]
+                    threads.pop(user_input, None)
                     st.success("✅ Response generated successfully!")
-                    st.markdown(final_response)
+                    # Resposta completa, agora com o bloco de referências
+                    response_area.markdown(final_response)
                     logger.info("✅ Response generated successfully")
                 else:
                     st.error("❌ Response does not contain 'final_response'")
@@ -248,4 +1551,4 @@ if __name__ == "__main__":
                 st.error(f"❌ Error generating response: {str(e)}")
                 import traceback
                 st.code(traceback.format_exc())
-                logger.error(f"Error generating response: {str(e)}", exc_info=True)
+                logger.error("Error generating response: %s", e, exc_info=True)
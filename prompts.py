@@ -45,6 +45,33 @@ Here's the web search results:
 </SEARCH_RESULTS>
 """
 
+# Prompt para resumir vários resultados de busca em uma única chamada
+resume_search_batch = agent_prompt + """
+Your objective here is to analyze several web search results and make one synthesis
+for each of them, emphasizing only what is relevant to the user's question and to the
+search query that found the result.
+
+After your work, another agent will use the syntheses to build a final response to the user, so
+make sure each synthesis contains only useful information.
+Be concise and clear.
+
+Here are the web search results:
+{search_results}
+
+IMPORTANT: You MUST respond with ONLY a valid JSON object with one summary per result id, in this exact format:
+{{
+    "summaries": [{{"id": 1, "summary": "..."}}, {{"id": 2, "summary": "..."}}]
+}}
+
+Do NOT include any other text, explanation, or formatting. Just the JSON object.
+"""
+
+# Item de resume_search_batch
+resume_search_batch_item = """<SEARCH_RESULT id="{id}" query="{query}">
+{content}
+</SEARCH_RESULT>
+"""
+
 # Prompt para gerar resposta final
 build_final_response = agent_prompt + """
 Your objective here is develop a final response to the user using
@@ -61,4 +88,28 @@ You must add reference citations (with the number of the citation, example: [1])
 articles you used in each paragraph of your answer.
 """
 
-__all__ = ["build_queries", "resume_search", "build_final_response"]
\ No newline at end of file
+# Prompt para revisar a resposta com resultados que chegaram depois do prazo
+refine_final_response = agent_prompt + """
+Your objective here is to improve a draft response to the user. The draft
+was written before some of the web search results below were available.
+
+Here's the draft response:
+<DRAFT_RESPONSE>
+{draft}
+</DRAFT_RESPONSE>
+
+Here's the web search results. The draft cites them by number; new results
+come after the ones already cited:
+<SEARCH_RESULTS>
+{search_results}
+</SEARCH_RESULTS>
+
+Rewrite the full response, keeping its structure and citations, and add the
+facts from the new results where they are relevant. The response should
+contain something between 500 - 800 words.
+
+You must add reference citations (with the number of the citation, example: [1]) for the 
+articles you used in each paragraph of your answer.
+"""
+
+__all__ = ["build_queries", "resume_search", "resume_search_batch", "resume_search_batch_item", "build_final_response", "refine_final_response"]
\ No newline at end of file
@@ -0,0 +1,249 @@
+"""
+Seleção de trechos relevantes do conteúdo extraído
+
+Em vez de cortar raw_content nos primeiros MAX_RAW_CHARS caracteres (muitas
+vezes menu e cabeçalho da página), o texto é dividido em chunks, cada chunk
+é pontuado por BM25 contra a pergunta do usuário e a query de busca, e os
+melhores chunks são empacotados no orçamento, na ordem original do texto.
+
+O BM25 é calculado com arrays NumPy sobre o vocabulário da query: não há
+rede, GPU nem modelo de embeddings.
+"""
+
+import logging
+import re
+from typing import Callable, Sequence
+
+import numpy as np
+
+try:
+    from config import RANKING_CHUNK_CHARS, RANKING_MAX_INPUT_CHARS, RANKING_BM25_K1, RANKING_BM25_B
+except ImportError:
+    RANKING_CHUNK_CHARS = 600
+    RANKING_MAX_INPUT_CHARS = 200_000
+    RANKING_BM25_K1 = 1.5
+    RANKING_BM25_B = 0.75
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+_BLOCK_RE = re.compile(r"\n\s*\n")
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+# Palavras sem peso na relevância (inglês e português, as línguas dos prompts)
+_STOPWORDS = frozenset("""
+a an and are as at be by for from how in is it of on or that the this to was what when where
+which who why with does do can you your about into than then there these those its
+o os as um uma de do da dos das e em no na nos nas para por com que como qual quais
+""".split())
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Dividir texto em termos minúsculos, sem stopwords
+
+    Args:
+        text: Texto livre
+
+    Returns:
+        Lista de termos
+    """
+    return [token for token in _TOKEN_RE.findall(text.lower()) if token not in _STOPWORDS]
+
+
+def split_chunks(text: str, chunk_chars: int = RANKING_CHUNK_CHARS) -> list[str]:
+    """
+    Dividir texto em chunks de até chunk_chars caracteres
+
+    Linhas curtas (itens de menu, títulos) são agrupadas dentro do mesmo
+    bloco (blocos são separados por linha em branco); linhas longas são
+    quebradas em frases e, em último caso, cortadas.
+
+    Args:
+        text: Conteúdo da página
+        chunk_chars: Tamanho máximo de cada chunk
+
+    Returns:
+        Chunks na ordem do texto
+    """
+    chunks: list[str] = []
+    for block in _BLOCK_RE.split(text):
+        pieces: list[str] = []
+        for line in block.split("\n"):
+            line = line.strip()
+            if len(line) <= chunk_chars:
+                if line:
+                    pieces.append(line)
+                continue
+            for sentence in _SENTENCE_RE.split(line):
+                pieces.extend(sentence[i:i + chunk_chars] for i in range(0, len(sentence), chunk_chars))
+
+        current = ""
+        for piece in pieces:
+            if current and len(current) + 1 + len(piece) > chunk_chars:
+                chunks.append(current)
+                current = piece
+            else:
+                current = f"{current}\n{piece}" if current else piece
+        if current:
+            chunks.append(current)
+    return chunks
+
+
+def bm25_scores(chunks: Sequence[str], queries: Sequence[str], k1: float = RANKING_BM25_K1, b: float = RANKING_BM25_B) -> np.ndarray:
+    """
+    Pontuar chunks por BM25 contra as queries
+
+    Os chunks da própria página formam o corpus do IDF. Termos repetidos
+    entre as queries (ex: presentes na pergunta e na query de busca) pesam
+    mais.
+
+    Args:
+        chunks: Chunks do documento
+        queries: Pergunta do usuário e query de busca
+        k1: Saturação da frequência do termo
+        b: Normalização pelo tamanho do chunk
+
+    Returns:
+        Array com um score por chunk
+    """
+    query_terms = tokenize(" ".join(queries))
+    if not chunks or not query_terms:
+        return np.zeros(len(chunks))
+
+    vocabulary: dict[str, int] = {}
+    for term in query_terms:
+        vocabulary.setdefault(term, len(vocabulary))
+    query_weights = np.bincount([vocabulary[term] for term in query_terms], minlength=len(vocabulary))
+
+    # Matriz de frequências (chunks x termos da query) montada em um único bincount
+    lengths = np.empty(len(chunks))
+    hits: list[int] = []
+    n_terms = len(vocabulary)
+    for row, chunk in enumerate(chunks):
+        tokens = tokenize(chunk)
+        lengths[row] = len(tokens)
+        hits.extend(row * n_terms + vocabulary[token] for token in tokens if token in vocabulary)
+    tf = np.bincount(hits, minlength=len(chunks) * n_terms).reshape(len(chunks), n_terms).astype(float)
+
+    df = np.count_nonzero(tf, axis=0)
+    idf = np.log1p((len(chunks) - df + 0.5) / (df + 0.5))
+    avg_length = lengths.mean() or 1.0
+    norm = k1 * (1 - b + b * lengths / avg_length)
+    saturated = tf * (k1 + 1) / (tf + norm[:, None])
+    return saturated @ (idf * query_weights)
+
+
+def select_relevant(text: str, queries: Sequence[str], budget: int, length: Callable[[str], int] = len, chunk_chars: int = RANKING_CHUNK_CHARS) -> str:
+    """
+    Reduzir o texto aos chunks mais relevantes que cabem no orçamento
+
+    Args:
+        text: Conteúdo extraído da página
+        queries: Pergunta do usuário e query de busca
+        budget: Orçamento na unidade de length
+        length: Medida do texto (caracteres por padrão; um contador de
+            tokens para orçamento em tokens)
+        chunk_chars: Tamanho máximo de cada chunk
+
+    Returns:
+        Chunks selecionados na ordem original, separados por linha em branco;
+        o início do texto se nenhum chunk tiver relação com as queries
+    """
+    if length(text) <= budget:
+        return text
+    text = text[:RANKING_MAX_INPUT_CHARS]
+    chunks = split_chunks(text, chunk_chars)
+    scores = bm25_scores(chunks, queries)
+    if not scores.any():
+        return _prefix(text, budget, length)
+
+    # Maior score primeiro; empate favorece o chunk que aparece antes
+    order = np.lexsort((np.arange(len(chunks)), -scores))
+    selected: list[int] = []
+    used = 0
+    separator = length("\n\n")
+    for index in order:
+        if scores[index] <= 0:
+            break
+        size = length(chunks[index]) + (separator if selected else 0)
+        if used + size > budget:
+            continue
+        selected.append(int(index))
+        used += size
+
+    if not selected:
+        return _prefix(text, budget, length)
+    logger.debug(f"Ranking: {len(selected)}/{len(chunks)} chunks selecionados ({used}/{budget})")
+    return "\n\n".join(chunks[index] for index in sorted(selected))
+
+
+def split_sentences(text: str, min_terms: int = 4) -> list[str]:
+    """
+    Dividir texto em frases, descartando fragmentos curtos (menus, títulos)
+
+    Args:
+        text: Conteúdo da página
+        min_terms: Mínimo de termos (sem stopwords) para manter a frase
+
+    Returns:
+        Frases na ordem do texto
+    """
+    sentences = []
+    for line in text.split("\n"):
+        for sentence in _SENTENCE_RE.split(line.strip()):
+            if len(tokenize(sentence)) >= min_terms:
+                sentences.append(sentence)
+    return sentences
+
+
+def extractive_summary(text: str, queries: Sequence[str], max_sentences: int = 5, max_chars: int = 1200) -> tuple[str, float]:
+    """
+    Resumo extrativo: as frases mais relevantes para as queries
+
+    Args:
+        text: Conteúdo da página
+        queries: Pergunta do usuário e query de busca
+        max_sentences: Máximo de frases no resumo
+        max_chars: Tamanho máximo do resumo
+
+    Returns:
+        (resumo com as frases na ordem original, cobertura entre 0 e 1 dos
+        termos das queries presentes no resumo)
+    """
+    sentences = split_sentences(text[:RANKING_MAX_INPUT_CHARS])
+    scores = bm25_scores(sentences, queries)
+    selected: list[int] = []
+    used = 0
+    for index in np.lexsort((np.arange(len(sentences)), -scores)):
+        if scores[index] <= 0 or len(selected) >= max_sentences:
+            break
+        size = len(sentences[index]) + 1
+        if used + size > max_chars:
+            continue
+        selected.append(int(index))
+        used += size
+
+    summary = " ".join(sentences[index] for index in sorted(selected))
+    query_terms = set(tokenize(" ".join(queries)))
+    if not query_terms:
+        return summary, 0.0
+    coverage = len(query_terms & set(tokenize(summary))) / len(query_terms)
+    return summary, coverage
+
+
+def _prefix(text: str, budget: int, length: Callable[[str], int]) -> str:
+    """Início do texto dentro do orçamento (comportamento sem ranking)"""
+    if length is len:
+        return text[:budget]
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if length(text[:middle]) <= budget:
+            low = middle
+        else:
+            high = middle - 1
+    return text[:low]
+
+
+__all__ = ["tokenize", "split_chunks", "split_sentences", "bm25_scores", "select_relevant", "extractive_summary"]
@@ -0,0 +1,587 @@
+"""
+Resiliência das chamadas ao Foundry Local
+
+- Retry com backoff exponencial e jitter para falhas transitórias (5xx,
+  429, conexão recusada/resetada, timeout).
+- Requisição "hedged": se a chamada passar do percentil de latência
+  observado, uma segunda requisição igual é enviada e vale a que responder
+  primeiro; a outra é abortada.
+- Circuit breaker por endpoint/modelo: depois de falhas seguidas as
+  chamadas falham imediatamente (ex: Foundry reiniciando ou carregando o
+  modelo) até uma requisição de teste dar certo.
+"""
+
+import asyncio
+import contextvars
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from typing import Awaitable, Callable, ContextManager, Optional, TypeVar
+
+import httpx
+import requests
+
+try:
+    from config import (
+        LLM_RETRY_ATTEMPTS, LLM_RETRY_BASE_DELAY, LLM_RETRY_MAX_DELAY,
+        LLM_HEDGE_ENABLED, LLM_HEDGE_PERCENTILE, LLM_HEDGE_MIN_SAMPLES, LLM_HEDGE_MIN_DELAY, LLM_HEDGE_WORKERS,
+        CIRCUIT_BREAKER_ENABLED, CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_TIMEOUT
+    )
+except ImportError:
+    LLM_RETRY_ATTEMPTS = 3
+    LLM_RETRY_BASE_DELAY = 0.5
+    LLM_RETRY_MAX_DELAY = 8.0
+    LLM_HEDGE_ENABLED = False
+    LLM_HEDGE_PERCENTILE = 95.0
+    LLM_HEDGE_MIN_SAMPLES = 20
+    LLM_HEDGE_MIN_DELAY = 0.5
+    LLM_HEDGE_WORKERS = 16
+    CIRCUIT_BREAKER_ENABLED = True
+    CIRCUIT_FAILURE_THRESHOLD = 5
+    CIRCUIT_RESET_TIMEOUT = 15.0
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Status HTTP que indicam falha transitória do servidor
+RETRYABLE_STATUS = frozenset({408, 429, 500, 502, 503, 504})
+
+
+class CircuitOpenError(RuntimeError):
+    """Chamada recusada sem ir à rede: circuito aberto para o endpoint/modelo"""
+
+
+def is_retryable(error: BaseException) -> bool:
+    """
+    Indicar se o erro é transitório e a requisição pode ser repetida
+
+    Args:
+        error: Exceção da chamada HTTP (requests ou httpx)
+
+    Returns:
+        True para 5xx/408/429, conexão recusada ou resetada e timeout
+    """
+    if isinstance(error, requests.exceptions.HTTPError):
+        return error.response is not None and error.response.status_code in RETRYABLE_STATUS
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code in RETRYABLE_STATUS
+    return isinstance(error, (
+        requests.exceptions.ConnectionError,
+        requests.exceptions.Timeout,
+        httpx.TransportError,
+        ConnectionError,
+        TimeoutError,
+    ))
+
+
+class RetryPolicy:
+    """Número de tentativas e espera entre elas (backoff exponencial com jitter)"""
+
+    def __init__(self, attempts: int = LLM_RETRY_ATTEMPTS, base_delay: float = LLM_RETRY_BASE_DELAY, max_delay: float = LLM_RETRY_MAX_DELAY, rng: Optional[random.Random] = None):
+        """
+        Inicializar política
+
+        Args:
+            attempts: Tentativas no total (1 = sem retry)
+            base_delay: Espera máxima antes da segunda tentativa, em segundos
+            max_delay: Teto da espera
+            rng: Gerador do jitter (testes)
+        """
+        self.attempts = max(1, attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._random = rng or random.Random()
+
+    def delay(self, retry: int) -> float:
+        """
+        Espera antes do retry-ésimo retry ("full jitter": uniforme entre 0 e o teto)
+
+        Args:
+            retry: Número do retry (1 = primeiro)
+
+        Returns:
+            Segundos de espera
+        """
+        ceiling = min(self.max_delay, self.base_delay * 2 ** (retry - 1))
+        return self._random.uniform(0, ceiling)
+
+
+class CircuitBreaker:
+    """
+    Circuito de um endpoint/modelo: closed -> open -> half_open -> closed
+
+    Com failure_threshold falhas seguidas o circuito abre e as chamadas falham
+    com CircuitOpenError. Após reset_timeout uma única chamada de teste é
+    liberada (half_open): sucesso fecha o circuito, falha reabre.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD, reset_timeout: float = CIRCUIT_RESET_TIMEOUT):
+        """
+        Inicializar circuito
+
+        Args:
+            name: Identificação nos logs (endpoint e modelo)
+            failure_threshold: Falhas seguidas que abrem o circuito
+            reset_timeout: Segundos com o circuito aberto antes do teste
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        """Estado atual (open vira half_open ao vencer o reset_timeout)"""
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow(self) -> None:
+        """
+        Liberar uma chamada
+
+        Raises:
+            CircuitOpenError: Se o circuito está aberto ou já há uma chamada de teste
+        """
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._state = self.HALF_OPEN
+                self._trial_running = False
+            if self._state == self.CLOSED:
+                return
+            if self._state == self.HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return
+            self.rejected += 1
+            retry_in = max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+        raise CircuitOpenError(f"Circuito aberto para {self.name} (nova tentativa em {retry_in:.1f}s)")
+
+    def record_success(self) -> None:
+        """Registrar resposta do servidor (fecha o circuito)"""
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info(f"🟢 Circuito fechado: {self.name}")
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial_running = False
+
+    def record_failure(self) -> None:
+        """Registrar falha transitória (pode abrir o circuito)"""
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    logger.warning(f"🔴 Circuito aberto: {self.name} ({self._failures} falhas seguidas)")
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._trial_running = False
+
+    def stats(self) -> dict:
+        """Estado, falhas seguidas e chamadas recusadas"""
+        state = self.state
+        with self._lock:
+            return {"state": state, "failures": self._failures, "rejected": self.rejected}
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(endpoint: str, model: str) -> CircuitBreaker:
+    """
+    Circuito compartilhado pelos clientes do mesmo endpoint/modelo
+
+    Args:
+        endpoint: URL base do Foundry
+        model: ID do modelo
+
+    Returns:
+        CircuitBreaker do par
+    """
+    name = f"{endpoint} [{model}]"
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(name)
+        return breaker
+
+
+class LatencyTracker:
+    """Janela das latências recentes de chamadas bem-sucedidas"""
+
+    def __init__(self, window: int = 200):
+        self._lock = threading.Lock()
+        self._samples: deque[float] = deque(maxlen=window)
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct: float, min_samples: int = 1) -> Optional[float]:
+        """
+        Percentil das latências
+
+        Args:
+            pct: Percentil entre 0 e 100
+            min_samples: Amostras mínimas para o valor ser confiável
+
+        Returns:
+            Latência em segundos ou None com poucas amostras
+        """
+        with self._lock:
+            if len(self._samples) < max(1, min_samples):
+                return None
+            ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(len(ordered) * pct / 100))
+        return ordered[index]
+
+
+class HedgeAttempt:
+    """
+    Uma das requisições de uma chamada hedged (modo síncrono)
+
+    Uma thread bloqueada em uma requisição HTTP não pode ser cancelada: quem
+    faz a requisição registra em on_abort como derrubá-la (ex: fechar a
+    conexão), e a requisição que perdeu é abortada quando a outra responde.
+    Depois de finish() a requisição já terminou e abort() não faz nada.
+    """
+
+    def __init__(self, hedge: bool = False):
+        """
+        Args:
+            hedge: True para a cópia enviada depois do atraso, False para a requisição original
+        """
+        self.hedge = hedge
+        self._lock = threading.Lock()
+        self._on_abort: Optional[Callable[[], None]] = None
+        self._finished = False
+        self.aborted = False
+
+    def on_abort(self, callback: Callable[[], None]) -> None:
+        """Registrar como abortar a requisição (executado já se ela perdeu)"""
+        with self._lock:
+            if not self.aborted:
+                self._on_abort = callback
+                return
+        callback()
+
+    def abort(self) -> None:
+        """Abortar a requisição que perdeu"""
+        with self._lock:
+            if self._finished:
+                return
+            self.aborted = True
+            callback, self._on_abort = self._on_abort, None
+        if callback is not None:
+            try:
+                callback()
+            except Exception as e:
+                logger.debug(f"Falha ao abortar requisição hedge: {e}")
+
+    def finish(self) -> None:
+        """Marcar a requisição como terminada (a conexão pode já servir outra chamada)"""
+        with self._lock:
+            self._finished = True
+            self._on_abort = None
+
+
+_current_attempt: contextvars.ContextVar[Optional[HedgeAttempt]] = contextvars.ContextVar("hedge_attempt", default=None)
+
+
+def current_attempt() -> Optional[HedgeAttempt]:
+    """Requisição hedged em execução nesta thread (None fora de uma chamada com hedge)"""
+    return _current_attempt.get()
+
+
+# Disparam e executam as cópias hedge do modo síncrono (a requisição original
+# roda na thread de quem chamou)
+_hedge_pool = ThreadPoolExecutor(max_workers=LLM_HEDGE_WORKERS, thread_name_prefix="hedge")
+
+# Vaga extra para a cópia hedge: None se não houver vaga livre (o hedge não é enviado)
+HedgeSlot = Callable[[], Optional[ContextManager]]
+
+
+class Resilience:
+    """Aplica retry, hedge e circuit breaker a uma chamada HTTP"""
+
+    def __init__(self, retry: Optional[RetryPolicy] = None, breaker: Optional[CircuitBreaker] = None, hedge: bool = LLM_HEDGE_ENABLED, hedge_percentile: float = LLM_HEDGE_PERCENTILE, hedge_min_samples: int = LLM_HEDGE_MIN_SAMPLES, hedge_min_delay: float = LLM_HEDGE_MIN_DELAY):
+        """
+        Inicializar
+
+        Args:
+            retry: Política de retry (default: LLM_RETRY_*)
+            breaker: Circuit breaker (None = desabilitado)
+            hedge: Enviar segunda requisição para chamadas lentas
+            hedge_percentile: Percentil de latência que dispara o hedge
+            hedge_min_samples: Chamadas observadas antes de usar o hedge
+            hedge_min_delay: Espera mínima antes do hedge, em segundos
+        """
+        self.retry = retry or RetryPolicy()
+        self.breaker = breaker
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_min_delay = hedge_min_delay
+        self.latency = LatencyTracker()
+        self._lock = threading.Lock()
+        self._stats = {"retries": 0, "hedged": 0, "hedge_wins": 0, "hedge_aborted": 0, "hedge_skipped": 0}
+
+    def stats(self) -> dict:
+        """Retries, hedges enviados, vencidos, abortados e sem vaga, e estado do circuito"""
+        with self._lock:
+            stats = dict(self._stats)
+        if self.breaker is not None:
+            stats["circuit"] = self.breaker.stats()
+        return stats
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+    def _hedge_delay(self, hedge: bool) -> Optional[float]:
+        """Espera antes do hedge (None = sem hedge nesta chamada)"""
+        if not (hedge and self.hedge):
+            return None
+        threshold = self.latency.percentile(self.hedge_percentile, self.hedge_min_samples)
+        return None if threshold is None else max(threshold, self.hedge_min_delay)
+
+    def _on_error(self, error: Exception, attempt: int) -> Optional[float]:
+        """
+        Registrar falha de uma tentativa
+
+        Returns:
+            Espera antes de repetir, ou None se o erro deve ser propagado
+        """
+        retryable = is_retryable(error)
+        if self.breaker is not None:
+            if retryable:
+                self.breaker.record_failure()
+            else:
+                # 4xx: o servidor está de pé
+                self.breaker.record_success()
+        if not retryable or attempt >= self.retry.attempts:
+            return None
+        delay = self.retry.delay(attempt)
+        self._count("retries")
+        logger.warning(f"🔁 Tentativa {attempt}/{self.retry.attempts} falhou ({type(error).__name__}: {error}); repetindo em {delay:.2f}s")
+        return delay
+
+    def _timed(self, fn: Callable[[], T]) -> T:
+        started = time.perf_counter()
+        result = fn()
+        self.latency.record(time.perf_counter() - started)
+        return result
+
+    def _attempt(self, fn: Callable[[], T], attempt: HedgeAttempt) -> T:
+        """Uma requisição de _hedged, com current_attempt() apontando para attempt"""
+        token = _current_attempt.set(attempt)
+        try:
+            return self._timed(fn)
+        except Exception:
+            if attempt.aborted:
+                self._count("hedge_aborted")
+            raise
+        finally:
+            attempt.finish()
+            _current_attempt.reset(token)
+
+    def _hedge_allowed(self, hedge_slot: Optional[HedgeSlot]) -> Optional[ContextManager]:
+        """Vaga para a cópia hedge (None = sem vaga livre, hedge não enviado)"""
+        slot = hedge_slot() if hedge_slot is not None else nullcontext()
+        if slot is None:
+            self._count("hedge_skipped")
+            logger.debug("Sem vaga livre no modelo: hedge não enviado")
+        return slot
+
+    def _hedged(self, fn: Callable[[], T], delay: float, hedge_slot: Optional[HedgeSlot] = None) -> T:
+        """
+        Executar fn e, se passar de delay, uma cópia; vale a primeira a responder
+
+        A requisição original roda nesta thread (com a conexão do pool); a cópia
+        roda em _hedge_pool, ocupando uma vaga extra de hedge_slot.
+        """
+        primary, copy = HedgeAttempt(), HedgeAttempt(hedge=True)
+        done = threading.Event()
+        won: list = []
+
+        def send_hedge() -> None:
+            if done.wait(delay):
+                return
+            slot = self._hedge_allowed(hedge_slot)
+            if slot is None:
+                return
+            logger.info(f"🪃 Chamada passou de {delay:.2f}s: enviando requisição hedge")
+            self._count("hedged")
+            with slot:
+                try:
+                    result = self._attempt(fn, copy)
+                except Exception as e:
+                    logger.debug(f"Requisição hedge falhou: {e}")
+                    return
+            won.append(result)
+            # A original ainda ocupa uma conexão e o modelo: derrubá-la
+            primary.abort()
+
+        hedger = _hedge_pool.submit(contextvars.copy_context().run, send_hedge)
+        try:
+            result = self._attempt(fn, primary)
+        except Exception:
+            done.set()
+            # Falha (ou abort) da original: vale a cópia, se ela já foi enviada
+            hedger.result()
+            if not won:
+                raise
+            self._count("hedge_wins")
+            return won[0]
+        done.set()
+        copy.abort()
+        return result
+
+    def call(self, fn: Callable[[], T], hedge: bool = False, hedge_slot: Optional[HedgeSlot] = None) -> T:
+        """
+        Executar fn com retry, circuit breaker e (opcionalmente) hedge
+
+        Args:
+            fn: Chamada HTTP; deve ser idempotente
+            hedge: Permitir requisição hedged (chamadas sem streaming)
+            hedge_slot: Vaga extra da cópia hedge (ex: no escalonador do modelo)
+
+        Returns:
+            Resultado de fn
+
+        Raises:
+            CircuitOpenError: Se o circuito está aberto
+            Exception: Erro não transitório, ou o último após esgotar as tentativas
+        """
+        attempt = 0
+        while True:
+            attempt += 1
+            if self.breaker is not None:
+                self.breaker.allow()
+            try:
+                delay = self._hedge_delay(hedge)
+                result = self._timed(fn) if delay is None else self._hedged(fn, delay, hedge_slot)
+            except Exception as e:
+                wait_for = self._on_error(e, attempt)
+                if wait_for is None:
+                    raise
+                time.sleep(wait_for)
+                continue
+            if self.breaker is not None:
+                self.breaker.record_success()
+            return result
+
+    async def _atimed(self, fn: Callable[[], Awaitable[T]]) -> T:
+        started = time.perf_counter()
+        result = await fn()
+        self.latency.record(time.perf_counter() - started)
+        return result
+
+    async def _ahedged(self, fn: Callable[[], Awaitable[T]], delay: float, hedge_slot: Optional[HedgeSlot] = None) -> T:
+        """Versão assíncrona de _hedged (a requisição perdedora é cancelada)"""
+        tasks = [asyncio.ensure_future(self._atimed(fn))]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done:
+                return tasks[0].result()
+            slot = self._hedge_allowed(hedge_slot)
+            if slot is None:
+                return await tasks[0]
+            logger.info(f"🪃 Chamada passou de {delay:.2f}s: enviando requisição hedge")
+            self._count("hedged")
+
+            async def send_hedge() -> T:
+                with slot:
+                    return await self._atimed(fn)
+
+            tasks.append(asyncio.ensure_future(send_hedge()))
+            pending = set(tasks)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is tasks[1]:
+                            self._count("hedge_wins")
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def acall(self, fn: Callable[[], Awaitable[T]], hedge: bool = False, hedge_slot: Optional[HedgeSlot] = None) -> T:
+        """
+        Versão assíncrona de call
+
+        Args:
+            fn: Função que cria a coroutine da chamada HTTP (chamada a cada tentativa)
+            hedge: Permitir requisição hedged
+            hedge_slot: Vaga extra da cópia hedge
+
+        Returns:
+            Resultado da coroutine
+        """
+        attempt = 0
+        while True:
+            attempt += 1
+            if self.breaker is not None:
+                self.breaker.allow()
+            try:
+                delay = self._hedge_delay(hedge)
+                result = await (self._atimed(fn) if delay is None else self._ahedged(fn, delay, hedge_slot))
+            except Exception as e:
+                wait_for = self._on_error(e, attempt)
+                if wait_for is None:
+                    raise
+                await asyncio.sleep(wait_for)
+                continue
+            if self.breaker is not None:
+                self.breaker.record_success()
+            return result
+
+
+def create_resilience(endpoint: str, model: str) -> Resilience:
+    """
+    Resiliência configurada por config.py para um cliente
+
+    Args:
+        endpoint: URL base do Foundry
+        model: ID do modelo
+
+    Returns:
+        Resilience com o circuito compartilhado do endpoint/modelo
+    """
+    breaker = get_circuit_breaker(endpoint, model) if CIRCUIT_BREAKER_ENABLED else None
+    return Resilience(RetryPolicy(), breaker)
+
+
+__all__ = [
+    "CircuitOpenError",
+    "RETRYABLE_STATUS",
+    "is_retryable",
+    "RetryPolicy",
+    "CircuitBreaker",
+    "get_circuit_breaker",
+    "LatencyTracker",
+    "HedgeAttempt",
+    "HedgeSlot",
+    "current_attempt",
+    "Resilience",
+    "create_resilience",
+]
@@ -0,0 +1,378 @@
+"""
+Estado compartilhado entre os ramos paralelos de uma mesma execução do grafo
+
+O estado do LangGraph só guarda dados serializáveis; objetos de coordenação
+entre ramos (locks, futures) ficam aqui, indexados pelo request_id do
+ReportState.
+"""
+
+import logging
+import math
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, Optional
+
+from schemas import QueryResult
+
+logger = logging.getLogger(__name__)
+
+# Contextos não liberados (ex: execução que falhou) expiram após este tempo
+RUN_CONTEXT_MAX_AGE = 3600
+
+
+class UrlRegistry:
+    """
+    Registro de URLs já reivindicadas por algum ramo da execução.
+
+    O primeiro ramo a reivindicar uma URL extrai e resume a página; os
+    demais esperam o Future da URL e reaproveitam o resultado.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._futures: dict[str, Future] = {}
+
+    def claim(self, url: str) -> tuple[bool, Future]:
+        """
+        Reivindicar uma URL
+
+        Args:
+            url: URL encontrada pela busca
+
+        Returns:
+            (True, future) se o chamador deve processar a URL e resolver o
+            future com resolve(); (False, future) se outro ramo já a processa
+        """
+        with self._lock:
+            future = self._futures.get(url)
+            if future is not None:
+                return False, future
+            future = Future()
+            self._futures[url] = future
+            return True, future
+
+    def resolve(self, url: str, result: Optional[QueryResult]) -> None:
+        """
+        Publicar o resultado de uma URL reivindicada
+
+        Args:
+            url: URL processada
+            result: QueryResult ou None se a página não pôde ser usada
+        """
+        with self._lock:
+            future = self._futures[url]
+        if not future.done():
+            future.set_result(result)
+
+    def __len__(self) -> int:
+        return len(self._futures)
+
+
+class BranchCancelled(Exception):
+    """Ramo atrasado interrompido depois que a coleta foi encerrada"""
+
+
+class BranchCollector:
+    """
+    Coleta dos ramos single_search com quorum e prazo.
+
+    A coleta é encerrada (closed) quando quorum ramos terminam ou quando o
+    prazo passa com ao menos um ramo concluído. Os ramos ainda em execução
+    são abandonados: o nó do grafo retorna sem resultados para final_writer
+    começar, e o resultado que chegar depois vai para late_results.
+    """
+
+    def __init__(self, branches: int, quorum: float, deadline: float, cancel_late: bool = True):
+        """
+        Inicializar coleta
+
+        Args:
+            branches: Número de ramos da execução
+            quorum: Fração dos ramos que encerra a coleta
+            deadline: Prazo em segundos a partir de agora
+            cancel_late: Interromper os ramos abandonados (False os deixa
+                terminar para um refinamento)
+        """
+        self.branches = branches
+        self.quorum = min(branches, max(1, math.ceil(branches * quorum)))
+        self.deadline = time.monotonic() + deadline
+        self.cancel_late = cancel_late
+        self.closed: Future = Future()
+        self.finished: Future = Future()
+        self.cancelled = threading.Event()
+        self._lock = threading.Lock()
+        self._next_branch = 0
+        self._on_time = 0
+        self._done: set[int] = set()
+        self._abandoned: set[int] = set()
+        self._late_results: list[QueryResult] = []
+        if branches == 0:
+            self.closed.set_result(None)
+            self.finished.set_result(None)
+
+    def register(self) -> int:
+        """Registrar um ramo e retornar seu identificador"""
+        with self._lock:
+            branch = self._next_branch
+            self._next_branch += 1
+            return branch
+
+    def remaining(self) -> Optional[float]:
+        """
+        Segundos até o prazo
+
+        Returns:
+            Tempo restante (0 se vencido), ou None se o prazo venceu sem
+            nenhum ramo concluído (esperar o primeiro)
+        """
+        remaining = self.deadline - time.monotonic()
+        with self._lock:
+            if remaining <= 0 and not self._on_time:
+                return None
+        return max(remaining, 0.0)
+
+    def branch_done(self, branch: int, results: Optional[list[QueryResult]]) -> bool:
+        """
+        Registrar o fim da execução de um ramo
+
+        Args:
+            branch: Identificador do ramo
+            results: Resultados do ramo (None se falhou)
+
+        Returns:
+            True se o ramo terminou a tempo (não foi abandonado)
+        """
+        with self._lock:
+            self._done.add(branch)
+            on_time = branch not in self._abandoned
+            if not on_time:
+                self._late_results.extend(results or [])
+            elif results is not None:
+                self._on_time += 1
+            close = self._should_close()
+            finished = len(self._done) >= self.branches
+        if close:
+            self._close()
+        if finished and not self.finished.done():
+            self.finished.set_result(None)
+        return on_time
+
+    def abandon(self, branch: int) -> bool:
+        """
+        Abandonar um ramo depois do encerramento da coleta
+
+        Returns:
+            False se o ramo já tinha terminado (o resultado deve ser usado)
+        """
+        with self._lock:
+            if branch in self._done:
+                return False
+            self._abandoned.add(branch)
+            return True
+
+    def expire(self) -> None:
+        """Encerrar a coleta se o prazo venceu com algum ramo concluído"""
+        with self._lock:
+            close = self._should_close()
+        if close:
+            self._close()
+
+    def late_results(self) -> list[QueryResult]:
+        """Resultados dos ramos abandonados que já terminaram"""
+        with self._lock:
+            return list(self._late_results)
+
+    @property
+    def abandoned(self) -> int:
+        """Número de ramos abandonados"""
+        with self._lock:
+            return len(self._abandoned)
+
+    def _should_close(self) -> bool:
+        """Quorum atingido ou prazo vencido (chamar com o lock adquirido)"""
+        if self.closed.done():
+            return False
+        return self._on_time >= self.quorum or (self._on_time > 0 and time.monotonic() >= self.deadline)
+
+    def _close(self) -> None:
+        with self._lock:
+            if self.closed.done():
+                return
+            if self.cancel_late:
+                self.cancelled.set()
+            self.closed.set_result(None)
+            on_time = self._on_time
+        logger.info(f"⏱️ Coleta encerrada com {on_time}/{self.branches} ramos (quorum {self.quorum})")
+
+    def raise_if_cancelled(self, branch: int) -> None:
+        """
+        Interromper um ramo abandonado (ponto de verificação entre etapas)
+
+        Args:
+            branch: Identificador do ramo
+
+        Raises:
+            BranchCancelled: Se o ramo foi abandonado e cancel_late está ativo
+        """
+        if self.cancelled.is_set():
+            with self._lock:
+                abandoned = branch in self._abandoned
+            if abandoned:
+                raise BranchCancelled()
+
+
+def _query_key(query: str) -> str:
+    """Mesma query com espaços ou maiúsculas diferentes"""
+    return " ".join(query.split()).casefold()
+
+
+class QueryPrefetch:
+    """
+    Buscas disparadas enquanto build_first_queries ainda gera as queries.
+
+    Cada query é submetida assim que sua string fecha no stream; os ramos
+    single_search pegam o Future pela query em vez de buscar de novo. Queries
+    repetidas compartilham a mesma busca. Queries que não entram na lista final
+    (resposta corrigida ou execução cancelada) são descartadas: a busca que
+    ainda não começou é cancelada e a que já terminou não é usada.
+    """
+
+    def __init__(self, submit: Callable[[str], Future]):
+        """
+        Args:
+            submit: Agenda a busca de uma query e devolve o Future do resultado
+        """
+        self._submit = submit
+        self._lock = threading.Lock()
+        self._futures: dict[str, Future] = {}
+        self.started_at = time.monotonic()
+        self.first_submit_at: Optional[float] = None
+        self.cancelled = False
+        self.duplicates = 0
+        self.discarded = 0
+
+    def submit(self, query: str) -> bool:
+        """
+        Disparar a busca de uma query
+
+        Returns:
+            False se a query for vazia, repetida ou o prefetch foi cancelado
+        """
+        key = _query_key(query)
+        with self._lock:
+            if self.cancelled or not key:
+                return False
+            if key in self._futures:
+                self.duplicates += 1
+                return False
+            if self.first_submit_at is None:
+                self.first_submit_at = time.monotonic()
+            self._futures[key] = self._submit(query)
+            return True
+
+    def get(self, query: str) -> Optional[Future]:
+        """Future da busca da query (None se não foi disparada ou foi descartada)"""
+        with self._lock:
+            future = self._futures.get(_query_key(query))
+        return None if future is None or future.cancelled() else future
+
+    def wanted(self, query: str) -> bool:
+        """A query ainda pode ser usada por um ramo (chamado antes das etapas seguintes da busca)"""
+        with self._lock:
+            return not self.cancelled and _query_key(query) in self._futures
+
+    def keep(self, queries: Iterable[str]) -> int:
+        """
+        Ficar só com as queries da lista final, disparando as que faltam
+
+        Args:
+            queries: Queries que os ramos vão executar
+
+        Returns:
+            Buscas descartadas
+        """
+        queries = list(queries)
+        keys = {_query_key(query) for query in queries}
+        with self._lock:
+            dropped = [key for key in self._futures if key not in keys]
+            for key in dropped:
+                self._futures.pop(key).cancel()
+            self.discarded += len(dropped)
+        for query in queries:
+            if self.get(query) is None:
+                self.submit(query)
+        return len(dropped)
+
+    def cancel(self) -> None:
+        """Descartar todas as buscas (geração das queries falhou ou foi cancelada)"""
+        with self._lock:
+            self.cancelled = True
+            self.discarded += len(self._futures)
+            for future in self._futures.values():
+                future.cancel()
+            self._futures.clear()
+
+    def time_to_first_search(self) -> Optional[float]:
+        """Segundos entre a criação e a primeira busca disparada"""
+        return None if self.first_submit_at is None else self.first_submit_at - self.started_at
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._futures)
+
+
+@dataclass
+class RunContext:
+    """Objetos de coordenação de uma execução (um request_id)"""
+
+    request_id: str
+    created_at: float = field(default_factory=time.time)
+    urls: UrlRegistry = field(default_factory=UrlRegistry)
+    collector: Optional[BranchCollector] = None
+    prefetch: Optional[QueryPrefetch] = None
+
+
+_contexts: dict[str, RunContext] = {}
+_contexts_lock = threading.Lock()
+
+
+def get_run_context(request_id: str) -> RunContext:
+    """
+    Retornar (criando se necessário) o contexto da execução
+
+    Args:
+        request_id: Identificador da execução
+
+    Returns:
+        RunContext compartilhado pelos ramos da execução
+    """
+    with _contexts_lock:
+        context = _contexts.get(request_id)
+        if context is None:
+            _expire_contexts()
+            context = _contexts[request_id] = RunContext(request_id)
+        return context
+
+
+def release_run_context(request_id: Optional[str]) -> None:
+    """
+    Descartar o contexto de uma execução concluída
+
+    Args:
+        request_id: Identificador da execução
+    """
+    with _contexts_lock:
+        _contexts.pop(request_id, None)
+
+
+def _expire_contexts() -> None:
+    """Remover contextos abandonados (chamar com o lock adquirido)"""
+    cutoff = time.time() - RUN_CONTEXT_MAX_AGE
+    for request_id in [rid for rid, ctx in _contexts.items() if ctx.created_at < cutoff]:
+        logger.debug(f"Contexto expirado: {request_id}")
+        del _contexts[request_id]
+
+
+__all__ = ["UrlRegistry", "BranchCancelled", "BranchCollector", "QueryPrefetch", "RunContext", "get_run_context", "release_run_context"]
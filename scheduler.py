@@ -0,0 +1,345 @@
+"""
+Escalonador de chamadas aos modelos locais
+
+O Foundry Local atende um único GPU (ou CPU): disparar todas as sumarizações
+ao mesmo tempo só gera timeouts e troca de modelo na memória. O
+ModelScheduler limita as requisições em andamento por modelo e ordena a fila
+por classe do usuário (interativo antes de batch), prioridade da chamada
+(final_writer antes das sumarizações) e uso por sessão (sessões que
+receberam menos vagas passam na frente).
+"""
+
+import asyncio
+import contextvars
+import itertools
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager, contextmanager
+from enum import IntEnum
+from typing import Iterator, AsyncIterator, Optional
+
+try:
+    from config import (
+        SCHEDULER_ENABLED, SCHEDULER_MAX_IN_FLIGHT, SCHEDULER_DEFAULT_MAX_IN_FLIGHT,
+        SCHEDULER_MAX_QUEUE, SCHEDULER_QUEUE_TIMEOUT
+    )
+except ImportError:
+    SCHEDULER_ENABLED = True
+    SCHEDULER_MAX_IN_FLIGHT = {}
+    SCHEDULER_DEFAULT_MAX_IN_FLIGHT = 1
+    SCHEDULER_MAX_QUEUE = 64
+    SCHEDULER_QUEUE_TIMEOUT = 600
+
+logger = logging.getLogger(__name__)
+
+
+class Priority(IntEnum):
+    """Prioridade da chamada (menor valor é atendido primeiro)"""
+
+    FINAL = 0       # Resposta final (usuário esperando o texto)
+    QUERY = 1       # Geração de queries (bloqueia a execução inteira)
+    NORMAL = 2      # Chamadas avulsas
+    SUMMARY = 3     # Sumarizações em background
+
+
+class SchedulerQueueFull(RuntimeError):
+    """Fila do modelo cheia: a chamada foi rejeitada"""
+
+
+_session_id: contextvars.ContextVar[str] = contextvars.ContextVar("scheduler_session_id", default="default")
+_interactive: contextvars.ContextVar[bool] = contextvars.ContextVar("scheduler_interactive", default=True)
+
+
+@contextmanager
+def scheduling_context(session_id: Optional[str] = None, interactive: bool = True) -> Iterator[None]:
+    """
+    Definir sessão e classe do usuário para as chamadas feitas no bloco
+
+    O contexto é propagado para as threads dos nós do LangGraph.
+
+    Args:
+        session_id: Identificador da sessão (para divisão justa da fila)
+        interactive: False para execuções em batch (atendidas depois)
+    """
+    session_token = _session_id.set(session_id or "default")
+    interactive_token = _interactive.set(interactive)
+    try:
+        yield
+    finally:
+        _session_id.reset(session_token)
+        _interactive.reset(interactive_token)
+
+
+class _Waiter:
+    """Chamada aguardando vaga em um modelo"""
+
+    __slots__ = ("model", "priority", "session", "interactive", "seq", "enqueued_at",
+                 "granted", "event", "loop", "future")
+
+    def __init__(self, model: str, priority: int, seq: int):
+        self.model = model
+        self.priority = int(priority)
+        self.session = _session_id.get()
+        self.interactive = _interactive.get()
+        self.seq = seq
+        self.enqueued_at = time.perf_counter()
+        self.granted = False
+        self.event: Optional[threading.Event] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.future: Optional[asyncio.Future] = None
+
+    def wake(self) -> None:
+        """Notificar o chamador de que a vaga foi concedida"""
+        if self.event is not None:
+            self.event.set()
+        elif self.future is not None:
+            self.loop.call_soon_threadsafe(self._resolve_future)
+
+    def _resolve_future(self) -> None:
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class ModelScheduler:
+    """Limita chamadas simultâneas por modelo com fila priorizada e justa"""
+
+    def __init__(self, limits: Optional[dict[str, int]] = None, default_limit: int = SCHEDULER_DEFAULT_MAX_IN_FLIGHT, max_queue: int = SCHEDULER_MAX_QUEUE, queue_timeout: Optional[float] = SCHEDULER_QUEUE_TIMEOUT):
+        """
+        Inicializar escalonador
+
+        Args:
+            limits: Máximo de chamadas em andamento por modelo
+            default_limit: Limite para modelos ausentes em limits
+            max_queue: Máximo de chamadas aguardando por modelo
+            queue_timeout: Espera máxima na fila em segundos (None = sem limite)
+        """
+        self.limits = dict(limits or {})
+        self.default_limit = default_limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        self._in_flight: dict[str, int] = defaultdict(int)
+        self._queues: dict[str, list[_Waiter]] = defaultdict(list)
+        self._served: dict[str, dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self._stats: dict[str, dict[str, float]] = defaultdict(
+            lambda: {"granted": 0, "rejected": 0, "timeouts": 0, "total_wait": 0.0, "max_wait": 0.0}
+        )
+
+    def limit(self, model: str) -> int:
+        """Máximo de chamadas simultâneas para o modelo"""
+        return self.limits.get(model, self.default_limit)
+
+    # ------------------------------------------------------------------
+    # Fila (todos os métodos com "_locked" exigem o lock adquirido)
+    # ------------------------------------------------------------------
+
+    def _enqueue_locked(self, waiter: _Waiter) -> bool:
+        """Conceder vaga imediata ou enfileirar; retorna True se concedida"""
+        model = waiter.model
+        if self._in_flight[model] < self.limit(model) and not self._queues[model]:
+            self._grant_locked(waiter)
+            return True
+        if len(self._queues[model]) >= self.max_queue:
+            self._stats[model]["rejected"] += 1
+            raise SchedulerQueueFull(f"Fila do modelo {model} cheia ({self.max_queue} chamadas)")
+        self._queues[model].append(waiter)
+        return False
+
+    def _grant_locked(self, waiter: _Waiter) -> None:
+        """Marcar a vaga como concedida e registrar o tempo de espera"""
+        waiter.granted = True
+        self._in_flight[waiter.model] += 1
+        self._served[waiter.model][waiter.session] += 1
+        wait = time.perf_counter() - waiter.enqueued_at
+        stats = self._stats[waiter.model]
+        stats["granted"] += 1
+        stats["total_wait"] += wait
+        stats["max_wait"] = max(stats["max_wait"], wait)
+
+    def _sort_key(self, waiter: _Waiter) -> tuple:
+        """Interativo antes de batch, depois prioridade, depois sessão menos atendida"""
+        served = self._served[waiter.model][waiter.session]
+        return (not waiter.interactive, waiter.priority, served, waiter.seq)
+
+    def _grant_next_locked(self, model: str) -> None:
+        """Conceder as vagas livres aos melhores candidatos da fila"""
+        queue = self._queues[model]
+        while queue and self._in_flight[model] < self.limit(model):
+            waiter = min(queue, key=self._sort_key)
+            queue.remove(waiter)
+            self._grant_locked(waiter)
+            waiter.wake()
+
+    def _cancel_locked(self, waiter: _Waiter) -> bool:
+        """Retirar da fila um chamador que desistiu; retorna True se ele já tinha a vaga"""
+        if waiter.granted:
+            return True
+        self._queues[waiter.model].remove(waiter)
+        return False
+
+    # ------------------------------------------------------------------
+    # API
+    # ------------------------------------------------------------------
+
+    def acquire(self, model: str, priority: int = Priority.NORMAL) -> None:
+        """
+        Esperar uma vaga no modelo (bloqueante)
+
+        Args:
+            model: ID do modelo
+            priority: Prioridade da chamada
+
+        Raises:
+            SchedulerQueueFull: Se a fila do modelo estiver cheia
+            TimeoutError: Se a espera exceder queue_timeout
+        """
+        waiter = _Waiter(model, priority, next(self._seq))
+        waiter.event = threading.Event()
+        with self._lock:
+            if self._enqueue_locked(waiter):
+                return
+        if waiter.event.wait(self.queue_timeout):
+            return
+        with self._lock:
+            if self._cancel_locked(waiter):
+                return
+            self._stats[model]["timeouts"] += 1
+        raise TimeoutError(f"Sem vaga no modelo {model} após {self.queue_timeout}s")
+
+    def try_acquire(self, model: str, priority: int = Priority.NORMAL) -> bool:
+        """
+        Ocupar uma vaga só se houver uma livre agora, sem entrar na fila (ex: requisição hedge)
+
+        Args:
+            model: ID do modelo
+            priority: Prioridade da chamada
+
+        Returns:
+            True se a vaga foi concedida (devolver com release)
+        """
+        with self._lock:
+            if self._in_flight[model] < self.limit(model) and not self._queues[model]:
+                self._grant_locked(_Waiter(model, priority, next(self._seq)))
+                return True
+            return False
+
+    async def aacquire(self, model: str, priority: int = Priority.NORMAL) -> None:
+        """
+        Esperar uma vaga no modelo sem bloquear o event loop
+
+        Args:
+            model: ID do modelo
+            priority: Prioridade da chamada
+
+        Raises:
+            SchedulerQueueFull: Se a fila do modelo estiver cheia
+            TimeoutError: Se a espera exceder queue_timeout
+        """
+        waiter = _Waiter(model, priority, next(self._seq))
+        waiter.loop = asyncio.get_running_loop()
+        waiter.future = waiter.loop.create_future()
+        with self._lock:
+            if self._enqueue_locked(waiter):
+                return
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            with self._lock:
+                granted = self._cancel_locked(waiter)
+                if not granted and isinstance(e, asyncio.TimeoutError):
+                    self._stats[model]["timeouts"] += 1
+            if granted:
+                if isinstance(e, asyncio.CancelledError):
+                    # A vaga chegou junto com o cancelamento: devolvê-la
+                    self.release(model)
+                    raise
+                return
+            if isinstance(e, asyncio.TimeoutError):
+                raise TimeoutError(f"Sem vaga no modelo {model} após {self.queue_timeout}s") from e
+            raise
+
+    def release(self, model: str) -> None:
+        """
+        Devolver a vaga e acordar o próximo da fila
+
+        Args:
+            model: ID do modelo
+        """
+        with self._lock:
+            self._in_flight[model] -= 1
+            self._grant_next_locked(model)
+
+    @contextmanager
+    def slot(self, model: str, priority: int = Priority.NORMAL) -> Iterator[None]:
+        """Ocupar uma vaga no modelo durante o bloco"""
+        self.acquire(model, priority)
+        try:
+            yield
+        finally:
+            self.release(model)
+
+    @asynccontextmanager
+    async def aslot(self, model: str, priority: int = Priority.NORMAL) -> AsyncIterator[None]:
+        """Versão assíncrona de slot"""
+        await self.aacquire(model, priority)
+        try:
+            yield
+        finally:
+            self.release(model)
+
+    def queue_depth(self, model: Optional[str] = None) -> int:
+        """Chamadas aguardando (em um modelo ou no total)"""
+        with self._lock:
+            if model is not None:
+                return len(self._queues[model])
+            return sum(len(queue) for queue in self._queues.values())
+
+    def in_flight(self, model: Optional[str] = None) -> int:
+        """Chamadas em andamento (em um modelo ou no total)"""
+        with self._lock:
+            if model is not None:
+                return self._in_flight[model]
+            return sum(self._in_flight.values())
+
+    def stats(self) -> dict[str, dict[str, float]]:
+        """Retornar ocupação, fila e tempos de espera por modelo"""
+        with self._lock:
+            stats = {}
+            for model in set(self._stats) | set(self._in_flight):
+                counters = self._stats[model]
+                granted = counters["granted"]
+                stats[model] = {
+                    "limit": self.limit(model),
+                    "in_flight": self._in_flight[model],
+                    "queued": len(self._queues[model]),
+                    "granted": granted,
+                    "rejected": counters["rejected"],
+                    "timeouts": counters["timeouts"],
+                    "avg_wait": counters["total_wait"] / granted if granted else 0.0,
+                    "max_wait": counters["max_wait"],
+                }
+            return stats
+
+
+def create_model_scheduler() -> Optional[ModelScheduler]:
+    """
+    Criar o escalonador a partir de config.py
+
+    Returns:
+        ModelScheduler ou None se SCHEDULER_ENABLED for False
+    """
+    if not SCHEDULER_ENABLED:
+        return None
+    return ModelScheduler(limits=SCHEDULER_MAX_IN_FLIGHT)
+
+
+__all__ = [
+    "Priority",
+    "SchedulerQueueFull",
+    "ModelScheduler",
+    "scheduling_context",
+    "create_model_scheduler",
+]
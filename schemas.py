@@ -1,7 +1,6 @@
 """Schemas Pydantic para o projeto Local Perplexity"""
 
-import operator
-from typing import Annotated, List, Optional
+from typing import Annotated, Dict, List, Optional
 from pydantic import BaseModel, Field
 
 
@@ -18,25 +17,110 @@ class QueryResult(BaseModel):
     resume: Optional[str] = Field(None, description="Resumo do conteúdo")
 
 
+class QueryList(BaseModel):
+    """Saída estruturada do gerador de queries.
+    
+    Attributes:
+        queries: Queries de busca geradas a partir da pergunta
+    """
+    queries: List[str]
+
+
+class PageSummary(BaseModel):
+    """Resumo de um item de um pedido de sumarização em lote.
+    
+    Attributes:
+        id: Número do item no prompt
+        summary: Síntese do conteúdo
+    """
+    id: int
+    summary: str
+
+
+class SummaryBatch(BaseModel):
+    """Saída estruturada da sumarização em lote.
+    
+    Attributes:
+        summaries: Um resumo por item do prompt
+    """
+    summaries: List[PageSummary]
+
+
+class SearchTask(BaseModel):
+    """Tarefa enviada a cada ramo paralelo single_search.
+    
+    Attributes:
+        query: Query de busca
+        request_id: Execução à qual o ramo pertence
+        user_input: Pergunta do usuário (para ranquear os trechos extraídos)
+    """
+    query: str
+    request_id: Optional[str] = None
+    user_input: Optional[str] = None
+
+
+def merge_results_by_url(left: List[QueryResult], right: List[QueryResult]) -> List[QueryResult]:
+    """Reducer de queries_results: concatena mantendo um resultado por URL.
+    
+    Args:
+        left: Resultados já acumulados
+        right: Resultados novos de um ramo
+        
+    Returns:
+        Resultados na ordem de chegada, sem URLs repetidas
+    """
+    merged = list(left)
+    seen = {result.url for result in merged if result.url}
+    for result in right:
+        if result.url and result.url in seen:
+            continue
+        seen.add(result.url)
+        merged.append(result)
+    return merged
+
+
+def sum_metrics(left: Dict[str, float], right: Dict[str, float]) -> Dict[str, float]:
+    """Reducer de metrics: soma os contadores publicados pelos nós.
+    
+    Args:
+        left: Métricas acumuladas
+        right: Métricas novas
+        
+    Returns:
+        Métricas somadas por chave
+    """
+    merged = dict(left)
+    for key, value in right.items():
+        merged[key] = merged.get(key, 0) + value
+    return merged
+
+
 class ReportState(BaseModel):
     """Estado do grafo LangGraph da aplicação.
     
     Attributes:
         user_input: Pergunta do usuário
+        request_id: Identificador da execução
         queries: Lista de queries geradas
-        queries_results: Resultados das buscas acumulados
+        queries_results: Resultados das buscas acumulados (um por URL)
         final_response: Resposta final gerada
+        metrics: Contadores da execução (ex: chamadas LLM economizadas)
     """
     user_input: Optional[str] = Field(None, description="Pergunta do usuário")
+    request_id: Optional[str] = Field(None, description="Identificador da execução")
     final_response: Optional[str] = Field(None, description="Resposta final")
     queries: List[str] = Field(default_factory=list, description="Queries geradas")
-    queries_results: Annotated[List[QueryResult], operator.add] = Field(
+    queries_results: Annotated[List[QueryResult], merge_results_by_url] = Field(
         default_factory=list,
         description="Resultados acumulados das buscas"
     )
+    metrics: Annotated[Dict[str, float], sum_metrics] = Field(
+        default_factory=dict,
+        description="Contadores da execução"
+    )
 
 
-__all__ = ["QueryResult", "ReportState"]
+__all__ = ["QueryResult", "QueryList", "PageSummary", "SummaryBatch", "SearchTask", "ReportState", "merge_results_by_url", "sum_metrics"]
 
 
 
@@ -0,0 +1,444 @@
+"""
+API HTTP assíncrona do pipeline de pesquisa
+
+Uso:
+    python server.py            # uvicorn em API_HOST:API_PORT
+
+Endpoints:
+    POST   /jobs               {"question": "...", "session_id": "..."} -> 202 {"id", "status"}
+    GET    /jobs/{id}          Estado do job (e o resultado, quando pronto)
+    GET    /jobs/{id}/events   Progresso em Server-Sent Events (nós, tokens, fim)
+    GET    /jobs/{id}/result   Resposta final com referências (202 enquanto roda)
+    DELETE /jobs/{id}          Cancelar o job
+    GET    /health             Fila, jobs em execução, chamadas por modelo e aquecimento
+    GET    /ready              200 com os modelos carregados, 503 enquanto carregam
+
+As perguntas entram em uma fila limitada (API_MAX_QUEUE, 429 quando cheia) e
+são executadas por API_WORKERS workers no event loop do servidor, com
+graph.astream e os mesmos clientes AzureFoundryLocalLLM da aplicação. Os
+modelos começam a carregar quando o servidor sobe (warmup.py); jobs aceitos
+antes disso esperam a carga.
+"""
+
+import asyncio
+import contextlib
+import json
+import logging
+import time
+import uuid
+from typing import Any, AsyncIterator, Optional
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+import perplexity
+from scheduler import scheduling_context
+from warmup import ModelWarmer
+
+try:
+    from config import API_HOST, API_PORT, API_WORKERS, API_MAX_QUEUE, API_JOB_TTL, API_MAX_JOBS
+except ImportError:
+    API_HOST = "127.0.0.1"
+    API_PORT = 8000
+    API_WORKERS = 4
+    API_MAX_QUEUE = 64
+    API_JOB_TTL = 3600
+    API_MAX_JOBS = 1000
+
+logger = logging.getLogger(__name__)
+
+class QueueFullError(Exception):
+    """Fila de jobs cheia"""
+
+
+class Job:
+    """Uma pergunta submetida à API e os eventos da sua execução"""
+
+    QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+    FINISHED = (DONE, FAILED, CANCELLED)
+
+    def __init__(self, question: str, session_id: Optional[str] = None):
+        self.id = uuid.uuid4().hex
+        self.question = question
+        self.session_id = session_id or self.id
+        self.status = self.QUEUED
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.output: dict = {}
+        self.error: Optional[str] = None
+        self.events: list[dict] = []
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in self.FINISHED
+
+    def publish(self, event: dict) -> None:
+        """
+        Registrar um evento e acordar quem acompanha o job
+
+        Args:
+            event: Evento com a chave "type"
+        """
+        self.events.append({"time": round(time.time() - self.created_at, 3), **event})
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def finish(self, status: str, error: Optional[str] = None) -> None:
+        """
+        Encerrar o job com o status final
+
+        Args:
+            status: DONE, FAILED ou CANCELLED
+            error: Mensagem de erro (FAILED)
+        """
+        self.status = status
+        self.error = error
+        self.finished_at = time.time()
+        self.publish({"type": status, **({"error": error} if error else {})})
+
+    async def follow(self, start: int = 0) -> AsyncIterator[tuple[int, dict]]:
+        """
+        Eventos a partir de start, esperando os novos até o job encerrar
+
+        Args:
+            start: Índice do primeiro evento
+
+        Yields:
+            (índice, evento)
+        """
+        index = start
+        while True:
+            changed = self._changed
+            while index < len(self.events):
+                yield index, self.events[index]
+                index += 1
+            if self.finished:
+                return
+            await changed.wait()
+
+    def result(self) -> dict:
+        """Resposta separada das referências, além das métricas da execução"""
+        final_response = self.output.get("final_response") or ""
+        answer, references = perplexity.split_references(final_response)
+        return {
+            "answer": answer,
+            "references": references,
+            "final_response": final_response,
+            "metrics": self.output.get("metrics", {}),
+        }
+
+    def to_dict(self) -> dict:
+        """Representação JSON do job"""
+        data = {
+            "id": self.id,
+            "question": self.question,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "events": len(self.events),
+        }
+        if self.status == self.DONE:
+            data["result"] = self.result()
+        if self.error:
+            data["error"] = self.error
+        return data
+
+
+class JobManager:
+    """Fila limitada de perguntas atendida por um pool de workers assíncronos"""
+
+    def __init__(self, graph=None, workers: int = API_WORKERS, max_queue: int = API_MAX_QUEUE, job_ttl: float = API_JOB_TTL, max_jobs: int = API_MAX_JOBS, warmer: Optional[ModelWarmer] = None):
+        """
+        Args:
+            graph: Grafo compilado (padrão: perplexity.graph)
+            workers: Jobs executados ao mesmo tempo
+            max_queue: Jobs aguardando worker
+            job_ttl: Segundos que um job encerrado continua consultável
+            max_jobs: Jobs guardados em memória
+            warmer: Aquecimento iniciado com o servidor (padrão: o da aplicação,
+                só com o grafo da aplicação)
+        """
+        if warmer is None and graph is None:
+            warmer = perplexity.get_warmer()
+        self.warmer = warmer
+        self.graph = graph if graph is not None else perplexity.graph
+        self.workers = workers
+        self.max_queue = max_queue
+        self.job_ttl = job_ttl
+        self.max_jobs = max_jobs
+        self.jobs: dict[str, Job] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: list[asyncio.Task] = []
+        self.running = 0
+
+    async def start(self) -> None:
+        """Criar a fila e os workers no event loop atual"""
+        if self.warmer is not None:
+            self.warmer.start()
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._workers = [asyncio.create_task(self._worker(), name=f"api-worker-{i}") for i in range(self.workers)]
+        logger.info(f"✅ API: {self.workers} worker(s), fila de {self.max_queue}")
+
+    async def stop(self) -> None:
+        """Cancelar os jobs em execução e encerrar os workers"""
+        for job in self.jobs.values():
+            if not job.finished:
+                self.cancel(job)
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        if self.warmer is not None:
+            self.warmer.stop(timeout=0)
+
+    def submit(self, question: str, session_id: Optional[str] = None) -> Job:
+        """
+        Enfileirar uma pergunta
+
+        Args:
+            question: Pergunta do usuário
+            session_id: Sessão para a divisão justa do escalonador de modelos
+
+        Returns:
+            Job criado
+
+        Raises:
+            QueueFullError: Fila cheia
+        """
+        self._expire_jobs()
+        job = Job(question, session_id)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise QueueFullError(f"Fila cheia ({self.max_queue} jobs aguardando)")
+        self.jobs[job.id] = job
+        job.publish({"type": Job.QUEUED, "position": self._queue.qsize()})
+        return job
+
+    def cancel(self, job: Job) -> bool:
+        """
+        Cancelar um job na fila ou em execução
+
+        Args:
+            job: Job a cancelar
+
+        Returns:
+            False se o job já tinha encerrado
+        """
+        if job.finished:
+            return False
+        if job.task is not None:
+            job.task.cancel()
+        else:
+            # Ainda na fila: o worker o descarta ao retirá-lo
+            job.finish(Job.CANCELLED)
+        return True
+
+    def _expire_jobs(self) -> None:
+        """Esquecer jobs encerrados há mais de job_ttl e os mais antigos acima de max_jobs"""
+        cutoff = time.time() - self.job_ttl
+        finished = sorted((job for job in self.jobs.values() if job.finished), key=lambda job: job.finished_at)
+        excess = len(self.jobs) - self.max_jobs + 1
+        for i, job in enumerate(finished):
+            if job.finished_at < cutoff or i < excess:
+                del self.jobs[job.id]
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                if job.finished:
+                    continue
+                job.task = asyncio.create_task(self._run(job))
+                # Cancelar o job não cancela o worker
+                await asyncio.wait([job.task])
+                if not job.finished:
+                    # Cancelado antes de a tarefa começar a rodar
+                    job.finish(Job.CANCELLED)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: Job) -> None:
+        """Executar o grafo publicando um evento por nó concluído e por token"""
+        self.running += 1
+        job.status = Job.RUNNING
+        job.started_at = time.time()
+        job.publish({"type": Job.RUNNING})
+        config = perplexity.run_config(job.id) if self.graph.checkpointer is not None else None
+        try:
+            with scheduling_context(session_id=job.session_id, interactive=True):
+                async for mode, chunk in self.graph.astream({"user_input": job.question}, config,
+                                                            stream_mode=["updates", "custom", "values"]):
+                    if mode == "values":
+                        job.output = chunk
+                    elif mode == "updates":
+                        for node, update in chunk.items():
+                            job.publish({"type": "node", "node": node, **_node_summary(update)})
+                    else:
+                        job.publish({"type": "token", **chunk} if "token" in chunk else {"type": "progress", **chunk})
+            job.finish(Job.DONE)
+            logger.info(f"✅ Job {job.id} concluído em {job.finished_at - job.started_at:.2f}s")
+        except asyncio.CancelledError:
+            job.finish(Job.CANCELLED)
+            logger.info(f"🛑 Job {job.id} cancelado")
+        except Exception as e:
+            job.finish(Job.FAILED, str(e))
+            logger.error(f"❌ Job {job.id} falhou: {e}", exc_info=True)
+        finally:
+            self.running -= 1
+
+    def ready(self) -> bool:
+        """Modelos carregados (sempre True sem aquecimento)"""
+        return self.warmer is None or self.warmer.ready()
+
+    def health(self) -> dict:
+        """Fila, jobs, chamadas em andamento por modelo e aquecimento"""
+        scheduler = perplexity.model_scheduler
+        return {
+            "status": "ok" if self._workers else "stopped",
+            "ready": self.ready(),
+            "warmup": self.warmer.status() if self.warmer is not None else None,
+            "workers": self.workers,
+            "running": self.running,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "queue_capacity": self.max_queue,
+            "jobs": len(self.jobs),
+            "models": scheduler.stats() if scheduler is not None else {},
+            "token_usage": {client.model: client.token_usage() for client in (perplexity.llm, perplexity.reasoning_llm)},
+        }
+
+
+def _node_summary(update: Any) -> dict:
+    """Resumo de uma atualização de nó para o evento (sem o estado inteiro)"""
+    if not isinstance(update, dict):
+        return {}
+    summary = {}
+    if "queries" in update:
+        summary["queries"] = update["queries"]
+    if "queries_results" in update:
+        summary["results"] = len(update["queries_results"])
+    if "final_response" in update:
+        summary["chars"] = len(update["final_response"] or "")
+    return summary
+
+
+def _sse(index: int, event: dict) -> str:
+    return f"id: {index}\nevent: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+def create_app(manager: Optional[JobManager] = None) -> Starlette:
+    """
+    Criar a aplicação ASGI
+
+    Args:
+        manager: JobManager (padrão: um novo com o grafo da aplicação)
+
+    Returns:
+        Aplicação Starlette
+    """
+    manager = manager or JobManager()
+
+    def get_job(request: Request) -> Optional[Job]:
+        return manager.jobs.get(request.path_params["job_id"])
+
+    def not_found(request: Request) -> JSONResponse:
+        return JSONResponse({"error": f"Job {request.path_params['job_id']} não encontrado"}, status_code=404)
+
+    async def submit(request: Request) -> JSONResponse:
+        try:
+            body = await request.json()
+        except ValueError:
+            body = None
+        question = body.get("question") if isinstance(body, dict) else None
+        if not isinstance(question, str) or not question.strip():
+            return JSONResponse({"error": "Campo 'question' obrigatório"}, status_code=400)
+        try:
+            job = manager.submit(question.strip(), body.get("session_id"))
+        except QueueFullError as e:
+            return JSONResponse({"error": str(e)}, status_code=429, headers={"Retry-After": "5"})
+        return JSONResponse({"id": job.id, "status": job.status}, status_code=202,
+                            headers={"Location": f"/jobs/{job.id}"})
+
+    async def status(request: Request) -> JSONResponse:
+        job = get_job(request)
+        return JSONResponse(job.to_dict()) if job else not_found(request)
+
+    async def result(request: Request) -> JSONResponse:
+        job = get_job(request)
+        if job is None:
+            return not_found(request)
+        if job.status == Job.DONE:
+            return JSONResponse(job.result())
+        if job.finished:
+            return JSONResponse(job.to_dict(), status_code=409)
+        return JSONResponse(job.to_dict(), status_code=202)
+
+    async def events(request: Request):
+        job = get_job(request)
+        if job is None:
+            return not_found(request)
+        # Reconexão do EventSource continua do último evento recebido
+        last_id = request.headers.get("last-event-id")
+        start = int(last_id) + 1 if last_id and last_id.isdigit() else 0
+
+        async def stream() -> AsyncIterator[str]:
+            async for index, event in job.follow(start):
+                yield _sse(index, event)
+
+        return StreamingResponse(stream(), media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+    async def cancel(request: Request) -> JSONResponse:
+        job = get_job(request)
+        if job is None:
+            return not_found(request)
+        if not manager.cancel(job):
+            return JSONResponse(job.to_dict(), status_code=409)
+        return JSONResponse({"id": job.id, "status": "cancelling" if job.task else job.status}, status_code=202)
+
+    async def health(request: Request) -> JSONResponse:
+        return JSONResponse(manager.health())
+
+    async def ready(request: Request) -> JSONResponse:
+        body = manager.warmer.status() if manager.warmer is not None else {"ready": True, "models": {}}
+        if manager.ready():
+            return JSONResponse(body)
+        return JSONResponse(body, status_code=503, headers={"Retry-After": "5"})
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app: Starlette) -> AsyncIterator[None]:
+        await manager.start()
+        try:
+            yield
+        finally:
+            await manager.stop()
+
+    app = Starlette(
+        routes=[
+            Route("/jobs", submit, methods=["POST"]),
+            Route("/jobs/{job_id}", status, methods=["GET"]),
+            Route("/jobs/{job_id}", cancel, methods=["DELETE"]),
+            Route("/jobs/{job_id}/result", result, methods=["GET"]),
+            Route("/jobs/{job_id}/events", events, methods=["GET"]),
+            Route("/health", health, methods=["GET"]),
+            Route("/ready", ready, methods=["GET"]),
+        ],
+        lifespan=lifespan,
+    )
+    app.state.manager = manager
+    return app
+
+
+__all__ = ["Job", "JobManager", "QueueFullError", "create_app"]
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(create_app(), host=API_HOST, port=API_PORT)
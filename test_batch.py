@@ -0,0 +1,125 @@
+"""
+Testes da execução em lote (leitura, gravação incremental e retomada)
+"""
+
+import io
+import json
+from typing import Optional, TypedDict
+
+import pytest
+from langgraph.graph import START, END, StateGraph
+
+import batch
+import perplexity
+
+
+class _State(TypedDict, total=False):
+    user_input: str
+    final_response: Optional[str]
+
+
+def _fake_graph(calls: list[str]):
+    """Um nó que responde com uma referência; perguntas com "fail" falham"""
+
+    async def write(state: _State) -> dict:
+        calls.append(state["user_input"])
+        if "fail" in state["user_input"]:
+            raise RuntimeError("Foundry indisponível")
+        return {"final_response": f"answer to {state['user_input']} [1]\n\nReferences:\n[1] - [Doc](https://example.com/doc)"}
+
+    builder = StateGraph(_State)
+    builder.add_node("final_writer", write)
+    builder.add_edge(START, "final_writer")
+    builder.add_edge("final_writer", END)
+    return builder.compile()
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    calls = []
+    monkeypatch.setattr(perplexity, "graph", _fake_graph(calls))
+    # Sem aquecimento dos modelos reais
+    monkeypatch.setattr(perplexity, "model_warmer", None, raising=False)
+    return calls
+
+
+def _records(path) -> list[dict]:
+    return [json.loads(line) for line in open(path, encoding="utf-8")]
+
+
+def test_read_questions_jsonl_and_csv(tmp_path):
+    jsonl = tmp_path / "q.jsonl"
+    jsonl.write_text('{"id": "a", "question": "first"}\n\n{"question": "second"}\n', encoding="utf-8")
+    csv_file = tmp_path / "q.csv"
+    csv_file.write_text("id,question\na,first\n,second\n", encoding="utf-8")
+
+    for path in (jsonl, csv_file):
+        questions = batch.read_questions(str(path))
+        assert [q["question"] for q in questions] == ["first", "second"]
+        assert questions[0]["id"] == "a"
+        assert questions[1]["id"] == batch._question_id("second")
+
+
+def test_read_questions_rejects_duplicate_ids(tmp_path):
+    path = tmp_path / "q.jsonl"
+    path.write_text('{"id": 1, "question": "a"}\n{"id": 1, "question": "b"}\n', encoding="utf-8")
+    with pytest.raises(ValueError, match="id repetido"):
+        batch.read_questions(str(path))
+
+
+def test_completed_ids_skips_failed_and_truncated_lines(tmp_path):
+    path = tmp_path / "out.jsonl"
+    path.write_text('{"id": "a", "status": "done"}\n{"id": "b", "status": "failed"}\n{"id": "c", "sta', encoding="utf-8")
+    assert batch.completed_ids(str(path)) == {"a"}
+    assert batch.completed_ids(str(tmp_path / "missing.jsonl")) == set()
+
+
+def test_run_batch_writes_records_and_resumes(tmp_path, calls, capsys):
+    questions = tmp_path / "q.jsonl"
+    questions.write_text("".join(json.dumps({"id": str(i), "question": q}) + "\n"
+                                 for i, q in enumerate(["one", "fail", "three"])), encoding="utf-8")
+    output = tmp_path / "answers.jsonl"
+
+    assert batch.main([str(questions), "-o", str(output), "-c", "2"]) == 1
+    records = {r["id"]: r for r in _records(output)}
+    assert records["0"]["status"] == "done"
+    assert records["0"]["answer"] == "answer to one [1]"
+    assert records["0"]["references"] == [{"index": 1, "title": "Doc", "url": "https://example.com/doc"}]
+    assert "final_writer" in records["0"]["nodes"]
+    assert records["1"]["status"] == "failed" and "Foundry indisponível" in records["1"]["error"]
+    assert "ETA" in capsys.readouterr().err
+
+    # Nova execução: só a pergunta que falhou roda de novo
+    calls.clear()
+    batch.main([str(questions), "-o", str(output)])
+    assert calls == ["fail"]
+    assert len(_records(output)) == 4
+
+
+def test_checkpoint_read_error_fails_only_its_question(tmp_path, calls, monkeypatch):
+    from langgraph.checkpoint.memory import MemorySaver
+
+    monkeypatch.setattr(perplexity.graph, "checkpointer", MemorySaver())
+
+    async def graph_input(question: str, config: dict) -> dict:
+        if question == "broken":
+            raise OSError("checkpoints.sqlite ilegível")
+        return {"user_input": question}
+
+    monkeypatch.setattr(perplexity, "agraph_input", graph_input)
+    questions = tmp_path / "q.jsonl"
+    questions.write_text('{"id": "a", "question": "one"}\n{"id": "b", "question": "broken"}\n', encoding="utf-8")
+    output = tmp_path / "answers.jsonl"
+
+    assert batch.main([str(questions), "-o", str(output)]) == 1
+    records = {r["id"]: r for r in _records(output)}
+    assert records["a"]["status"] == "done"
+    assert records["b"]["status"] == "failed" and "ilegível" in records["b"]["error"]
+
+
+def test_progress_eta():
+    progress = batch.Progress(total=4, stream=io.StringIO())
+    assert progress.eta() is None
+    progress.started -= 10
+    progress.update(True, "a", 10.0)
+    assert progress.eta() == pytest.approx(30, rel=0.05)
@@ -0,0 +1,40 @@
+"""
+Testes do MicroBatcher usado na extração em lote
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from batching import MicroBatcher
+
+
+def test_concurrent_submissions_share_one_batch():
+    """Chaves submetidas por threads diferentes viram um lote sem duplicatas"""
+    calls = []
+
+    def handler(keys):
+        calls.append(sorted(keys))
+        return {key: key.upper() for key in keys}
+
+    batcher = MicroBatcher(handler, max_batch_size=10, max_wait=0.2)
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        futures = list(pool.map(batcher.submit, ["a", "b", "a", "c"]))
+
+    assert [f.result(timeout=5) for f in futures] == ["A", "B", "A", "C"]
+    assert calls == [["a", "b", "c"]]
+
+
+def test_failure_is_isolated_per_key():
+    """Falha de uma chave não afeta as outras do mesmo lote"""
+    def handler(keys):
+        return {key: ValueError(key) if key == "bad" else key for key in keys}
+
+    batcher = MicroBatcher(handler, max_batch_size=2, max_wait=0.2)
+    futures = batcher.submit_many(["ok", "bad", "later"])
+
+    assert futures["ok"].result(timeout=5) == "ok"
+    assert futures["later"].result(timeout=5) == "later"
+    with pytest.raises(ValueError):
+        futures["bad"].result(timeout=5)
+    assert batcher.batches == 2
@@ -0,0 +1,87 @@
+"""
+Testes dos servidores falsos e das estatísticas do benchmark offline
+"""
+
+import pytest
+
+from benchmarks.fake_foundry import FakeFoundryConfig, FakeFoundryServer
+from benchmarks.fake_tavily import FakeTavilyClient
+from benchmarks.run_pipeline import percentile
+from llm_client import AzureFoundryLocalLLM
+from resilience import Resilience, RetryPolicy
+from schemas import QueryList
+
+
+@pytest.fixture
+def fake_foundry():
+    config = FakeFoundryConfig(latency=0.0, tokens_per_second=10_000, completion_tokens=8)
+    with FakeFoundryServer(config) as server:
+        yield server
+
+
+def test_fake_foundry_serves_client(fake_foundry):
+    """O cliente real funciona contra o servidor falso (texto, JSON e stream)"""
+    llm = AzureFoundryLocalLLM(model="fake", endpoint=fake_foundry.url)
+    try:
+        assert len(llm.invoke("hello").content.split()) == 8
+        queries = llm.invoke_structured(
+            'Return {"queries": [...]}\n<USER_INPUT>\nllms\n</USER_INPUT>', QueryList
+        )
+        assert queries.queries[0] == "llms aspect 1"
+        assert len("".join(llm.stream("hello")).split()) == 8
+    finally:
+        llm.close()
+
+    stats = fake_foundry.stats()
+    assert stats["requests_by_model"] == {"fake": 3}
+    assert stats["failures"] == 0
+
+
+def test_fake_foundry_injects_failures():
+    """failure_rate=1 faz todas as requisições falharem"""
+    with FakeFoundryServer(FakeFoundryConfig(latency=0.0, failure_rate=1.0)) as server:
+        llm = AzureFoundryLocalLLM(model="fake", endpoint=server.url, resilience=Resilience(RetryPolicy(attempts=1)))
+        with pytest.raises(Exception):
+            llm.invoke("hello")
+        llm.close()
+        assert server.stats()["failures"] == 1
+
+
+def test_fake_tavily_overlapping_urls():
+    """Queries repetidas encontram as mesmas URLs e extract reporta falhas"""
+    tavily = FakeTavilyClient(search_latency=0, extract_latency=0, failure_rate=1.0)
+    first = tavily.search("q", max_results=2)["results"]
+    assert [r["url"] for r in first] == [r["url"] for r in tavily.search("q", max_results=2)["results"]]
+
+    response = tavily.extract([first[0]["url"]])
+    assert response["results"] == []
+    assert response["failed_results"][0]["url"] == first[0]["url"]
+
+
+def test_percentile_interpolates():
+    assert percentile([], 50) == 0.0
+    assert percentile([1.0, 2.0, 3.0, 4.0], 50) == 2.5
+    assert percentile([1.0, 2.0, 3.0, 4.0], 100) == 4.0
+
+
+def test_json_extract_benchmark_scanner_picks_answer():
+    from benchmarks.json_extract import measure
+
+    report = measure("texto_depois", samples=5, size=500)
+    assert report["legacy_ok"] == 0 and report["scanner_ok"] == 1
+    assert report["stream_read"] < 0.5
+
+
+def test_import_is_lazy():
+    """Importar perplexity não carrega Streamlit nem cria clientes e grafo"""
+    from benchmarks.import_time import heavy_modules
+
+    assert heavy_modules() == {"streamlit": False, "graph": False, "llm": False}
+
+
+def test_lazy_objects_are_created_once():
+    import perplexity
+
+    assert perplexity.graph is perplexity.get_graph()
+    assert perplexity.llm is perplexity.get_llm()
+    assert perplexity.llm.scheduler is perplexity.reasoning_llm.scheduler
@@ -0,0 +1,75 @@
+"""
+Testes do cache de respostas (LRU em memória + SQLite)
+"""
+
+import time
+
+from cache import LLMResponseCache, LRUCache, SQLiteCache
+
+
+def test_lru_evicts_least_recently_used():
+    """Ao exceder max_entries a entrada menos usada é removida"""
+    cache = LRUCache(max_entries=2)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    assert cache.get("a") == "1"
+    cache.set("c", "3")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["hits"] == 2
+    assert stats["misses"] == 1
+
+
+def test_lru_byte_cap():
+    """O limite de bytes remove entradas antigas até caber"""
+    cache = LRUCache(max_entries=100, max_bytes=10)
+    cache.set("a", "x" * 6)
+    cache.set("b", "y" * 6)
+    assert len(cache) == 1
+    assert cache.get("b") == "y" * 6
+    assert cache.stats()["bytes"] == 6
+
+
+def test_sqlite_tier_ttl(tmp_path):
+    """Entradas persistem entre instâncias e expiram pelo TTL"""
+    path = str(tmp_path / "cache.sqlite")
+    first = LLMResponseCache(path=path, ttl=60)
+    key = LLMResponseCache.key("m", [{"role": "user", "content": "oi"}], 0.7, 512)
+    first.set(key, "resposta")
+    first.disk.close()
+
+    second = LLMResponseCache(path=path, ttl=60)
+    assert second.get(key) == "resposta"
+    assert second.stats()["disk"]["hits"] == 1
+
+    expired = SQLiteCache(path, ttl=0.01)
+    time.sleep(0.05)
+    assert expired.get(key) is None
+    assert expired.stats()["expirations"] == 1
+
+
+def test_sqlite_tier_purges_and_caps_on_open_and_set(tmp_path):
+    """Entradas vencidas saem ao abrir; acima do limite saem as mais antigas"""
+    path = str(tmp_path / "cache.sqlite")
+    first = SQLiteCache(path, ttl=None)
+    first.set("never-read", "old")
+    first.close()
+    time.sleep(0.05)
+
+    reopened = SQLiteCache(path, ttl=0.01)
+    assert reopened.stats()["entries"] == 0 and reopened.stats()["expirations"] == 1
+    reopened.close()
+
+    capped = SQLiteCache(path, ttl=None, max_entries=2, gc_interval=0)
+    for key in ("a", "b", "c"):
+        capped.set(key, key * 10)
+    assert capped.get("a") is None and capped.get("c") == "c" * 10
+    assert capped.stats()["evictions"] == 1
+
+    capped.max_entries, capped.max_bytes = None, 15
+    capped.set("d", "d" * 10)
+    assert capped.get("b") is None and capped.get("c") is None and capped.get("d") == "d" * 10
+    capped.close()
@@ -0,0 +1,168 @@
+"""
+Testes do checkpointer SQLite e da retomada de execuções
+"""
+
+import operator
+import time
+from typing import Annotated, Optional, TypedDict
+
+import pytest
+from langgraph.graph import START, END, StateGraph
+from langgraph.types import Send
+
+import perplexity
+from checkpoint import SQLiteCheckpointSaver
+from schemas import QueryResult
+
+
+class _State(TypedDict, total=False):
+    user_input: str
+    request_id: Optional[str]
+    queries: list[str]
+    queries_results: Annotated[list[QueryResult], operator.add]
+    final_response: str
+
+
+def _result(query: str) -> QueryResult:
+    return QueryResult(title=query, url=f"https://example.com/{query}", resume=f"summary of {query}")
+
+
+def _graph(saver: SQLiteCheckpointSaver, calls: list[str], failures: set[str]):
+    """Grafo com o formato do pipeline: queries -> ramos via Send -> resposta"""
+
+    def build(state: _State) -> dict:
+        calls.append("build")
+        return {"queries": ["a", "b", "c"], "request_id": "test-checkpoint"}
+
+    def search(task: dict) -> dict:
+        calls.append(task["query"])
+        if task["query"] in failures:
+            failures.discard(task["query"])
+            raise RuntimeError(f"falha em {task['query']}")
+        return {"queries_results": [_result(task["query"])]}
+
+    def write(state: _State) -> dict:
+        calls.append("final")
+        return {"final_response": " ".join(r.title for r in state["queries_results"])}
+
+    builder = StateGraph(_State)
+    builder.add_node("build", build)
+    builder.add_node("search", search)
+    builder.add_node("final", write)
+    builder.add_edge(START, "build")
+    builder.add_conditional_edges("build", lambda state: [Send("search", {"query": q}) for q in state["queries"]], ["search"])
+    builder.add_edge("search", "final")
+    builder.add_edge("final", END)
+    return builder.compile(checkpointer=saver)
+
+
+@pytest.fixture
+def saver(tmp_path):
+    saver = SQLiteCheckpointSaver(str(tmp_path / "checkpoints.sqlite"), max_age=None, max_bytes=None)
+    yield saver
+    saver.close()
+
+
+def test_checkpoints_persist_across_connections(tmp_path):
+    path = str(tmp_path / "checkpoints.sqlite")
+    saver = SQLiteCheckpointSaver(path)
+    output = _graph(saver, [], set()).invoke({"user_input": "q"}, perplexity.run_config("t1"))
+    saver.close()
+
+    reopened = SQLiteCheckpointSaver(path)
+    graph = _graph(reopened, [], set())
+    state = graph.get_state(perplexity.run_config("t1"))
+    assert state.values["final_response"] == output["final_response"] == "a b c"
+    assert state.values["queries_results"][0] == _result("a")
+    assert not state.next
+    history = list(reopened.list(perplexity.run_config("t1")))
+    assert len(history) > 3
+    assert list(reopened.list(perplexity.run_config("t1"), limit=2)) == history[:2]
+    reopened.close()
+
+
+def test_resume_reuses_completed_branches(saver):
+    calls, failures = [], {"b"}
+    graph = _graph(saver, calls, failures)
+    config = perplexity.run_config("t1")
+
+    with pytest.raises(RuntimeError):
+        graph.invoke({"user_input": "q"}, config)
+    assert graph.get_state(config).next == ("search",)
+
+    calls.clear()
+    output = graph.invoke(None, config)
+    # Só o ramo que falhou roda de novo; build e os outros ramos vêm do checkpoint
+    assert calls == ["b", "final"]
+    assert sorted(output["final_response"].split()) == ["a", "b", "c"]
+
+
+def test_async_resume(saver):
+    import asyncio
+
+    calls = []
+    graph = _graph(saver, calls, {"c"})
+    config = perplexity.run_config("t1")
+
+    async def run() -> dict:
+        with pytest.raises(RuntimeError):
+            await graph.ainvoke({"user_input": "q"}, config)
+        calls.clear()
+        return await graph.ainvoke(None, config)
+
+    output = asyncio.run(run())
+    assert calls == ["c", "final"]
+    assert len(output["queries_results"]) == 3
+
+
+def test_graph_input_resumes_only_unfinished_threads(saver, monkeypatch):
+    graph = _graph(saver, [], {"a"})
+    monkeypatch.setattr(perplexity, "graph", graph)
+    config = perplexity.run_config("t1")
+
+    assert perplexity.graph_input("q", config) == {"user_input": "q"}
+    with pytest.raises(RuntimeError):
+        graph.invoke(perplexity.graph_input("q", config), config)
+    assert perplexity.graph_input("q", config) is None
+
+    graph.invoke(perplexity.graph_input("q", config), config)
+    assert perplexity.graph_input("q", config) == {"user_input": "q"}
+
+
+def test_rerun_of_finished_thread_starts_fresh(saver, monkeypatch):
+    import asyncio
+
+    graph = _graph(saver, [], set())
+    monkeypatch.setattr(perplexity, "graph", graph)
+    config = perplexity.run_config("t1")
+    graph.invoke(perplexity.graph_input("q", config), config)
+
+    # Os reducers não somam os resultados da execução anterior
+    output = graph.invoke(perplexity.graph_input("q", config), config)
+    assert len(output["queries_results"]) == 3
+    output = asyncio.run(graph.ainvoke(asyncio.run(perplexity.agraph_input("q", config)), config))
+    assert len(output["queries_results"]) == 3
+
+
+def test_gc_removes_expired_threads(saver):
+    graph = _graph(saver, [], set())
+    for thread_id in ("old", "new"):
+        graph.invoke({"user_input": "q"}, perplexity.run_config(thread_id))
+    saver._conn.execute("UPDATE checkpoints SET created_at = ? WHERE thread_id = 'old'", (time.time() - 3600,))
+
+    saver.max_age = 60
+    assert saver.collect_garbage() == {"expired": 1, "oversized": 0}
+    assert saver.get_tuple(perplexity.run_config("old")) is None
+    assert saver.get_tuple(perplexity.run_config("new")) is not None
+
+
+def test_gc_trims_oldest_threads_over_size_limit(saver):
+    graph = _graph(saver, [], set())
+    for thread_id in ("t1", "t2", "t3"):
+        graph.invoke({"user_input": "q"}, perplexity.run_config(thread_id))
+    per_thread = saver.stats()["bytes"] // 3
+
+    saver.max_bytes = per_thread + per_thread // 2
+    assert saver.collect_garbage() == {"expired": 0, "oversized": 2}
+    assert saver.stats()["threads"] == 1
+    assert saver.get_tuple(perplexity.run_config("t3")) is not None
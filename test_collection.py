@@ -0,0 +1,136 @@
+"""
+Testes da coleta dos ramos com quorum e prazo
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import perplexity
+from run_context import BranchCancelled, BranchCollector, get_run_context, release_run_context
+from schemas import QueryResult, SearchTask
+
+SLOW = 2.0
+
+
+def _result(query: str) -> QueryResult:
+    return QueryResult(title=query, url=f"https://example.com/{query}", resume=f"summary of {query}")
+
+
+def test_collector_closes_on_quorum():
+    collector = BranchCollector(3, quorum=0.6, deadline=60)
+    branches = [collector.register() for _ in range(3)]
+
+    collector.branch_done(branches[0], [_result("a")])
+    assert not collector.closed.done()
+    collector.branch_done(branches[1], [_result("b")])
+    assert collector.closed.done()
+
+    assert collector.abandon(branches[2])
+    assert not collector.branch_done(branches[2], [_result("c")])
+    assert collector.late_results() == [_result("c")]
+    assert collector.finished.done()
+
+
+def test_collector_deadline_needs_one_branch():
+    collector = BranchCollector(3, quorum=1.0, deadline=0.0)
+    first = collector.register()
+
+    assert collector.remaining() is None
+    collector.expire()
+    assert not collector.closed.done()
+
+    collector.branch_done(first, [_result("a")])
+    assert collector.closed.done()
+
+
+def test_collector_cancels_only_abandoned_branches():
+    collector = BranchCollector(2, quorum=0.5, deadline=60)
+    done, running = collector.register(), collector.register()
+    collector.branch_done(done, [_result("a")])
+
+    collector.raise_if_cancelled(running)
+    collector.abandon(running)
+    with pytest.raises(BranchCancelled):
+        collector.raise_if_cancelled(running)
+
+
+@pytest.fixture
+def quorum_run(monkeypatch):
+    """Execução com 2 ramos e quorum de 1; o ramo "slow" demora SLOW segundos"""
+    started = threading.Event()
+    request_id = "test-collection"
+
+    def fake_branch(task: SearchTask, checkpoint=lambda: None) -> dict:
+        if task.query == "slow":
+            started.set()
+            time.sleep(SLOW)
+            checkpoint()
+        return {"queries_results": [_result(task.query)], "metrics": {}}
+
+    async def afake_branch(task: SearchTask) -> dict:
+        if task.query == "slow":
+            started.set()
+            await asyncio.sleep(SLOW)
+        return {"queries_results": [_result(task.query)], "metrics": {}}
+
+    monkeypatch.setattr(perplexity, "_search_branch", fake_branch)
+    monkeypatch.setattr(perplexity, "_asearch_branch", afake_branch)
+    collector = get_run_context(request_id).collector = BranchCollector(2, quorum=0.5, deadline=60)
+    tasks = [SearchTask(query=query, request_id=request_id) for query in ("fast", "slow")]
+    yield tasks, collector, started
+    release_run_context(request_id)
+
+
+def test_single_search_returns_without_straggler(quorum_run):
+    tasks, collector, started = quorum_run
+    begin = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        fast, slow = pool.map(perplexity.single_search, tasks)
+    elapsed = time.perf_counter() - begin
+
+    assert elapsed < SLOW / 2
+    assert fast["queries_results"] == [_result("fast")]
+    assert slow == {"metrics": {"late_branches": 1}}
+    assert started.is_set()
+    # O ramo atrasado é interrompido no próximo ponto de verificação
+    collector.finished.result(timeout=SLOW * 2)
+    assert collector.late_results() == []
+
+
+def test_asingle_search_cancels_straggler(quorum_run):
+    tasks, collector, _ = quorum_run
+
+    async def run():
+        begin = time.perf_counter()
+        outputs = await asyncio.gather(*(perplexity.asingle_search(task) for task in tasks))
+        return outputs, time.perf_counter() - begin
+
+    (fast, slow), elapsed = asyncio.run(run())
+    assert elapsed < SLOW / 2
+    assert fast["queries_results"] == [_result("fast")]
+    assert slow == {"metrics": {"late_branches": 1}}
+    assert collector.finished.done()
+
+
+def test_refine_prompt_appends_new_late_results():
+    collector = BranchCollector(2, quorum=0.5, deadline=60)
+    done, late = collector.register(), collector.register()
+    collector.branch_done(done, [_result("a")])
+    collector.abandon(late)
+    collector.branch_done(late, [_result("a"), _result("b")])
+    state = perplexity.ReportState(
+        user_input="question",
+        queries_results=[_result("a")],
+        final_response="draft [1]\n\nReferences:\n[1] - [a](https://example.com/a)",
+    )
+
+    prompt, results, added = perplexity._refine_prompt(state, collector)
+
+    assert added == [_result("b")]
+    assert results == [_result("a"), _result("b")]
+    assert "draft [1]" in prompt and "References:" not in prompt
+    assert "[2]" in prompt
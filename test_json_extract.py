@@ -0,0 +1,155 @@
+"""
+Testes da extração de JSON (scanner de chaves, raciocínio, schema e streaming)
+"""
+
+import json
+import random
+
+import pytest
+
+from json_extract import JsonScanner, StreamingArrayItems, StreamingJsonExtractor, extract_json, strip_reasoning
+from schemas import QueryList
+
+_TRICKY = ['{', '}', '"', '\\', '\\"', '{"a": 1}', '</think>', 'ação ✅', '\n', '\\u00e9']
+
+
+def _valid_query(value: dict) -> bool:
+    try:
+        QueryList(**value)
+    except Exception:
+        return False
+    return True
+
+
+@pytest.mark.parametrize("content, expected", [
+    ('{"queries": ["a"]}', {"queries": ["a"]}),
+    ('Aqui está:\n```json\n{"queries": ["a"]}\n```', {"queries": ["a"]}),
+    ('Use {chaves} assim: {"queries": ["a"]} e depois {fim}', {"queries": ["a"]}),
+    ('{"queries": ["a}", "b{", "c\\"}"]}', {"queries": ["a}", "b{", "c\"}"]}),
+    ('{"queries": ["a\\\\"]} {"queries": ["b"]}', {"queries": ["a\\"]}),
+    ('{"outer": {"inner": 1}}', {"outer": {"inner": 1}}),
+    ('sem json aqui', None),
+    ('{"queries": ["a"]', None),
+])
+def test_extract_json(content, expected):
+    assert extract_json(content) == expected
+
+
+def test_reasoning_is_skipped():
+    content = '<think>Formato: {"queries": ["rascunho"]}. Pronto.</think>\n{"queries": ["final"]}'
+    assert extract_json(content) == {"queries": ["final"]}
+    # Servidores que omitem a tag de abertura
+    assert strip_reasoning('rascunho {"x": 1}</think>{"y": 2}') == '{"y": 2}'
+
+
+def test_json_inside_truncated_reasoning():
+    assert extract_json('<think>sem fechar {"queries": ["a"]}') == {"queries": ["a"]}
+
+
+def test_unclosed_brace_in_prose():
+    content = 'Formato {"queries": [...] e a resposta:\n{"queries": ["a"]}'
+    assert extract_json(content, _valid_query) == {"queries": ["a"]}
+
+
+def test_first_object_valid_for_schema():
+    content = 'Exemplo: {"title": "x"}. Resposta: {"queries": ["a", "b"]}'
+    assert extract_json(content) == {"title": "x"}
+    assert extract_json(content, _valid_query) == {"queries": ["a", "b"]}
+    # Objeto interno válido quando o externo não é
+    assert extract_json('{"data": {"queries": ["a"]}}', _valid_query) == {"queries": ["a"]}
+
+
+def test_scanner_spans_across_chunks():
+    scanner = JsonScanner()
+    assert scanner.feed('texto {"a": "\\') == []
+    assert scanner.feed('"}", "b": {') == []
+    assert scanner.depth == 2
+    assert scanner.feed('}}') == [(24, 26, 1), (6, 27, 0)]
+    assert json.loads(scanner.get(6, 27)) == {"a": '"}', "b": {}}
+
+
+def test_streaming_stops_at_first_valid_object():
+    content = '<think>{"queries": ["rascunho"]}</think> {"queries": ["a"]} texto que não precisa chegar'
+    extractor = StreamingJsonExtractor(_valid_query)
+    tokens = content.split(" ")
+    for i, token in enumerate(tokens):
+        found = extractor.feed(token + " ")
+        if found is not None:
+            break
+    assert found == {"queries": ["a"]}
+    assert i == 3
+
+
+def test_streaming_without_validation_waits_for_outer_object():
+    extractor = StreamingJsonExtractor()
+    assert extractor.feed('{"outer": {"inner": 1}') is None
+    assert extractor.feed(', "x": 2}') == {"outer": {"inner": 1}, "x": 2}
+
+
+@pytest.mark.parametrize("size", [1, 2, 5, 200])
+def test_array_items_are_released_as_strings_close(size):
+    content = '<think>{"queries": ["rascunho"]}</think> {"queries": ["a \\"b\\"", "c, ]",\n "d"], "x": ["e"]}'
+    items = StreamingArrayItems("queries")
+    released = []
+    for position in range(0, len(content), size):
+        released += [(item, position) for item in items.feed(content[position:position + size])]
+
+    assert [item for item, _ in released] == ['a "b"', "c, ]", "d"]
+    assert items.done
+    if size == 1:
+        # Cada item sai no token que fecha as aspas, antes do fim do objeto
+        assert [position for _, position in released] == [content.index(end) + len(end) - 1 for end in ('\\"b\\""', ' ]"', '"d"')]
+
+
+def test_array_items_stop_at_non_string():
+    items = StreamingArrayItems("queries")
+    assert items.feed('{"queries": ["a", {"b": 1}, "c"]}') == ["a"]
+    assert items.done
+
+
+def _random_text(rng: random.Random) -> str:
+    return "".join(rng.choice(_TRICKY + ["palavra ", "  ", "{x", "y}"]) for _ in range(rng.randint(0, 12)))
+
+
+def _random_value(rng: random.Random, depth: int = 0):
+    kind = rng.randint(0, 4 if depth < 3 else 2)
+    if kind == 0:
+        return "".join(rng.choice(_TRICKY + ["abc"]) for _ in range(rng.randint(0, 5)))
+    if kind == 1:
+        return rng.randint(-5, 5)
+    if kind == 2:
+        return rng.choice([True, None, 1.5])
+    if kind == 3:
+        return [_random_value(rng, depth + 1) for _ in range(rng.randint(0, 3))]
+    return {f"k{i}{rng.choice(_TRICKY)}": _random_value(rng, depth + 1) for i in range(rng.randint(0, 3))}
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_fuzz_adversarial_outputs(seed):
+    rng = random.Random(seed)
+    target = {"target": seed, "payload": _random_value(rng)}
+    encoded = json.dumps(target, ensure_ascii=rng.random() < 0.5, indent=rng.choice([None, 2]))
+    decoy = json.dumps({"decoy": _random_value(rng)})
+    content = (
+        f"<think>{_random_text(rng).replace('</think>', '')} {decoy}</think>"
+        f"{_random_text(rng)} {decoy} {encoded} {_random_text(rng)}"
+    )
+
+    def validate(value: dict) -> bool:
+        return "target" in value
+
+    assert extract_json(content, validate) == target
+
+    extractor = StreamingJsonExtractor(validate)
+    position, found = 0, None
+    while found is None and position < len(content):
+        size = rng.randint(1, 8)
+        found = extractor.feed(content[position:position + size])
+        position += size
+    if found is None:
+        # '{"' solto antes da resposta: o cliente ainda extrai do texto completo
+        assert extract_json(extractor.content, validate) == target
+    else:
+        assert found == target
+        # O stream para logo depois do objeto, sem ler o texto seguinte inteiro
+        assert position < content.index(encoded) + len(encoded) + 8
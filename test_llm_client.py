@@ -0,0 +1,310 @@
+"""
+Testes do AzureFoundryLocalLLM contra um servidor Foundry local simulado
+"""
+
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from cache import LLMResponseCache
+from llm_client import AzureFoundryLocalLLM, _response_format, response_format_supported
+from scheduler import ModelScheduler
+from schemas import QueryResult
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """Handler OpenAI-compatível mínimo para /v1/chat/completions"""
+
+    protocol_version = "HTTP/1.1"
+    active = 0
+    peak = 0
+    lock = threading.Lock()
+    payloads = []
+    reject_response_format = False
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length))
+        _StubHandler.payloads.append(payload)
+        prompt = payload["messages"][-1]["content"]
+        if "response_format" in payload and _StubHandler.reject_response_format:
+            body = b'{"error": {"message": "Unsupported parameter: response_format"}}'
+            self.send_response(400)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        if prompt.startswith("slow:"):
+            # Simular geração lenta e medir chamadas simultâneas
+            with _StubHandler.lock:
+                _StubHandler.active += 1
+                _StubHandler.peak = max(_StubHandler.peak, _StubHandler.active)
+            time.sleep(0.05)
+            with _StubHandler.lock:
+                _StubHandler.active -= 1
+        if prompt.startswith("json:"):
+            content = json.dumps({"title": prompt[5:25].split("\n")[0], "url": "https://example.com"})
+        elif prompt.startswith("broken:"):
+            # JSON cortado; o pedido de correção recebe um objeto válido
+            content = '<think>rascunho</think> {"title": "quebrado", "url": '
+        elif "Broken JSON:" in prompt:
+            content = json.dumps({"title": "corrigido", "url": "https://example.com"})
+        elif prompt.startswith("think:"):
+            # Raciocínio com JSON de rascunho, a resposta e texto depois dela
+            content = '<think> {"title": "rascunho"} </think> {"title": "final"} ' + "depois " * 200
+        else:
+            content = f"echo: {prompt[:20]}"
+        if payload.get("stream"):
+            events = [
+                json.dumps({"choices": [{"delta": {"content": word}}]})
+                for word in content.split(" ")
+            ]
+            body = "".join(f"data: {event}\n\n" for event in events + ["[DONE]"]).encode()
+            content_type = "text/event-stream"
+        else:
+            body = json.dumps({
+                "choices": [{"message": {"role": "assistant", "content": content}}]
+            }).encode()
+            content_type = "application/json"
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stub_endpoint():
+    """Subir servidor stub em porta livre e retornar sua URL"""
+    _StubHandler.payloads = []
+    _StubHandler.reject_response_format = False
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_pool_reuses_connections(stub_endpoint):
+    """Chamadas sequenciais devem reutilizar a mesma conexão keep-alive"""
+    llm = AzureFoundryLocalLLM(model="stub", endpoint=stub_endpoint)
+    for i in range(5):
+        assert llm.invoke(f"pergunta {i}").content.startswith("echo:")
+
+    stats = llm.pool_stats()
+    assert stats["requests"] == 5
+    assert stats["new_connections"] == 1
+    assert stats["reused_connections"] == 4
+    llm.close()
+
+
+def test_pool_without_keep_alive(stub_endpoint):
+    """Com keep_alive=False cada chamada abre uma conexão nova"""
+    llm = AzureFoundryLocalLLM(model="stub", endpoint=stub_endpoint, keep_alive=False)
+    for i in range(3):
+        llm.invoke(f"pergunta {i}")
+
+    stats = llm.pool_stats()
+    assert stats["new_connections"] == 3
+    assert stats["reused_connections"] == 0
+    llm.close()
+
+
+def test_pool_is_thread_safe(stub_endpoint):
+    """Threads concorrentes compartilham o pool sem exceder pool_maxsize"""
+    llm = AzureFoundryLocalLLM(model="stub", endpoint=stub_endpoint, pool_maxsize=2, pool_block=True)
+    with ThreadPoolExecutor(max_workers=6) as executor:
+        responses = list(executor.map(lambda i: llm.invoke(f"q{i}"), range(24)))
+
+    assert all(r.content.startswith("echo:") for r in responses)
+    stats = llm.pool_stats()
+    assert stats["requests"] == 24
+    assert stats["new_connections"] <= 2
+    llm.close()
+
+
+def test_ainvoke_concurrent(stub_endpoint):
+    """ainvoke e ainvoke_structured rodam concorrentes num único event loop"""
+    llm = AzureFoundryLocalLLM(model="stub", endpoint=stub_endpoint)
+
+    async def run():
+        responses = await asyncio.gather(*(llm.ainvoke(f"q{i}") for i in range(10)))
+        with pytest.raises(ValueError):
+            await llm.with_structured_output(QueryResult).ainvoke("sem json")
+        await llm.aclose()
+        return responses
+
+    responses = asyncio.run(run())
+    assert [r.content for r in responses] == [f"echo: q{i}" for i in range(10)]
+
+
+def test_async_client_per_event_loop(stub_endpoint):
+    """Cada event loop tem o seu cliente e os de loops encerrados são descartados"""
+    llm = AzureFoundryLocalLLM(model="stub", endpoint=stub_endpoint)
+
+    assert asyncio.run(llm.ainvoke("a")).content == "echo: a"
+    first = next(iter(llm._async_clients.values()))
+    assert asyncio.run(llm.ainvoke("b")).content == "echo: b"
+    # O cliente do primeiro asyncio.run foi descartado ao criar o do segundo
+    assert len(llm._async_clients) == 1 and first not in llm._async_clients.values()
+
+    barrier = threading.Barrier(2)
+
+    async def run(prompt: str) -> tuple[str, object]:
+        await llm.ainvoke(prompt)
+        client = llm._get_async_client()
+        # Os dois loops ficam vivos ao mesmo tempo: nenhum troca o cliente do outro
+        await asyncio.to_thread(barrier.wait, 5)
+        response = await llm.ainvoke(prompt)
+        assert llm._get_async_client() is client
+        await llm.aclose()
+        return response.content, client
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        results = list(pool.map(lambda prompt: asyncio.run(run(prompt)), ["x", "y"]))
+    assert [content for content, _ in results] == ["echo: x", "echo: y"]
+    assert results[0][1] is not results[1][1]
+    llm.close()
+    assert llm._async_clients == {}
+
+
+def test_stream_tokens(stub_endpoint):
+    """stream e astream devolvem os deltas SSE em ordem"""
+    llm = AzureFoundryLocalLLM(model="stub", endpoint=stub_endpoint)
+    assert list(llm.stream("olá mundo")) == ["echo:", "olá", "mundo"]
+
+    async def collect():
+        tokens = [token async for token in llm.astream("olá mundo")]
+        await llm.aclose()
+        return tokens
+
+    assert asyncio.run(collect()) == ["echo:", "olá", "mundo"]
+    llm.close()
+
+
+def test_cache_skips_http(stub_endpoint):
+    """Chamadas repetidas com cache não chegam ao servidor"""
+    llm = AzureFoundryLocalLLM(model="stub", endpoint=stub_endpoint, cache=LLMResponseCache())
+    first = llm.invoke("mesma pergunta").content
+    assert llm.invoke("mesma pergunta").content == first
+    assert "".join(llm.stream("mesma pergunta")) == first
+    assert llm.pool_stats()["requests"] == 1
+
+    stats = llm.cache.stats()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 1
+    llm.close()
+
+
+def test_cache_structured_output(stub_endpoint):
+    """Respostas estruturadas ficam no cache como JSON validado"""
+    llm = AzureFoundryLocalLLM(model="stub", endpoint=stub_endpoint, cache=LLMResponseCache())
+    first = llm.invoke_structured("json:titulo", QueryResult)
+    second = llm.invoke_structured("json:titulo", QueryResult)
+
+    assert second == first
+    assert second.title == "titulo"
+    assert llm.pool_stats()["requests"] == 1
+    llm.close()
+
+
+def test_scheduler_caps_in_flight_requests(stub_endpoint):
+    """Com escalonador, o servidor nunca vê mais chamadas que o limite do modelo"""
+    _StubHandler.peak = 0
+    scheduler = ModelScheduler(limits={"stub": 2})
+    llm = AzureFoundryLocalLLM(model="stub", endpoint=stub_endpoint, scheduler=scheduler)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda i: llm.invoke(f"slow:{i}"), range(8)))
+
+    assert _StubHandler.peak == 2
+    assert scheduler.stats()["stub"]["granted"] == 8
+    llm.close()
+
+
+def test_structured_streaming_stops_after_object(stub_endpoint):
+    """Com structured_streaming, a leitura termina no primeiro objeto válido após o raciocínio"""
+    llm = AzureFoundryLocalLLM(model="stub", endpoint=stub_endpoint, structured_streaming=True)
+    assert llm.invoke_structured("think:", QueryResult).title == "final"
+    assert llm.token_usage()["completion_tokens"] == 6
+
+    async def run():
+        result = await llm.ainvoke_structured("think:", QueryResult)
+        await llm.aclose()
+        return result
+
+    assert asyncio.run(run()).title == "final"
+    assert llm.token_usage()["completion_tokens"] == 12
+    with pytest.raises(ValueError):
+        llm.invoke_structured("sem json", QueryResult)
+    llm.close()
+
+
+def test_response_format_sends_cached_schema(stub_endpoint):
+    """O JSON schema vai em response_format e é serializado uma vez por classe"""
+    llm = AzureFoundryLocalLLM(model="stub", endpoint=stub_endpoint)
+    llm.invoke_structured("json:a", QueryResult)
+    llm.invoke_structured("json:b", QueryResult)
+
+    formats = [payload["response_format"] for payload in _StubHandler.payloads]
+    assert formats[0]["json_schema"]["schema"] == QueryResult.model_json_schema()
+    assert _response_format(QueryResult) is _response_format(QueryResult)
+    assert response_format_supported(stub_endpoint) is True
+    assert llm.structured_stats()["json_schema"]["calls"] == 2
+    llm.close()
+
+
+def test_response_format_rejection_is_detected_once(stub_endpoint):
+    """Servidor sem response_format: refaz sem o parâmetro e não tenta de novo no endpoint"""
+    _StubHandler.reject_response_format = True
+    llm = AzureFoundryLocalLLM(model="stub", endpoint=stub_endpoint)
+    assert llm.invoke_structured("json:a", QueryResult).title == "a"
+    assert response_format_supported(stub_endpoint) is False
+
+    other = AzureFoundryLocalLLM(model="outro", endpoint=stub_endpoint)
+    assert other.invoke_structured("json:b", QueryResult).title == "b"
+    assert ["response_format" in payload for payload in _StubHandler.payloads] == [True, False, False]
+    assert llm.structured_stats()["prompt"]["calls"] == 1
+    llm.close()
+    other.close()
+
+
+def test_repair_resends_only_broken_fragment(stub_endpoint):
+    """JSON inválido gera um pedido de correção com o trecho quebrado, não o prompt original"""
+    llm = AzureFoundryLocalLLM(model="stub", endpoint=stub_endpoint, structured_output_mode="prompt")
+    assert llm.invoke_structured("broken: prompt original longo", QueryResult).title == "corrigido"
+
+    repair = _StubHandler.payloads[-1]["messages"][-1]["content"]
+    assert '{"title": "quebrado", "url":' in repair
+    assert "prompt original" not in repair and "rascunho" not in repair
+    stats = llm.structured_stats()["prompt"]
+    assert stats["calls"] == 1 and stats["repairs"] == 1 and stats["retry_rate"] == 1.0
+
+    async def run():
+        result = await llm.ainvoke_structured("broken: outra", QueryResult)
+        await llm.aclose()
+        return result
+
+    assert asyncio.run(run()).title == "corrigido"
+    assert llm.structured_stats()["prompt"]["repairs"] == 2
+    llm.close()
+
+
+def test_repair_attempts_are_bounded(stub_endpoint):
+    """Sem correção possível, a chamada falha após repair_attempts pedidos"""
+    _StubHandler.payloads = []
+    llm = AzureFoundryLocalLLM(model="stub", endpoint=stub_endpoint, structured_output_mode="prompt", repair_attempts=0)
+    with pytest.raises(ValueError):
+        llm.invoke_structured("broken: x", QueryResult)
+    assert len(_StubHandler.payloads) == 1
+    assert llm.structured_stats()["prompt"]["failures"] == 1
+    llm.close()
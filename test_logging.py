@@ -0,0 +1,111 @@
+"""
+Testes do logging em fila (formatação adiada, lotes, JSON lines e rotação)
+"""
+
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+
+import pytest
+
+from log_pipeline import BatchWriter, DeferredQueueHandler, JsonFormatter
+
+
+class _Formatted:
+    """Registra em qual thread a mensagem foi montada"""
+
+    def __init__(self):
+        self.threads = []
+
+    def __str__(self) -> str:
+        self.threads.append(threading.current_thread().name)
+        return "payload"
+
+
+@pytest.fixture
+def pipeline(tmp_path):
+    """Logger ligado a uma fila própria; devolve (logger, writer, caminho)"""
+    path = tmp_path / "app.log"
+    handler = logging.handlers.RotatingFileHandler(path, maxBytes=0, encoding="utf-8", delay=True)
+    handler.setFormatter(logging.Formatter("%(levelname)s %(message)s"))
+    log_queue = queue.SimpleQueue()
+    writer = BatchWriter(log_queue, [handler], batch_size=16)
+    writer.start()
+
+    logger = logging.getLogger(f"test_logging.{tmp_path.name}")
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    logger.addHandler(DeferredQueueHandler(log_queue))
+    yield logger, writer, path
+    writer.stop()
+    logger.handlers.clear()
+
+
+def test_records_are_written_in_order(pipeline):
+    logger, writer, path = pipeline
+    for i in range(100):
+        logger.info("linha %d", i)
+    writer.stop()
+
+    lines = path.read_text(encoding="utf-8").splitlines()
+    assert lines == [f"INFO linha {i}" for i in range(100)]
+
+
+def test_message_is_formatted_by_writer_thread(pipeline):
+    logger, writer, path = pipeline
+    payload = _Formatted()
+    logger.debug("valor: %s", payload)
+    writer.stop()
+
+    # Outros handlers do processo (ex: captura do pytest) podem formatar de novo
+    assert "log-writer" in payload.threads
+    assert path.read_text(encoding="utf-8") == "DEBUG valor: payload\n"
+
+
+def test_queue_handler_keeps_arguments():
+    record = logging.LogRecord("x", logging.INFO, __file__, 1, "valor: %s", (_Formatted(),), None)
+    prepared = DeferredQueueHandler(queue.SimpleQueue()).prepare(record)
+    assert prepared is record and prepared.args[0].threads == []
+
+
+def test_disabled_level_is_never_formatted(pipeline):
+    logger, writer, path = pipeline
+    logger.setLevel(logging.INFO)
+    payload = _Formatted()
+    logger.debug("valor: %s", payload)
+    writer.stop()
+
+    assert payload.threads == []
+    assert not path.exists()
+
+
+def test_json_lines_with_exception(tmp_path):
+    record = logging.LogRecord("llm_client", logging.ERROR, __file__, 1, "falha em %s", ("modelo",), None)
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        import sys
+        record.exc_info = sys.exc_info()
+
+    data = json.loads(JsonFormatter().format(record))
+    assert data["level"] == "ERROR" and data["logger"] == "llm_client"
+    assert data["message"] == "falha em modelo"
+    assert "ValueError: boom" in data["exception"]
+
+
+def test_file_rotates_by_size(tmp_path):
+    path = tmp_path / "app.log"
+    handler = logging.handlers.RotatingFileHandler(path, maxBytes=200, backupCount=2, encoding="utf-8", delay=True)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    writer = BatchWriter(queue.SimpleQueue(), [handler])
+
+    records = [logging.LogRecord("x", logging.INFO, __file__, 1, "%03d " + "x" * 45, (i,), None) for i in range(12)]
+    writer.write(records)
+    handler.close()
+
+    files = sorted(p.name for p in tmp_path.iterdir())
+    assert files == ["app.log", "app.log.1", "app.log.2"]
+    assert all(p.stat().st_size <= 200 for p in tmp_path.iterdir())
+    assert path.read_text(encoding="utf-8").splitlines()[-1].startswith("011")
@@ -217,28 +217,5 @@ def main() -> int:
         return 1
 
 
-if __name__ == "__main__":
-    sys.exit(main())
-    print("\n" + "=" * 60)
-    print("📋 RESUMO DOS TESTES")
-    print("=" * 60)
-    
-    for test_name, passed in results.items():
-        status = "✅ PASSOU" if passed else "❌ FALHOU"
-        print(f"{test_name}: {status}")
-    
-    total_passed = sum(results.values())
-    total_tests = len(results)
-    
-    print(f"\nTotal: {total_passed}/{total_tests} testes passaram")
-    
-    if total_passed == total_tests:
-        print("\n🎉 MIGRAÇÃO BEM-SUCEDIDA! Todos os testes passaram!")
-        return 0
-    else:
-        print("\n⚠️  Alguns testes falharam. Verifique os erros acima.")
-        return 1
-
-
 if __name__ == "__main__":
     sys.exit(main())
@@ -0,0 +1,115 @@
+"""
+Testes do prefetch das buscas durante a geração das queries (Foundry e Tavily falsos)
+"""
+
+import asyncio
+import json
+import time
+
+import pytest
+
+import perplexity
+from benchmarks.fake_foundry import FakeFoundryConfig, FakeFoundryServer
+from benchmarks.fake_tavily import FakeTavilyClient
+from llm_client import AzureFoundryLocalLLM
+from run_context import get_run_context, release_run_context
+from schemas import ReportState, SearchTask
+from utils import CachedTavilyClient
+
+QUESTION = "How are LLMs trained?"
+
+
+class _DuplicateServer(FakeFoundryServer):
+    """Gera a mesma query duas vezes (com espaços e maiúsculas diferentes)"""
+
+    def respond(self, prompt: str) -> str:
+        if '"queries"' in prompt:
+            return json.dumps({"queries": ["LLM training data", "llm  training DATA", "tokenizers"]})
+        return super().respond(prompt)
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    """Foundry lento (30 tokens/s) e Tavily falso; devolve start(server_cls) -> FakeTavilyClient"""
+    servers = []
+
+    def start(server_cls=FakeFoundryServer) -> FakeTavilyClient:
+        server = server_cls(FakeFoundryConfig(latency=0.0, tokens_per_second=30, completion_tokens=5)).start()
+        servers.append(server)
+        tavily = FakeTavilyClient(search_latency=0.01, extract_latency=0.01)
+        monkeypatch.setattr(perplexity, "llm", AzureFoundryLocalLLM(model="fake", endpoint=server.url))
+        monkeypatch.setattr(perplexity, "_tavily", CachedTavilyClient(tavily, db_path=None))
+        monkeypatch.setattr(perplexity, "SUMMARY_MODE", "extractive")
+        return tavily
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+def _tasks(output: dict) -> list[SearchTask]:
+    return [SearchTask(query=query, request_id=output["request_id"], user_input=QUESTION) for query in output["queries"]]
+
+
+def test_searches_start_while_queries_are_generated(pipeline):
+    tavily = pipeline()
+    output = perplexity.build_first_queries(ReportState(user_input=QUESTION, request_id="test-prefetch"))
+    generated = time.perf_counter()
+
+    assert len(output["queries"]) == 3
+    # A primeira query fecha bem antes das outras duas serem geradas
+    assert tavily.first_search(QUESTION) < generated - 0.2
+    assert output["metrics"] == {"prefetched_queries": 3, "prefetch_discarded": 0}
+
+    results = [perplexity.single_search(task) for task in _tasks(output)]
+    assert all(result["queries_results"] for result in results)
+    # Os ramos usam as buscas e extrações já disparadas
+    assert tavily.stats()["search_calls"] == 3
+    release_run_context("test-prefetch")
+
+
+def test_duplicate_queries_share_one_search(pipeline):
+    tavily = pipeline(_DuplicateServer)
+
+    async def run() -> list[dict]:
+        output = await perplexity.abuild_first_queries(ReportState(user_input=QUESTION, request_id="test-prefetch-dup"))
+        return await asyncio.gather(*(perplexity.asingle_search(task) for task in _tasks(output)))
+
+    results = asyncio.run(run())
+    # A query repetida reaproveita a busca e o UrlRegistry descarta as URLs já resumidas
+    assert [len(result["queries_results"]) > 0 for result in results] == [True, False, True]
+    assert results[1]["metrics"]["duplicate_urls"] > 0
+    assert tavily.stats()["search_calls"] == 2
+    assert get_run_context("test-prefetch-dup").prefetch.duplicates == 1
+    release_run_context("test-prefetch-dup")
+
+
+def test_cancelled_generation_discards_prefetch(pipeline):
+    tavily = pipeline()
+
+    async def run() -> None:
+        task = asyncio.create_task(perplexity.abuild_first_queries(ReportState(user_input=QUESTION, request_id="test-prefetch-cancel")))
+        deadline = time.monotonic() + 5
+        while tavily.first_search(QUESTION) is None and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    prefetch = get_run_context("test-prefetch-cancel").prefetch
+    assert prefetch.cancelled and len(prefetch) == 0
+    assert not prefetch.submit("late query")
+    assert tavily.stats()["search_calls"] < 3
+    release_run_context("test-prefetch-cancel")
+
+
+def test_prefetch_disabled(pipeline, monkeypatch):
+    tavily = pipeline()
+    monkeypatch.setattr(perplexity, "QUERY_PREFETCH_ENABLED", False)
+    output = perplexity.build_first_queries(ReportState(user_input=QUESTION, request_id="test-no-prefetch"))
+
+    assert "metrics" not in output and tavily.stats()["search_calls"] == 0
+    perplexity.single_search(_tasks(output)[0])
+    assert tavily.stats()["search_calls"] == 1
+    release_run_context("test-no-prefetch")
@@ -0,0 +1,76 @@
+"""
+Testes da seleção de trechos por BM25
+"""
+
+import numpy as np
+
+from ranking import bm25_scores, extractive_summary, select_relevant, split_chunks
+
+NAVIGATION = "\n".join(f"Menu item {i}\nHome | Products | Pricing | Login" for i in range(80))
+RELEVANT = (
+    "Pretraining a large language model uses next-token prediction over a tokenized corpus. "
+    "The transformer is trained with gradient descent on billions of tokens."
+)
+FOOTER = "\n".join(f"Copyright notice {i}. All rights reserved. Cookie policy." for i in range(60))
+PAGE = f"{NAVIGATION}\n\n{RELEVANT}\n\n{FOOTER}"
+QUERIES = ["How is the process of building a LLM?", "large language model pretraining tokens"]
+
+
+def test_relevant_passage_survives_budget():
+    """O trecho relevante no meio da página é mantido dentro do orçamento"""
+    assert RELEVANT not in PAGE[:1000]
+
+    selected = select_relevant(PAGE, QUERIES, budget=1000)
+
+    assert RELEVANT in selected
+    assert len(selected) <= 1000
+    assert "Menu item 0" not in selected
+
+
+def test_short_or_unrelated_text_keeps_prefix():
+    """Texto dentro do orçamento fica intacto; sem termos em comum, vale o prefixo"""
+    assert select_relevant("short text", QUERIES, budget=100) == "short text"
+    assert select_relevant(NAVIGATION, ["quantum chromodynamics"], budget=300) == NAVIGATION[:300]
+
+
+def test_token_budget():
+    """Orçamento medido por uma função de tamanho arbitrária (ex: tokens)"""
+    words = lambda text: len(text.split())
+    selected = select_relevant(PAGE, QUERIES, budget=60, length=words)
+
+    assert RELEVANT in selected
+    assert words(selected) <= 60
+
+
+def test_bm25_prefers_rare_query_terms():
+    """Chunks com mais termos raros da query pontuam mais"""
+    chunks = ["tokens tokens model", "model model model", "unrelated text here"]
+    scores = bm25_scores(chunks, ["tokens model"])
+
+    assert scores.argmax() == 0
+    assert scores[2] == 0
+    assert np.all(bm25_scores(chunks, ["the of"]) == 0)
+
+
+def test_split_chunks_respects_size():
+    """Chunks nunca passam de chunk_chars e preservam o texto"""
+    chunks = split_chunks(PAGE, chunk_chars=200)
+
+    assert all(len(chunk) <= 200 for chunk in chunks)
+    assert "".join(chunks).replace("\n", "").replace(" ", "") == PAGE.replace("\n", "").replace(" ", "")
+
+
+def test_extractive_summary_picks_relevant_sentences():
+    """O resumo extrativo traz as frases da query, em ordem, com cobertura alta"""
+    summary, coverage = extractive_summary(PAGE, ["large language model pretraining tokens"], max_sentences=2)
+
+    assert summary == RELEVANT
+    assert coverage == 1.0
+
+
+def test_extractive_summary_low_coverage():
+    """Página sem relação com a query tem cobertura baixa (modo hybrid chama o LLM)"""
+    summary, coverage = extractive_summary(FOOTER, QUERIES)
+
+    assert summary == ""
+    assert coverage == 0.0
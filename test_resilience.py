@@ -0,0 +1,168 @@
+"""
+Testes de retry, hedge e circuit breaker contra o Foundry falso com falhas roteirizadas
+"""
+
+import asyncio
+import random
+import threading
+import time
+
+import pytest
+
+from benchmarks.fake_foundry import FakeFoundryConfig, FakeFoundryServer
+from llm_client import AzureFoundryLocalLLM
+from resilience import CircuitBreaker, CircuitOpenError, Resilience, RetryPolicy
+from scheduler import ModelScheduler
+
+
+def _server(*faults: str, slow_latency: float = 1.0) -> FakeFoundryServer:
+    config = FakeFoundryConfig(
+        latency=0.0, tokens_per_second=10_000, completion_tokens=5,
+        faults=list(faults), slow_latency=slow_latency
+    )
+    return FakeFoundryServer(config)
+
+
+def _client(server: FakeFoundryServer, **kwargs) -> AzureFoundryLocalLLM:
+    kwargs.setdefault("retry", RetryPolicy(attempts=3, base_delay=0.01))
+    return AzureFoundryLocalLLM(model="fake", endpoint=server.url, resilience=Resilience(**kwargs))
+
+
+def _requests(server: FakeFoundryServer) -> int:
+    return server.stats()["requests_by_model"].get("fake", 0)
+
+
+def test_retry_delay_is_jittered_and_capped():
+    policy = RetryPolicy(attempts=5, base_delay=1.0, max_delay=3.0, rng=random.Random(0))
+    delays = [policy.delay(retry) for retry in range(1, 6) for _ in range(50)]
+    assert all(0 <= delay <= 3.0 for delay in delays)
+    assert len(set(delays)) > 1
+
+
+def test_invoke_retries_transient_failures():
+    with _server("503", "reset") as server:
+        llm = _client(server)
+        assert llm.invoke("hello").content
+        assert _requests(server) == 3
+        assert llm.resilience.stats()["retries"] == 2
+
+
+def test_client_error_is_not_retried():
+    with _server("400") as server:
+        llm = _client(server)
+        with pytest.raises(Exception):
+            llm.invoke("hello")
+        assert _requests(server) == 1
+
+
+def test_circuit_breaker_fails_fast_and_recovers():
+    breaker = CircuitBreaker("fake", failure_threshold=2, reset_timeout=0.2)
+    with _server("500", "500") as server:
+        llm = _client(server, retry=RetryPolicy(attempts=1), breaker=breaker)
+        for _ in range(2):
+            with pytest.raises(Exception):
+                llm.invoke("hello")
+        assert breaker.state == CircuitBreaker.OPEN
+
+        with pytest.raises(CircuitOpenError):
+            llm.invoke("hello")
+        assert _requests(server) == 2
+
+        time.sleep(0.25)
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        assert llm.invoke("hello").content
+        assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_hedged_request_wins_over_slow_call():
+    with _server(slow_latency=3.0) as server:
+        llm = _client(server, hedge=True, hedge_percentile=50, hedge_min_samples=1, hedge_min_delay=0.05)
+        llm.invoke("warm up")
+        server.config.faults.append("slow")
+
+        started = time.perf_counter()
+        assert llm.invoke("hello").content
+        assert time.perf_counter() - started < 1.5
+        stats = llm.resilience.stats()
+        assert stats["hedged"] == 1 and stats["hedge_wins"] == 1
+
+
+def _hedging_client(server: FakeFoundryServer, limit: int) -> AzureFoundryLocalLLM:
+    llm = _client(server, hedge=True, hedge_percentile=50, hedge_min_samples=1, hedge_min_delay=0.05)
+    llm.scheduler = ModelScheduler({"fake": limit})
+    llm.invoke("warm up")
+    return llm
+
+
+def _wait_for(condition, timeout: float = 1.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_hedge_is_skipped_when_model_allows_one_call():
+    with _server(slow_latency=0.5) as server:
+        llm = _hedging_client(server, limit=1)
+        server.config.faults.append("slow")
+        assert llm.invoke("hello").content
+
+        stats = llm.resilience.stats()
+        assert stats["hedged"] == 0 and stats["hedge_skipped"] == 1
+        assert _requests(server) == 2
+        assert llm.scheduler.in_flight("fake") == 0
+
+
+def test_hedge_takes_extra_slot_and_aborts_loser():
+    with _server(slow_latency=3.0) as server:
+        llm = _hedging_client(server, limit=2)
+        connections = llm.pool_stats()["new_connections"]
+        server.config.faults.append("slow")
+
+        # A cópia vence: a original (conexão do pool) é derrubada em vez de esperar os 3s
+        started = time.perf_counter()
+        assert llm.invoke("hello").content
+        assert time.perf_counter() - started < 1.5
+        assert _wait_for(lambda: llm.resilience.stats()["hedge_aborted"] == 1)
+        assert llm.resilience.stats()["hedge_wins"] == 1
+        assert _wait_for(lambda: llm.scheduler.in_flight("fake") == 0)
+
+        # Chamadas que não precisam de hedge continuam no pool
+        for i in range(3):
+            llm.invoke(f"fast {i}")
+        assert llm.pool_stats()["new_connections"] == connections + 1
+
+
+def test_hedge_threshold_ignores_scheduler_queue():
+    with _server() as server:
+        llm = _client(server, hedge=True, hedge_min_samples=1)
+        llm.scheduler = ModelScheduler({"fake": 1})
+        with llm.scheduler.slot("fake"):
+            thread = threading.Thread(target=llm.invoke, args=("queued",))
+            thread.start()
+            time.sleep(0.3)
+        thread.join()
+        assert llm.resilience.latency.percentile(50) < 0.1
+
+
+def test_stream_retries_before_first_token():
+    with _server("reset") as server:
+        llm = _client(server)
+        assert "".join(llm.stream("hello"))
+        assert _requests(server) == 2
+
+
+def test_async_invoke_and_stream_retry():
+    async def run() -> tuple[str, str]:
+        llm = _client(server)
+        try:
+            response = await llm.ainvoke("hello")
+            tokens = [token async for token in llm.astream("hello again")]
+            return response.content, "".join(tokens)
+        finally:
+            await llm.aclose()
+
+    with _server("503", "502") as server:
+        content, streamed = asyncio.run(run())
+        assert content and streamed
+        assert _requests(server) == 4
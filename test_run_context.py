@@ -0,0 +1,79 @@
+"""
+Testes da deduplicação de URLs entre ramos de uma execução e do prefetch das buscas
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from run_context import QueryPrefetch, get_run_context, release_run_context
+from schemas import QueryResult, merge_results_by_url, sum_metrics
+
+
+def test_first_claim_wins_and_others_reuse():
+    """Só o primeiro ramo processa a URL; os outros recebem o mesmo resultado"""
+    registry = get_run_context("req-1").urls
+    processed = []
+
+    def branch(i):
+        claimed, future = registry.claim("https://example.com")
+        if claimed:
+            processed.append(i)
+            registry.resolve("https://example.com", QueryResult(url="https://example.com", resume="r"))
+        return future.result(timeout=5)
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(branch, range(4)))
+
+    assert len(processed) == 1
+    assert all(result.resume == "r" for result in results)
+    release_run_context("req-1")
+    assert get_run_context("req-1").urls is not registry
+
+
+def test_reducer_merges_by_url():
+    """queries_results mantém um resultado por URL; metrics são somadas"""
+    merged = merge_results_by_url(
+        [QueryResult(url="a", resume="1")],
+        [QueryResult(url="a", resume="2"), QueryResult(url="b", resume="3")]
+    )
+    assert [(r.url, r.resume) for r in merged] == [("a", "1"), ("b", "3")]
+
+    assert sum_metrics({"llm_calls_saved": 1}, {"llm_calls_saved": 2, "duplicate_urls": 2}) == {
+        "llm_calls_saved": 3, "duplicate_urls": 2
+    }
+
+
+def test_prefetch_dedupes_and_discards_queries():
+    """Queries repetidas compartilham a busca; as que saem da lista final são canceladas"""
+    release = threading.Event()
+    searched = []
+
+    def search(query: str) -> str:
+        release.wait(5)
+        searched.append(query)
+        return f"results for {query}"
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        prefetch = QueryPrefetch(lambda query: pool.submit(search, query))
+        assert prefetch.submit("LLM training")
+        assert not prefetch.submit("  llm   Training ")
+        assert prefetch.submit("draft query")   # Espera na fila do pool
+        assert prefetch.get("llm training") is prefetch.get("LLM training")
+
+        assert prefetch.keep(["LLM training", "tokenizers"]) == 1
+        assert prefetch.get("draft query") is None and not prefetch.wanted("draft query")
+        release.set()
+        assert prefetch.get("tokenizers").result() == "results for tokenizers"
+
+    assert sorted(searched) == ["LLM training", "tokenizers"]
+    assert prefetch.duplicates == 1 and prefetch.discarded == 1
+    assert prefetch.time_to_first_search() is not None
+
+
+def test_prefetch_cancel_stops_new_searches():
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        prefetch = QueryPrefetch(lambda query: pool.submit(str.upper, query))
+        prefetch.submit("a")
+        prefetch.cancel()
+        assert not prefetch.submit("b")
+        assert prefetch.get("a") is None and len(prefetch) == 0
@@ -0,0 +1,94 @@
+"""
+Testes do ModelScheduler (limite por modelo, prioridade e justiça entre sessões)
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from scheduler import ModelScheduler, Priority, SchedulerQueueFull, scheduling_context
+
+
+def _queue_in_order(scheduler, callers):
+    """Enfileirar chamadores (sessão, interativo, prioridade) com o modelo ocupado
+    e devolver a ordem em que recebem a vaga"""
+    order = []
+    scheduler.acquire("m")
+    threads = []
+    for name, session, interactive, priority in callers:
+        def run(name=name, session=session, interactive=interactive, priority=priority):
+            with scheduling_context(session, interactive):
+                with scheduler.slot("m", priority):
+                    order.append(name)
+        thread = threading.Thread(target=run)
+        thread.start()
+        threads.append(thread)
+        while scheduler.queue_depth("m") < len(threads):
+            time.sleep(0.001)
+    scheduler.release("m")
+    for thread in threads:
+        thread.join(timeout=5)
+    return order
+
+
+def test_priority_and_interactive_first():
+    """final_writer passa na frente das sumarizações e interativo na frente de batch"""
+    order = _queue_in_order(ModelScheduler(default_limit=1), [
+        ("batch-final", "s1", False, Priority.FINAL),
+        ("summary", "s1", True, Priority.SUMMARY),
+        ("final", "s1", True, Priority.FINAL),
+    ])
+    assert order == ["final", "summary", "batch-final"]
+
+
+def test_fair_share_between_sessions():
+    """Uma sessão com muitas chamadas não monopoliza o modelo"""
+    order = _queue_in_order(ModelScheduler(default_limit=1), [
+        ("a1", "a", True, Priority.SUMMARY),
+        ("a2", "a", True, Priority.SUMMARY),
+        ("a3", "a", True, Priority.SUMMARY),
+        ("b1", "b", True, Priority.SUMMARY),
+    ])
+    assert order.index("b1") < order.index("a3")
+
+
+def test_bounded_queue_and_stats():
+    """Fila cheia rejeita novas chamadas; stats expõem fila e espera"""
+    scheduler = ModelScheduler(default_limit=1, max_queue=1, queue_timeout=0.3)
+    scheduler.acquire("m")
+    with pytest.raises(TimeoutError):
+        scheduler.acquire("m")
+
+    waiter = threading.Thread(target=lambda: pytest.raises(TimeoutError, scheduler.acquire, "m"))
+    waiter.start()
+    while scheduler.queue_depth("m") < 1:
+        time.sleep(0.001)
+    with pytest.raises(SchedulerQueueFull):
+        scheduler.acquire("m")
+    waiter.join()
+
+    stats = scheduler.stats()["m"]
+    assert stats["in_flight"] == 1
+    assert stats["rejected"] == 1
+    assert stats["timeouts"] == 2
+
+
+def test_async_slots_respect_limit():
+    """aslot limita corrotinas concorrentes ao limite do modelo"""
+    scheduler = ModelScheduler(limits={"m": 2})
+    peak = 0
+
+    async def call():
+        nonlocal peak
+        async with scheduler.aslot("m"):
+            peak = max(peak, scheduler.in_flight("m"))
+            await asyncio.sleep(0.01)
+
+    async def run():
+        await asyncio.gather(*(call() for _ in range(8)))
+
+    asyncio.run(run())
+    assert peak == 2
+    assert scheduler.in_flight("m") == 0
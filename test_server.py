@@ -0,0 +1,156 @@
+"""
+Testes da API HTTP com um grafo falso (sem Foundry nem Tavily)
+"""
+
+import asyncio
+import json
+import time
+from typing import Optional, TypedDict
+
+import pytest
+from langgraph.config import get_stream_writer
+from langgraph.graph import START, END, StateGraph
+from starlette.testclient import TestClient
+
+from server import Job, JobManager, create_app
+
+ANSWER = "LLMs are trained on text [1]."
+REFERENCES = "\n\nReferences:\n[1] - [Training LLMs](https://example.com/llm)"
+
+
+class _State(TypedDict, total=False):
+    user_input: str
+    queries: list[str]
+    final_response: Optional[str]
+
+
+def _fake_graph():
+    """build_first_queries -> final_writer; "slow" na pergunta segura o final_writer"""
+
+    async def build(state: _State) -> dict:
+        return {"queries": [state["user_input"]]}
+
+    async def write(state: _State) -> dict:
+        if "slow" in state["user_input"]:
+            await asyncio.sleep(30)
+        if "fail" in state["user_input"]:
+            raise RuntimeError("Foundry indisponível")
+        writer = get_stream_writer()
+        writer({"ttft": 0.01})
+        for token in ANSWER.split(" "):
+            writer({"token": token + " "})
+        return {"final_response": ANSWER + REFERENCES}
+
+    builder = StateGraph(_State)
+    builder.add_node("build_first_queries", build)
+    builder.add_node("final_writer", write)
+    builder.add_edge(START, "build_first_queries")
+    builder.add_edge("build_first_queries", "final_writer")
+    builder.add_edge("final_writer", END)
+    return builder.compile()
+
+
+@pytest.fixture
+def client():
+    manager = JobManager(graph=_fake_graph(), workers=1, max_queue=2)
+    with TestClient(create_app(manager)) as client:
+        yield client
+
+
+def _wait(client: TestClient, job_id: str, status: str, timeout: float = 5.0) -> dict:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f"/jobs/{job_id}").json()
+        if job["status"] == status:
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} não chegou a {status}: {job}")
+
+
+def test_submit_and_fetch_result(client):
+    response = client.post("/jobs", json={"question": "how are LLMs trained?"})
+    assert response.status_code == 202
+    job_id = response.json()["id"]
+
+    _wait(client, job_id, Job.DONE)
+    result = client.get(f"/jobs/{job_id}/result").json()
+    assert result["answer"] == ANSWER
+    assert result["references"] == [{"index": 1, "title": "Training LLMs", "url": "https://example.com/llm"}]
+
+
+def test_events_stream_nodes_and_tokens(client):
+    job_id = client.post("/jobs", json={"question": "question"}).json()["id"]
+
+    with client.stream("GET", f"/jobs/{job_id}/events") as response:
+        assert response.headers["content-type"].startswith("text/event-stream")
+        events = [json.loads(line[len("data: "):]) for line in response.iter_lines() if line.startswith("data: ")]
+
+    types = [event["type"] for event in events]
+    assert types[0] == Job.QUEUED and types[-1] == Job.DONE
+    assert [event["node"] for event in events if event["type"] == "node"] == ["build_first_queries", "final_writer"]
+    assert "".join(event["token"] for event in events if event["type"] == "token").strip() == ANSWER
+    assert {"type": "progress", "ttft": 0.01}.items() <= next(e for e in events if e["type"] == "progress").items()
+
+
+def test_events_resume_after_last_event_id(client):
+    job_id = client.post("/jobs", json={"question": "question"}).json()["id"]
+    _wait(client, job_id, Job.DONE)
+
+    with client.stream("GET", f"/jobs/{job_id}/events", headers={"Last-Event-ID": "2"}) as response:
+        ids = [int(line[len("id: "):]) for line in response.iter_lines() if line.startswith("id: ")]
+    assert ids[0] == 3
+
+
+def test_failed_job_reports_error(client):
+    job_id = client.post("/jobs", json={"question": "fail"}).json()["id"]
+    job = _wait(client, job_id, Job.FAILED)
+    assert "Foundry indisponível" in job["error"]
+    assert client.get(f"/jobs/{job_id}/result").status_code == 409
+
+
+def test_queue_limit_and_cancellation(client):
+    running = client.post("/jobs", json={"question": "slow 1"}).json()["id"]
+    _wait(client, running, Job.RUNNING)
+    queued = [client.post("/jobs", json={"question": f"slow {i}"}) for i in (2, 3)]
+    assert [r.status_code for r in queued] == [202, 202]
+
+    rejected = client.post("/jobs", json={"question": "slow 4"})
+    assert rejected.status_code == 429
+
+    health = client.get("/health").json()
+    assert health["running"] == 1 and health["queue_depth"] == 2
+
+    assert client.delete(f"/jobs/{queued[0].json()['id']}").status_code == 202
+    assert client.delete(f"/jobs/{running}").status_code == 202
+    _wait(client, running, Job.CANCELLED)
+    # O job cancelado na fila é descartado; o seguinte assume o worker
+    _wait(client, queued[1].json()["id"], Job.RUNNING)
+    assert client.get(f"/jobs/{queued[0].json()['id']}").json()["status"] == Job.CANCELLED
+    assert client.delete(f"/jobs/{running}").status_code == 409
+
+
+def test_bad_requests(client):
+    assert client.post("/jobs", json={}).status_code == 400
+    assert client.post("/jobs", content=b"not json").status_code == 400
+    assert client.get("/jobs/unknown").status_code == 404
+
+
+def test_ready_probe_waits_for_model_load():
+    from benchmarks.fake_foundry import FakeFoundryConfig, FakeFoundryServer
+    from llm_client import AzureFoundryLocalLLM
+    from warmup import ModelWarmer
+
+    config = FakeFoundryConfig(latency=0.0, tokens_per_second=10_000, completion_tokens=5, cold_start=0.3)
+    with FakeFoundryServer(config) as foundry:
+        warmer = ModelWarmer([AzureFoundryLocalLLM(model="fake", endpoint=foundry.url)], keepalive_interval=0)
+        manager = JobManager(graph=_fake_graph(), workers=1, warmer=warmer)
+        with TestClient(create_app(manager)) as client:
+            response = client.get("/ready")
+            assert response.status_code == 503
+            assert response.json()["models"]["fake"]["state"] in (ModelWarmer.COLD, ModelWarmer.LOADING)
+
+            assert warmer.wait_ready(5)
+            response = client.get("/ready")
+            assert response.status_code == 200
+            assert response.json()["models"]["fake"]["load_seconds"] >= 0.3
+            assert client.get("/health").json()["ready"] is True
@@ -0,0 +1,93 @@
+"""
+Testes da sumarização em lote (várias páginas por chamada ao modelo)
+"""
+
+import json
+
+import pytest
+
+import perplexity
+from benchmarks.fake_foundry import FakeFoundryConfig, FakeFoundryServer
+from llm_client import AzureFoundryLocalLLM
+from perplexity import _SummaryRequest, _pack_summary_batches, _summarize_batch
+
+QUESTION = "How are LLMs trained?"
+
+
+def _items(n: int, chars: int = 400) -> list[_SummaryRequest]:
+    return [_SummaryRequest(QUESTION, f"query {i}", f"page {i} " + "x" * chars) for i in range(n)]
+
+
+class _PartialServer(FakeFoundryServer):
+    """Responde aos lotes com JSON inválido (lotes grandes) ou só o primeiro resumo"""
+
+    def respond(self, prompt: str) -> str:
+        ids = prompt.count("<SEARCH_RESULT id=")
+        if ids > 2:
+            return "Sure! Here are the summaries: ..."
+        if ids == 2:
+            return json.dumps({"summaries": [{"id": 1, "summary": "first"}]})
+        return super().respond(prompt)
+
+
+@pytest.fixture
+def use_server(monkeypatch):
+    servers = []
+
+    def start(server_cls=FakeFoundryServer):
+        server = server_cls(FakeFoundryConfig(latency=0.0, tokens_per_second=10_000, completion_tokens=5)).start()
+        servers.append(server)
+        monkeypatch.setattr(perplexity, "llm", AzureFoundryLocalLLM(model="fake", endpoint=server.url))
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+def test_pack_respects_size_and_context(monkeypatch):
+    """Lotes param em SUMMARY_BATCH_SIZE e na janela de contexto"""
+    monkeypatch.setattr(perplexity, "SUMMARY_BATCH_SIZE", 3)
+    assert [len(batch) for batch in _pack_summary_batches(QUESTION, _items(7))] == [3, 3, 1]
+
+    monkeypatch.setattr(perplexity, "SUMMARY_BATCH_CONTEXT_TOKENS", 1200)
+    monkeypatch.setattr(perplexity, "SUMMARY_BATCH_ITEM_TOKENS", 100)
+    batches = _pack_summary_batches(QUESTION, _items(5, chars=1600))
+    assert all(len(batch) <= 2 for batch in batches)
+    assert sum(len(batch) for batch in batches) == 5
+
+
+def test_one_request_per_batch(use_server):
+    """Cinco páginas da mesma pergunta viram uma única chamada"""
+    server = use_server()
+    items = _items(5)
+
+    results = _summarize_batch(items)
+
+    assert set(results) == set(items)
+    assert all(isinstance(summary, str) and summary for summary in results.values())
+    assert server.stats()["requests"] == 1
+
+
+def test_questions_are_not_mixed(use_server):
+    """Páginas de perguntas diferentes vão em chamadas separadas"""
+    server = use_server()
+    items = _items(2) + [_SummaryRequest("Other question?", "q", "content")]
+
+    _summarize_batch(items)
+
+    assert server.stats()["requests"] == 2
+
+
+def test_invalid_or_partial_response_falls_back(use_server):
+    """JSON inválido divide o lote; resumos ausentes são pedidos um a um"""
+    server = use_server(_PartialServer)
+    items = _items(4)
+
+    results = _summarize_batch(items)
+
+    assert all(isinstance(summary, str) and summary for summary in results.values())
+    # 4 (inválido) -> 2 + 2 (cada um só com o id 1) -> 1 chamada individual por metade
+    assert server.stats()["requests"] == 5
+    assert results[items[0]] == "first"
+    assert results[items[2]] == "first"
@@ -0,0 +1,147 @@
+"""
+Testes do CachedTavilyClient com um cliente Tavily falso (sem rede)
+"""
+
+import json
+import os
+import time
+
+import perplexity
+from utils import CachedTavilyClient, _TinyDBTier, url_match_key
+
+
+class FakeTavily:
+    """Cliente Tavily falso que conta as chamadas recebidas"""
+
+    def __init__(self):
+        self.search_calls = 0
+        self.extract_calls: list = []
+        self.version = 1
+
+    def search(self, query, **kwargs):
+        self.search_calls += 1
+        return {"results": [{"url": f"https://example.com/{query}", "title": f"{query} v{self.version}"}]}
+
+    def extract(self, urls, **kwargs):
+        self.extract_calls.append(urls)
+        urls = [urls] if isinstance(urls, str) else urls
+        return {
+            "results": [{"url": url, "raw_content": f"page {url}"} for url in urls if "broken" not in url],
+            "failed_results": [{"url": url, "error": "boom"} for url in urls if "broken" in url],
+        }
+
+
+def test_search_is_cached():
+    """Search repetido com os mesmos parâmetros usa o cache"""
+    fake = FakeTavily()
+    tavily = CachedTavilyClient(fake)
+    first = tavily.search("llm", max_results=1)
+    assert tavily.search("llm", max_results=1) == first
+    tavily.search("llm", max_results=2)
+
+    assert fake.search_calls == 2
+    assert tavily.stats()["search"]["hits"] == 1
+    assert tavily.stats()["search"]["hit_ratio"] == 1 / 3
+
+
+def test_extract_fetches_only_missing_urls():
+    """Extract de lista só busca as URLs ausentes; falhas não são cacheadas"""
+    fake = FakeTavily()
+    tavily = CachedTavilyClient(fake)
+    tavily.extract("https://a")
+    response = tavily.extract(["https://a", "https://b", "https://broken"])
+
+    assert fake.extract_calls == ["https://a", ["https://b", "https://broken"]]
+    assert [r["url"] for r in response["results"]] == ["https://a", "https://b"]
+    assert response["failed_results"][0]["url"] == "https://broken"
+
+
+class NormalizingTavily(FakeTavily):
+    """Devolve as URLs sem a barra final, como o Tavily faz após redirecionamentos"""
+
+    def extract(self, urls, **kwargs):
+        response = super().extract(urls, **kwargs)
+        for item in response["results"] + response["failed_results"]:
+            item["url"] = item["url"].rstrip("/")
+        return response
+
+
+def test_url_match_key():
+    assert url_match_key("https://www.Example.com/b/#top") == url_match_key("http://example.com/b")
+    assert url_match_key("https://example.com/a") != url_match_key("https://example.com/b")
+
+
+def test_extract_maps_normalized_urls_to_requested(monkeypatch):
+    """Resultados com a URL normalizada pelo Tavily continuam associados à URL pedida"""
+    fake = NormalizingTavily()
+    tavily = CachedTavilyClient(fake)
+    response = tavily.extract(["https://a/", "https://b/", "https://broken/"])
+    assert [r["url"] for r in response["results"]] == ["https://a/", "https://b/"]
+    assert response["failed_results"][0]["url"] == "https://broken/"
+    tavily.extract("https://a/")
+    assert len(fake.extract_calls) == 1
+
+    monkeypatch.setattr(perplexity, "_tavily", CachedTavilyClient(NormalizingTavily()))
+    assert perplexity._extraction_batcher.submit("https://example.com/b/").result(timeout=5) == "page https://example.com/b/"
+    contents = perplexity._extract_batch(["https://c/", "https://broken/"])
+    assert contents["https://c/"] == "page https://c/"
+    assert isinstance(contents["https://broken/"], ValueError)
+
+
+def test_stale_while_revalidate():
+    """Entrada vencida é servida enquanto a versão nova é buscada em background"""
+    fake = FakeTavily()
+    tavily = CachedTavilyClient(fake, search_ttl=0.01, stale_ttl=60)
+    tavily.search("llm")
+    time.sleep(0.05)
+    fake.version = 2
+
+    stale = tavily.search("llm")
+    assert stale["results"][0]["title"] == "llm v1"
+    tavily.close()
+    assert tavily.search("llm")["results"][0]["title"] == "llm v2"
+    assert tavily.stats()["search"]["refreshes"] == 1
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    """O tier TinyDB é reutilizado por uma nova instância"""
+    path = str(tmp_path / "tavily.json")
+    first = CachedTavilyClient(FakeTavily(), db_path=path)
+    first.search("llm")
+    first.close()
+
+    fake = FakeTavily()
+    second = CachedTavilyClient(fake, db_path=path)
+    assert second.search("llm")["results"][0]["title"] == "llm v1"
+    assert fake.search_calls == 0
+    second.close()
+
+
+def test_disk_tier_batches_writes_and_purges_on_open(tmp_path):
+    """O arquivo não é reescrito a cada gravação e entradas vencidas saem ao abrir"""
+    path = str(tmp_path / "tavily.json")
+    tier = _TinyDBTier(path, {"search": 60}, flush_every=10, flush_interval=3600)
+    tier.set("search", "old", {"stored_at": time.time() - 120, "response": "old"})
+    tier.set("search", "new", {"stored_at": time.time(), "response": "new"})
+    assert not os.path.getsize(path)
+    assert tier.get("search", "new")["response"] == "new"
+    tier.close()
+
+    tier = _TinyDBTier(path, {"search": 60})
+    assert tier.get("search", "old") is None
+    assert tier.get("search", "new")["response"] == "new"
+    tier.close()
+    assert [doc["key"] for doc in json.load(open(path))["search"].values()] == ["new"]
+
+
+def test_disk_tier_evicts_oldest_over_limits(tmp_path):
+    tier = _TinyDBTier(str(tmp_path / "tavily.json"), {"extract": 3600}, max_entries=2)
+    for key in ("a", "b", "c"):
+        tier.set("extract", key, {"stored_at": time.time(), "response": key})
+    assert tier.get("extract", "a") is None and tier.get("extract", "c") is not None
+    assert tier.stats()["entries"] == 2 and tier.stats()["evictions"] == 1
+
+    tier.max_entries, tier.max_bytes = 10, tier.stats()["bytes"] - 1
+    tier.set("extract", "b", {"stored_at": time.time(), "response": "b2"})
+    assert tier.get("extract", "c") is None and tier.get("extract", "b")["response"] == "b2"
+    tier.close()
@@ -0,0 +1,95 @@
+"""
+Testes da contagem de tokens e do empacotamento na janela de contexto
+"""
+
+import pytest
+
+import perplexity
+import tokens
+from benchmarks.fake_foundry import FakeFoundryConfig, FakeFoundryServer
+from llm_client import AzureFoundryLocalLLM
+from schemas import QueryResult, ReportState
+from tokens import CharEstimateTokenizer, pack_by_priority, truncate_to_tokens
+
+
+class _WordTokenizer:
+    """Um token por palavra (determinístico, sem vocabulário)"""
+
+    def count(self, text: str) -> int:
+        return len(text.split())
+
+
+@pytest.fixture
+def word_tokens(monkeypatch):
+    monkeypatch.setattr(tokens, "_tokenizers", {})
+    monkeypatch.setattr(tokens, "_default_tokenizer", _WordTokenizer())
+
+
+def test_char_estimate_rounds_up():
+    tokenizer = CharEstimateTokenizer(chars_per_token=4)
+    assert tokenizer.count("") == 0
+    assert tokenizer.count("abcd") == 1
+    assert tokenizer.count("abcde") == 2
+
+
+def test_registered_tokenizer_overrides_default(word_tokens):
+    tokens.register_tokenizer("chars-model", CharEstimateTokenizer(chars_per_token=1))
+    assert tokens.count_tokens("one two three") == 3
+    assert tokens.count_tokens("one two three", "chars-model") == 13
+    assert tokens.count_tokens("one two three", "other-model") == 3
+
+
+def test_truncate_to_tokens(word_tokens):
+    assert truncate_to_tokens("a b c", 5) == "a b c"
+    assert truncate_to_tokens("a b c d e", 2).split() == ["a", "b"]
+
+
+def test_pack_by_priority_drops_lowest_and_keeps_order():
+    items = ["aa", "bbbb", "c", "ddd"]
+    kept = pack_by_priority(items, len, budget=6, priority=[3, 1, 4, 2])
+    # Prioridade: c(1) + aa(2) + ddd(3) = 6; bbbb não cabe
+    assert kept == ["aa", "c", "ddd"]
+
+
+def test_pack_by_priority_shrinks_first_overflow():
+    items = ["aaaa", "bbbbbbbb", "cccc"]
+    kept = pack_by_priority(items, len, budget=10, shrink=lambda item, available: item[:available])
+    assert kept == ["aaaa", "bbbbbb"]
+
+
+def test_final_results_fit_context_window(word_tokens, monkeypatch):
+    monkeypatch.setattr(perplexity, "prompt_budget", lambda model, max_tokens: 400)
+    results = [
+        QueryResult(title=f"Page {i}", url=f"https://example.com/{i}", resume=f"unrelated filler text {i} " * 40)
+        for i in range(5)
+    ]
+    results[3] = results[3].model_copy(update={"resume": "transformers are trained with gradient descent " * 10})
+    state = ReportState(user_input="how are transformers trained", queries_results=results)
+
+    kept = perplexity._final_results(state)
+    prompt = perplexity._final_prompt(state, kept)
+
+    assert tokens.count_tokens(prompt) <= 400
+    assert results[3] in kept
+    assert len(kept) < len(results)
+    output = perplexity._final_output(state, "answer [1]", kept)
+    assert output["final_response"].count("](https://example.com/") == len(kept)
+
+
+def test_final_results_unchanged_when_they_fit(word_tokens):
+    results = [QueryResult(title="t", url="https://example.com", resume="short summary")]
+    state = ReportState(user_input="question", queries_results=results)
+    assert perplexity._final_results(state) == results
+
+
+def test_client_accumulates_token_usage(word_tokens):
+    config = FakeFoundryConfig(latency=0.0, tokens_per_second=10_000, completion_tokens=5)
+    with FakeFoundryServer(config) as server:
+        client = AzureFoundryLocalLLM(model="fake", endpoint=server.url)
+        client.invoke("one two three")
+        list(client.stream("four five"))
+
+    usage = client.token_usage()
+    assert usage["calls"] == 2
+    assert usage["prompt_tokens"] == 5
+    assert usage["completion_tokens"] > 0
@@ -0,0 +1,108 @@
+"""
+Testes dos spans de tracing
+"""
+
+import asyncio
+import json
+
+import pytest
+
+import tracing
+from benchmarks.fake_foundry import FakeFoundryConfig, FakeFoundryServer
+from llm_client import AzureFoundryLocalLLM
+from tracing import InMemorySpanExporter, configure_tracing, span
+
+
+@pytest.fixture
+def exporter():
+    exporter = InMemorySpanExporter()
+    configure_tracing(enabled=True, path=None, exporters=[exporter])
+    yield exporter
+    configure_tracing(enabled=False)
+
+
+def test_disabled_tracing_is_noop():
+    """Sem tracing, span() devolve sempre o mesmo objeto no-op"""
+    configure_tracing(enabled=False)
+    with span("a", request_id="r1") as s:
+        s.set(x=1)
+    assert s is span("b")
+    assert not s.recording
+
+
+def test_nested_spans_inherit_request_id(exporter):
+    """Spans filhos apontam para o pai e herdam o request_id"""
+    with span("node", request_id="r1") as parent:
+        with span("llm") as child:
+            child.add("tokens", 3)
+            child.add("tokens", 2)
+
+    by_name = {s.name: s for s in exporter.spans}
+    assert [s.name for s in exporter.spans] == ["llm", "node"]
+    assert by_name["llm"].parent_id == parent.span_id
+    assert by_name["llm"].request_id == "r1"
+    assert by_name["llm"].attributes == {"tokens": 5}
+    assert by_name["node"].parent_id is None
+    assert by_name["node"].end >= by_name["llm"].end
+
+
+def test_error_status_and_async_isolation(exporter):
+    """Exceções marcam o span; tarefas asyncio concorrentes não se misturam"""
+    with pytest.raises(ValueError):
+        with span("failing"):
+            raise ValueError("boom")
+    assert exporter.spans[0].status == "error"
+    assert "boom" in exporter.spans[0].error
+
+    async def branch(request_id):
+        with span("branch", request_id=request_id):
+            await asyncio.sleep(0.01)
+            with span("inner"):
+                await asyncio.sleep(0.01)
+
+    async def main():
+        await asyncio.gather(branch("a"), branch("b"))
+
+    exporter.clear()
+    asyncio.run(main())
+    parents = {s.span_id: s.request_id for s in exporter.spans if s.name == "branch"}
+    for inner in (s for s in exporter.spans if s.name == "inner"):
+        assert parents[inner.parent_id] == inner.request_id
+
+
+def test_jsonl_export(tmp_path):
+    """Cada span concluído vira uma linha JSON"""
+    path = tmp_path / "trace.jsonl"
+    configure_tracing(enabled=True, path=str(path))
+    try:
+        with span("node", request_id="r1", query="q"):
+            with span("llm"):
+                pass
+    finally:
+        configure_tracing(enabled=False)
+
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [line["name"] for line in lines] == ["llm", "node"]
+    assert lines[1]["attributes"] == {"query": "q"}
+    assert lines[0]["request_id"] == "r1"
+    assert lines[0]["duration_ms"] >= 0
+
+
+def test_llm_calls_record_tokens_and_bytes(exporter):
+    """Chamadas ao Foundry registram tokens e bytes no span"""
+    config = FakeFoundryConfig(latency=0.0, tokens_per_second=10_000, completion_tokens=8)
+    with FakeFoundryServer(config) as server:
+        llm = AzureFoundryLocalLLM(model="fake", endpoint=server.url)
+        with span("node", request_id="r1"):
+            llm.invoke("hello")
+            assert len(list(llm.stream("hello"))) == 8
+        llm.close()
+
+    invoke, stream = (s for s in exporter.spans if s.name.startswith("llm."))
+    assert invoke.request_id == stream.request_id == "r1"
+    assert invoke.attributes["completion_tokens"] == 8
+    assert invoke.attributes["request_bytes"] > 0
+    assert stream.attributes["completion_tokens"] == 8
+    assert stream.attributes["response_bytes"] > 0
+    assert "ttft_ms" in stream.attributes
+    assert tracing.current_span().recording is False
@@ -0,0 +1,89 @@
+"""
+Testes do aquecimento e keep-alive dos modelos contra um Foundry falso com carga lenta
+"""
+
+import time
+
+import pytest
+
+from benchmarks.fake_foundry import FakeFoundryConfig, FakeFoundryServer
+from llm_client import AzureFoundryLocalLLM
+from resilience import Resilience, RetryPolicy
+from warmup import ModelWarmer
+
+COLD_START = 0.3
+
+
+@pytest.fixture
+def server():
+    config = FakeFoundryConfig(latency=0.0, tokens_per_second=10_000, completion_tokens=5, cold_start=COLD_START)
+    with FakeFoundryServer(config) as server:
+        yield server
+
+
+def _client(server: FakeFoundryServer, model: str) -> AzureFoundryLocalLLM:
+    return AzureFoundryLocalLLM(model=model, endpoint=server.url, timeout=10, resilience=Resilience(RetryPolicy(attempts=1), hedge=False))
+
+
+def _timed_invoke(client: AzureFoundryLocalLLM) -> float:
+    started = time.perf_counter()
+    client.invoke(f"pergunta {time.perf_counter()}")
+    return time.perf_counter() - started
+
+
+def test_loads_models_in_order_and_reports_times(server):
+    warmer = ModelWarmer([_client(server, "queries"), _client(server, "reasoning")], keepalive_interval=0)
+    assert not warmer.ready()
+    assert warmer.status()["models"]["queries"]["state"] == ModelWarmer.COLD
+
+    warmer.start()
+    assert warmer.wait_ready(5)
+    models = warmer.status()["models"]
+    assert all(m["state"] == ModelWarmer.READY and m["load_seconds"] >= COLD_START for m in models.values())
+    # Um modelo por vez: o segundo fica pronto depois das duas cargas
+    assert models["reasoning"]["ready_after_s"] >= 2 * COLD_START
+    assert server.stats()["loads"] == 2
+
+    # O primeiro pedido do pipeline não paga a carga nem entra nas contas de tokens do ping
+    client = warmer.clients["queries"]
+    assert client.token_usage()["calls"] == 0
+    assert _timed_invoke(client) < COLD_START
+    warmer.stop()
+
+
+def test_keepalive_prevents_unload():
+    config = FakeFoundryConfig(latency=0.0, tokens_per_second=10_000, completion_tokens=5,
+                               cold_start=COLD_START, idle_unload=0.5)
+    with FakeFoundryServer(config) as server:
+        client = _client(server, "queries")
+        warmer = ModelWarmer([client], keepalive_interval=0.2).start()
+        assert warmer.wait_ready(5)
+        time.sleep(1.2)
+
+        assert _timed_invoke(client) < COLD_START
+        assert server.stats()["loads"] == 1
+        assert warmer.status()["models"]["queries"]["pings"] >= 3
+        warmer.stop()
+
+
+def test_keepalive_skips_models_in_use(server):
+    client = _client(server, "queries")
+    warmer = ModelWarmer([client], keepalive_interval=0.3).start()
+    assert warmer.wait_ready(5)
+    deadline = time.monotonic() + 1.0
+    while time.monotonic() < deadline:
+        client.invoke(f"pergunta {time.monotonic()}")
+        time.sleep(0.05)
+
+    assert warmer.status()["models"]["queries"]["pings"] == 1
+    warmer.stop()
+
+
+def test_failed_load_is_retried():
+    config = FakeFoundryConfig(latency=0.0, tokens_per_second=10_000, completion_tokens=5, faults=["503", "503"])
+    with FakeFoundryServer(config) as server:
+        warmer = ModelWarmer([_client(server, "queries")], keepalive_interval=0, retry_interval=0.05).start()
+        assert warmer.wait_ready(5)
+        state = warmer.status()["models"]["queries"]
+        assert state["failures"] == 2 and state["pings"] == 1 and state["error"] is None
+        warmer.stop()
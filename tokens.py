@@ -0,0 +1,225 @@
+"""
+Contagem de tokens e empacotamento de prompts na janela de contexto
+
+Os tokenizers são plugáveis por modelo (register_tokenizer). O padrão é o
+tiktoken (cl100k_base), uma aproximação razoável para Phi e Qwen; se ele não
+estiver instalado ou não conseguir carregar o vocabulário (ex: máquina sem
+internet), cai para a estimativa por caracteres.
+"""
+
+import logging
+import math
+import threading
+from typing import Callable, Optional, Protocol, Sequence, TypeVar
+
+try:
+    from config import (
+        TOKENIZER, TOKENIZER_ENCODING, TOKENIZER_CHARS_PER_TOKEN,
+        MODEL_CONTEXT_TOKENS, DEFAULT_CONTEXT_TOKENS, PROMPT_SAFETY_MARGIN_TOKENS
+    )
+except ImportError:
+    TOKENIZER = "tiktoken"
+    TOKENIZER_ENCODING = "cl100k_base"
+    TOKENIZER_CHARS_PER_TOKEN = 4.0
+    MODEL_CONTEXT_TOKENS = {}
+    DEFAULT_CONTEXT_TOKENS = 4096
+    PROMPT_SAFETY_MARGIN_TOKENS = 64
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class Tokenizer(Protocol):
+    """Qualquer objeto com count(text) -> número de tokens"""
+
+    def count(self, text: str) -> int: ...
+
+
+class CharEstimateTokenizer:
+    """Estimativa rápida: um token a cada chars_per_token caracteres"""
+
+    def __init__(self, chars_per_token: float = TOKENIZER_CHARS_PER_TOKEN):
+        self.chars_per_token = chars_per_token
+
+    def count(self, text: str) -> int:
+        return math.ceil(len(text) / self.chars_per_token)
+
+
+class TiktokenTokenizer:
+    """Contagem exata com um encoding do tiktoken"""
+
+    def __init__(self, encoding: str = TOKENIZER_ENCODING):
+        """
+        Carregar o encoding
+
+        Args:
+            encoding: Nome do encoding do tiktoken
+
+        Raises:
+            ImportError: Se tiktoken não estiver instalado
+            Exception: Se o vocabulário não puder ser carregado
+        """
+        import tiktoken
+
+        self._encoding = tiktoken.get_encoding(encoding)
+
+    def count(self, text: str) -> int:
+        return len(self._encoding.encode(text, disallowed_special=()))
+
+
+_tokenizers: dict[str, Tokenizer] = {}
+_default_tokenizer: Optional[Tokenizer] = None
+_tokenizers_lock = threading.Lock()
+
+
+def register_tokenizer(model: str, tokenizer: Tokenizer) -> None:
+    """
+    Usar um tokenizer específico para um modelo
+
+    Args:
+        model: ID do modelo
+        tokenizer: Tokenizer do modelo
+    """
+    with _tokenizers_lock:
+        _tokenizers[model] = tokenizer
+
+
+def _create_default_tokenizer() -> Tokenizer:
+    """Tokenizer de config.TOKENIZER, com fallback para a estimativa"""
+    if TOKENIZER == "tiktoken":
+        try:
+            return TiktokenTokenizer()
+        except Exception as e:
+            logger.warning(f"⚠️ tiktoken indisponível ({type(e).__name__}); usando estimativa por caracteres")
+    return CharEstimateTokenizer()
+
+
+def get_tokenizer(model: Optional[str] = None) -> Tokenizer:
+    """
+    Tokenizer do modelo (ou o padrão)
+
+    Args:
+        model: ID do modelo
+
+    Returns:
+        Tokenizer registrado para o modelo ou o padrão
+    """
+    global _default_tokenizer
+    with _tokenizers_lock:
+        tokenizer = _tokenizers.get(model) if model else None
+        if tokenizer is None:
+            if _default_tokenizer is None:
+                _default_tokenizer = _create_default_tokenizer()
+            tokenizer = _default_tokenizer
+        return tokenizer
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """
+    Contar tokens de um texto
+
+    Args:
+        text: Texto
+        model: ID do modelo (define o tokenizer)
+
+    Returns:
+        Número de tokens
+    """
+    return get_tokenizer(model).count(text)
+
+
+def context_limit(model: str) -> int:
+    """Janela de contexto do modelo em tokens (prompt + resposta)"""
+    return MODEL_CONTEXT_TOKENS.get(model, DEFAULT_CONTEXT_TOKENS)
+
+
+def prompt_budget(model: str, max_tokens: int) -> int:
+    """
+    Tokens disponíveis para o prompt
+
+    Args:
+        model: ID do modelo
+        max_tokens: Tokens reservados para a resposta
+
+    Returns:
+        Janela de contexto menos resposta e margem de segurança
+    """
+    return max(context_limit(model) - max_tokens - PROMPT_SAFETY_MARGIN_TOKENS, 0)
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model: Optional[str] = None) -> str:
+    """
+    Maior prefixo do texto com até max_tokens tokens
+
+    Args:
+        text: Texto
+        max_tokens: Limite de tokens
+        model: ID do modelo
+
+    Returns:
+        Prefixo do texto
+    """
+    tokenizer = get_tokenizer(model)
+    if tokenizer.count(text) <= max_tokens:
+        return text
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if tokenizer.count(text[:middle]) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    return text[:low]
+
+
+def pack_by_priority(items: Sequence[T], cost: Callable[[T], int], budget: int, priority: Optional[Sequence[float]] = None, shrink: Optional[Callable[[T, int], Optional[T]]] = None) -> list[T]:
+    """
+    Selecionar itens que cabem no orçamento, descartando os de menor prioridade
+
+    Os itens são considerados da maior para a menor prioridade; o primeiro
+    que não couber inteiro é reduzido com shrink (se houver) para o espaço
+    restante. A ordem original é preservada no resultado.
+
+    Args:
+        items: Itens candidatos
+        cost: Tokens de um item
+        budget: Tokens disponíveis
+        priority: Prioridade por item (default: ordem original)
+        shrink: Função (item, tokens disponíveis) -> item reduzido ou None
+
+    Returns:
+        Itens mantidos (alguns possivelmente reduzidos) na ordem original
+    """
+    scores = list(priority) if priority is not None else [-i for i in range(len(items))]
+    order = sorted(range(len(items)), key=lambda i: (-scores[i], i))
+    kept: dict[int, T] = {}
+    used = 0
+    for index in order:
+        item = items[index]
+        size = cost(item)
+        if used + size <= budget:
+            kept[index] = item
+            used += size
+            continue
+        if shrink is not None and budget - used > 0:
+            reduced = shrink(item, budget - used)
+            if reduced is not None and used + cost(reduced) <= budget:
+                kept[index] = reduced
+                used += cost(reduced)
+        break
+    return [kept[index] for index in sorted(kept)]
+
+
+__all__ = [
+    "Tokenizer",
+    "CharEstimateTokenizer",
+    "TiktokenTokenizer",
+    "register_tokenizer",
+    "get_tokenizer",
+    "count_tokens",
+    "context_limit",
+    "prompt_budget",
+    "truncate_to_tokens",
+    "pack_by_priority",
+]
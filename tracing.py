@@ -0,0 +1,366 @@
+"""
+Spans de tracing do pipeline
+
+Cada nó do grafo, extração, sumarização e chamada ao Foundry abre um span
+com request_id, início/fim, tokens e bytes trafegados. Os spans se aninham
+pelo contextvar do span atual (propagado pelo LangGraph às threads dos nós)
+e são exportados para um arquivo JSONL e, opcionalmente, para o
+OpenTelemetry.
+
+Com o tracing desabilitado, span() devolve um objeto no-op compartilhado:
+não há alocação, relógio nem I/O por chamada.
+"""
+
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Optional
+
+try:
+    from config import TRACING_ENABLED, TRACE_PATH, TRACE_OTEL_ENABLED
+except ImportError:
+    TRACING_ENABLED = False
+    TRACE_PATH = "traces.jsonl"
+    TRACE_OTEL_ENABLED = False
+
+logger = logging.getLogger(__name__)
+
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """Operação medida; use como context manager"""
+
+    __slots__ = ("tracer", "name", "request_id", "span_id", "parent_id", "attributes",
+                 "start", "end", "status", "error", "_started", "_activate", "_token")
+
+    recording = True
+
+    def __init__(self, tracer: "Tracer", name: str, attributes: dict[str, Any], activate: bool = True):
+        self.tracer = tracer
+        self.name = name
+        self.request_id: Optional[str] = attributes.pop("request_id", None)
+        self.span_id = os.urandom(8).hex()
+        self.parent_id: Optional[str] = None
+        self.attributes = attributes
+        self.start = 0.0
+        self.end = 0.0
+        self.status = "ok"
+        self.error: Optional[str] = None
+        self._started = 0.0
+        self._activate = activate
+        self._token = None
+
+    @property
+    def duration(self) -> float:
+        """Duração em segundos"""
+        return self.end - self.start
+
+    def set(self, **attributes: Any) -> None:
+        """Adicionar ou substituir atributos"""
+        self.attributes.update(attributes)
+
+    def add(self, name: str, value: float) -> None:
+        """Somar a um atributo numérico"""
+        self.attributes[name] = self.attributes.get(name, 0) + value
+
+    def __enter__(self) -> "Span":
+        parent = _current_span.get()
+        if parent is not None:
+            self.parent_id = parent.span_id
+            self.request_id = self.request_id or parent.request_id
+        if self._activate:
+            self._token = _current_span.set(self)
+        self.start = time.time()
+        self._started = time.perf_counter()
+        self.tracer._on_start(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self.end = self.start + (time.perf_counter() - self._started)
+        if isinstance(exc, Exception):
+            self.status = "error"
+            self.error = f"{exc_type.__name__}: {exc}"
+        elif exc is not None:
+            # GeneratorExit (stream abandonado) e CancelledError
+            self.status = "cancelled"
+        if self._token is not None:
+            _current_span.reset(self._token)
+            self._token = None
+        self.tracer._on_end(self)
+        return False
+
+    def to_dict(self) -> dict[str, Any]:
+        """Representação serializável do span concluído"""
+        return {
+            "name": self.name,
+            "request_id": self.request_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start,
+            "end": self.end,
+            "duration_ms": round(self.duration * 1000, 3),
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+class _NoopSpan:
+    """Span devolvido com o tracing desabilitado (não registra nada)"""
+
+    __slots__ = ()
+
+    recording = False
+    request_id = None
+
+    def set(self, **attributes: Any) -> None:
+        pass
+
+    def add(self, name: str, value: float) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+# ============================================================================
+# EXPORTADORES
+# ============================================================================
+
+class SpanExporter:
+    """Destino dos spans; on_start é opcional, export recebe spans concluídos"""
+
+    def on_start(self, span: Span) -> None:
+        pass
+
+    def export(self, span: Span) -> None:
+        raise NotImplementedError
+
+    def shutdown(self) -> None:
+        pass
+
+
+class JsonlSpanExporter(SpanExporter):
+    """Grava um span concluído por linha em um arquivo JSONL"""
+
+    def __init__(self, path: str = TRACE_PATH):
+        """
+        Inicializar exportador
+
+        Args:
+            path: Arquivo de trace (aberto em modo append)
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(span.to_dict(), default=str, ensure_ascii=False)
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class InMemorySpanExporter(SpanExporter):
+    """Guarda os spans concluídos em memória (testes e benchmarks)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.spans: list[Span] = []
+
+    def export(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.spans.clear()
+
+
+class OpenTelemetrySpanExporter(SpanExporter):
+    """
+    Espelha os spans no OpenTelemetry (API opentelemetry-api).
+
+    O provider e o exportador OTLP são configurados pela aplicação; sem
+    provider configurado a API do OpenTelemetry descarta os spans.
+    """
+
+    def __init__(self, instrumentation_name: str = "local-perplexity"):
+        """
+        Inicializar exportador
+
+        Args:
+            instrumentation_name: Nome do tracer OpenTelemetry
+
+        Raises:
+            ImportError: Se opentelemetry-api não estiver instalado
+        """
+        from opentelemetry import trace
+
+        self._trace = trace
+        self._tracer = trace.get_tracer(instrumentation_name)
+        self._lock = threading.Lock()
+        self._open: dict[str, Any] = {}
+
+    def on_start(self, span: Span) -> None:
+        with self._lock:
+            parent = self._open.get(span.parent_id)
+        context = self._trace.set_span_in_context(parent) if parent is not None else None
+        otel_span = self._tracer.start_span(span.name, context=context, start_time=int(span.start * 1e9))
+        with self._lock:
+            self._open[span.span_id] = otel_span
+
+    def export(self, span: Span) -> None:
+        with self._lock:
+            otel_span = self._open.pop(span.span_id, None)
+        if otel_span is None:
+            return
+        if span.request_id:
+            otel_span.set_attribute("request_id", span.request_id)
+        for name, value in span.attributes.items():
+            if isinstance(value, (str, bool, int, float)):
+                otel_span.set_attribute(name, value)
+        if span.status == "error":
+            otel_span.set_status(self._trace.Status(self._trace.StatusCode.ERROR, span.error))
+        otel_span.end(end_time=int(span.end * 1e9))
+
+
+# ============================================================================
+# TRACER
+# ============================================================================
+
+class Tracer:
+    """Cria spans e os entrega aos exportadores"""
+
+    def __init__(self, exporters: Optional[list[SpanExporter]] = None, enabled: bool = True):
+        """
+        Inicializar tracer
+
+        Args:
+            exporters: Destinos dos spans
+            enabled: False torna span() um no-op
+        """
+        self.exporters = list(exporters or [])
+        self.enabled = enabled and bool(self.exporters)
+
+    def start_span(self, name: str, attributes: dict[str, Any], activate: bool = True) -> Span:
+        return Span(self, name, attributes, activate)
+
+    def _on_start(self, span: Span) -> None:
+        for exporter in self.exporters:
+            try:
+                exporter.on_start(span)
+            except Exception as e:
+                logger.warning(f"Erro no exportador de trace {type(exporter).__name__}: {e}")
+
+    def _on_end(self, span: Span) -> None:
+        for exporter in self.exporters:
+            try:
+                exporter.export(span)
+            except Exception as e:
+                logger.warning(f"Erro no exportador de trace {type(exporter).__name__}: {e}")
+
+    def shutdown(self) -> None:
+        """Fechar os exportadores"""
+        for exporter in self.exporters:
+            exporter.shutdown()
+
+
+_tracer = Tracer(enabled=False)
+
+
+def configure_tracing(enabled: bool = TRACING_ENABLED, path: Optional[str] = TRACE_PATH, otel: bool = TRACE_OTEL_ENABLED, exporters: Optional[list[SpanExporter]] = None) -> Tracer:
+    """
+    Substituir o tracer global
+
+    Args:
+        enabled: Ativar o tracing
+        path: Arquivo JSONL de trace (None = sem arquivo)
+        otel: Espelhar os spans no OpenTelemetry
+        exporters: Exportadores adicionais
+
+    Returns:
+        Novo tracer global
+    """
+    global _tracer
+    selected = list(exporters or [])
+    if enabled and path:
+        selected.append(JsonlSpanExporter(path))
+    if enabled and otel:
+        try:
+            selected.append(OpenTelemetrySpanExporter())
+        except ImportError:
+            logger.warning("⚠️ opentelemetry-api não instalado: spans só no arquivo JSONL")
+
+    previous, _tracer = _tracer, Tracer(selected, enabled=enabled)
+    previous.shutdown()
+    if _tracer.enabled:
+        logger.info(f"🔎 Tracing ativo ({', '.join(type(e).__name__ for e in selected)})")
+    return _tracer
+
+
+def get_tracer() -> Tracer:
+    """Tracer global atual"""
+    return _tracer
+
+
+def span(name: str, activate: bool = True, **attributes: Any):
+    """
+    Abrir um span (use com "with")
+
+    Args:
+        name: Nome da operação
+        activate: Tornar o span pai dos spans abertos dentro do bloco
+            (False para geradores, que cedem o controle entre yields)
+        **attributes: Atributos iniciais; request_id identifica a execução
+            e é herdado pelos spans filhos
+
+    Returns:
+        Span, ou o span no-op se o tracing estiver desabilitado
+    """
+    tracer = _tracer
+    if not tracer.enabled:
+        return _NOOP_SPAN
+    return tracer.start_span(name, attributes, activate)
+
+
+def current_span():
+    """Span ativo no contexto atual (no-op se não houver)"""
+    return _current_span.get() or _NOOP_SPAN
+
+
+if TRACING_ENABLED:
+    configure_tracing()
+
+
+__all__ = [
+    "Span",
+    "SpanExporter",
+    "JsonlSpanExporter",
+    "InMemorySpanExporter",
+    "OpenTelemetrySpanExporter",
+    "Tracer",
+    "configure_tracing",
+    "get_tracer",
+    "span",
+    "current_span",
+]
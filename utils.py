@@ -1,5 +1,415 @@
 """Utilitários do projeto - mantém apenas funcionalidades essenciais"""
 
+import atexit
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Optional
+
 from tavily import TavilyClient
+from tinydb import TinyDB
+from tinydb.middlewares import CachingMiddleware
+from tinydb.storages import JSONStorage
+
+from cache import LRUCache, make_cache_key
+
+try:
+    from config import (
+        TAVILY_SEARCH_TTL, TAVILY_EXTRACT_TTL, TAVILY_STALE_TTL,
+        TAVILY_CACHE_MAX_ENTRIES, TAVILY_CACHE_MAX_BYTES, TAVILY_CACHE_PATH,
+        TAVILY_CACHE_DISK_MAX_ENTRIES, TAVILY_CACHE_DISK_MAX_BYTES,
+        TAVILY_CACHE_FLUSH_EVERY, TAVILY_CACHE_FLUSH_INTERVAL
+    )
+except ImportError:
+    TAVILY_SEARCH_TTL = 6 * 3600
+    TAVILY_EXTRACT_TTL = 24 * 3600
+    TAVILY_STALE_TTL = 3600
+    TAVILY_CACHE_MAX_ENTRIES = 512
+    TAVILY_CACHE_MAX_BYTES = 64 * 1024 * 1024
+    TAVILY_CACHE_PATH = None
+    TAVILY_CACHE_DISK_MAX_ENTRIES = 10_000
+    TAVILY_CACHE_DISK_MAX_BYTES = 256 * 1024 * 1024
+    TAVILY_CACHE_FLUSH_EVERY = 50
+    TAVILY_CACHE_FLUSH_INTERVAL = 30.0
+
+logger = logging.getLogger(__name__)
+
+
+def url_match_key(url: str) -> str:
+    """
+    Forma da URL usada para casar resultados do Tavily com as URLs pedidas
+
+    O Tavily pode devolver a URL normalizada (barra final, esquema, www,
+    fragmento), então o campo url da resposta nem sempre é a URL pedida.
+
+    Args:
+        url: URL pedida ou devolvida
+
+    Returns:
+        URL sem esquema, www, fragmento e barra final, com o host em minúsculas
+    """
+    url = url.split("#", 1)[0].strip()
+    _, _, rest = url.rpartition("://")
+    host, slash, path = rest.partition("/")
+    host = host.lower().removeprefix("www.")
+    return f"{host}{slash}{path}".rstrip("/")
+
+
+def match_extract_results(urls: list[str], items: list[dict]) -> dict[str, dict]:
+    """
+    Associar itens de results/failed_results do extract às URLs pedidas
+
+    Args:
+        urls: URLs enviadas ao Tavily
+        items: Itens da resposta (cada um com "url")
+
+    Returns:
+        Dict url pedida -> item, com o campo url reescrito para a URL pedida
+    """
+    if len(urls) == 1:
+        # Uma só URL pedida: o resultado pertence a ela, qualquer que seja a URL devolvida
+        return {urls[0]: {**items[0], "url": urls[0]}} if items else {}
+    requested = {url_match_key(url): url for url in urls}
+    matched: dict[str, dict] = {}
+    for item in items:
+        url = item.get("url")
+        url = url if url in urls else requested.get(url_match_key(url or ""))
+        if url is not None and url not in matched:
+            matched[url] = {**item, "url": url}
+    return matched
+
+
+class _TinyDBTier:
+    """
+    Tier persistente do cache Tavily em um arquivo TinyDB (uma tabela por endpoint)
+
+    O arquivo é lido uma vez ao abrir (CachingMiddleware) e um índice em
+    memória leva cada chave ao seu documento, sem varrer a tabela. As
+    gravações só reescrevem o arquivo a cada flush_every gravações, a cada
+    flush_interval segundos e no close(). Ao abrir, entradas mais velhas que
+    max_age do endpoint são removidas; acima de max_entries ou max_bytes as
+    gravadas há mais tempo saem primeiro.
+    """
+
+    def __init__(self, path: str, max_age: dict[str, float], max_entries: int = TAVILY_CACHE_DISK_MAX_ENTRIES, max_bytes: Optional[int] = TAVILY_CACHE_DISK_MAX_BYTES, flush_every: int = TAVILY_CACHE_FLUSH_EVERY, flush_interval: float = TAVILY_CACHE_FLUSH_INTERVAL):
+        """
+        Abrir o arquivo
+
+        Args:
+            path: Arquivo TinyDB
+            max_age: Idade máxima por endpoint (TTL + stale_ttl)
+            max_entries: Máximo de entradas no arquivo
+            max_bytes: Máximo de bytes (JSON) das entradas (None = sem limite)
+            flush_every: Gravações acumuladas antes de reescrever o arquivo
+            flush_interval: Segundos máximos entre reescritas
+        """
+        self._storage: Optional[CachingMiddleware] = None
+
+        def storage(*args, **kwargs) -> CachingMiddleware:
+            self._storage = CachingMiddleware(JSONStorage)(*args, **kwargs)
+            self._storage.WRITE_CACHE_SIZE = max(1, flush_every)
+            return self._storage
+
+        self._db = TinyDB(path, storage=storage)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self._flushed_at = time.monotonic()
+        self._lock = threading.Lock()
+        # (endpoint, key) -> (doc_id, bytes), da gravação mais antiga para a mais nova
+        self._index: OrderedDict[tuple[str, str], tuple[int, int]] = OrderedDict()
+        self._bytes = 0
+        self.evictions = 0
+
+        now = time.time()
+        documents, expired = [], 0
+        for endpoint in self._db.tables():
+            table = self._db.table(endpoint)
+            stale = [doc.doc_id for doc in table if now - doc.get("stored_at", 0) > max_age.get(endpoint, 0)]
+            if stale:
+                table.remove(doc_ids=stale)
+                expired += len(stale)
+            documents += [(doc.get("stored_at", 0), endpoint, doc) for doc in table]
+        for _, endpoint, doc in sorted(documents, key=lambda item: item[0]):
+            size = len(json.dumps(doc))
+            self._index[(endpoint, doc["key"])] = (doc.doc_id, size)
+            self._bytes += size
+        self._evict()
+        # Gravações pendentes ainda vão para o arquivo se o processo sair sem close()
+        atexit.register(self.flush)
+        if expired or self.evictions:
+            logger.info(f"📦 Cache Tavily em disco: {expired} entradas vencidas e {self.evictions} excedentes removidas")
+            self._storage.flush()
+
+    def get(self, endpoint: str, key: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._index.get((endpoint, key))
+            if entry is None:
+                return None
+            return self._db.table(endpoint).get(doc_id=entry[0])
+
+    def set(self, endpoint: str, key: str, entry: dict) -> None:
+        document = {"key": key, **entry}
+        size = len(json.dumps(document))
+        with self._lock:
+            table = self._db.table(endpoint)
+            current = self._index.pop((endpoint, key), None)
+            if current is not None:
+                table.update(document, doc_ids=[current[0]])
+                self._bytes -= current[1]
+                doc_id = current[0]
+            else:
+                doc_id = table.insert(document)
+            self._index[(endpoint, key)] = (doc_id, size)
+            self._bytes += size
+            self._evict()
+            if time.monotonic() - self._flushed_at >= self.flush_interval:
+                self._flush()
+
+    def stats(self) -> dict[str, int]:
+        """Entradas, bytes e remoções por limite"""
+        with self._lock:
+            return {"entries": len(self._index), "bytes": self._bytes, "evictions": self.evictions}
+
+    def flush(self) -> None:
+        """Gravar no arquivo as alterações pendentes"""
+        with self._lock:
+            self._flush()
+
+    def close(self) -> None:
+        atexit.unregister(self.flush)
+        with self._lock:
+            self._db.close()
+
+    def _flush(self) -> None:
+        self._storage.flush()
+        self._flushed_at = time.monotonic()
+
+    def _evict(self) -> None:
+        """Remover as entradas mais antigas acima dos limites"""
+        over = lambda: len(self._index) > self.max_entries or (self.max_bytes is not None and self._bytes > self.max_bytes)
+        while self._index and over():
+            (endpoint, _), (doc_id, size) = self._index.popitem(last=False)
+            self._db.table(endpoint).remove(doc_ids=[doc_id])
+            self._bytes -= size
+            self.evictions += 1
+
+
+class CachedTavilyClient:
+    """
+    TavilyClient com cache de search e extract.
+
+    Cada endpoint tem seu TTL. Entradas vencidas há menos de stale_ttl segundos
+    ainda são devolvidas (stale-while-revalidate) enquanto uma thread em
+    background busca a versão nova. O extract é cacheado por URL, então
+    listas de URLs só buscam as que faltam.
+    """
+
+    def __init__(
+        self,
+        client: Any = None,
+        search_ttl: float = TAVILY_SEARCH_TTL,
+        extract_ttl: float = TAVILY_EXTRACT_TTL,
+        stale_ttl: float = TAVILY_STALE_TTL,
+        max_entries: int = TAVILY_CACHE_MAX_ENTRIES,
+        max_bytes: Optional[int] = TAVILY_CACHE_MAX_BYTES,
+        db_path: Optional[str] = TAVILY_CACHE_PATH
+    ):
+        """
+        Inicializar wrapper
+
+        Args:
+            client: Cliente com search/extract (default: TavilyClient())
+            search_ttl: Validade dos resultados de search em segundos
+            extract_ttl: Validade do raw_content extraído em segundos
+            stale_ttl: Janela após o TTL em que a entrada vencida ainda é servida
+            max_entries: Máximo de entradas no tier em memória
+            max_bytes: Máximo de bytes no tier em memória
+            db_path: Arquivo TinyDB do tier persistente (None = só memória)
+        """
+        self.client = client if client is not None else TavilyClient()
+        self.ttls = {"search": search_ttl, "extract": extract_ttl}
+        self.stale_ttl = stale_ttl
+        self.memory = LRUCache(max_entries=max_entries, max_bytes=max_bytes)
+        self.disk = _TinyDBTier(db_path, {endpoint: ttl + stale_ttl for endpoint, ttl in self.ttls.items()}) if db_path else None
+        self._lock = threading.Lock()
+        self._refreshing: set[str] = set()
+        self._refresher = ThreadPoolExecutor(max_workers=2, thread_name_prefix="tavily-refresh")
+        self._stats = {
+            endpoint: {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0}
+            for endpoint in self.ttls
+        }
+
+    # ------------------------------------------------------------------
+    # Armazenamento
+    # ------------------------------------------------------------------
+
+    def _lookup(self, endpoint: str, key: str) -> tuple[Optional[Any], str]:
+        """
+        Buscar entrada e classificar sua idade
+
+        Returns:
+            (resposta, estado) com estado "fresh", "stale" ou "miss"
+        """
+        raw = self.memory.get(key)
+        entry = json.loads(raw) if raw is not None else None
+        if entry is None and self.disk is not None:
+            entry = self.disk.get(endpoint, key)
+            if entry is not None:
+                self.memory.set(key, json.dumps(entry))
+
+        if entry is None:
+            return None, "miss"
+        age = time.time() - entry["stored_at"]
+        if age <= self.ttls[endpoint]:
+            return entry["response"], "fresh"
+        if age <= self.ttls[endpoint] + self.stale_ttl:
+            return entry["response"], "stale"
+        return None, "miss"
+
+    def _store(self, endpoint: str, key: str, response: Any) -> None:
+        """Gravar resposta nos dois tiers"""
+        entry = {"stored_at": time.time(), "response": response}
+        self.memory.set(key, json.dumps(entry))
+        if self.disk is not None:
+            self.disk.set(endpoint, key, entry)
+
+    def _record(self, endpoint: str, state: str) -> None:
+        """Atualizar contadores do endpoint"""
+        counter = {"fresh": "hits", "stale": "stale_hits", "miss": "misses"}[state]
+        with self._lock:
+            self._stats[endpoint][counter] += 1
+        logger.debug(f"Tavily cache {endpoint}: {state} (hit ratio {self.hit_ratio(endpoint):.0%})")
+
+    def _revalidate(self, endpoint: str, key: str, fetch) -> None:
+        """Agendar atualização em background de uma entrada vencida"""
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                self._store(endpoint, key, fetch())
+                with self._lock:
+                    self._stats[endpoint]["refreshes"] += 1
+            except Exception as e:
+                logger.warning(f"Erro ao revalidar cache Tavily ({endpoint}): {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        self._refresher.submit(refresh)
+
+    # ------------------------------------------------------------------
+    # API compatível com TavilyClient
+    # ------------------------------------------------------------------
+
+    def search(self, query: str, **kwargs: Any) -> dict:
+        """
+        Executar search com cache
+
+        Args:
+            query: Query de busca
+            kwargs: Parâmetros repassados ao TavilyClient.search
+
+        Returns:
+            Resposta do Tavily
+        """
+        key = make_cache_key("search", query, kwargs)
+        response, state = self._lookup("search", key)
+        self._record("search", state)
+
+        fetch = lambda: self.client.search(query, **kwargs)
+        if state == "stale":
+            self._revalidate("search", key, fetch)
+        if response is None:
+            response = fetch()
+            self._store("search", key, response)
+        return response
+
+    def extract(self, urls: str | list[str], **kwargs: Any) -> dict:
+        """
+        Executar extract com cache por URL
+
+        Args:
+            urls: URL ou lista de URLs
+            kwargs: Parâmetros repassados ao TavilyClient.extract
+
+        Returns:
+            Resposta no formato do Tavily ({"results": [...], "failed_results": [...]})
+        """
+        url_list = [urls] if isinstance(urls, str) else list(urls)
+        keys = {url: make_cache_key("extract", url, kwargs) for url in url_list}
+        cached: dict[str, dict] = {}
+        missing: list[str] = []
+
+        for url in url_list:
+            result, state = self._lookup("extract", keys[url])
+            self._record("extract", state)
+            if state == "stale":
+                self._revalidate("extract", keys[url], lambda url=url: self._fetch_one(url, kwargs))
+            if result is None:
+                missing.append(url)
+            else:
+                cached[url] = result
+
+        failed: list[dict] = []
+        if missing:
+            response = self.client.extract(missing if len(missing) > 1 else missing[0], **kwargs)
+            # O Tavily pode normalizar a URL: o resultado é guardado com a URL pedida
+            for url, result in match_extract_results(missing, response.get("results", [])).items():
+                cached[url] = result
+                self._store("extract", keys[url], result)
+            failed = list(match_extract_results(missing, response.get("failed_results", [])).values())
+
+        return {
+            "results": [cached[url] for url in url_list if url in cached],
+            "failed_results": failed,
+        }
+
+    def _fetch_one(self, url: str, kwargs: dict) -> dict:
+        """Buscar o extract de uma única URL (usado na revalidação)"""
+        response = self.client.extract(url, **kwargs)
+        if not response.get("results"):
+            raise ValueError(f"Extract sem resultado para {url}")
+        return response["results"][0]
+
+    # ------------------------------------------------------------------
+    # Estatísticas
+    # ------------------------------------------------------------------
+
+    def hit_ratio(self, endpoint: str) -> float:
+        """Fração de lookups servidos pelo cache (frescos ou vencidos)"""
+        stats = self._stats[endpoint]
+        served = stats["hits"] + stats["stale_hits"]
+        total = served + stats["misses"]
+        return served / total if total else 0.0
+
+    def stats(self) -> dict[str, dict[str, float]]:
+        """Retornar contadores e hit ratio por endpoint"""
+        with self._lock:
+            stats = {endpoint: dict(counters) for endpoint, counters in self._stats.items()}
+        for endpoint in stats:
+            stats[endpoint]["hit_ratio"] = self.hit_ratio(endpoint)
+        return stats
+
+    def log_stats(self) -> None:
+        """Registrar o hit ratio de cada endpoint"""
+        for endpoint, counters in self.stats().items():
+            logger.info(
+                f"📦 Tavily cache {endpoint}: hit ratio {counters['hit_ratio']:.0%} "
+                f"({counters['hits']} hits, {counters['stale_hits']} stale, {counters['misses']} misses)"
+            )
+
+    def close(self) -> None:
+        """Encerrar revalidações pendentes e o tier persistente"""
+        self._refresher.shutdown(wait=True)
+        if self.disk is not None:
+            self.disk.close()
+
 
-__all__ = ["TavilyClient"]
\ No newline at end of file
+__all__ = ["TavilyClient", "CachedTavilyClient", "url_match_key", "match_extract_results"]
@@ -0,0 +1,176 @@
+"""
+Aquecimento e keep-alive dos modelos do Foundry Local
+
+O Foundry Local só carrega um modelo na memória da GPU/CPU no primeiro pedido
+e o descarrega depois de um tempo ocioso. Esse primeiro pedido leva dezenas
+de segundos (daí os timeouts de 120-300 s em config.py) e caía na pergunta
+do usuário. O ModelWarmer manda, em uma thread de background, um pedido de 1
+token a cada modelo assim que a UI, a API ou o batch sobem (o de queries
+primeiro, que é o primeiro a ser usado) e registra quanto cada carga levou.
+Depois, repete o pedido nos modelos que ficaram keepalive_interval segundos
+sem nenhuma chamada. ready() é a sonda de prontidão da UI e do GET /ready.
+"""
+
+import logging
+import threading
+import time
+from typing import Optional, Sequence
+
+from llm_client import AzureFoundryLocalLLM
+
+try:
+    from config import WARMUP_ENABLED, WARMUP_KEEPALIVE_INTERVAL, WARMUP_RETRY_INTERVAL, WARMUP_PROMPT
+except ImportError:
+    WARMUP_ENABLED = True
+    WARMUP_KEEPALIVE_INTERVAL = 240
+    WARMUP_RETRY_INTERVAL = 10
+    WARMUP_PROMPT = "Hi"
+
+logger = logging.getLogger(__name__)
+
+
+class ModelWarmer:
+    """Carregar os modelos em background e mantê-los carregados"""
+
+    COLD, LOADING, READY, FAILED = "cold", "loading", "ready", "failed"
+
+    def __init__(self, clients: Sequence[AzureFoundryLocalLLM], keepalive_interval: float = WARMUP_KEEPALIVE_INTERVAL, retry_interval: float = WARMUP_RETRY_INTERVAL, prompt: str = WARMUP_PROMPT):
+        """
+        Args:
+            clients: Um cliente por modelo, na ordem de carga
+            keepalive_interval: Segundos sem uso até o próximo ping (0 = só carregar)
+            retry_interval: Espera antes de tentar de novo uma carga que falhou
+            prompt: Texto dos pings
+        """
+        self.clients = {client.model: client for client in clients}
+        self.keepalive_interval = keepalive_interval
+        self.retry_interval = retry_interval
+        self.prompt = prompt
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._ready = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._started: Optional[float] = None
+        self._models = {
+            model: {
+                "state": self.COLD, "load_seconds": None, "ready_after_s": None, "pings": 0,
+                "failures": 0, "last_ping_s": None, "error": None, "calls": 0, "last_active": 0.0,
+            }
+            for model in self.clients
+        }
+
+    def start(self) -> "ModelWarmer":
+        """Iniciar o aquecimento em background (chamadas seguintes não fazem nada)"""
+        with self._lock:
+            if self._thread is None:
+                self._started = time.monotonic()
+                self._thread = threading.Thread(target=self._run, name="model-warmup", daemon=True)
+                self._thread.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = 5.0) -> None:
+        """Parar os pings (um ping em andamento termina sozinho)"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def ready(self) -> bool:
+        """Todos os modelos carregados e respondendo"""
+        return self._ready.is_set()
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """
+        Esperar os modelos ficarem prontos
+
+        Args:
+            timeout: Espera máxima em segundos (None = sem limite)
+
+        Returns:
+            True se ficaram prontos dentro do prazo
+        """
+        return self._ready.wait(timeout)
+
+    def status(self) -> dict:
+        """
+        Estado do aquecimento para a UI e o /health
+
+        Returns:
+            ready e, por modelo: state (cold, loading, ready, failed),
+            load_seconds (primeira carga), ready_after_s (desde start),
+            pings, failures, last_ping_s e error
+        """
+        with self._lock:
+            models = {
+                model: {key: value for key, value in state.items() if key not in ("calls", "last_active")}
+                for model, state in self._models.items()
+            }
+        return {"ready": self.ready(), "models": models}
+
+    def _run(self) -> None:
+        for model in self.clients:
+            while not self._ping(model):
+                if self._stop.wait(self.retry_interval):
+                    return
+        logger.info("✅ Modelos prontos em %.1fs", time.monotonic() - self._started)
+        if self.keepalive_interval <= 0:
+            return
+        # Uso é amostrado pelas chamadas de token_usage: o erro fica em 1/4 do intervalo
+        while not self._stop.wait(self.keepalive_interval / 4):
+            now = time.monotonic()
+            for model, client in self.clients.items():
+                state = self._models[model]
+                calls = client.token_usage()["calls"]
+                if calls != state["calls"]:
+                    # Chamadas do pipeline já mantêm o modelo carregado
+                    state["calls"], state["last_active"] = calls, now
+                elif now - state["last_active"] >= self.keepalive_interval:
+                    self._ping(model)
+
+    def _ping(self, model: str) -> bool:
+        """Um ping ao modelo, atualizando o estado; False se falhou"""
+        client, state = self.clients[model], self._models[model]
+        with self._lock:
+            if state["state"] != self.READY:
+                state["state"] = self.LOADING
+        try:
+            seconds = client.ping(self.prompt)
+        except Exception as e:
+            with self._lock:
+                state.update(state=self.FAILED, error=f"{type(e).__name__}: {e}", failures=state["failures"] + 1)
+                # Próximo ping do keep-alive em retry_interval, não no intervalo inteiro
+                state["last_active"] = time.monotonic() - self.keepalive_interval + self.retry_interval
+            self._ready.clear()
+            logger.warning("⚠️ Ping ao modelo %s falhou: %s", model, e)
+            return False
+
+        now = time.monotonic()
+        with self._lock:
+            first_load = state["load_seconds"] is None
+            state.update(state=self.READY, error=None, pings=state["pings"] + 1, last_ping_s=round(seconds, 3),
+                         calls=client.token_usage()["calls"], last_active=now)
+            if first_load:
+                state.update(load_seconds=round(seconds, 3), ready_after_s=round(now - self._started, 3))
+            all_ready = all(s["state"] == self.READY for s in self._models.values())
+        if first_load:
+            logger.info("🔥 Modelo %s carregado em %.1fs", model, seconds)
+        if all_ready:
+            self._ready.set()
+        return True
+
+
+def create_model_warmer(clients: Sequence[AzureFoundryLocalLLM]) -> Optional[ModelWarmer]:
+    """
+    Criar o aquecimento a partir de config.py
+
+    Args:
+        clients: Um cliente por modelo, na ordem de carga
+
+    Returns:
+        ModelWarmer (ainda parado) ou None se WARMUP_ENABLED for False
+    """
+    if not WARMUP_ENABLED:
+        return None
+    return ModelWarmer(clients)
+
+
+__all__ = ["ModelWarmer", "create_model_warmer"]